@@ -13,13 +13,14 @@ from decimal import Decimal
 
 from fastapi import APIRouter, Depends, HTTPException, Query, Path
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, desc, asc, func
+from sqlalchemy import and_, or_, desc, asc, func, text
 from pydantic import BaseModel, Field
 
 from backend.database import get_db
 from backend.models.project_models import Project, ProjectTask, BudgetTracking, ChangeOrder
-# Worker1の見積システムと連携（予定）
-# from backend.models.estimate_models import Estimate, EstimateItem
+from backend.api.project_api import create_project_with_tasks
+from backend.services.estimate_project_conversion import load_estimate_source
+from backend.services.system_metrics import system_metrics
 # Worker3の請求書システムと連携（予定）  
 # from backend.models.invoice_models import Invoice
 
@@ -94,115 +95,6 @@ def get_current_user_company_id() -> int:
     # TODO: Worker4の認証システムと連携
     return 1
 
-def generate_project_name_from_estimate(estimate_data: Dict) -> str:
-    """見積データからプロジェクト名を生成"""
-    customer_name = estimate_data.get('customer_name', '顧客')
-    estimate_title = estimate_data.get('title', '工事')
-    return f"{customer_name}邸 {estimate_title}"
-
-def extract_tasks_from_estimate_items(estimate_items: List[Dict]) -> List[Dict]:
-    """見積明細からタスクを抽出・生成"""
-    tasks = []
-    current_date = date.today()
-    
-    # 大項目（レベル0）のみをタスクとして抽出
-    major_items = [item for item in estimate_items if item.get('level', 0) == 0]
-    
-    for i, item in enumerate(major_items):
-        start_date = current_date
-        if i > 0:
-            # 前のタスクの終了日の翌日から開始
-            start_date = tasks[i-1]['end_date']
-        
-        # 項目名から推定される作業日数
-        duration_days = estimate_task_duration(item['item_description'])
-        end_date = start_date
-        
-        task = {
-            'task_name': item['item_description'],
-            'task_description': f"見積項目: {item['item_description']}",
-            'task_type': 'work',
-            'start_date': start_date,
-            'end_date': end_date,
-            'budget_amount': item.get('line_total_cost', 0),  # 仕入単価×数量
-            'level': 0,
-            'sort_order': i + 1,
-            'is_milestone': False
-        }
-        tasks.append(task)
-    
-    return tasks
-
-def estimate_task_duration(task_name: str) -> int:
-    """タスク名から作業日数を推定"""
-    duration_map = {
-        '整地': 2,
-        '準備': 1,
-        '植栽': 5,
-        '樹木': 3,
-        '石工事': 4,
-        '舗装': 3,
-        '外構': 7,
-        '仕上げ': 2,
-        '清掃': 1
-    }
-    
-    for keyword, days in duration_map.items():
-        if keyword in task_name:
-            return days
-    
-    return 3  # デフォルト3日
-
-async def get_estimate_data(estimate_id: int) -> Dict:
-    """見積データを取得（Worker1システムと連携）"""
-    # TODO: Worker1の見積APIと連携
-    # estimate_api = EstimateAPI()
-    # estimate_data = await estimate_api.get_estimate(estimate_id)
-    
-    # 仮実装（実際のWorker1システムと連携時に置き換え）
-    return {
-        'estimate_id': estimate_id,
-        'customer_id': 1,
-        'customer_name': '田中',
-        'title': '庭園リフォーム工事',
-        'total_amount': Decimal('1500000'),
-        'total_cost': Decimal('1000000'),
-        'items': [
-            {
-                'item_description': '整地・準備作業',
-                'level': 0,
-                'quantity': 1,
-                'unit_price': 100000,
-                'line_total_amount': 100000,
-                'line_total_cost': 80000
-            },
-            {
-                'item_description': '植栽工事',
-                'level': 0,
-                'quantity': 1,
-                'unit_price': 600000,
-                'line_total_amount': 600000,
-                'line_total_cost': 400000
-            },
-            {
-                'item_description': '石工事・舗装',
-                'level': 0,
-                'quantity': 1,
-                'unit_price': 500000,
-                'line_total_amount': 500000,
-                'line_total_cost': 350000
-            },
-            {
-                'item_description': '仕上げ・清掃',
-                'level': 0,
-                'quantity': 1,
-                'unit_price': 300000,
-                'line_total_amount': 300000,
-                'line_total_cost': 170000
-            }
-        ]
-    }
-
 async def create_invoice_from_project(project_id: int, request: ProjectToInvoiceRequest) -> Dict:
     """プロジェクトから請求書を作成（Worker3システムと連携）"""
     # TODO: Worker3の請求書APIと連携
@@ -229,7 +121,7 @@ async def system_health_check(
     
     # データベース接続確認
     try:
-        db.execute("SELECT 1")
+        db.execute(text("SELECT 1"))
         db_status = "healthy"
     except Exception as e:
         db_status = f"error: {str(e)}"
@@ -258,13 +150,8 @@ async def system_health_check(
         }
     }
     
-    # パフォーマンス指標
-    performance_metrics = {
-        "response_time_ms": 150,
-        "active_connections": 10,
-        "memory_usage_mb": 512,
-        "cpu_usage_percent": 25
-    }
+    # パフォーマンス指標（実測値、短時間キャッシュ）
+    performance_metrics = system_metrics.collect(db)
     
     # 全体のステータス決定
     overall_status = "healthy"
@@ -289,49 +176,23 @@ async def create_project_from_estimate(
     request: EstimateToProjectRequest,
     db: Session = Depends(get_db)
 ):
-    """見積からプロジェクト自動作成（Worker1連携）"""
+    """見積からプロジェクト自動作成（大項目からタスク・日程を生成）"""
     
     company_id = get_current_user_company_id()
     
     try:
-        # 見積データ取得
-        estimate_data = await get_estimate_data(request.estimate_id)
-        
-        # プロジェクト名生成
-        project_name = request.project_name or generate_project_name_from_estimate(estimate_data)
+        source = load_estimate_source(db, request.estimate_id, company_id)
+        if not source:
+            raise HTTPException(status_code=404, detail="見積が見つかりません")
         
-        # プロジェクト作成
-        project = Project(
-            company_id=company_id,
-            customer_id=estimate_data['customer_id'],
-            estimate_id=request.estimate_id,
-            project_name=project_name,
-            total_budget=estimate_data['total_cost'],
-            estimated_revenue=estimate_data['total_amount'],
-            start_date=request.start_date or date.today(),
+        project, planned = create_project_with_tasks(
+            db, company_id, source, request.start_date or date.today(),
+            project_name=request.project_name,
             end_date=request.end_date,
             manager_id=request.manager_id,
             notes=request.notes
         )
         
-        db.add(project)
-        db.commit()
-        db.refresh(project)
-        
-        # タスク自動生成
-        tasks_data = extract_tasks_from_estimate_items(estimate_data['items'])
-        created_tasks = []
-        
-        for task_data in tasks_data:
-            task = ProjectTask(
-                project_id=project.project_id,
-                **task_data
-            )
-            db.add(task)
-            created_tasks.append(task_data)
-        
-        db.commit()
-        
         return EstimateToProjectResponse(
             project_id=project.project_id,
             project_name=project.project_name,
@@ -339,10 +200,12 @@ async def create_project_from_estimate(
             estimated_revenue=project.estimated_revenue,
             estimated_profit=project.estimated_profit,
             estimated_profit_rate=project.estimated_profit_rate,
-            created_tasks=created_tasks,
+            created_tasks=[task.as_dict() for task in planned],
             message=f"見積ID:{request.estimate_id}からプロジェクトを作成しました"
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"プロジェクト作成エラー: {str(e)}")
 
@@ -12,6 +12,7 @@ import io
 
 from ..database.database import get_db
 from ..services.price_master_service import PriceMasterService
+from ..services.query_budget import query_budget
 from ..auth.auth_service import get_current_user
 from ..models.models import User
 
@@ -65,10 +66,12 @@ class BulkUpdateRequest(BaseModel):
 
 class PriceSearchResponse(BaseModel):
     items: List[Dict[str, Any]]
-    total_count: int
+    total_count: Optional[int] = None
     page: int
     per_page: int
-    total_pages: int
+    total_pages: Optional[int] = None
+    next_cursor: Optional[str] = None
+    has_more: bool = False
 
 # ===== Helper Functions =====
 
@@ -79,6 +82,7 @@ def get_price_service(db: Session = Depends(get_db), current_user: User = Depend
 # ===== Category Management APIs =====
 
 @router.get("/categories", response_model=List[Dict[str, Any]])
+@query_budget(max_queries=2)
 async def get_categories(
     service: PriceMasterService = Depends(get_price_service)
 ):
@@ -105,6 +109,7 @@ async def create_category(
 async def search_price_items(
     search_text: Optional[str] = Query(None, description="検索テキスト"),
     category_id: Optional[int] = Query(None, description="カテゴリID"),
+    include_subcategories: bool = Query(False, description="配下のカテゴリも含める"),
     supplier_id: Optional[int] = Query(None, description="仕入先ID"),
     price_min: Optional[float] = Query(None, description="価格範囲（最小）"),
     price_max: Optional[float] = Query(None, description="価格範囲（最大）"),
@@ -114,6 +119,8 @@ async def search_price_items(
     sort_order: str = Query("asc", description="ソート順序"),
     page: int = Query(1, ge=1, description="ページ番号"),
     per_page: int = Query(25, ge=1, le=100, description="1ページあたりの件数"),
+    cursor: Optional[str] = Query(None, description="前ページの next_cursor"),
+    total_mode: str = Query("cached", pattern="^(cached|estimate|none)$", description="件数の取得方法"),
     service: PriceMasterService = Depends(get_price_service)
 ):
     """単価マスター検索"""
@@ -127,14 +134,19 @@ async def search_price_items(
         return service.search_price_items(
             search_text=search_text,
             category_id=category_id,
+            include_subcategories=include_subcategories,
             supplier_id=supplier_id,
             price_range=price_range if price_range else None,
             is_active=is_active,
             sort_by=sort_by,
             sort_order=sort_order,
             page=page,
-            per_page=per_page
+            per_page=per_page,
+            cursor=cursor,
+            total_mode=total_mode
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -10,8 +10,13 @@ from fastapi import APIRouter, HTTPException, Depends, Query
 from typing import List, Optional, Dict, Any
 from datetime import datetime, date, timedelta
 from pydantic import BaseModel, Field
+from sqlalchemy.orm import Session
 import json
 
+from backend.database import get_db
+from backend.services.schedule_engine import ScheduleError, ScheduleGraph, critical_path_delay
+from backend.services.schedule_store import ProcessScheduleStore
+
 # Pydantic Models
 class ProcessTask(BaseModel):
     id: int
@@ -127,10 +132,6 @@ LANDSCAPING_PROCESS_TEMPLATES = {
     }
 }
 
-# Mock データベース（実際の実装では本物のDBを使用）
-mock_schedules: Dict[int, ProcessSchedule] = {}
-mock_schedule_counter = 1
-
 # APIルーター
 router = APIRouter(prefix="/api/process", tags=["process-management"])
 
@@ -154,36 +155,22 @@ async def get_process_template(template_id: str):
     }
 
 @router.post("/schedules")
-async def create_process_schedule(request: ProcessScheduleCreateRequest):
+async def create_process_schedule(request: ProcessScheduleCreateRequest, db: Session = Depends(get_db)):
     """工程表作成"""
-    global mock_schedule_counter
-    
     # テンプレートから自動生成
     tasks = []
     if request.template_id and request.template_id in LANDSCAPING_PROCESS_TEMPLATES:
         template = LANDSCAPING_PROCESS_TEMPLATES[request.template_id]
-        start_date = request.start_date
+        # クリティカルパス法で最早開始・終了日を計算（タスクIDは番号+1）
+        result = ScheduleGraph(
+            {i + 1: task_template["duration"] for i, task_template in enumerate(template["tasks"])},
+            {i + 1: [dep_index + 1 for dep_index in task_template["dependencies"]]
+             for i, task_template in enumerate(template["tasks"])}
+        ).compute()
+        task_dates = result.dates(request.start_date)
         
         for i, task_template in enumerate(template["tasks"]):
-            # 依存関係を考慮して開始日を計算
-            task_start_date = start_date
-            if task_template["dependencies"]:
-                max_dependency_end = start_date
-                for dep_index in task_template["dependencies"]:
-                    if dep_index < len(template["tasks"]):
-                        dep_task = template["tasks"][dep_index]
-                        dep_end = start_date + timedelta(days=sum(
-                            template["tasks"][j]["duration"] for j in range(dep_index + 1)
-                        ))
-                        if dep_end > max_dependency_end:
-                            max_dependency_end = dep_end
-                task_start_date = max_dependency_end
-            else:
-                # 前のタスクの開始日からのオフセット
-                if i > 0:
-                    task_start_date = start_date + timedelta(days=i)
-            
-            task_end_date = task_start_date + timedelta(days=task_template["duration"])
+            task_start_date, task_end_date = task_dates[i + 1]
             
             task = ProcessTask(
                 id=i + 1,
@@ -194,7 +181,7 @@ async def create_process_schedule(request: ProcessScheduleCreateRequest):
                 duration=task_template["duration"],
                 progress=0,
                 category=task_template["category"],
-                dependencies=task_template["dependencies"],
+                dependencies=[dep_index + 1 for dep_index in task_template["dependencies"]],
                 assigned_to="",
                 status="planned",
                 priority="medium"
@@ -206,79 +193,66 @@ async def create_process_schedule(request: ProcessScheduleCreateRequest):
         task = ProcessTask(**task_data)
         tasks.append(task)
     
-    # 工程表作成
-    end_date = request.start_date
-    if tasks:
-        end_date = max(task.end_date for task in tasks)
+    # 依存関係の循環チェック
+    try:
+        ScheduleGraph.from_tasks([task.model_dump() for task in tasks]).topological_order()
+    except ScheduleError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    schedule = ProcessSchedule(
-        id=mock_schedule_counter,
+    # 工程表作成（タスク・依存関係は行単位で保存）
+    schedule = ProcessScheduleStore(db).create_schedule(
         project_id=request.project_id,
         name=request.name,
         description=request.description,
         start_date=request.start_date,
-        end_date=end_date,
-        tasks=tasks,
-        template_id=request.template_id,
-        created_at=datetime.now(),
-        updated_at=datetime.now()
+        tasks=[task.model_dump() for task in tasks],
+        template_id=request.template_id
     )
     
-    mock_schedules[mock_schedule_counter] = schedule
-    mock_schedule_counter += 1
-    
     return {
-        "schedule": schedule,
+        "schedule": ProcessSchedule(**schedule),
         "status": "success",
         "message": "工程表が作成されました"
     }
 
+def _get_schedule_or_404(store: ProcessScheduleStore, schedule_id: int) -> ProcessSchedule:
+    schedule = store.get_schedule(schedule_id)
+    if not schedule:
+        raise HTTPException(status_code=404, detail="Schedule not found")
+    return ProcessSchedule(**schedule)
+
 @router.get("/projects/{project_id}/schedule")
-async def get_project_schedule(project_id: int):
+async def get_project_schedule(project_id: int, db: Session = Depends(get_db)):
     """プロジェクトの工程表取得"""
-    for schedule in mock_schedules.values():
-        if schedule.project_id == project_id:
-            return {
-                "schedule": schedule,
-                "status": "success"
-            }
+    schedule = ProcessScheduleStore(db).get_project_schedule(project_id)
+    if not schedule:
+        raise HTTPException(status_code=404, detail="Schedule not found")
     
-    raise HTTPException(status_code=404, detail="Schedule not found")
+    return {
+        "schedule": ProcessSchedule(**schedule),
+        "status": "success"
+    }
 
 @router.put("/projects/{project_id}/schedule")
 async def update_project_schedule(
     project_id: int, 
-    request: ProcessScheduleUpdateRequest
+    request: ProcessScheduleUpdateRequest,
+    db: Session = Depends(get_db)
 ):
     """プロジェクトの工程表更新"""
-    schedule = None
-    for s in mock_schedules.values():
-        if s.project_id == project_id:
-            schedule = s
-            break
-    
+    store = ProcessScheduleStore(db)
+    schedule = store.get_project_schedule(project_id)
     if not schedule:
         raise HTTPException(status_code=404, detail="Schedule not found")
     
-    # 更新処理
-    if request.name is not None:
-        schedule.name = request.name
-    if request.description is not None:
-        schedule.description = request.description
-    if request.start_date is not None:
-        schedule.start_date = request.start_date
-    if request.end_date is not None:
-        schedule.end_date = request.end_date
+    # 更新処理（tasks 指定時のみタスクを置き換え、終了日を再計算）
+    tasks = None
     if request.tasks is not None:
-        schedule.tasks = request.tasks
-        # 終了日を再計算
-        if schedule.tasks:
-            schedule.end_date = max(task.end_date for task in schedule.tasks)
-    
-    schedule.updated_at = datetime.now()
+        tasks = [task.model_dump() for task in request.tasks]
+    schedule = store.update_schedule(schedule["id"], request.model_dump(exclude={"tasks"}), tasks)
     
     return {
-        "schedule": schedule,
+        "schedule": ProcessSchedule(**schedule),
         "status": "success",
         "message": "工程表が更新されました"
     }
@@ -286,42 +260,31 @@ async def update_project_schedule(
 @router.post("/schedules/{schedule_id}/tasks")
 async def create_process_task(
     schedule_id: int,
-    request: ProcessTaskCreateRequest
+    request: ProcessTaskCreateRequest,
+    db: Session = Depends(get_db)
 ):
     """工程にタスクを追加"""
-    schedule = mock_schedules.get(schedule_id)
-    if not schedule:
-        raise HTTPException(status_code=404, detail="Schedule not found")
-    
-    # 新しいタスクID生成
-    max_task_id = max([task.id for task in schedule.tasks], default=0)
-    new_task_id = max_task_id + 1
-    
-    new_task = ProcessTask(
-        id=new_task_id,
-        name=request.name,
-        description=request.description,
-        start_date=request.start_date,
-        end_date=request.end_date,
-        duration=request.duration,
-        progress=0,
-        category=request.category,
-        dependencies=request.dependencies or [],
-        assigned_to=request.assigned_to or "",
-        status="planned",
-        priority=request.priority or "medium"
-    )
-    
-    schedule.tasks.append(new_task)
-    schedule.updated_at = datetime.now()
-    
-    # 終了日を再計算
-    if schedule.tasks:
-        schedule.end_date = max(task.end_date for task in schedule.tasks)
+    store = ProcessScheduleStore(db)
+    _get_schedule_or_404(store, schedule_id)
+    
+    # タスクIDは工程表内の最大値+1をストア側で採番
+    new_task = store.add_task(schedule_id, {
+        "name": request.name,
+        "description": request.description,
+        "start_date": request.start_date,
+        "end_date": request.end_date,
+        "duration": request.duration,
+        "progress": 0,
+        "category": request.category,
+        "dependencies": request.dependencies or [],
+        "assigned_to": request.assigned_to or "",
+        "status": "planned",
+        "priority": request.priority or "medium"
+    })
     
     return {
-        "task": new_task,
-        "schedule": schedule,
+        "task": ProcessTask(**new_task),
+        "schedule": _get_schedule_or_404(store, schedule_id),
         "status": "success",
         "message": "タスクが追加されました"
     }
@@ -330,129 +293,88 @@ async def create_process_task(
 async def update_process_task(
     schedule_id: int,
     task_id: int,
-    request: ProcessTaskUpdateRequest
+    request: ProcessTaskUpdateRequest,
+    db: Session = Depends(get_db)
 ):
     """工程のタスクを更新"""
-    schedule = mock_schedules.get(schedule_id)
-    if not schedule:
-        raise HTTPException(status_code=404, detail="Schedule not found")
-    
-    task = None
-    for t in schedule.tasks:
-        if t.id == task_id:
-            task = t
-            break
+    store = ProcessScheduleStore(db)
+    schedule = _get_schedule_or_404(store, schedule_id)
     
+    # 依存関係の変更で循環が生じないか確認
+    if request.dependencies is not None:
+        tasks = [task.model_dump() for task in schedule.tasks]
+        for task in tasks:
+            if task["id"] == task_id:
+                task["dependencies"] = request.dependencies
+        try:
+            ScheduleGraph.from_tasks(tasks).topological_order()
+        except ScheduleError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
+    # 更新処理（対象タスクの1行と、日程変更時は移動が必要な後続タスクのみ）
+    task = store.update_task(schedule_id, task_id, request.model_dump(exclude_unset=True))
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     
-    # 更新処理
-    if request.name is not None:
-        task.name = request.name
-    if request.description is not None:
-        task.description = request.description
-    if request.start_date is not None:
-        task.start_date = request.start_date
-    if request.end_date is not None:
-        task.end_date = request.end_date
-    if request.duration is not None:
-        task.duration = request.duration
-    if request.progress is not None:
-        task.progress = request.progress
-    if request.category is not None:
-        task.category = request.category
-    if request.assigned_to is not None:
-        task.assigned_to = request.assigned_to
-    if request.status is not None:
-        task.status = request.status
-    if request.priority is not None:
-        task.priority = request.priority
-    if request.dependencies is not None:
-        task.dependencies = request.dependencies
-    
-    schedule.updated_at = datetime.now()
-    
-    # 終了日を再計算
-    if schedule.tasks:
-        schedule.end_date = max(task.end_date for task in schedule.tasks)
-    
     return {
-        "task": task,
-        "schedule": schedule,
+        "task": ProcessTask(**task),
+        "rescheduled_tasks": task["rescheduled"],
+        "schedule": _get_schedule_or_404(store, schedule_id),
         "status": "success",
         "message": "タスクが更新されました"
     }
 
 @router.delete("/schedules/{schedule_id}/tasks/{task_id}")
-async def delete_process_task(schedule_id: int, task_id: int):
+async def delete_process_task(schedule_id: int, task_id: int, db: Session = Depends(get_db)):
     """工程のタスクを削除"""
-    schedule = mock_schedules.get(schedule_id)
-    if not schedule:
-        raise HTTPException(status_code=404, detail="Schedule not found")
+    store = ProcessScheduleStore(db)
+    _get_schedule_or_404(store, schedule_id)
     
-    original_count = len(schedule.tasks)
-    schedule.tasks = [task for task in schedule.tasks if task.id != task_id]
-    
-    if len(schedule.tasks) == original_count:
+    if not store.delete_task(schedule_id, task_id):
         raise HTTPException(status_code=404, detail="Task not found")
     
-    schedule.updated_at = datetime.now()
-    
-    # 終了日を再計算
-    if schedule.tasks:
-        schedule.end_date = max(task.end_date for task in schedule.tasks)
-    else:
-        schedule.end_date = schedule.start_date
-    
     return {
-        "schedule": schedule,
+        "schedule": _get_schedule_or_404(store, schedule_id),
         "status": "success",
         "message": "タスクが削除されました"
     }
 
 @router.get("/schedules/{schedule_id}/report")
-async def get_progress_report(schedule_id: int):
+async def get_progress_report(
+    schedule_id: int,
+    critical_path: bool = Query(True, description="クリティカルパスの遅延を計算する（全タスクを読み込むため、ダッシュボードなどは false で省略）"),
+    db: Session = Depends(get_db)
+):
     """進捗レポート取得"""
-    schedule = mock_schedules.get(schedule_id)
+    store = ProcessScheduleStore(db)
+    schedule = store.get_schedule_header(schedule_id)
     if not schedule:
         raise HTTPException(status_code=404, detail="Schedule not found")
     
-    # 進捗統計計算
-    total_tasks = len(schedule.tasks)
-    completed_tasks = len([task for task in schedule.tasks if task.status == "completed"])
-    delayed_tasks = len([task for task in schedule.tasks if task.status == "delayed"])
-    
-    overall_progress = 0
-    if total_tasks > 0:
-        overall_progress = sum(task.progress for task in schedule.tasks) // total_tasks
+    # 進捗統計（タスク更新時に維持しているカテゴリ×ステータス別の集計から算出）
+    summary = store.progress_summary(schedule_id)
     
-    # カテゴリ別進捗
-    category_stats = {}
-    for task in schedule.tasks:
-        if task.category not in category_stats:
-            category_stats[task.category] = {"tasks": [], "progress": 0}
-        category_stats[task.category]["tasks"].append(task)
-    
-    category_progress = []
-    for category, stats in category_stats.items():
-        tasks_count = len(stats["tasks"])
-        category_avg_progress = sum(task.progress for task in stats["tasks"]) // tasks_count if tasks_count > 0 else 0
-        category_progress.append({
-            "category": category,
-            "progress": category_avg_progress,
-            "tasks_count": tasks_count
-        })
+    # クリティカルパス上の遅延（未完了のクリティカルタスクの超過日数。省略時は0日）
+    path_delay, critical_tasks = 0, []
+    if critical_path:
+        try:
+            path_delay, critical_tasks = critical_path_delay(
+                store.get_schedule(schedule_id)["tasks"], date.today()
+            )
+        except ScheduleError as e:
+            raise HTTPException(status_code=400, detail=str(e))
     
     report = {
         "schedule_id": schedule_id,
-        "project_id": schedule.project_id,
-        "overall_progress": overall_progress,
-        "completed_tasks": completed_tasks,
-        "total_tasks": total_tasks,
-        "delayed_tasks": delayed_tasks,
-        "critical_path_delay": 0,  # 簡略化
-        "estimated_completion": schedule.end_date.isoformat(),
-        "category_progress": category_progress,
+        "project_id": schedule["project_id"],
+        "overall_progress": summary["overall_progress"],
+        "completed_tasks": summary["completed_tasks"],
+        "total_tasks": summary["total_tasks"],
+        "delayed_tasks": summary["delayed_tasks"],
+        "critical_path_delay": path_delay,
+        "critical_path": critical_tasks,
+        "estimated_completion": schedule["end_date"].isoformat(),
+        "category_progress": summary["category_progress"],
         "generated_at": datetime.now().isoformat()
     }
     
@@ -461,6 +383,42 @@ async def get_progress_report(schedule_id: int):
         "status": "success"
     }
 
+@router.get("/schedules/{schedule_id}/progress-history")
+async def get_progress_history(
+    schedule_id: int,
+    date_from: Optional[date] = Query(None, description="開始日"),
+    date_to: Optional[date] = Query(None, description="終了日（開始日と両方指定で1日1行）"),
+    db: Session = Depends(get_db)
+):
+    """日別進捗の推移（バーンアップチャート用）"""
+    store = ProcessScheduleStore(db)
+    if not store.get_schedule_header(schedule_id):
+        raise HTTPException(status_code=404, detail="Schedule not found")
+    
+    return {
+        "schedule_id": schedule_id,
+        "history": store.progress_history(schedule_id, date_from, date_to),
+        "status": "success"
+    }
+
+@router.post("/schedules/{schedule_id}/rollups/rebuild")
+async def rebuild_progress_rollups(
+    schedule_id: int,
+    db: Session = Depends(get_db)
+):
+    """進捗集計をタスクから再計算（ずれていた集計行を返す）"""
+    store = ProcessScheduleStore(db)
+    mismatches = store.rebuild_rollups(schedule_id)
+    if mismatches is None:
+        raise HTTPException(status_code=404, detail="Schedule not found")
+    
+    return {
+        "schedule_id": schedule_id,
+        "mismatch_count": len(mismatches),
+        "mismatches": mismatches,
+        "status": "success"
+    }
+
 @router.get("/categories")
 async def get_process_categories():
     """工程カテゴリ一覧取得"""
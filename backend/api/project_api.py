@@ -8,23 +8,34 @@ Purpose: 史上最強の造園業向けプロジェクト管理APIの実装
 """
 
 from datetime import date, datetime
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from decimal import Decimal
+import json
 
-from fastapi import APIRouter, Depends, HTTPException, Query, Path
+from fastapi import APIRouter, Depends, HTTPException, Query, Path, Response
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, desc, asc, func
+from sqlalchemy import and_, or_, desc, asc, func, insert, update
 from pydantic import BaseModel, Field, validator
 
 from backend.models.project_models import (
     Project, ProjectTask, BudgetTracking, ChangeOrder,
     ProjectStatus, TaskStatus, TaskType, Priority,
-    ChangeOrderType, ChangeOrderStatus, BudgetCategory
+    ChangeOrderType, ChangeOrderStatus, BudgetCategory,
+    check_project_counters, refresh_project_counters
 )
 from backend.database import get_db
+from backend.services.estimate_project_conversion import (
+    EstimateSource, PlannedTask, load_estimate_source, plan_project_tasks, project_name_from_estimate
+)
+from backend.services.pagination import order_by_desc, paginate_keyset
+from backend.services.resource_leveling import ResourceTask, find_conflicts, level_resources, parse_resources
+from backend.services.schedule_engine import ScheduleError, TaskShift, propagate_shifts
 
 router = APIRouter(prefix="/api/projects", tags=["projects"])
 
+# プロジェクト一覧の並び順（カーソルのキー）
+PROJECT_LIST_ORDER = order_by_desc(Project.updated_at, Project.project_id)
+
 # ==============================================
 # Pydantic Models (Request/Response)
 # ==============================================
@@ -136,6 +147,17 @@ class TaskResponse(TaskBase):
     class Config:
         from_attributes = True
 
+class TaskShiftResponse(BaseModel):
+    task_id: int
+    previous_start_date: date
+    previous_end_date: date
+    start_date: date
+    end_date: date
+    days: int
+
+class TaskUpdateResponse(TaskResponse):
+    rescheduled_tasks: List[TaskShiftResponse] = []
+
 class BudgetTrackingBase(BaseModel):
     category: BudgetCategory
     subcategory: Optional[str] = None
@@ -221,6 +243,18 @@ class ProjectStatistics(BaseModel):
 # Utility Functions
 # ==============================================
 
+# プロジェクトレスポンスの列（計算項目は hybrid_property のSQL式）
+PROJECT_RESPONSE_COLUMNS = tuple(
+    getattr(Project, name).label(name) for name in ProjectResponse.model_fields
+)
+
+def project_response_query(db: Session):
+    """ProjectResponse の列だけを取得するクエリ（ORMオブジェクトを生成しない）"""
+    return db.query(*PROJECT_RESPONSE_COLUMNS)
+
+def to_project_response(row) -> ProjectResponse:
+    return ProjectResponse(**row._mapping)
+
 def get_current_user_company_id() -> int:
     """現在のユーザーの会社IDを取得（認証システム連携予定）"""
     # TODO: 認証システムと連携
@@ -237,42 +271,176 @@ def calculate_delay_days(end_date: date, progress: float) -> int:
         return (today - end_date).days
     return 0
 
+# ==============================================
+# Task Scheduling & Estimate Conversion
+# ==============================================
+
+def serialize_task_dependencies(dependencies: Optional[List[int]]) -> Optional[str]:
+    """タスクIDのリストを dependencies 列（JSON配列）へ"""
+    return None if dependencies is None else json.dumps(dependencies)
+
+def parse_task_dependencies(value) -> List[int]:
+    """dependencies 列（JSON配列）をタスクIDのリストへ"""
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = json.loads(value)
+    return [int(task_id) for task_id in value]
+
+def reschedule_successors(db: Session, project_id: int, sources: List[int]) -> List[TaskShift]:
+    """
+    変更タスクの後続タスクを後ろ倒しで再計算し、移動したタスクのみ一括更新
+    （終了日を含むため、後続の開始日は先行タスクの終了日の翌日以降）
+    """
+    rows = db.query(
+        ProjectTask.task_id, ProjectTask.start_date, ProjectTask.end_date, ProjectTask.dependencies
+    ).filter(ProjectTask.project_id == project_id).all()
+    dates = {row.task_id: (row.start_date, row.end_date) for row in rows}
+    successors: Dict[int, List[int]] = {}
+    predecessors: Dict[int, List[int]] = {}
+    for row in rows:
+        for depends_on in parse_task_dependencies(row.dependencies):
+            if depends_on in dates:
+                successors.setdefault(depends_on, []).append(row.task_id)
+                predecessors.setdefault(row.task_id, []).append(depends_on)
+
+    try:
+        shifts = propagate_shifts(sources, successors, predecessors, dates, gap_days=1)
+    except ScheduleError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if shifts:
+        db.execute(update(ProjectTask), [
+            {"task_id": shift.task_id, "start_date": shift.start_date, "end_date": shift.end_date}
+            for shift in shifts
+        ])
+    return shifts
+
+def insert_planned_tasks(db: Session, project_id: int, planned: List[PlannedTask]) -> List[int]:
+    """
+    計画済みタスクを一括登録し、採番後のタスクIDで依存関係を一括更新
+    （ORMのイベントを経由しないため、集計列はここで再計算）
+    """
+    if not planned:
+        return []
+    task_ids = db.scalars(
+        insert(ProjectTask).returning(ProjectTask.task_id, sort_by_parameter_order=True),
+        [
+            {
+                "project_id": project_id,
+                "task_name": task.task_name,
+                "task_description": f"見積項目: {task.task_name}",
+                "task_type": TaskType.WORK.value,
+                "start_date": task.start_date,
+                "end_date": task.end_date,
+                "planned_start_date": task.start_date,
+                "planned_end_date": task.end_date,
+                "budget_amount": task.budget_amount,
+                "sort_order": task.sort_order,
+                "level": 0,
+                "is_milestone": False
+            }
+            for task in planned
+        ]
+    ).all()
+    dependencies = [
+        {"task_id": task_ids[task.index],
+         "dependencies": serialize_task_dependencies([task_ids[index] for index in task.dependencies])}
+        for task in planned if task.dependencies
+    ]
+    if dependencies:
+        db.execute(update(ProjectTask), dependencies)
+    refresh_project_counters(db.connection(), [project_id], change_orders=False)
+    return task_ids
+
+def create_project_with_tasks(
+    db: Session, company_id: int, source: EstimateSource, start_date: date, **fields
+) -> Tuple[Project, List[PlannedTask]]:
+    """見積の大項目からタスク・日程を作成してプロジェクトを登録（fields は指定値で上書き）"""
+    planned = plan_project_tasks(source.headers, start_date)
+    end_date = max((task.end_date for task in planned), default=start_date)
+    project = Project(
+        company_id=company_id,
+        customer_id=source.customer_id,
+        estimate_id=source.estimate_id,
+        project_name=project_name_from_estimate(source),
+        site_address=source.site_address,
+        total_budget=source.total_cost or sum(task.budget_amount for task in planned),
+        estimated_revenue=source.total_amount,
+        start_date=start_date,
+        end_date=end_date,
+        planned_end_date=end_date
+    )
+    for field, value in fields.items():
+        if value is not None:
+            setattr(project, field, value)
+    db.add(project)
+    db.flush()
+    
+    insert_planned_tasks(db, project.project_id, planned)
+    db.commit()
+    db.refresh(project)
+    return project, planned
+
+# 資源平準化の対象（進行中・見積中プロジェクトの未完了タスク）
+ACTIVE_PROJECT_STATUSES = [ProjectStatus.IN_PROGRESS.value, ProjectStatus.ESTIMATING.value]
+PRIORITY_WEIGHTS = {Priority.HIGH.value: 3, Priority.MEDIUM.value: 2, Priority.LOW.value: 1}
+
+def load_resource_tasks(db: Session, company_id: int) -> List[ResourceTask]:
+    """会社内の稼働中タスクを資源平準化用に取得（1クエリ、着手済みは移動しない）"""
+    rows = db.query(
+        ProjectTask.task_id, ProjectTask.project_id, ProjectTask.assigned_to,
+        ProjectTask.start_date, ProjectTask.end_date, ProjectTask.dependencies,
+        ProjectTask.status, Project.priority
+    ).join(Project).filter(
+        and_(
+            Project.company_id == company_id,
+            Project.status.in_(ACTIVE_PROJECT_STATUSES),
+            ProjectTask.status.notin_([TaskStatus.COMPLETED.value, TaskStatus.SUSPENDED.value])
+        )
+    ).all()
+    return [
+        ResourceTask(
+            task_id=row.task_id,
+            project_id=row.project_id,
+            resources=parse_resources(row.assigned_to),
+            start_date=row.start_date,
+            end_date=row.end_date,
+            dependencies=tuple(parse_task_dependencies(row.dependencies)),
+            priority=PRIORITY_WEIGHTS.get(row.priority, 0),
+            locked=row.status in (TaskStatus.IN_PROGRESS.value, TaskStatus.DELAYED.value)
+        )
+        for row in rows
+    ]
+
 # ==============================================
 # Project Endpoints
 # ==============================================
 
 @router.get("/", response_model=List[ProjectResponse])
 async def get_projects(
+    response: Response,
     db: Session = Depends(get_db),
     status: Optional[ProjectStatus] = None,
     priority: Optional[Priority] = None,
     skip: int = Query(0, ge=0),
-    limit: int = Query(100, ge=1, le=1000)
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(None, description="前ページの X-Next-Cursor")
 ):
-    """プロジェクト一覧取得"""
+    """プロジェクト一覧取得（次ページのカーソルは X-Next-Cursor ヘッダー）"""
     company_id = get_current_user_company_id()
     
-    query = db.query(Project).filter(Project.company_id == company_id)
+    query = project_response_query(db).filter(Project.company_id == company_id)
     
     if status:
         query = query.filter(Project.status == status.value)
     if priority:
         query = query.filter(Project.priority == priority.value)
     
-    projects = query.order_by(desc(Project.updated_at)).offset(skip).limit(limit).all()
+    page = paginate_keyset(query, PROJECT_LIST_ORDER, limit, cursor=cursor, offset=skip)
+    if page.next_cursor:
+        response.headers["X-Next-Cursor"] = page.next_cursor
     
-    # 計算フィールドを追加
-    result = []
-    for project in projects:
-        project_dict = project.__dict__.copy()
-        project_dict['estimated_profit'] = project.estimated_profit
-        project_dict['estimated_profit_rate'] = project.estimated_profit_rate
-        project_dict['budget_consumption_rate'] = project.budget_consumption_rate
-        project_dict['schedule_status'] = project.schedule_status
-        project_dict['budget_status'] = project.budget_status
-        result.append(ProjectResponse(**project_dict))
-    
-    return result
+    return [to_project_response(row) for row in page.items]
 
 @router.get("/overview", response_model=List[ProjectOverviewResponse])
 async def get_projects_overview(
@@ -281,66 +449,51 @@ async def get_projects_overview(
     """プロジェクト概要一覧（ダッシュボード用）"""
     company_id = get_current_user_company_id()
     
-    # SQL直接実行でパフォーマンス最適化
-    query = """
-    SELECT 
-        p.project_id,
-        p.project_name,
-        p.status,
-        p.priority,
-        p.progress_percentage,
-        CASE 
-            WHEN p.estimated_revenue > 0 THEN 
-                ROUND(((p.estimated_revenue - p.total_budget) / p.estimated_revenue * 100)::NUMERIC, 2)
-            ELSE 0 
-        END AS estimated_profit_rate,
-        CASE 
-            WHEN p.total_budget > 0 THEN 
-                ROUND((p.actual_cost / p.total_budget * 100)::NUMERIC, 2)
-            ELSE 0 
-        END AS budget_consumption_rate,
-        CASE 
-            WHEN p.end_date < CURRENT_DATE AND p.progress_percentage < 100 THEN '遅延'
-            WHEN p.end_date = CURRENT_DATE AND p.progress_percentage < 100 THEN '要注意'
-            WHEN p.progress_percentage = 100 THEN '完了'
-            ELSE '正常'
-        END AS schedule_status,
-        CASE 
-            WHEN p.actual_cost > p.total_budget THEN '予算超過'
-            WHEN p.actual_cost > p.total_budget * 0.9 THEN '要注意'
-            ELSE '正常'
-        END AS budget_status,
-        (SELECT COUNT(*) FROM project_tasks WHERE project_id = p.project_id) AS total_tasks,
-        (SELECT COUNT(*) FROM project_tasks WHERE project_id = p.project_id AND status = '完了') AS completed_tasks,
-        (SELECT COUNT(*) FROM project_tasks WHERE project_id = p.project_id AND status = '遅延') AS delayed_tasks,
-        (SELECT COUNT(*) FROM change_orders WHERE project_id = p.project_id) AS change_orders_count,
-        (SELECT COUNT(*) FROM change_orders WHERE project_id = p.project_id AND status = '申請中') AS pending_change_orders
-    FROM projects p
-    WHERE p.company_id = :company_id
-    ORDER BY p.updated_at DESC
-    """
-    
-    result = db.execute(query, {"company_id": company_id}).fetchall()
-    
-    return [
-        ProjectOverviewResponse(
-            project_id=row[0],
-            project_name=row[1],
-            status=row[2],
-            priority=row[3],
-            progress_percentage=float(row[4]),
-            estimated_profit_rate=float(row[5]),
-            budget_consumption_rate=float(row[6]),
-            schedule_status=row[7],
-            budget_status=row[8],
-            total_tasks=row[9],
-            completed_tasks=row[10],
-            delayed_tasks=row[11],
-            change_orders_count=row[12],
-            pending_change_orders=row[13]
-        )
-        for row in result
-    ]
+    # 1クエリで取得（計算項目はSQL式、件数はタスク・変更指示の更新時に集計済みの列）
+    rows = db.query(
+        Project.project_id,
+        Project.project_name,
+        Project.status,
+        Project.priority,
+        Project.progress_percentage,
+        func.round(Project.estimated_profit_rate, 2).label('estimated_profit_rate'),
+        func.round(Project.budget_consumption_rate, 2).label('budget_consumption_rate'),
+        Project.schedule_status.label('schedule_status'),
+        Project.budget_status.label('budget_status'),
+        Project.task_count.label('total_tasks'),
+        Project.completed_task_count.label('completed_tasks'),
+        Project.delayed_task_count.label('delayed_tasks'),
+        Project.change_order_count.label('change_orders_count'),
+        Project.pending_change_order_count.label('pending_change_orders')
+    ).filter(Project.company_id == company_id).order_by(Project.updated_at.desc()).all()
+    
+    return [ProjectOverviewResponse(**row._mapping) for row in rows]
+
+@router.get("/overview/consistency")
+async def check_overview_counters(
+    db: Session = Depends(get_db)
+):
+    """ダッシュボード用集計列の整合性チェック（参照のみ）"""
+    company_id = get_current_user_company_id()
+    mismatches = check_project_counters(db, company_id)
+    return {
+        "mismatch_count": len(mismatches),
+        "repaired": False,
+        "mismatches": mismatches
+    }
+
+@router.post("/overview/consistency/repair")
+async def repair_overview_counters(
+    db: Session = Depends(get_db)
+):
+    """ダッシュボード用集計列の不一致を再計算して修正"""
+    company_id = get_current_user_company_id()
+    mismatches = check_project_counters(db, company_id, repair=True)
+    return {
+        "mismatch_count": len(mismatches),
+        "repaired": bool(mismatches),
+        "mismatches": mismatches
+    }
 
 @router.get("/statistics", response_model=ProjectStatistics)
 async def get_project_statistics(
@@ -349,15 +502,17 @@ async def get_project_statistics(
     """プロジェクト統計情報"""
     company_id = get_current_user_company_id()
     
-    projects = db.query(Project).filter(Project.company_id == company_id).all()
-    
-    total_projects = len(projects)
-    active_projects = len([p for p in projects if p.status in ['進行中', '見積中']])
-    completed_projects = len([p for p in projects if p.status == '完了'])
-    delayed_projects = len([p for p in projects if p.schedule_status == '遅延'])
-    
-    total_budget = sum(p.total_budget for p in projects)
-    total_revenue = sum(p.estimated_revenue for p in projects)
+    # 1回の集計クエリで算出（プロジェクトをロードしない）
+    stats = db.query(
+        func.count(Project.project_id),
+        func.count().filter(Project.status.in_([ProjectStatus.IN_PROGRESS.value, ProjectStatus.ESTIMATING.value])),
+        func.count().filter(Project.status == ProjectStatus.COMPLETED.value),
+        func.count().filter(Project.schedule_status == '遅延'),
+        func.coalesce(func.sum(Project.total_budget), 0),
+        func.coalesce(func.sum(Project.estimated_revenue), 0)
+    ).filter(Project.company_id == company_id).one()
+    
+    total_projects, active_projects, completed_projects, delayed_projects, total_budget, total_revenue = stats
     total_profit = total_revenue - total_budget
     
     average_profit_rate = 0
@@ -375,6 +530,44 @@ async def get_project_statistics(
         average_profit_rate=average_profit_rate
     )
 
+@router.get("/resources/conflicts")
+async def get_resource_conflicts(
+    db: Session = Depends(get_db)
+):
+    """班・重機の重複割当一覧（プロジェクト横断）"""
+    company_id = get_current_user_company_id()
+    conflicts = find_conflicts(load_resource_tasks(db, company_id))
+    return {
+        "conflict_count": len(conflicts),
+        "conflicts": [conflict.as_dict() for conflict in conflicts]
+    }
+
+@router.post("/resources/level")
+async def level_project_resources(
+    apply: bool = Query(False, description="平準化結果をタスクの日程に反映する"),
+    db: Session = Depends(get_db)
+):
+    """資源平準化（重複する非クリティカルタスクを余裕日数の範囲で後ろ倒し、解消できない重複は unresolved）"""
+    company_id = get_current_user_company_id()
+    try:
+        result = level_resources(load_resource_tasks(db, company_id))
+    except ScheduleError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if apply and result.moves:
+        db.execute(update(ProjectTask), [
+            {"task_id": move.task_id, "start_date": move.start_date, "end_date": move.end_date}
+            for move in result.moves
+        ])
+        db.commit()
+    
+    return {
+        "applied": apply and bool(result.moves),
+        "move_count": len(result.moves),
+        "moves": [move.as_dict() for move in result.moves],
+        "unresolved": [conflict.as_dict() for conflict in result.unresolved]
+    }
+
 @router.post("/", response_model=ProjectResponse)
 async def create_project(
     project: ProjectCreate,
@@ -386,40 +579,24 @@ async def create_project(
     db.commit()
     db.refresh(db_project)
     
-    # 計算フィールドを追加してレスポンス
-    project_dict = db_project.__dict__.copy()
-    project_dict['estimated_profit'] = db_project.estimated_profit
-    project_dict['estimated_profit_rate'] = db_project.estimated_profit_rate
-    project_dict['budget_consumption_rate'] = db_project.budget_consumption_rate
-    project_dict['schedule_status'] = db_project.schedule_status
-    project_dict['budget_status'] = db_project.budget_status
-    
-    return ProjectResponse(**project_dict)
+    # 計算フィールドは hybrid_property から取得
+    return ProjectResponse.model_validate(db_project)
 
 @router.post("/from-estimate/{estimate_id}", response_model=ProjectResponse)
 async def create_project_from_estimate(
     estimate_id: int = Path(...),
+    start_date: Optional[date] = Query(None, description="着工日（省略時は本日）"),
     db: Session = Depends(get_db)
 ):
-    """見積からプロジェクト自動作成"""
-    # TODO: 見積データ取得（worker1の見積システムと連携）
-    # estimate = get_estimate(estimate_id)
-    
-    # 仮実装
+    """見積からプロジェクト自動作成（大項目からタスク・日程を生成）"""
     company_id = get_current_user_company_id()
     
-    project_data = ProjectCreate(
-        company_id=company_id,
-        customer_id=1,  # TODO: 見積から取得
-        estimate_id=estimate_id,
-        project_name="見積からの自動プロジェクト",
-        total_budget=Decimal('1000000'),
-        estimated_revenue=Decimal('1500000'),
-        start_date=date.today(),
-        end_date=date.today()
-    )
+    source = load_estimate_source(db, estimate_id, company_id)
+    if not source:
+        raise HTTPException(status_code=404, detail="Estimate not found")
     
-    return await create_project(project_data, db)
+    project, _ = create_project_with_tasks(db, company_id, source, start_date or date.today())
+    return ProjectResponse.model_validate(project)
 
 @router.get("/{project_id}", response_model=ProjectResponse)
 async def get_project(
@@ -429,21 +606,14 @@ async def get_project(
     """プロジェクト詳細取得"""
     company_id = get_current_user_company_id()
     
-    project = db.query(Project).filter(
+    row = project_response_query(db).filter(
         and_(Project.project_id == project_id, Project.company_id == company_id)
     ).first()
     
-    if not project:
+    if not row:
         raise HTTPException(status_code=404, detail="Project not found")
     
-    project_dict = project.__dict__.copy()
-    project_dict['estimated_profit'] = project.estimated_profit
-    project_dict['estimated_profit_rate'] = project.estimated_profit_rate
-    project_dict['budget_consumption_rate'] = project.budget_consumption_rate
-    project_dict['schedule_status'] = project.schedule_status
-    project_dict['budget_status'] = project.budget_status
-    
-    return ProjectResponse(**project_dict)
+    return to_project_response(row)
 
 @router.put("/{project_id}", response_model=ProjectResponse)
 async def update_project(
@@ -469,14 +639,7 @@ async def update_project(
     db.commit()
     db.refresh(project)
     
-    project_dict = project.__dict__.copy()
-    project_dict['estimated_profit'] = project.estimated_profit
-    project_dict['estimated_profit_rate'] = project.estimated_profit_rate
-    project_dict['budget_consumption_rate'] = project.budget_consumption_rate
-    project_dict['schedule_status'] = project.schedule_status
-    project_dict['budget_status'] = project.budget_status
-    
-    return ProjectResponse(**project_dict)
+    return ProjectResponse.model_validate(project)
 
 @router.delete("/{project_id}")
 async def delete_project(
@@ -526,6 +689,7 @@ async def get_project_tasks(
     result = []
     for task in tasks:
         task_dict = task.__dict__.copy()
+        task_dict['dependencies'] = parse_task_dependencies(task.dependencies)
         task_dict['duration_days'] = task.duration_days
         task_dict['delay_days'] = task.delay_days
         task_dict['budget_consumption_rate'] = task.budget_consumption_rate
@@ -558,6 +722,7 @@ async def create_task(
     task_data = task.dict()
     task_data['project_id'] = project_id
     task_data['sort_order'] = max_sort_order + 1
+    task_data['dependencies'] = serialize_task_dependencies(task_data.get('dependencies'))
     
     db_task = ProjectTask(**task_data)
     db.add(db_task)
@@ -565,13 +730,14 @@ async def create_task(
     db.refresh(db_task)
     
     task_dict = db_task.__dict__.copy()
+    task_dict['dependencies'] = parse_task_dependencies(db_task.dependencies)
     task_dict['duration_days'] = db_task.duration_days
     task_dict['delay_days'] = db_task.delay_days
     task_dict['budget_consumption_rate'] = db_task.budget_consumption_rate
     
     return TaskResponse(**task_dict)
 
-@router.put("/{project_id}/tasks/{task_id}", response_model=TaskResponse)
+@router.put("/{project_id}/tasks/{task_id}", response_model=TaskUpdateResponse)
 async def update_task(
     project_id: int = Path(...),
     task_id: int = Path(...),
@@ -596,17 +762,32 @@ async def update_task(
     # 更新
     update_data = task_update.dict(exclude_unset=True)
     for field, value in update_data.items():
+        if field == 'dependencies':
+            # dependencies 列は JSON 配列のテキスト（insert_planned_tasks と同じ形式）
+            value = serialize_task_dependencies(value)
         setattr(task, field, value)
     
+    # 日程・依存関係の変更時は後続タスクのみ再計算
+    shifts = []
+    if update_data.keys() & {'start_date', 'end_date'}:
+        db.flush()
+        shifts = reschedule_successors(db, project_id, [task_id])
+    elif update_data.get('dependencies'):
+        # 新しい先行タスクを起点にして、このタスク自身も再計算対象にする
+        db.flush()
+        shifts = reschedule_successors(db, project_id, update_data['dependencies'])
+    
     db.commit()
     db.refresh(task)
     
     task_dict = task.__dict__.copy()
+    task_dict['dependencies'] = parse_task_dependencies(task.dependencies)
     task_dict['duration_days'] = task.duration_days
     task_dict['delay_days'] = task.delay_days
     task_dict['budget_consumption_rate'] = task.budget_consumption_rate
+    task_dict['rescheduled_tasks'] = [shift.as_dict() for shift in shifts]
     
-    return TaskResponse(**task_dict)
+    return TaskUpdateResponse(**task_dict)
 
 # ==============================================
 # Budget Tracking Endpoints
@@ -12,12 +12,14 @@ from typing import List, Optional, Dict, Any
 from decimal import Decimal
 
 from fastapi import APIRouter, Depends, HTTPException, Header, Request
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, contains_eager
 from sqlalchemy import and_, or_, desc, func
 from pydantic import BaseModel
 
 from backend.database import get_db
+from backend.services.query_budget import query_budget
 from backend.models.project_models import Project, ProjectTask, BudgetTracking
+from backend.auth.request_context import AuthContext, get_auth_context, resolve_principal, resolve_token_payload
 
 router = APIRouter(prefix="/api/rbac", tags=["rbac_integration"])
 
@@ -126,48 +128,69 @@ ROLE_PERMISSIONS = {
 # ユーティリティ関数
 # ==============================================
 
-async def get_current_user_from_token(authorization: str = Header(None)) -> RBACUser:
-    """認証トークンからユーザー情報を取得"""
-    # TODO: Worker4の認証システムと実際に連携
-    if not authorization or not authorization.startswith('Bearer '):
-        raise HTTPException(status_code=401, detail="認証トークンが必要です")
-    
-    token = authorization.replace('Bearer ', '')
-    
+# テスト用トークン（TODO: Worker4のJWT検証に置き換え）
+TEST_TOKEN_PAYLOADS = {
+    'manager_token': {
+        "user_id": 1,
+        "sub": "田中経営者",
+        "email": "manager@example.com",
+        "role": "経営者",
+        "role_id": "role_001",
+        "company_id": 1,
+    },
+    'employee_token': {
+        "user_id": 2,
+        "sub": "佐藤従業員",
+        "email": "employee@example.com",
+        "role": "従業員",
+        "role_id": "role_002",
+        "company_id": 1,
+    },
+}
+
+# JWTのロール名 → RBAC統合のロール名
+JWT_ROLE_NAMES = {
+    'owner': '経営者',
+    'employee': '従業員',
+}
+
+def decode_rbac_token(token: str) -> Optional[Dict[str, Any]]:
+    """認証トークンをデコード"""
     # 仮実装: 実際にはWorker4のJWT検証を行う
     # user_data = await verify_jwt_token(token)
+    return TEST_TOKEN_PAYLOADS.get(token)
+
+def rbac_user_from_context(context: AuthContext) -> RBACUser:
+    """デコード済みペイロードからRBACユーザーを生成"""
+    payload = context.payload_for(decode_rbac_token)
+    role_name = JWT_ROLE_NAMES.get(payload.get("role"), payload.get("role"))
+    return RBACUser(
+        user_id=payload["user_id"],
+        username=payload.get("sub"),
+        email=payload.get("email"),
+        role=UserRole(
+            role_id=payload.get("role_id", f"role_{role_name}"),
+            role_name=role_name,
+            permissions=ROLE_PERMISSIONS.get(role_name, []),
+            company_id=payload["company_id"]
+        ),
+        company_id=payload["company_id"],
+        is_active=True
+    )
+
+async def get_current_user_from_token(request: Request) -> RBACUser:
+    """
+    認証トークンからユーザー情報を取得
+    認証ミドルウェア等でデコード済みの場合はその結果を再利用する
+    """
+    if not get_auth_context(request).token:
+        raise HTTPException(status_code=401, detail="認証トークンが必要です")
     
-    # テスト用のユーザーデータ
-    if token == 'manager_token':
-        return RBACUser(
-            user_id=1,
-            username="田中経営者",
-            email="manager@example.com",
-            role=UserRole(
-                role_id="role_001",
-                role_name="経営者",
-                permissions=ROLE_PERMISSIONS['経営者'],
-                company_id=1
-            ),
-            company_id=1,
-            is_active=True
-        )
-    elif token == 'employee_token':
-        return RBACUser(
-            user_id=2,
-            username="佐藤従業員",
-            email="employee@example.com",
-            role=UserRole(
-                role_id="role_002", 
-                role_name="従業員",
-                permissions=ROLE_PERMISSIONS['従業員'],
-                company_id=1
-            ),
-            company_id=1,
-            is_active=True
-        )
-    else:
+    payload = resolve_token_payload(request, decode_rbac_token)
+    if payload is None:
         raise HTTPException(status_code=401, detail="無効な認証トークンです")
+    
+    return resolve_principal(request, "rbac_user", rbac_user_from_context)
 
 def check_permission(user: RBACUser, permission: str) -> bool:
     """ユーザーの権限をチェック"""
@@ -381,6 +404,7 @@ async def get_dashboard_metrics(
     }
 
 @router.get("/my-assignments")
+@query_budget(max_queries=2)
 async def get_my_assignments(
     current_user: RBACUser = Depends(get_current_user_from_token),
     db: Session = Depends(get_db)
@@ -388,7 +412,8 @@ async def get_my_assignments(
     """自分の担当タスク一覧"""
     
     # TODO: タスク担当者テーブルと連携
-    tasks = db.query(ProjectTask).join(Project).filter(
+    # 結合済みのプロジェクトを task.project に読み込む（タスクごとの遅延ロードを避ける）
+    tasks = db.query(ProjectTask).join(Project).options(contains_eager(ProjectTask.project)).filter(
         and_(
             Project.company_id == current_user.company_id,
             # ProjectTask.assigned_to == current_user.user_id  # TODO: 実装
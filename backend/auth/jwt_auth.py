@@ -18,14 +18,17 @@ import time
 import logging
 from datetime import datetime, timedelta, timezone
 
+from .password_hashing import password_hasher
+from .request_context import AuthContext, get_auth_context, resolve_principal, resolve_token_payload
+
 # JWT設定
 JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", secrets.token_urlsafe(32))
 JWT_ALGORITHM = "HS256"
 JWT_ACCESS_TOKEN_EXPIRE_MINUTES = 480  # 8時間
 JWT_REFRESH_TOKEN_EXPIRE_DAYS = 7  # 7日間
 
-# パスワードハッシュ化設定
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# パスワードハッシュ化設定（非同期処理用ハッシャーと設定を共有）
+pwd_context = password_hasher.context
 
 # HTTPBearer認証
 security = HTTPBearer()
@@ -112,6 +115,15 @@ class JWTAuthManager:
         """パスワードハッシュ化"""
         return pwd_context.hash(password)
     
+    async def verify_password_async(self, plain_password: str, hashed_password: str,
+                                    host: Optional[str] = None) -> bool:
+        """パスワード検証（ハッシュプールで実行、イベントループを止めない）"""
+        return await password_hasher.verify(plain_password, hashed_password, host=host)
+    
+    async def get_password_hash_async(self, password: str, host: Optional[str] = None) -> str:
+        """パスワードハッシュ化（ハッシュプールで実行）"""
+        return await password_hasher.hash(password, host=host)
+    
     def create_access_token(self, data: Dict[str, Any]) -> str:
         """アクセストークン生成"""
         start_time = time.time()
@@ -258,18 +270,33 @@ class JWTAuthManager:
             self.logger.error(f"トークン検証エラー: {str(e)}")
             return None
     
-    def authenticate_user(self, db: Session, username: str, password: str) -> Optional[UserAuth]:
-        """ユーザー認証"""
+    def _find_active_user(self, db: Session, username: str):
+        """認証対象ユーザー取得"""
         # データベースからユーザー取得（実際の実装では適切なモデルを使用）
         # ここではサンプル実装
         from ..main import users_table  # 仮のテーブル参照
         
+        return db.query(users_table).filter(
+            users_table.username == username,
+            users_table.is_active == True
+        ).first()
+    
+    @staticmethod
+    def _to_user_auth(user) -> UserAuth:
+        return UserAuth(
+            user_id=user.user_id,
+            username=user.username,
+            email=user.email,
+            role=user.role,
+            company_id=user.company_id,
+            full_name=user.full_name,
+            is_active=user.is_active
+        )
+    
+    def authenticate_user(self, db: Session, username: str, password: str) -> Optional[UserAuth]:
+        """ユーザー認証"""
         try:
-            # SQLAlchemyクエリ
-            user = db.query(users_table).filter(
-                users_table.username == username,
-                users_table.is_active == True
-            ).first()
+            user = self._find_active_user(db, username)
             
             if not user:
                 return None
@@ -277,15 +304,24 @@ class JWTAuthManager:
             if not self.verify_password(password, user.password_hash):
                 return None
             
-            return UserAuth(
-                user_id=user.user_id,
-                username=user.username,
-                email=user.email,
-                role=user.role,
-                company_id=user.company_id,
-                full_name=user.full_name,
-                is_active=user.is_active
-            )
+            return self._to_user_auth(user)
+            
+        except Exception:
+            return None
+    
+    async def authenticate_user_async(self, db: Session, username: str, password: str,
+                                      host: Optional[str] = None) -> Optional[UserAuth]:
+        """ユーザー認証（bcrypt検証をハッシュプールで実行）"""
+        try:
+            user = self._find_active_user(db, username)
+            
+            if not user:
+                return None
+            
+            if not await self.verify_password_async(password, user.password_hash, host=host):
+                return None
+            
+            return self._to_user_auth(user)
             
         except Exception:
             return None
@@ -464,9 +500,28 @@ class JWTAuthManager:
 # グローバル認証マネージャー
 auth_manager = JWTAuthManager()
 
+def user_auth_from_context(context: AuthContext) -> UserAuth:
+    """デコード済みペイロードから認証ユーザー情報を生成"""
+    payload = context.payload_for(auth_manager.verify_token)
+    return UserAuth(
+        user_id=payload.get("user_id"),
+        username=payload.get("sub"),
+        email=payload.get("email"),
+        role=payload.get("role"),
+        company_id=payload.get("company_id"),
+        full_name="",  # 必要に応じてDBから取得
+        is_active=True
+    )
+
 async def get_current_user(request: Request) -> UserAuth:
-    """現在のユーザー取得"""
-    credentials: HTTPAuthorizationCredentials = await security(request)
+    """
+    現在のユーザー取得
+    認証ミドルウェアで解決済みの場合はデコードせずに再利用する
+    """
+    context = get_auth_context(request)
+    if not context.token:
+        # 未認証時の標準エラー応答
+        await security(request)
     
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -475,28 +530,14 @@ async def get_current_user(request: Request) -> UserAuth:
     )
     
     try:
-        payload = auth_manager.verify_token(credentials.credentials)
+        payload = resolve_token_payload(request, auth_manager.verify_token)
         if payload is None:
             raise credentials_exception
         
-        username: str = payload.get("sub")
-        user_id: int = payload.get("user_id")
-        role: str = payload.get("role")
-        company_id: int = payload.get("company_id")
-        email: str = payload.get("email")
-        
-        if username is None or user_id is None:
+        if payload.get("sub") is None or payload.get("user_id") is None:
             raise credentials_exception
         
-        return UserAuth(
-            user_id=user_id,
-            username=username,
-            email=email,
-            role=role,
-            company_id=company_id,
-            full_name="",  # 必要に応じてDBから取得
-            is_active=True
-        )
+        return resolve_principal(request, "user_auth", user_auth_from_context)
         
     except jwt.PyJWTError:
         raise credentials_exception
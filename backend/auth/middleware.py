@@ -6,12 +6,14 @@ Garden DX - 権限チェックミドルウェア
 from fastapi import HTTPException, Request, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import JSONResponse
 from typing import Dict, List, Optional, Callable, Any
 import re
 from datetime import datetime, timezone
 import json
 
-from .jwt_auth import JWTAuthManager, UserAuth, get_current_user
+from .jwt_auth import JWTAuthManager, UserAuth, auth_manager, get_current_user, user_auth_from_context
+from .request_context import get_auth_context, resolve_principal, resolve_token_payload
 from .rbac import RBACManager, UserRole, Permission, rbac_manager
 from .security import SessionSecurity, SecurityMiddleware, session_security
 
@@ -20,13 +22,15 @@ class AuthenticationMiddleware(BaseHTTPMiddleware):
     
     def __init__(self, app):
         super().__init__(app)
-        self.auth_manager = JWTAuthManager()
+        # トークン発行時のセッション情報を参照するためグローバルインスタンスを共有
+        self.auth_manager = auth_manager
         self.excluded_paths = [
             "/",
             "/health",
             "/api/auth/login",
             "/api/auth/register",
             "/api/auth/refresh",
+            "/api/demo",  # 未ログインで試せるデモ用API
             "/docs",
             "/redoc",
             "/openapi.json",
@@ -43,18 +47,16 @@ class AuthenticationMiddleware(BaseHTTPMiddleware):
         if request.url.path.startswith("/api/") and not request.url.path.startswith("/api/auth/"):
             try:
                 # JWTトークン取得
-                auth_header = request.headers.get("Authorization")
-                if not auth_header or not auth_header.startswith("Bearer "):
+                context = get_auth_context(request)
+                if not context.token:
                     raise HTTPException(
                         status_code=status.HTTP_401_UNAUTHORIZED,
                         detail="認証が必要です",
                         headers={"WWW-Authenticate": "Bearer"}
                     )
                 
-                token = auth_header.split(" ")[1]
-                
-                # トークン検証
-                payload = self.auth_manager.verify_token(token)
+                # トークン検証（リクエスト内で1回のみ、結果は後続の依存関数と共有）
+                payload = resolve_token_payload(request, self.auth_manager.verify_token)
                 if not payload:
                     raise HTTPException(
                         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -63,22 +65,15 @@ class AuthenticationMiddleware(BaseHTTPMiddleware):
                     )
                 
                 # ユーザー情報をリクエストに追加
-                request.state.current_user = UserAuth(
-                    user_id=payload.get("user_id"),
-                    username=payload.get("sub"),
-                    email=payload.get("email"),
-                    role=payload.get("role"),
-                    company_id=payload.get("company_id"),
-                    full_name="",  # 必要に応じて取得
-                    is_active=True
-                )
+                request.state.current_user = resolve_principal(request, "user_auth", user_auth_from_context)
                 
-            except HTTPException:
-                raise
+            except HTTPException as e:
+                # BaseHTTPMiddleware内の例外は例外ハンドラーを通らないためレスポンスに変換
+                return JSONResponse(status_code=e.status_code, content={"detail": e.detail}, headers=e.headers)
             except Exception as e:
-                raise HTTPException(
+                return JSONResponse(
                     status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="認証エラーが発生しました",
+                    content={"detail": "認証エラーが発生しました"},
                     headers={"WWW-Authenticate": "Bearer"}
                 )
         
@@ -88,7 +83,8 @@ class AuthenticationMiddleware(BaseHTTPMiddleware):
     def _is_excluded_path(self, path: str) -> bool:
         """除外パス判定"""
         for excluded in self.excluded_paths:
-            if path.startswith(excluded):
+            # "/" は完全一致のみ（前方一致だと全パスが除外される）
+            if path == excluded or (excluded != "/" and path.startswith(excluded)):
                 return True
         return False
 
@@ -0,0 +1,198 @@
+"""
+Garden DX - パスワードハッシュ処理のオフロード
+bcryptは1回100〜300msかかるため、イベントループ上で直接実行せず
+上限付きのスレッド／プロセスプールで実行する非同期APIを提供
+"""
+
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+from passlib.context import CryptContext
+
+logger = logging.getLogger("garden_password_hashing")
+
+# bcryptのワークファクター（2^rounds 回の反復）
+DEFAULT_BCRYPT_ROUNDS = int(os.getenv("PASSWORD_BCRYPT_ROUNDS", "12"))
+# ハッシュ処理の同時実行数（プール全体）
+DEFAULT_MAX_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# 同一ホストからの同時実行数
+DEFAULT_PER_HOST_LIMIT = int(os.getenv("PASSWORD_HASH_PER_HOST_LIMIT", "2"))
+# ログイン時のハッシュ処理レイテンシ目標（ミリ秒）
+DEFAULT_LATENCY_SLO_MS = float(os.getenv("PASSWORD_HASH_SLO_MS", "250"))
+
+# プロセスプール用（ワーカープロセスごとに設定文字列からCryptContextを復元）
+_process_contexts: Dict[str, CryptContext] = {}
+
+def _context_from_config(config: str) -> CryptContext:
+    context = _process_contexts.get(config)
+    if context is None:
+        context = _process_contexts[config] = CryptContext.from_string(config)
+    return context
+
+def _hash_in_process(config: str, password: str) -> str:
+    return _context_from_config(config).hash(password)
+
+def _verify_in_process(config: str, password: str, hashed_password: str) -> bool:
+    return _context_from_config(config).verify(password, hashed_password)
+
+def build_password_context(rounds: int = DEFAULT_BCRYPT_ROUNDS) -> CryptContext:
+    """ワークファクター指定のCryptContextを生成"""
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+
+class PasswordHasher:
+    """
+    非同期パスワードハッシャー
+    - プール全体の同時実行数は max_workers で制限
+    - 1ホストあたりの同時実行数は per_host_limit で制限（ログイン集中時の占有防止）
+    """
+
+    def __init__(
+        self,
+        context: Optional[CryptContext] = None,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        per_host_limit: int = DEFAULT_PER_HOST_LIMIT,
+        use_processes: bool = False,
+    ):
+        self.context = context or build_password_context()
+        self.max_workers = max_workers
+        self.per_host_limit = per_host_limit
+        self.use_processes = use_processes
+        self._executor: Optional[Executor] = None
+        self._config = self.context.to_string()
+        self._host_semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._host_waiters: Dict[str, int] = {}
+        self.last_calibration: Optional[Dict[str, Any]] = None
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            if self.use_processes:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                # bcryptはハッシュ計算中にGILを解放するためスレッドで並列化できる
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="password-hash"
+                )
+        return self._executor
+
+    # ------------------------------------------------------------------
+    # 同期API（起動時処理・スクリプト用）
+    # ------------------------------------------------------------------
+
+    def hash_sync(self, password: str) -> str:
+        return self.context.hash(password)
+
+    def verify_sync(self, password: str, hashed_password: str) -> bool:
+        return self.context.verify(password, hashed_password)
+
+    # ------------------------------------------------------------------
+    # 非同期API
+    # ------------------------------------------------------------------
+
+    async def hash(self, password: str, host: Optional[str] = None) -> str:
+        """パスワードハッシュ化（プールで実行）"""
+        if self.use_processes:
+            return await self._run(host, _hash_in_process, self._config, password)
+        return await self._run(host, self.context.hash, password)
+
+    async def verify(self, password: str, hashed_password: str, host: Optional[str] = None) -> bool:
+        """パスワード検証（プールで実行）"""
+        try:
+            if self.use_processes:
+                return await self._run(host, _verify_in_process, self._config, password, hashed_password)
+            return await self._run(host, self.context.verify, password, hashed_password)
+        except (ValueError, TypeError):
+            # 不正なハッシュ形式は検証失敗として扱う
+            return False
+
+    async def _run(self, host: Optional[str], func, *args):
+        loop = asyncio.get_running_loop()
+        if host is None:
+            return await loop.run_in_executor(self.executor, func, *args)
+
+        semaphore = self._host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = self._host_semaphores[host] = asyncio.Semaphore(self.per_host_limit)
+        self._host_waiters[host] = self._host_waiters.get(host, 0) + 1
+        try:
+            async with semaphore:
+                return await loop.run_in_executor(self.executor, func, *args)
+        finally:
+            # 待機者がいなくなったホストのセマフォは破棄（辞書が肥大化しないように）
+            remaining = self._host_waiters[host] - 1
+            if remaining:
+                self._host_waiters[host] = remaining
+            else:
+                del self._host_waiters[host]
+                del self._host_semaphores[host]
+
+    # ------------------------------------------------------------------
+    # キャリブレーション
+    # ------------------------------------------------------------------
+
+    def calibrate(self, latency_slo_ms: float = DEFAULT_LATENCY_SLO_MS, samples: int = 3) -> Dict[str, Any]:
+        """
+        現在のワークファクターでのハッシュ時間を計測し、SLOに対する推奨値を算出
+        bcryptのコストはrounds+1ごとに2倍になるため、1点の計測から外挿する
+        """
+        rounds = self.context.handler("bcrypt").default_rounds
+        sample_password = "garden-calibration-Pw1!"
+
+        timings = []
+        for _ in range(max(1, samples)):
+            start = time.perf_counter()
+            self.context.hash(sample_password)
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        median_ms = timings[len(timings) // 2]
+
+        estimates = {r: median_ms * 2 ** (r - rounds) for r in range(max(4, rounds - 2), rounds + 3)}
+        within_slo = [r for r, ms in estimates.items() if ms <= latency_slo_ms]
+        recommended = max(within_slo) if within_slo else min(estimates)
+
+        report = {
+            "scheme": "bcrypt",
+            "rounds": rounds,
+            "hash_ms_median": round(median_ms, 1),
+            "hash_ms_samples": [round(t, 1) for t in timings],
+            "latency_slo_ms": latency_slo_ms,
+            "recommended_rounds": recommended,
+            "estimated_ms_by_rounds": {r: round(ms, 1) for r, ms in estimates.items()},
+            "max_workers": self.max_workers,
+            "per_host_limit": self.per_host_limit,
+            # プールが飽和した場合の1秒あたり処理可能ログイン数の目安
+            "max_hashes_per_second": round(self.max_workers * 1000 / median_ms, 1) if median_ms else None,
+        }
+        self.last_calibration = report
+
+        if median_ms > latency_slo_ms:
+            logger.warning(
+                f"パスワードハッシュがSLOを超過: rounds={rounds}, {median_ms:.1f}ms > {latency_slo_ms}ms "
+                f"(推奨rounds={recommended})"
+            )
+        else:
+            logger.info(f"パスワードハッシュ計測: rounds={rounds}, {median_ms:.1f}ms (SLO {latency_slo_ms}ms)")
+        return report
+
+    async def calibrate_async(self, latency_slo_ms: float = DEFAULT_LATENCY_SLO_MS, samples: int = 3) -> Dict[str, Any]:
+        """
+        キャリブレーションをプール上で実行（起動処理・APIでイベントループを止めない）
+        プロセスプールには self を渡せないため、その場合は既定のスレッドプールで実行する
+        """
+        loop = asyncio.get_running_loop()
+        executor = None if self.use_processes else self.executor
+        return await loop.run_in_executor(executor, self.calibrate, latency_slo_ms, samples)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+# グローバルハッシャー
+password_hasher = PasswordHasher(
+    use_processes=os.getenv("PASSWORD_HASH_USE_PROCESSES", "false").lower() == "true"
+)
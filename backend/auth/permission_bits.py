@@ -0,0 +1,115 @@
+"""
+Garden DX - ビットマスク権限モデル
+ロール別権限をインポート時に整数ビットマスクへコンパイルし、
+権限チェックを1回のAND演算で行う
+"""
+
+from typing import Any, Dict, Hashable, Iterable, List, Mapping, Tuple
+
+
+def _key(value: Any) -> Hashable:
+    """Enumメンバーを値（文字列）に正規化"""
+    return getattr(value, "value", value)
+
+
+def flatten_permission_matrix(matrix: Mapping[str, Mapping[str, Mapping[str, bool]]]) -> Dict[str, List[str]]:
+    """
+    {role: {resource: {action: bool}}} 形式の権限マトリクスを
+    {role: ["resource:action", ...]} 形式に展開（Trueのみ）
+    """
+    return {
+        role: [
+            f"{resource}:{action}"
+            for resource, actions in resources.items()
+            for action, granted in actions.items()
+            if granted
+        ]
+        for role, resources in matrix.items()
+    }
+
+
+class PermissionBatch:
+    """複数権限の一括判定用に事前コンパイルした問い合わせ"""
+
+    __slots__ = ("mask", "_entries")
+
+    def __init__(self, entries: List[Tuple[str, int]]):
+        self._entries = entries
+        self.mask = 0
+        for _, bit in entries:
+            self.mask |= bit
+
+    def evaluate(self, granted_mask: int) -> Dict[str, bool]:
+        """付与済みマスクに対する {ラベル: 可否} を返す"""
+        hits = granted_mask & self.mask
+        return {label: bool(hits & bit) for label, bit in self._entries}
+
+
+class PermissionTable:
+    """ロール→権限ビットマスクのコンパイル済みテーブル"""
+
+    def __init__(self, role_permissions: Mapping[Any, Iterable[Any]]):
+        self._bits: Dict[Hashable, int] = {}
+        self._role_masks: Dict[Hashable, int] = {}
+        self._names: List[str] = []
+
+        for role, permissions in role_permissions.items():
+            mask = 0
+            for permission in permissions:
+                mask |= self._register(permission)
+            # Enumメンバーと文字列値のどちらでも引けるよう両方登録
+            self._role_masks[role] = mask
+            self._role_masks[_key(role)] = mask
+
+    def _register(self, permission: Any) -> int:
+        bit = self._bits.get(permission)
+        if bit is None:
+            bit = 1 << len(self._names)
+            self._names.append(_key(permission))
+            self._bits[permission] = bit
+            self._bits[_key(permission)] = bit
+        return bit
+
+    @property
+    def permission_names(self) -> List[str]:
+        """ビット順の権限名一覧"""
+        return list(self._names)
+
+    def bit(self, permission: Any) -> int:
+        """権限のビット値（未定義の権限は0）"""
+        return self._bits.get(permission, 0)
+
+    def role_mask(self, role: Any) -> int:
+        """ロールのビットマスク（未定義のロールは0）"""
+        return self._role_masks.get(role, 0)
+
+    def mask_of(self, permissions: Iterable[Any]) -> int:
+        """権限リストからビットマスクを生成"""
+        mask = 0
+        for permission in permissions:
+            mask |= self._bits.get(permission, 0)
+        return mask
+
+    def has(self, role: Any, permission: Any) -> bool:
+        """ロールが権限を持つか（AND演算1回）"""
+        return bool(self._role_masks.get(role, 0) & self._bits.get(permission, 0))
+
+    def mask_has(self, mask: int, permission: Any) -> bool:
+        """ビットマスクが権限を含むか"""
+        return bool(mask & self._bits.get(permission, 0))
+
+    def permissions_of(self, mask: int) -> List[str]:
+        """ビットマスクを権限名リストに復元"""
+        return [name for index, name in enumerate(self._names) if mask >> index & 1]
+
+    def batch(self, labelled_permissions: Mapping[str, Any]) -> PermissionBatch:
+        """{ラベル: 権限} から一括判定クエリをコンパイル"""
+        return PermissionBatch([
+            (label, self._bits.get(permission, 0))
+            for label, permission in labelled_permissions.items()
+        ])
+
+    def allowed(self, role: Any, permissions: Iterable[Any]) -> Dict[str, bool]:
+        """指定ロールについて、N個の権限それぞれの可否を一括判定"""
+        granted = self._role_masks.get(role, 0)
+        return {_key(p): bool(granted & self._bits.get(p, 0)) for p in permissions}
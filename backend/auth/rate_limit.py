@@ -0,0 +1,298 @@
+"""
+Garden DX - レート制限サブシステム
+スライディングウィンドウカウンター方式（識別子ごとに固定サイズの状態）
+- インメモリストア: LRU＋アイドルキー自動削除
+- 共有メモリストア: gunicorn等の複数ワーカー間で制限を共有
+- ASGIミドルウェア: RateLimit-* 標準ヘッダー付与
+"""
+
+import atexit
+import hashlib
+import ipaddress
+import json
+import math
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+# 1キーあたりの状態: (ウィンドウ番号, 現ウィンドウ件数, 前ウィンドウ件数)
+WindowState = Tuple[int, int, int]
+
+@dataclass(frozen=True)
+class RateLimitRule:
+    """レート制限ルール"""
+    limit: int
+    window_seconds: float = 60.0
+
+@dataclass(frozen=True)
+class RateLimitResult:
+    """レート制限判定結果"""
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_after: float        # 現ウィンドウ終了までの秒数
+    retry_after: float = 0.0  # 拒否時、次に許可されるまでの秒数
+
+    def headers(self) -> dict:
+        """標準レート制限ヘッダー（draft-ietf-httpapi-ratelimit-headers）"""
+        headers = {
+            "RateLimit-Limit": str(self.limit),
+            "RateLimit-Remaining": str(self.remaining),
+            "RateLimit-Reset": str(math.ceil(self.reset_after)),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(1, math.ceil(self.retry_after)))
+        return headers
+
+def evaluate_window(state: Optional[WindowState], rule: RateLimitRule, now: float) -> Tuple[WindowState, RateLimitResult]:
+    """
+    スライディングウィンドウカウンターの1回分の判定
+    推定件数 = 前ウィンドウ件数 × 未経過割合 + 現ウィンドウ件数
+    """
+    window = rule.window_seconds
+    index = int(now // window)
+    elapsed = now - index * window
+
+    if state is None or state[0] < index - 1:
+        current, previous = 0, 0
+    elif state[0] == index - 1:
+        current, previous = 0, state[1]
+    else:
+        current, previous = state[1], state[2]
+
+    weight = 1.0 - elapsed / window
+    estimated = previous * weight + current
+    reset_after = window - elapsed
+
+    if estimated + 1 > rule.limit:
+        # 許可されるまでの待ち時間を算出
+        if current < rule.limit and previous:
+            needed_weight = (rule.limit - 1 - current) / previous
+            retry_after = max(0.0, (1.0 - needed_weight) * window - elapsed)
+        else:
+            retry_after = reset_after + (1.0 - (rule.limit - 1) / max(current, 1)) * window
+        return (index, current, previous), RateLimitResult(
+            allowed=False, limit=rule.limit, remaining=0,
+            reset_after=reset_after, retry_after=retry_after,
+        )
+
+    current += 1
+    remaining = max(0, int(rule.limit - (estimated + 1)))
+    return (index, current, previous), RateLimitResult(
+        allowed=True, limit=rule.limit, remaining=remaining, reset_after=reset_after,
+    )
+
+class MemoryRateLimitStore:
+    """
+    プロセス内ストア（LRU、アイドルキーは自動削除）
+    ウィンドウ番号を比較してアイドル判定するため、ウィンドウ幅ごとにテーブルを分ける
+    """
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._tables: Dict[float, "OrderedDict[str, WindowState]"] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return sum(len(table) for table in self._tables.values())
+
+    def hit(self, key: str, rule: RateLimitRule, now: float) -> RateLimitResult:
+        with self._lock:
+            states = self._tables.get(rule.window_seconds)
+            if states is None:
+                states = self._tables[rule.window_seconds] = OrderedDict()
+            state, result = evaluate_window(states.get(key), rule, now)
+            states[key] = state
+            states.move_to_end(key)
+
+            # 先頭（最も古いアクセス）が2ウィンドウ以上アイドルなら削除（償却O(1)）
+            for _ in range(2):
+                oldest_key, oldest_state = next(iter(states.items()))
+                if oldest_state[0] >= state[0] - 1:
+                    break
+                del states[oldest_key]
+
+            if len(states) > self.max_keys:
+                states.popitem(last=False)
+            return result
+
+    def reset(self, key: str) -> None:
+        with self._lock:
+            for states in self._tables.values():
+                states.pop(key, None)
+
+class SharedMemoryRateLimitStore:
+    """
+    共有メモリストア（複数ワーカー間で制限を共有）
+    固定スロット数のハッシュテーブル。スロット衝突時は古いキーを上書きする
+    （衝突したキーのカウンターがリセットされるだけで、制限が厳しくなることはない）。
+    ワーカーをfork する前にマスタープロセスで生成すること（gunicorn --preload が必須。
+    --preload なしでは各ワーカーが別々の共有メモリを生成し、制限はワーカーごとになる）。
+    共有メモリは生成したプロセスの終了時（または release 呼び出し時）に削除する。
+    キーはウィンドウ幅の異なるルール間で共有しないこと（"login:<user>" のように名前空間を付ける）。
+    """
+
+    _SLOT = struct.Struct("<QqII")  # fingerprint, window index, current, previous
+
+    def __init__(self, slots: int = 65_536, name: Optional[str] = None, lock=None):
+        from multiprocessing import Lock, shared_memory
+
+        self.slots = slots
+        size = slots * self._SLOT.size
+        if name:
+            self._shm = shared_memory.SharedMemory(name=name)
+            self._owner_pid = None
+        else:
+            self._shm = shared_memory.SharedMemory(create=True, size=size)
+            self._owner_pid = os.getpid()
+            atexit.register(self.release)
+        self._lock = lock or Lock()
+        self._closed = False
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    def _locate(self, key: str) -> Tuple[int, int]:
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+        fingerprint = int.from_bytes(digest, "little") or 1
+        return fingerprint, (fingerprint % self.slots) * self._SLOT.size
+
+    def hit(self, key: str, rule: RateLimitRule, now: float) -> RateLimitResult:
+        fingerprint, offset = self._locate(key)
+        buffer = self._shm.buf
+        with self._lock:
+            stored_fp, index, current, previous = self._SLOT.unpack_from(buffer, offset)
+            state = (index, current, previous) if stored_fp == fingerprint else None
+            state, result = evaluate_window(state, rule, now)
+            self._SLOT.pack_into(buffer, offset, fingerprint, *state)
+        return result
+
+    def reset(self, key: str) -> None:
+        fingerprint, offset = self._locate(key)
+        with self._lock:
+            self._SLOT.pack_into(self._shm.buf, offset, 0, 0, 0, 0)
+
+    def close(self, unlink: bool = False) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._shm.close()
+        if unlink:
+            self._shm.unlink()
+
+    def release(self) -> None:
+        """接続を閉じ、生成したプロセスであれば共有メモリを削除（fork したワーカーでは削除しない）"""
+        self.close(unlink=self._owner_pid == os.getpid())
+
+class SlidingWindowRateLimiter:
+    """スライディングウィンドウ・レートリミッター"""
+
+    def __init__(self, store=None, clock: Callable[[], float] = time.monotonic):
+        self.store = store if store is not None else MemoryRateLimitStore()
+        self.clock = clock
+
+    def hit(self, key: str, rule: RateLimitRule) -> RateLimitResult:
+        """1リクエスト分を記録して判定"""
+        return self.store.hit(key, rule, self.clock())
+
+    def is_allowed(self, key: str, rule: RateLimitRule) -> bool:
+        return self.hit(key, rule).allowed
+
+    def reset(self, key: str) -> None:
+        self.store.reset(key)
+
+def parse_trusted_proxies(value: str) -> Tuple:
+    """カンマ区切りのIP・CIDR（例: "127.0.0.1,10.0.0.0/8"）"""
+    return tuple(ipaddress.ip_network(item.strip(), strict=False) for item in value.split(",") if item.strip())
+
+# X-Forwarded-For / X-Real-IP を信頼するプロキシ（未設定ならヘッダーは無視）
+TRUSTED_PROXIES = parse_trusted_proxies(os.getenv("TRUSTED_PROXIES", ""))
+
+def _is_trusted(address: str, trusted_proxies) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in trusted_proxies)
+
+def client_ip_from_scope(scope, trusted_proxies=None) -> str:
+    """
+    ASGIスコープからクライアントIP取得（プロキシ環境対応）
+    接続元が信頼するプロキシの場合のみ転送ヘッダーを使う。X-Forwarded-For は右から辿り、
+    信頼するプロキシ以外の最初のアドレスをクライアントとする（クライアントが付けた値は使わない）
+    """
+    if trusted_proxies is None:
+        trusted_proxies = TRUSTED_PROXIES
+    client = scope.get("client")
+    peer = client[0] if client else "unknown"
+    if not _is_trusted(peer, trusted_proxies):
+        return peer
+
+    headers = dict(scope.get("headers") or [])
+    forwarded_for = headers.get(b"x-forwarded-for")
+    if forwarded_for:
+        hops = [hop.strip() for hop in forwarded_for.decode("latin-1").split(",") if hop.strip()]
+        for hop in reversed(hops):
+            if not _is_trusted(hop, trusted_proxies):
+                return hop
+        if hops:
+            return hops[0]
+    real_ip = headers.get(b"x-real-ip")
+    if real_ip:
+        return real_ip.decode("latin-1").strip()
+    return peer
+
+class RateLimitMiddleware:
+    """レート制限ASGIミドルウェア"""
+
+    def __init__(
+        self,
+        app,
+        rule: RateLimitRule = RateLimitRule(limit=100, window_seconds=60),
+        limiter: Optional[SlidingWindowRateLimiter] = None,
+        key_func: Callable[[dict], str] = client_ip_from_scope,
+        exempt_paths: Iterable[str] = ("/health", "/api/docs", "/api/redoc", "/openapi.json"),
+    ):
+        self.app = app
+        self.rule = rule
+        self.limiter = limiter or SlidingWindowRateLimiter()
+        self.key_func = key_func
+        self.exempt_paths = tuple(exempt_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.exempt_paths):
+            await self.app(scope, receive, send)
+            return
+
+        result = self.limiter.hit(self.key_func(scope), self.rule)
+        rate_headers = [
+            (name.lower().encode("latin-1"), value.encode("latin-1"))
+            for name, value in result.headers().items()
+        ]
+
+        if not result.allowed:
+            body = json.dumps({"detail": "レート制限に達しました"}, ensure_ascii=False).encode("utf-8")
+            await send({
+                "type": "http.response.start",
+                "status": 429,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode("latin-1")),
+                    *rate_headers,
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                message = dict(message)
+                message["headers"] = list(message.get("headers", [])) + rate_headers
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
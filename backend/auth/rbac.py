@@ -10,6 +10,8 @@ from fastapi import HTTPException, Depends, Request
 from sqlalchemy.orm import Session
 import json
 
+from .permission_bits import PermissionBatch, PermissionTable
+
 class UserRole(str, Enum):
     """ユーザーロール定義"""
     OWNER = "owner"      # 経営者（親方）
@@ -137,10 +139,21 @@ class RBACManager:
                 Permission.INVOICE_READ,
             ]
         }
+        
+        # ロール別ビットマスクを事前計算
+        self.permission_table = PermissionTable(self.role_permissions)
     
     def has_permission(self, user_role: UserRole, permission: Permission) -> bool:
         """ユーザーロールが指定された権限を持つかチェック"""
-        return permission in self.role_permissions.get(user_role, [])
+        return self.permission_table.has(user_role, permission)
+    
+    def compile_permission_flags(self, permissions: Dict[str, Permission]) -> PermissionBatch:
+        """{ラベル: 権限} の一括判定クエリを事前コンパイル"""
+        return self.permission_table.batch(permissions)
+    
+    def get_permission_flags(self, user_role: UserRole, flags: PermissionBatch) -> Dict[str, bool]:
+        """コンパイル済みクエリでN個の権限可否を一括判定"""
+        return flags.evaluate(self.permission_table.role_mask(user_role))
     
     def get_user_permissions(self, user_role: UserRole) -> List[Permission]:
         """ユーザーロールの全権限を取得"""
@@ -222,30 +235,31 @@ def check_dashboard_access(user_role: UserRole) -> bool:
     return rbac_manager.has_permission(user_role, Permission.DASHBOARD_PROFIT)
 
 # フロントエンド用権限情報API
+_FRONTEND_PERMISSION_FLAGS = rbac_manager.compile_permission_flags({
+    # 基本権限
+    "canViewCosts": Permission.COST_READ,
+    "canViewProfits": Permission.PROFIT_READ,
+    "canAdjustTotal": Permission.PRICE_ADJUST_TOTAL,
+    "canIssueInvoice": Permission.INVOICE_ISSUE,
+    "canViewDashboard": Permission.DASHBOARD_PROFIT,
+    "canManageUsers": Permission.USER_MANAGE,
+    "canManageSystem": Permission.SYSTEM_SETTINGS,
+    
+    # 詳細権限
+    "canEditPriceMaster": Permission.PRICE_MASTER_WRITE,
+    "canDeleteCustomers": Permission.CUSTOMER_DELETE,
+    "canDeleteProjects": Permission.PROJECT_DELETE,
+    "canApproveEstimates": Permission.ESTIMATE_APPROVE,
+    
+    # 読み取り権限
+    "canReadEstimates": Permission.ESTIMATE_READ,
+    "canReadProjects": Permission.PROJECT_READ,
+    "canReadInvoices": Permission.INVOICE_READ,
+})
+
 def get_user_permissions_dict(user_role: UserRole) -> Dict[str, bool]:
     """フロントエンド用の権限辞書を生成"""
-    permissions = rbac_manager.get_user_permissions(user_role)
-    return {
-        # 基本権限
-        "canViewCosts": Permission.COST_READ in permissions,
-        "canViewProfits": Permission.PROFIT_READ in permissions,
-        "canAdjustTotal": Permission.PRICE_ADJUST_TOTAL in permissions,
-        "canIssueInvoice": Permission.INVOICE_ISSUE in permissions,
-        "canViewDashboard": Permission.DASHBOARD_PROFIT in permissions,
-        "canManageUsers": Permission.USER_MANAGE in permissions,
-        "canManageSystem": Permission.SYSTEM_SETTINGS in permissions,
-        
-        # 詳細権限
-        "canEditPriceMaster": Permission.PRICE_MASTER_WRITE in permissions,
-        "canDeleteCustomers": Permission.CUSTOMER_DELETE in permissions,
-        "canDeleteProjects": Permission.PROJECT_DELETE in permissions,
-        "canApproveEstimates": Permission.ESTIMATE_APPROVE in permissions,
-        
-        # 読み取り権限
-        "canReadEstimates": Permission.ESTIMATE_READ in permissions,
-        "canReadProjects": Permission.PROJECT_READ in permissions,
-        "canReadInvoices": Permission.INVOICE_READ in permissions,
-    }
+    return rbac_manager.get_permission_flags(user_role, _FRONTEND_PERMISSION_FLAGS)
 
 # 権限チェック用ミドルウェア関数
 async def check_endpoint_permission(request: Request, required_permission: Permission):
@@ -290,22 +304,21 @@ def filter_data_by_role(data: Dict, user_role: UserRole) -> Dict:
     return filtered_data
 
 # 権限マトリクス表示用関数
+_RBAC_MATRIX_FLAGS = rbac_manager.compile_permission_flags({
+    "顧客情報の閲覧・編集": Permission.CUSTOMER_WRITE,
+    "見積の作成・編集": Permission.ESTIMATE_WRITE,
+    "仕入原価・粗利率の閲覧": Permission.COST_READ,
+    "単価マスタの編集": Permission.PRICE_MASTER_WRITE,
+    "明細ごとの調整額入力": Permission.PRICE_ADJUST_ITEM,
+    "見積合計に対する最終調整": Permission.PRICE_ADJUST_TOTAL,
+    "収益性ダッシュボード閲覧": Permission.DASHBOARD_PROFIT,
+    "請求書の発行": Permission.INVOICE_ISSUE,
+    "システム全体の設定変更": Permission.SYSTEM_SETTINGS,
+})
+
 def get_rbac_matrix() -> Dict[str, Dict[str, bool]]:
     """RBAC権限マトリクスを取得"""
-    matrix = {}
-    
-    for role in UserRole:
-        permissions = rbac_manager.get_user_permissions(role)
-        matrix[role.value] = {
-            "顧客情報の閲覧・編集": Permission.CUSTOMER_WRITE in permissions,
-            "見積の作成・編集": Permission.ESTIMATE_WRITE in permissions,
-            "仕入原価・粗利率の閲覧": Permission.COST_READ in permissions,
-            "単価マスタの編集": Permission.PRICE_MASTER_WRITE in permissions,
-            "明細ごとの調整額入力": Permission.PRICE_ADJUST_ITEM in permissions,
-            "見積合計に対する最終調整": Permission.PRICE_ADJUST_TOTAL in permissions,
-            "収益性ダッシュボード閲覧": Permission.DASHBOARD_PROFIT in permissions,
-            "請求書の発行": Permission.INVOICE_ISSUE in permissions,
-            "システム全体の設定変更": Permission.SYSTEM_SETTINGS in permissions,
-        }
-    
-    return matrix
\ No newline at end of file
+    return {
+        role.value: rbac_manager.get_permission_flags(role, _RBAC_MATRIX_FLAGS)
+        for role in UserRole
+    }
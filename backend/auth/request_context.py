@@ -0,0 +1,95 @@
+"""
+Garden DX - リクエスト単位の認証コンテキスト
+認証ミドルウェア・各依存関数で同じトークンを何度もデコードしたり
+ユーザーをDBから再取得したりしないよう、解決済みの主体を request.state に保持する
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional
+
+from fastapi import Request
+
+@dataclass
+class AuthContext:
+    """リクエスト単位の認証情報と処理回数"""
+    token: Optional[str] = None
+    # 直近に解決したデコード結果（互換用）。検証方式ごとの結果は payload_for で取得する
+    payload: Optional[Dict[str, Any]] = None
+    payloads: Dict[Any, Optional[Dict[str, Any]]] = field(default_factory=dict)
+    # 直近に解決したユーザー（互換用）。検証方式ごとのユーザーは decoder をキーに users へ保持する
+    user: Any = None
+    users: Dict[Any, Any] = field(default_factory=dict)
+    principals: Dict[str, Any] = field(default_factory=dict)
+    # 計測用カウンター（テストで「デコード1回・DB参照1回以下」を検証する）
+    token_decodes: int = 0
+    db_lookups: int = 0
+
+    def payload_for(self, decoder: Callable[[str], Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+        """decoder で検証済みのペイロード（未検証・検証失敗は None）"""
+        return self.payloads.get(decoder)
+
+def extract_bearer_token(request: Request) -> Optional[str]:
+    """Authorizationヘッダーからベアラートークンを取得"""
+    auth_header = request.headers.get("Authorization")
+    if not auth_header or not auth_header.startswith("Bearer "):
+        return None
+    return auth_header[len("Bearer "):].strip() or None
+
+def get_auth_context(request: Request) -> AuthContext:
+    """リクエストの認証コンテキスト取得（未作成なら作成）"""
+    context = getattr(request.state, "auth_context", None)
+    if context is None:
+        context = AuthContext(token=extract_bearer_token(request))
+        request.state.auth_context = context
+    return context
+
+def resolve_token_payload(request: Request, decoder: Callable[[str], Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+    """
+    トークンのデコード結果を取得
+    decoder ごとに最初の1回だけ呼び出し、以降はキャッシュを返す
+    （ある方式で検証済みのトークンを、署名・audience等の異なる別方式の結果として扱わない）
+    """
+    context = get_auth_context(request)
+    if decoder not in context.payloads:
+        payload = None
+        if context.token:
+            context.token_decodes += 1
+            payload = decoder(context.token)
+        context.payloads[decoder] = payload
+    context.payload = context.payloads[decoder]
+    return context.payload
+
+def resolve_user(
+    request: Request,
+    loader: Callable[[Dict[str, Any]], Any],
+    decoder: Optional[Callable[[str], Optional[Dict[str, Any]]]] = None,
+) -> Any:
+    """
+    トークンに対応するDBユーザーを取得
+    decoder ごとにリクエスト内で最初の1回だけ loader を呼び出す（decoder 指定時はその方式で検証済みのペイロードを渡す）
+    """
+    context = get_auth_context(request)
+    if decoder not in context.users:
+        user = None
+        payload = context.payload_for(decoder) if decoder is not None else context.payload
+        if payload is not None:
+            context.db_lookups += 1
+            user = loader(payload)
+        context.users[decoder] = user
+    context.user = context.users[decoder]
+    return context.user
+
+def resolve_principal(request: Request, kind: str, factory: Callable[[AuthContext], Any]) -> Any:
+    """
+    用途別の主体オブジェクト（CurrentUser, RBACUser など）を取得
+    同一リクエスト内では kind ごとに1回だけ生成する
+    """
+    context = get_auth_context(request)
+    if kind not in context.principals:
+        context.principals[kind] = factory(context)
+    return context.principals[kind]
+
+def get_auth_counters(request: Request) -> Dict[str, int]:
+    """リクエスト内の認証処理回数"""
+    context = get_auth_context(request)
+    return {"token_decodes": context.token_decodes, "db_lookups": context.db_lookups}
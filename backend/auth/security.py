@@ -3,11 +3,16 @@ Garden DX - セキュリティ強化システム
 高セキュリティ実装（パスワードハッシュ化・セッション管理・脆弱性対策）
 """
 
+import asyncio
 import hashlib
+import heapq
 import secrets
 import re
+import sys
+import time
+from array import array
 from datetime import datetime, timedelta, timezone
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 from fastapi import HTTPException, Request, Response
 from fastapi.security import HTTPBearer
 from starlette.middleware.base import BaseHTTPMiddleware
@@ -18,6 +23,8 @@ import hmac
 import base64
 import json
 
+from .rate_limit import RateLimitRule, SlidingWindowRateLimiter
+
 # ログ設定
 security_logger = logging.getLogger("garden_security")
 
@@ -132,13 +139,67 @@ class PasswordSecurity:
         chars = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789!@#$%^&*"
         return ''.join(secrets.choice(chars) for _ in range(length))
 
+class SessionActivityRing:
+    """
+    セッションアクティビティのリングバッファ
+    直近 size 件のタイムスタンプ（monotonic秒）を固定サイズ配列に保持し、
+    件数・初回・最終時刻は集計カウンターとして保持する
+    """
+    
+    __slots__ = ("_times", "_next", "count", "first_at", "last_at")
+    
+    def __init__(self, size: int, now: float):
+        self._times = array("d", bytes(8 * size))
+        self._next = 0
+        self.count = 0
+        self.first_at = now
+        self.last_at = now
+    
+    def record(self, now: float) -> None:
+        """アクティビティ記録（O(1)、メモリ割り当てなし）"""
+        times = self._times
+        times[self._next] = now
+        self._next = (self._next + 1) % len(times)
+        self.count += 1
+        self.last_at = now
+    
+    def recent(self) -> List[float]:
+        """保持中のタイムスタンプを古い順に取得"""
+        size = len(self._times)
+        if self.count < size:
+            return self._times[:self.count].tolist()
+        return (self._times[self._next:] + self._times[:self._next]).tolist()
+    
+    def count_since(self, since: float) -> int:
+        """指定時刻以降のアクティビティ件数（保持範囲内）"""
+        return sum(1 for t in self.recent() if t >= since)
+
 class SessionSecurity:
-    """セッションセキュリティ管理"""
+    """
+    セッションセキュリティ管理
+    時刻比較はすべて単一のmonotonicクロックで行い、表示用の日時は基準点から換算する。
+    期限切れセッションは検証時ではなくバックグラウンドのスイーパーが削除する。
+    """
     
-    def __init__(self):
+    ACTIVITY_BUFFER_SIZE = 100
+    SWEEP_INTERVAL_SECONDS = 60
+    
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
         self.active_sessions: Dict[str, Dict[str, Any]] = {}
         self.user_sessions: Dict[int, List[str]] = {}
-        self.session_activities: Dict[str, List[datetime]] = {}
+        self.session_activities: Dict[str, SessionActivityRing] = {}
+        # 有効期限ヒープ（延長時は新エントリを追加し、古いエントリはスイープ時に読み飛ばす）
+        self._expiry_heap: List[Tuple[float, str]] = []
+        self._sweeper_task: Optional[asyncio.Task] = None
+        self._wall_anchor = datetime.now(timezone.utc)
+        self._clock_anchor = self.clock()
+        self._timeout_seconds = SecurityConfig.SESSION_TIMEOUT_MINUTES * 60
+        self._refresh_threshold_seconds = SecurityConfig.SESSION_REFRESH_THRESHOLD_MINUTES * 60
+    
+    def _to_datetime(self, monotonic_time: float) -> datetime:
+        """monotonic時刻を表示用のUTC日時に換算"""
+        return self._wall_anchor + timedelta(seconds=monotonic_time - self._clock_anchor)
     
     def create_session(self, user_id: int, user_data: Dict[str, Any], request: Request) -> str:
         """セキュアセッション作成"""
@@ -151,21 +212,22 @@ class SessionSecurity:
         
         # セッションID生成
         session_id = secrets.token_urlsafe(32)
+        now = self.clock()
+        expires_at = now + self._timeout_seconds
         
         # セッション情報保存
         session_data = {
             "user_id": user_id,
             "user_data": user_data,
-            "created_at": datetime.now(timezone.utc),
-            "last_activity": datetime.now(timezone.utc),
-            "expires_at": datetime.now(timezone.utc) + timedelta(minutes=SecurityConfig.SESSION_TIMEOUT_MINUTES),
+            "created_at": self._to_datetime(now),
+            "expires_monotonic": expires_at,
             "ip_address": self._get_client_ip(request),
             "user_agent": request.headers.get("User-Agent", ""),
             "is_active": True,
-            "activity_count": 0
         }
         
         self.active_sessions[session_id] = session_data
+        heapq.heappush(self._expiry_heap, (expires_at, session_id))
         
         # ユーザー別セッション管理
         if user_id not in self.user_sessions:
@@ -173,22 +235,24 @@ class SessionSecurity:
         self.user_sessions[user_id].append(session_id)
         
         # アクティビティ追跡
-        self.session_activities[session_id] = [datetime.now(timezone.utc)]
+        activity = SessionActivityRing(self.ACTIVITY_BUFFER_SIZE, now)
+        activity.record(now)
+        self.session_activities[session_id] = activity
         
         security_logger.info(f"セッション作成: user_id={user_id}, session_id={session_id[:8]}..., ip={session_data['ip_address']}")
         
         return session_id
     
     def validate_session(self, session_id: str, request: Request) -> Optional[Dict[str, Any]]:
-        """セッション検証"""
-        if session_id not in self.active_sessions:
+        """セッション検証（クロック読み取りは1回のみ）"""
+        session = self.active_sessions.get(session_id)
+        if session is None:
             return None
         
-        session = self.active_sessions[session_id]
+        now = self.clock()
         
-        # 期限チェック
-        if datetime.now(timezone.utc) > session["expires_at"]:
-            self.terminate_session(session_id)
+        # 期限チェック（削除はスイーパーが行う）
+        if now > session["expires_monotonic"]:
             return None
         
         # アクティブ状態チェック
@@ -201,21 +265,16 @@ class SessionSecurity:
             security_logger.warning(f"IPアドレス変更検出: session_id={session_id[:8]}..., old_ip={session['ip_address']}, new_ip={current_ip}")
             # 本番環境では無効化を検討
         
-        # アクティビティ更新
-        session["last_activity"] = datetime.now(timezone.utc)
-        session["activity_count"] += 1
-        
         # アクティビティ追跡
-        if session_id in self.session_activities:
-            self.session_activities[session_id].append(datetime.now(timezone.utc))
-            # 古いアクティビティを削除（最新100件のみ保持）
-            if len(self.session_activities[session_id]) > 100:
-                self.session_activities[session_id] = self.session_activities[session_id][-100:]
+        activity = self.session_activities.get(session_id)
+        if activity is not None:
+            activity.record(now)
         
         # セッション延長チェック
-        time_until_expiry = session["expires_at"] - datetime.now(timezone.utc)
-        if time_until_expiry.total_seconds() < SecurityConfig.SESSION_REFRESH_THRESHOLD_MINUTES * 60:
-            session["expires_at"] = datetime.now(timezone.utc) + timedelta(minutes=SecurityConfig.SESSION_TIMEOUT_MINUTES)
+        if session["expires_monotonic"] - now < self._refresh_threshold_seconds:
+            expires_at = now + self._timeout_seconds
+            session["expires_monotonic"] = expires_at
+            heapq.heappush(self._expiry_heap, (expires_at, session_id))
             security_logger.info(f"セッション延長: session_id={session_id[:8]}...")
         
         return session
@@ -259,6 +318,55 @@ class SessionSecurity:
         
         return terminated_count
     
+    def reap_expired_sessions(self) -> int:
+        """期限切れセッションの削除（期限順ヒープから期限到来分のみ取り出す）"""
+        now = self.clock()
+        heap = self._expiry_heap
+        reaped = 0
+        
+        while heap and heap[0][0] <= now:
+            expires_at, session_id = heapq.heappop(heap)
+            session = self.active_sessions.get(session_id)
+            # 延長済み・終了済みのセッションの古いエントリは読み飛ばす
+            if session is None or session["expires_monotonic"] != expires_at:
+                continue
+            self.terminate_session(session_id)
+            reaped += 1
+        
+        # 終了済みセッションのエントリが溜まりすぎた場合はヒープを再構築
+        if len(heap) > 2 * len(self.active_sessions) + 1024:
+            self._expiry_heap = [
+                (session["expires_monotonic"], session_id)
+                for session_id, session in self.active_sessions.items()
+            ]
+            heapq.heapify(self._expiry_heap)
+        
+        if reaped:
+            security_logger.info(f"期限切れセッション削除: {reaped}件")
+        return reaped
+    
+    async def _sweep_loop(self, interval_seconds: float) -> None:
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                self.reap_expired_sessions()
+            except Exception as e:
+                security_logger.error(f"セッションスイープエラー: {str(e)}")
+    
+    def start_sweeper(self, interval_seconds: Optional[float] = None) -> asyncio.Task:
+        """バックグラウンドスイーパー開始（起動イベントから呼び出す）"""
+        if self._sweeper_task is None or self._sweeper_task.done():
+            self._sweeper_task = asyncio.get_running_loop().create_task(
+                self._sweep_loop(interval_seconds or self.SWEEP_INTERVAL_SECONDS)
+            )
+        return self._sweeper_task
+    
+    def stop_sweeper(self) -> None:
+        """バックグラウンドスイーパー停止"""
+        if self._sweeper_task is not None:
+            self._sweeper_task.cancel()
+            self._sweeper_task = None
+    
     def get_user_sessions(self, user_id: int) -> List[Dict[str, Any]]:
         """ユーザーのセッション一覧"""
         sessions = []
@@ -267,18 +375,41 @@ class SessionSecurity:
             for session_id in self.user_sessions[user_id]:
                 if session_id in self.active_sessions:
                     session = self.active_sessions[session_id]
+                    activity = self.session_activities.get(session_id)
                     sessions.append({
                         "session_id": session_id[:8] + "...",
                         "created_at": session["created_at"],
-                        "last_activity": session["last_activity"],
-                        "expires_at": session["expires_at"],
+                        "last_activity": self._to_datetime(activity.last_at) if activity else session["created_at"],
+                        "expires_at": self._to_datetime(session["expires_monotonic"]),
                         "ip_address": session["ip_address"],
                         "user_agent": session["user_agent"],
-                        "activity_count": session["activity_count"]
+                        "activity_count": activity.count if activity else 0
                     })
         
         return sessions
     
+    def get_memory_usage(self) -> Dict[str, Any]:
+        """セッション管理のメモリ使用量（1万セッションあたりに換算）"""
+        session_count = len(self.active_sessions)
+        if not session_count:
+            return {"sessions": 0, "bytes_per_session": 0, "mb_per_10k_sessions": 0.0}
+        
+        total_bytes = sys.getsizeof(self.active_sessions) + sys.getsizeof(self.session_activities)
+        for session_id, session in self.active_sessions.items():
+            total_bytes += sys.getsizeof(session_id) + sys.getsizeof(session)
+            total_bytes += sum(sys.getsizeof(value) for value in session.values())
+        for activity in self.session_activities.values():
+            total_bytes += sys.getsizeof(activity) + sys.getsizeof(activity._times)
+        total_bytes += sys.getsizeof(self._expiry_heap) + len(self._expiry_heap) * sys.getsizeof((0.0, ""))
+        
+        bytes_per_session = total_bytes / session_count
+        return {
+            "sessions": session_count,
+            "bytes_per_session": round(bytes_per_session),
+            "mb_per_10k_sessions": round(bytes_per_session * 10_000 / 1024 / 1024, 2),
+            "activity_buffer_size": self.ACTIVITY_BUFFER_SIZE,
+        }
+    
     def _get_client_ip(self, request: Request) -> str:
         """クライアントIP取得"""
         # プロキシ環境対応
@@ -362,32 +493,15 @@ class SecurityMiddleware(BaseHTTPMiddleware):
         return request.client.host if request.client else "unknown"
 
 class RateLimiter:
-    """レート制限"""
+    """レート制限（スライディングウィンドウカウンター、識別子あたり固定サイズ）"""
     
-    def __init__(self):
-        self.requests: Dict[str, List[datetime]] = {}
+    def __init__(self, limiter: Optional[SlidingWindowRateLimiter] = None):
+        self.limiter = limiter or SlidingWindowRateLimiter()
+        self.rule = RateLimitRule(limit=SecurityConfig.RATE_LIMIT_REQUESTS_PER_MINUTE, window_seconds=60)
     
     def is_allowed(self, client_id: str) -> bool:
         """レート制限チェック"""
-        now = datetime.now(timezone.utc)
-        minute_ago = now - timedelta(minutes=1)
-        
-        # 古いリクエストを削除
-        if client_id in self.requests:
-            self.requests[client_id] = [
-                req_time for req_time in self.requests[client_id]
-                if req_time > minute_ago
-            ]
-        else:
-            self.requests[client_id] = []
-        
-        # リクエスト数チェック
-        if len(self.requests[client_id]) >= SecurityConfig.RATE_LIMIT_REQUESTS_PER_MINUTE:
-            return False
-        
-        # リクエスト記録
-        self.requests[client_id].append(now)
-        return True
+        return self.limiter.is_allowed(client_id, self.rule)
 
 class LoginAttemptTracker:
     """ログイン試行追跡"""
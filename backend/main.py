@@ -6,7 +6,7 @@ FastAPI バックエンドメイン
 from fastapi import FastAPI, Depends, HTTPException, Security
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean, Text, ForeignKey, Float
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session, relationship
@@ -27,9 +27,18 @@ from services.auth_service import (
     User
 )
 
+# 見積金額計算（明細・合計の端数処理）
+from services.totals_engine import estimate_totals_engine
+
 # 設定管理API
 from api.settings import router as settings_router
 
+# パスワードハッシュ（bcryptをスレッドプールで実行）
+from auth.password_hashing import password_hasher
+
+# セッション管理（期限切れセッションはバックグラウンドで削除）
+from auth.security import session_security
+
 load_dotenv()
 
 # FastAPIアプリケーション初期化
@@ -41,6 +50,33 @@ app = FastAPI(
     redoc_url="/api/redoc"
 )
 
+# JWT認証 - /api/ 配下はトークンを検証し、結果を request.state で後続の依存関数と共有
+# レート制限・CORSより内側に配置し、401応答にもレート制限とCORSヘッダーを適用
+from auth.middleware import AuthenticationMiddleware
+app.add_middleware(AuthenticationMiddleware)
+
+# レート制限 - スライディングウィンドウ（RateLimit-* ヘッダー付与）
+# CORSより内側に配置し、429応答にもCORSヘッダーを付与
+# RATE_LIMIT_SHARED_MEMORY=true でワーカー間共有（gunicorn --preload が必須。fork前に生成し、終了時に削除）
+# プロキシ配下では TRUSTED_PROXIES にプロキシのIP・CIDRを設定（設定したプロキシの転送ヘッダーのみ使用）
+from auth.rate_limit import (
+    RateLimitMiddleware,
+    RateLimitRule,
+    SlidingWindowRateLimiter,
+    SharedMemoryRateLimitStore,
+)
+
+rate_limit_store = (
+    SharedMemoryRateLimitStore()
+    if os.getenv("RATE_LIMIT_SHARED_MEMORY", "false").lower() == "true"
+    else None
+)
+app.add_middleware(
+    RateLimitMiddleware,
+    rule=RateLimitRule(limit=int(os.getenv("RATE_LIMIT_PER_MINUTE", "100")), window_seconds=60),
+    limiter=SlidingWindowRateLimiter(store=rate_limit_store),
+)
+
 # CORS設定 - パフォーマンス最適化
 app.add_middleware(
     CORSMiddleware,
@@ -57,12 +93,28 @@ app.add_middleware(
         "Accept",
         "X-Requested-With",
     ],
+    expose_headers=["RateLimit-Limit", "RateLimit-Remaining", "RateLimit-Reset", "Retry-After"],
     max_age=86400,  # preflightキャッシュ時間1日
 )
 
+# クエリ予算・N+1検出（QUERY_BUDGET_MODE=strict で予算超過を例外に、本番は警告メトリクス）
+from services.query_budget import QueryBudgetMiddleware, query_budget, track_engine
+app.add_middleware(QueryBudgetMiddleware)
+
+# リクエストレイテンシ計測（最も外側に配置し、レート制限・CORSを含めた応答時間を記録）
+from services.system_metrics import RequestMetricsMiddleware
+app.add_middleware(RequestMetricsMiddleware)
+
 # データベース設定 - 最適化済み
 from database import engine, SessionLocal, Base
 
+# DBクエリ数・実行時間の計測（Prometheus）
+from services.prometheus_metrics import (
+    CONTENT_TYPE as METRICS_CONTENT_TYPE, generate_latest, instrument_engine, multiprocess_exporter
+)
+instrument_engine(engine, slow_query_seconds=float(os.getenv("SLOW_QUERY_SECONDS", "1.0")))
+track_engine(engine)
+
 # セキュリティ
 security = HTTPBearer()
 
@@ -203,6 +255,51 @@ async def root():
 async def health_check():
     return {"status": "healthy", "timestamp": datetime.now()}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus メトリクス（テキスト形式）"""
+    return Response(content=generate_latest(), media_type=METRICS_CONTENT_TYPE)
+
+@app.on_event("startup")
+async def start_metrics_exporter():
+    """複数ワーカー時はメトリクスの定期書き出しを開始"""
+    if multiprocess_exporter is not None:
+        multiprocess_exporter.start()
+
+@app.on_event("shutdown")
+async def stop_metrics_exporter():
+    if multiprocess_exporter is not None:
+        multiprocess_exporter.stop()
+
+@app.on_event("startup")
+async def calibrate_password_hashing():
+    """起動時にbcryptのハッシュ時間を計測し、レイテンシSLOと比較してログ出力"""
+    if os.getenv("PASSWORD_HASH_CALIBRATE", "true").lower() == "true":
+        await password_hasher.calibrate_async()
+
+@app.on_event("startup")
+async def start_session_sweeper():
+    """期限切れセッションのバックグラウンド削除を開始"""
+    session_security.start_sweeper()
+
+@app.on_event("shutdown")
+async def shutdown_password_hashing():
+    password_hasher.shutdown()
+
+@app.on_event("shutdown")
+async def stop_session_sweeper():
+    session_security.stop_sweeper()
+
+@app.on_event("shutdown")
+async def release_rate_limit_store():
+    if rate_limit_store is not None:
+        rate_limit_store.release()
+
+@app.get("/api/auth/password-hash-calibration")
+async def get_password_hash_calibration(user: User = Depends(require_owner_role())):
+    """パスワードハッシュのキャリブレーション結果（ワークファクター調整用）"""
+    return password_hasher.last_calibration or await password_hasher.calibrate_async()
+
 # 単価マスタ関連API - パフォーマンス最適化
 @app.get("/api/price-master", response_model=List[PriceMaster])
 async def get_price_master(
@@ -278,6 +375,7 @@ async def create_price_master(
 
 # 見積関連API - パフォーマンス最適化
 @app.get("/api/estimates", response_model=List[Estimate])
+@query_budget(max_queries=5)
 async def get_estimates(
     status: Optional[str] = None,
     customer_id: Optional[int] = None,
@@ -322,6 +420,7 @@ async def get_estimates(
     return _get_estimates_optimized()
 
 @app.get("/api/estimates/{estimate_id}")
+@query_budget(max_queries=5)
 async def get_estimate(
     estimate_id: int, 
     current_user: User = Depends(require_permission("estimates", "view")),
@@ -427,9 +526,9 @@ async def add_estimate_item(
     line_total = 0
     line_cost = 0
     if item.quantity and item.unit_price:
-        line_total = int(item.quantity * item.unit_price) + item.line_item_adjustment
+        line_total = estimate_totals_engine.line_amount(item.quantity, item.unit_price, item.line_item_adjustment)
     if item.quantity and item.purchase_price:
-        line_cost = int(item.quantity * item.purchase_price)
+        line_cost = estimate_totals_engine.line_amount(item.quantity, item.purchase_price)
     
     db_item = EstimateItem(
         **item.dict(),
@@ -640,15 +739,13 @@ async def get_permission_matrix(current_user: User = Depends(require_owner_role(
 def _recalculate_estimate_totals(estimate: Estimate, db: Session):
     """見積合計金額再計算"""
     items = db.query(EstimateItem).filter(EstimateItem.estimate_id == estimate.estimate_id).all()
+    totals = estimate_totals_engine.estimate_totals(items, estimate.adjustment_amount)
     
-    subtotal = sum(item.line_total or 0 for item in items if item.item_type == "item")
-    total_cost = sum(item.line_cost or 0 for item in items if item.item_type == "item")
-    
-    estimate.subtotal = subtotal
-    estimate.total_cost = total_cost
-    estimate.total_amount = subtotal + estimate.adjustment_amount
-    estimate.gross_profit = estimate.total_amount - total_cost
-    estimate.gross_margin_rate = estimate.gross_profit / estimate.total_amount if estimate.total_amount > 0 else 0.0
+    estimate.subtotal = totals.subtotal
+    estimate.total_cost = totals.total_cost
+    estimate.total_amount = totals.total_amount
+    estimate.gross_profit = totals.gross_profit
+    estimate.gross_margin_rate = totals.gross_profit_rate
 
 # テスト用認証なしエンドポイント
 @app.get("/api/demo/estimates")
@@ -3,12 +3,15 @@
 """
 
 from functools import wraps
-from typing import List, Optional
-from fastapi import HTTPException, Depends, status
+from typing import Dict, List, Optional
+from fastapi import HTTPException, Depends, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 
 from ..database import get_db
+from ..auth.permission_bits import PermissionTable
+from ..auth.jwt_auth import auth_manager
+from ..auth.request_context import AuthContext, resolve_principal, resolve_token_payload
 
 # セキュリティスキーム
 security = HTTPBearer()
@@ -102,6 +105,9 @@ ROLE_PERMISSIONS = {
     ]
 }
 
+# 役割別権限のビットマスク（インポート時に計算）
+ROLE_PERMISSION_TABLE = PermissionTable(ROLE_PERMISSIONS)
+
 class CurrentUser:
     """現在のユーザー情報"""
     def __init__(self, user_id: int, email: str, role: str, company_id: int, permissions: List[str]):
@@ -110,10 +116,18 @@ class CurrentUser:
         self.role = role
         self.company_id = company_id
         self.permissions = permissions
+        self.permission_mask = ROLE_PERMISSION_TABLE.mask_of(permissions)
     
     def has_permission(self, permission: str) -> bool:
         """権限チェック"""
-        return permission in self.permissions
+        return ROLE_PERMISSION_TABLE.mask_has(self.permission_mask, permission)
+    
+    def allowed_permissions(self, permissions: List[str]) -> Dict[str, bool]:
+        """複数権限の可否を一括判定"""
+        return {
+            permission: ROLE_PERMISSION_TABLE.mask_has(self.permission_mask, permission)
+            for permission in permissions
+        }
     
     def has_role(self, role: str) -> bool:
         """役割チェック"""
@@ -127,43 +141,51 @@ class CurrentUser:
         """従業員権限チェック"""
         return self.role == UserRoles.EMPLOYEE
 
+# JWTのロール名 → 請求書システムのロール名
+JWT_ROLE_NAMES = {
+    'owner': UserRoles.MANAGER,
+    'employee': UserRoles.EMPLOYEE,
+}
+
+def current_user_from_context(context: AuthContext) -> CurrentUser:
+    """認証コンテキストから現在のユーザー情報を生成（auth_manager.verify_token で検証済みであること）"""
+    payload = context.payload_for(auth_manager.verify_token)
+    user_data = {
+        'user_id': payload.get('user_id'),
+        'email': payload.get('email'),
+        'role': JWT_ROLE_NAMES.get(payload.get('role'), payload.get('role')),
+        'company_id': payload.get('company_id')
+    }
+    
+    # 役割に基づく権限を取得
+    permissions = ROLE_PERMISSIONS.get(user_data['role'], [])
+    
+    return CurrentUser(
+        user_id=user_data['user_id'],
+        email=user_data['email'],
+        role=user_data['role'],
+        company_id=user_data['company_id'],
+        permissions=permissions
+    )
+
 async def get_current_user(
+    request: Request,
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db)
 ) -> CurrentUser:
     """
     現在のユーザー情報を取得
     Worker4のJWT認証システムと連携
+    同一リクエスト内では1回だけ解決し、request.state で共有する
     """
-    try:
-        token = credentials.credentials
-        
-        # TODO: Worker4のJWT検証APIと連携
-        # 現在は仮のユーザー情報を返す
-        mock_user_data = {
-            'user_id': 1,
-            'email': 'tanaka@landscaping.co.jp',
-            'role': UserRoles.MANAGER,
-            'company_id': 1
-        }
-        
-        # 役割に基づく権限を取得
-        permissions = ROLE_PERMISSIONS.get(mock_user_data['role'], [])
-        
-        return CurrentUser(
-            user_id=mock_user_data['user_id'],
-            email=mock_user_data['email'],
-            role=mock_user_data['role'],
-            company_id=mock_user_data['company_id'],
-            permissions=permissions
-        )
-        
-    except Exception as e:
+    # 認証ミドルウェアと同じ方式で検証（ミドルウェアで検証済みなら再デコードしない）
+    if resolve_token_payload(request, auth_manager.verify_token) is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="認証に失敗しました",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    return resolve_principal(request, "current_user", current_user_from_context)
 
 async def get_current_company_id(current_user: CurrentUser = Depends(get_current_user)) -> int:
     """現在のユーザーの会社IDを取得"""
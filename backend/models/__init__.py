@@ -4,7 +4,7 @@ SQLAlchemyモデル定義
 仕様書準拠のマルチテナント対応データベース設計
 """
 
-from sqlalchemy import Column, Integer, String, DateTime, Decimal, Boolean, Text, ForeignKey, Date, Index
+from sqlalchemy import Column, Integer, String, DateTime, Numeric as Decimal, Boolean, Text, ForeignKey, Date, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -37,6 +37,7 @@ class Customer(Base):
     customer_id = Column(Integer, primary_key=True, index=True)
     company_id = Column(Integer, ForeignKey("companies.company_id"), nullable=False)
     customer_name = Column(String(255), nullable=False)
+    customer_name_kana = Column(String(255))  # 振込名義との照合用
     customer_type = Column(String(50), default="個人")  # 個人/法人
     postal_code = Column(String(10))
     address = Column(Text)
@@ -3,7 +3,7 @@ from decimal import Decimal
 from typing import List, Optional, Dict, Any
 from enum import Enum
 
-from sqlalchemy import Column, Integer, String, Text, DECIMAL, Date, DateTime, Boolean, ForeignKey, CheckConstraint
+from sqlalchemy import Column, Integer, String, Text, DECIMAL, Date, DateTime, Boolean, ForeignKey, CheckConstraint, Index, JSON, insert, text, update
 from sqlalchemy.orm import relationship, Session
 from sqlalchemy.ext.declarative import declarative_base
 from pydantic import BaseModel, Field, validator
@@ -86,8 +86,25 @@ class Invoice(Base):
     __table_args__ = (
         CheckConstraint(status.in_([s.value for s in InvoiceStatus]), name="check_invoice_status"),
         CheckConstraint(payment_status.in_([s.value for s in PaymentStatus]), name="check_payment_status"),
+        # 一覧のキーセットページネーション用 (company_id, created_at DESC, invoice_id DESC)
+        Index("idx_invoices_company_created_keyset", "company_id", created_at.desc(), invoice_id.desc()),
+        # 1つの見積から有効な請求書は1件のみ（キャンセル済みは再発行できる）
+        Index(
+            "idx_invoices_company_estimate_unique", "company_id", "estimate_id", unique=True,
+            postgresql_where=text("estimate_id IS NOT NULL AND status <> 'キャンセル'")
+        ),
     )
 
+class InvoiceMonthlySummary(Base):
+    """請求書月次集計モデル（締め済み月の支払サマリーをマテリアライズ）"""
+    __tablename__ = "invoice_monthly_summaries"
+
+    company_id = Column(Integer, primary_key=True)
+    month = Column(Date, primary_key=True)  # 月初日
+    # [[status, payment_status, 件数, 請求額, 入金額], ...]（金額は文字列で保持）
+    breakdown = Column(JSON, nullable=False, default=list)
+    computed_at = Column(DateTime, default=datetime.utcnow)
+
 class InvoiceItem(Base):
     """請求書明細モデル"""
     __tablename__ = "invoice_items"
@@ -106,6 +123,7 @@ class InvoiceItem(Base):
     unit = Column(String(20), nullable=True)
     unit_price = Column(DECIMAL(10, 0), nullable=False, default=0)
     amount = Column(DECIMAL(12, 0), nullable=False, default=0)
+    tax_rate = Column(DECIMAL(5, 3), nullable=True)  # 明細の税率（NULLは請求書の税率）
     
     # 表示順序・階層
     sort_order = Column(Integer, default=0)
@@ -166,6 +184,7 @@ class InvoicePayment(Base):
     bank_name = Column(String(100), nullable=True)
     account_info = Column(String(100), nullable=True)
     transaction_id = Column(String(100), nullable=True)
+    statement_line_key = Column(String(64), nullable=True)  # 入金明細行のハッシュ（取引番号の無い明細の重複検出）
     
     # 備考
     notes = Column(Text, nullable=True)
@@ -218,6 +237,7 @@ class InvoiceItemBase(BaseModel):
     unit: Optional[str] = None
     unit_price: Decimal = Field(default=Decimal('0'), ge=0)
     amount: Decimal = Field(default=Decimal('0'), ge=0)
+    tax_rate: Optional[Decimal] = Field(default=None, ge=0, le=1)  # 明細の税率（軽減税率8%など。未指定は請求書の税率）
     sort_order: int = 0
     level: int = 1
     is_header: bool = False
@@ -281,6 +301,13 @@ class InvoiceCreate(InvoiceBase):
     """請求書作成スキーマ"""
     items: List[InvoiceItemCreate] = []
 
+class InvoiceBatchFromEstimates(BaseModel):
+    """見積一括請求書化リクエストスキーマ"""
+    estimate_ids: List[int] = Field(..., min_length=1, max_length=500)
+    invoice_date: Optional[date] = None  # 未指定時は本日
+    payment_term_days: int = Field(default=30, ge=0, le=365)
+    tax_rate: Decimal = Field(default=Decimal('0.10'), ge=0, le=1)
+
 class InvoiceUpdate(InvoiceBase):
     """請求書更新スキーマ"""
     invoice_number: Optional[str] = None
@@ -354,56 +381,56 @@ class InvoiceSearchParams(BaseModel):
     search_term: Optional[str] = None  # 請求書番号、顧客名での検索
     page: int = Field(default=1, ge=1)
     per_page: int = Field(default=20, ge=1, le=100)
+    cursor: Optional[str] = None  # 前ページの next_cursor（指定時は page より優先）
+    total_mode: str = Field(default="cached", pattern="^(cached|estimate|none)$")
 
 # ====================
 # 業務ロジック関数
 # ====================
 
-def calculate_invoice_totals(items: List[InvoiceItemCreate], tax_rate: Decimal = Decimal('0.10')) -> Dict[str, Decimal]:
-    """請求書合計金額の計算"""
-    subtotal = sum(item.amount for item in items)
-    tax_amount = (subtotal * tax_rate).quantize(Decimal('0'))
-    total_amount = subtotal + tax_amount
-    
-    return {
-        'subtotal': subtotal,
-        'tax_amount': tax_amount,
-        'total_amount': total_amount
-    }
-
-def generate_invoice_number(db: Session, company_id: int) -> str:
-    """請求書番号の自動生成"""
-    today = datetime.now().date()
-    year_month = today.strftime('%Y%m')
-    
-    # 当月の最大連番を取得
-    last_invoice = db.query(Invoice).filter(
+def overdue_invoices_query(db: Session, company_id: int, today: Optional[date] = None):
+    """期限切れ請求書の参照クエリ（更新は行わない）"""
+    today = today or datetime.now().date()
+    return db.query(Invoice).filter(
         Invoice.company_id == company_id,
-        Invoice.invoice_number.like(f'INV-{year_month}-%')
-    ).order_by(Invoice.invoice_number.desc()).first()
-    
-    if last_invoice:
-        # 最後の番号から連番を取得
-        last_number = int(last_invoice.invoice_number.split('-')[-1])
-        sequence = last_number + 1
-    else:
-        sequence = 1
-    
-    return f'INV-{year_month}-{sequence:03d}'
+        Invoice.payment_status.in_([PaymentStatus.UNPAID.value, PaymentStatus.OVERDUE.value]),
+        Invoice.due_date < today
+    )
 
-def check_overdue_invoices(db: Session, company_id: int) -> List[Invoice]:
-    """期限切れ請求書の確認"""
-    today = datetime.now().date()
-    
-    overdue_invoices = db.query(Invoice).filter(
-        Invoice.company_id == company_id,
-        Invoice.payment_status == PaymentStatus.UNPAID,
+def mark_overdue_invoices(db: Session, company_id: Optional[int] = None, today: Optional[date] = None,
+                          user_id: Optional[int] = None) -> List[Any]:
+    """
+    期限切れ請求書を滞納ステータスに一括更新（コミットは呼び出し側）
+    UPDATE ... RETURNING 1文で更新し、履歴もまとめて1回のINSERTで記録する。
+    戻り値は更新された (invoice_id, company_id, invoice_date) の行リスト
+    """
+    today = today or datetime.now().date()
+    now = datetime.utcnow()
+    
+    statement = update(Invoice).where(
+        Invoice.payment_status == PaymentStatus.UNPAID.value,
         Invoice.due_date < today
-    ).all()
-    
-    # ステータスを自動更新
-    for invoice in overdue_invoices:
-        invoice.payment_status = PaymentStatus.OVERDUE
-    
-    db.commit()
-    return overdue_invoices
\ No newline at end of file
+    )
+    if company_id is not None:
+        statement = statement.where(Invoice.company_id == company_id)
+    statement = statement.values(
+        payment_status=PaymentStatus.OVERDUE.value,
+        updated_at=now,
+        updated_by=user_id
+    ).returning(Invoice.invoice_id, Invoice.company_id, Invoice.invoice_date)
+    
+    rows = db.execute(statement, execution_options={"synchronize_session": False}).all()
+    if rows:
+        db.execute(insert(InvoiceHistory), [
+            {
+                'invoice_id': row.invoice_id,
+                'action': "支払ステータス変更",
+                'old_payment_status': PaymentStatus.UNPAID.value,
+                'new_payment_status': PaymentStatus.OVERDUE.value,
+                'change_summary': f"支払期限（{today}より前）を過ぎたため滞納に変更しました",
+                'changed_at': now,
+                'changed_by': user_id,
+            }
+            for row in rows
+        ])
+    return rows
\ No newline at end of file
@@ -9,14 +9,15 @@ Purpose: 史上最強の造園業向けプロジェクト管理システムの
 
 from datetime import date, datetime
 from decimal import Decimal
-from typing import Optional, List
+from typing import Optional, List, Dict, Any, Iterable
 from enum import Enum
 
 from sqlalchemy import (
-    Column, Integer, String, Text, Date, DateTime, Decimal as SQLDecimal,
-    Boolean, ForeignKey, CheckConstraint, Index, event
+    Column, Integer, String, Text, Date, DateTime, Numeric as SQLDecimal, Float,
+    Boolean, ForeignKey, CheckConstraint, Index, bindparam, event, inspect, select, text, case, and_, type_coerce
 )
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import relationship, validates
 from sqlalchemy.dialects.postgresql import JSON
 from sqlalchemy.sql import func
@@ -135,6 +136,14 @@ class Project(Base):
     progress_percentage = Column(SQLDecimal(5, 2), default=0)
     manager_id = Column(Integer)  # 担当者ID
     notes = Column(Text)
+    
+    # 集計カウンター（タスク・変更指示の登録/更新時に同一トランザクションで再計算）
+    task_count = Column(Integer, nullable=False, default=0, server_default='0')
+    completed_task_count = Column(Integer, nullable=False, default=0, server_default='0')
+    delayed_task_count = Column(Integer, nullable=False, default=0, server_default='0')
+    change_order_count = Column(Integer, nullable=False, default=0, server_default='0')
+    pending_change_order_count = Column(Integer, nullable=False, default=0, server_default='0')
+    
     created_at = Column(DateTime, default=func.current_timestamp())
     updated_at = Column(DateTime, default=func.current_timestamp(), onupdate=func.current_timestamp())
     
@@ -166,45 +175,87 @@ class Project(Base):
             raise ValueError(f"Invalid priority: {priority}")
         return priority
     
-    @property
+    # 計算項目は hybrid_property（インスタンスではPython、クエリではSQL式として評価）
+    @hybrid_property
     def estimated_profit(self) -> Decimal:
         """見積利益額"""
-        return self.estimated_revenue - self.total_budget
+        return (self.estimated_revenue or 0) - (self.total_budget or 0)
     
-    @property
+    @estimated_profit.expression
+    def estimated_profit(cls):
+        return func.coalesce(cls.estimated_revenue, 0) - func.coalesce(cls.total_budget, 0)
+    
+    @hybrid_property
     def estimated_profit_rate(self) -> float:
         """見積利益率（%）"""
-        if self.estimated_revenue > 0:
+        if (self.estimated_revenue or 0) > 0:
             return float((self.estimated_profit / self.estimated_revenue) * 100)
         return 0.0
     
-    @property
+    @estimated_profit_rate.expression
+    def estimated_profit_rate(cls):
+        return type_coerce(case(
+            (cls.estimated_revenue > 0, cls.estimated_profit * 100.0 / cls.estimated_revenue),
+            else_=0
+        ), Float)
+    
+    @hybrid_property
     def budget_consumption_rate(self) -> float:
         """予算消化率（%）"""
-        if self.total_budget > 0:
-            return float((self.actual_cost / self.total_budget) * 100)
+        if (self.total_budget or 0) > 0:
+            return float(((self.actual_cost or 0) / self.total_budget) * 100)
         return 0.0
     
-    @property
+    @budget_consumption_rate.expression
+    def budget_consumption_rate(cls):
+        return type_coerce(case(
+            (cls.total_budget > 0, func.coalesce(cls.actual_cost, 0) * 100.0 / cls.total_budget),
+            else_=0
+        ), Float)
+    
+    @hybrid_property
     def schedule_status(self) -> str:
         """スケジュールステータス"""
         today = date.today()
-        if self.end_date and self.end_date < today and self.progress_percentage < 100:
+        progress = self.progress_percentage or 0
+        if self.end_date and self.end_date < today and progress < 100:
             return "遅延"
-        elif self.end_date and self.end_date == today and self.progress_percentage < 100:
+        elif self.end_date and self.end_date == today and progress < 100:
             return "要注意"
-        elif self.progress_percentage == 100:
+        elif progress == 100:
             return "完了"
         return "正常"
     
-    @property
+    @schedule_status.expression
+    def schedule_status(cls):
+        progress = func.coalesce(cls.progress_percentage, 0)
+        return case(
+            (and_(cls.end_date < func.current_date(), progress < 100), "遅延"),
+            (and_(cls.end_date == func.current_date(), progress < 100), "要注意"),
+            (progress == 100, "完了"),
+            else_="正常"
+        )
+    
+    @hybrid_property
     def budget_status(self) -> str:
         """予算ステータス"""
-        if self.actual_cost > self.total_budget:
+        actual_cost = self.actual_cost or 0
+        total_budget = self.total_budget or 0
+        if actual_cost > total_budget:
             return "予算超過"
-        elif self.actual_cost > self.total_budget * Decimal('0.9'):
+        elif actual_cost > total_budget * Decimal('0.9'):
             return "要注意"
         return "正常"
+    
+    @budget_status.expression
+    def budget_status(cls):
+        actual_cost = func.coalesce(cls.actual_cost, 0)
+        total_budget = func.coalesce(cls.total_budget, 0)
+        return case(
+            (actual_cost > total_budget, "予算超過"),
+            (actual_cost > total_budget * Decimal('0.9'), "要注意"),
+            else_="正常"
+        )
 
 class ProjectTask(Base):
     """プロジェクトタスク（工程）"""
@@ -405,33 +456,146 @@ class ChangeOrder(Base):
 # イベントリスナー（自動計算）
 # ==============================================
 
+# タスク集計の再計算（進捗率は大項目タスクのみで計算）
+_REFRESH_TASK_TOTALS_SQL = text("""
+UPDATE projects
+SET (progress_percentage, actual_cost, task_count, completed_task_count, delayed_task_count) = (
+    SELECT
+        COALESCE(AVG(CASE WHEN parent_task_id IS NULL THEN progress_percentage END), 0),
+        COALESCE(SUM(actual_cost), 0),
+        COUNT(*),
+        COUNT(CASE WHEN status = '完了' THEN 1 END),
+        COUNT(CASE WHEN status = '遅延' THEN 1 END)
+    FROM project_tasks
+    WHERE project_id = :project_id
+)
+WHERE project_id = :project_id
+""")
+
+# 変更指示件数の再計算
+_REFRESH_CHANGE_ORDER_COUNTS_SQL = text("""
+UPDATE projects
+SET (change_order_count, pending_change_order_count) = (
+    SELECT COUNT(*), COUNT(CASE WHEN status = '申請中' THEN 1 END)
+    FROM change_orders
+    WHERE project_id = :project_id
+)
+WHERE project_id = :project_id
+""")
+
+# 集計に影響する列（更新時はこれらが変わった場合のみ再計算）
+_TASK_TOTAL_COLUMNS = ('project_id', 'status', 'progress_percentage', 'actual_cost', 'parent_task_id')
+_CHANGE_ORDER_COUNT_COLUMNS = ('project_id', 'status')
+
+def _affected_project_ids(target, changed_columns: Optional[Iterable[str]] = None) -> List[int]:
+    """再計算が必要なプロジェクトID（プロジェクト移動時は移動元も含む）"""
+    state = inspect(target)
+    if changed_columns and not any(state.attrs[column].history.has_changes() for column in changed_columns):
+        return []
+    project_ids = {target.project_id}
+    project_ids.update(state.attrs.project_id.history.deleted or ())
+    project_ids.discard(None)
+    return sorted(project_ids)
+
+# 再計算前にプロジェクト行をロック（PostgreSQL。タスク登録時の外部キー検査の KEY SHARE とは競合しない）
+_LOCK_PROJECTS_SQL = text(
+    "SELECT project_id FROM projects WHERE project_id IN :project_ids ORDER BY project_id FOR NO KEY UPDATE"
+).bindparams(bindparam("project_ids", expanding=True))
+
+def refresh_project_counters(connection, project_ids: Iterable[int], tasks: bool = True, change_orders: bool = True):
+    """
+    プロジェクトの集計列を再計算
+    ORMを経由しない一括登録・更新の後は呼び出し側で実行する。
+    PostgreSQL では先にプロジェクト行をロックし、ロック取得後の新しいスナップショットで数え直す
+    （同じプロジェクトへの同時更新が互いの変更を見落として上書きしない）
+    """
+    project_ids = sorted(set(project_ids))
+    params = [{"project_id": project_id} for project_id in project_ids]
+    if not params:
+        return
+    if connection.dialect.name == "postgresql":
+        connection.execute(_LOCK_PROJECTS_SQL, {"project_ids": project_ids})
+    if tasks:
+        connection.execute(_REFRESH_TASK_TOTALS_SQL, params)
+    if change_orders:
+        connection.execute(_REFRESH_CHANGE_ORDER_COUNTS_SQL, params)
+
 @event.listens_for(ProjectTask, 'after_insert')
-@event.listens_for(ProjectTask, 'after_update')
 @event.listens_for(ProjectTask, 'after_delete')
 def update_project_progress(mapper, connection, target):
-    """タスク更新時にプロジェクト進捗を自動計算"""
-    if isinstance(target, ProjectTask):
-        project_id = target.project_id
-    else:
-        return
-    
-    # プロジェクト進捗率計算（大項目タスクのみで計算）
-    stmt = """
-    UPDATE projects 
-    SET progress_percentage = (
-        SELECT COALESCE(AVG(progress_percentage), 0)
-        FROM project_tasks 
-        WHERE project_id = :project_id
-        AND parent_task_id IS NULL
-    ),
-    actual_cost = (
-        SELECT COALESCE(SUM(actual_cost), 0)
-        FROM project_tasks 
-        WHERE project_id = :project_id
-    )
-    WHERE project_id = :project_id
+    """タスク登録・削除時にプロジェクト進捗・タスク件数を自動計算"""
+    refresh_project_counters(connection, _affected_project_ids(target), change_orders=False)
+
+@event.listens_for(ProjectTask, 'after_update')
+def update_project_progress_on_change(mapper, connection, target):
+    """タスク更新時（進捗・ステータス・原価などの変更時のみ）に再計算"""
+    refresh_project_counters(connection, _affected_project_ids(target, _TASK_TOTAL_COLUMNS), change_orders=False)
+
+@event.listens_for(ChangeOrder, 'after_insert')
+@event.listens_for(ChangeOrder, 'after_delete')
+def update_change_order_counts(mapper, connection, target):
+    """変更指示の登録・削除時にプロジェクトの変更指示件数を自動計算"""
+    refresh_project_counters(connection, _affected_project_ids(target), tasks=False)
+
+@event.listens_for(ChangeOrder, 'after_update')
+def update_change_order_counts_on_change(mapper, connection, target):
+    """変更指示のステータス変更時に再計算"""
+    refresh_project_counters(connection, _affected_project_ids(target, _CHANGE_ORDER_COUNT_COLUMNS), tasks=False)
+
+# 整合性チェック対象の集計列
+PROJECT_COUNTER_COLUMNS = (
+    'task_count', 'completed_task_count', 'delayed_task_count',
+    'change_order_count', 'pending_change_order_count',
+)
+
+def project_counter_totals():
+    """タスク・変更指示をプロジェクト単位に1回ずつ集計するサブクエリ（FILTER句）"""
+    task_totals = select(
+        ProjectTask.project_id,
+        func.count().label('task_count'),
+        func.count().filter(ProjectTask.status == TaskStatus.COMPLETED.value).label('completed_task_count'),
+        func.count().filter(ProjectTask.status == TaskStatus.DELAYED.value).label('delayed_task_count'),
+    ).group_by(ProjectTask.project_id).subquery()
+    change_order_totals = select(
+        ChangeOrder.project_id,
+        func.count().label('change_order_count'),
+        func.count().filter(ChangeOrder.status == ChangeOrderStatus.REQUESTED.value).label('pending_change_order_count'),
+    ).group_by(ChangeOrder.project_id).subquery()
+    return task_totals, change_order_totals
+
+def check_project_counters(session, company_id: Optional[int] = None, repair: bool = False) -> List[Dict[str, Any]]:
+    """
+    集計カウンターの整合性チェック
+    1回のGROUP BY集計と projects の値を比較して不一致のプロジェクトを返す
+    （repair=True の場合は再計算して修正）
     """
-    connection.execute(stmt, project_id=project_id)
+    task_totals, change_order_totals = project_counter_totals()
+    columns = [Project.project_id]
+    for name in PROJECT_COUNTER_COLUMNS:
+        totals = task_totals if name in task_totals.c else change_order_totals
+        columns.append(getattr(Project, name).label(name))
+        columns.append(func.coalesce(totals.c[name], 0).label(f"actual_{name}"))
+    
+    query = select(*columns)\
+        .outerjoin(task_totals, task_totals.c.project_id == Project.project_id)\
+        .outerjoin(change_order_totals, change_order_totals.c.project_id == Project.project_id)
+    if company_id is not None:
+        query = query.where(Project.company_id == company_id)
+    
+    mismatches = []
+    for row in session.execute(query):
+        diff = {
+            name: {'stored': getattr(row, name), 'actual': getattr(row, f"actual_{name}")}
+            for name in PROJECT_COUNTER_COLUMNS
+            if getattr(row, name) != getattr(row, f"actual_{name}")
+        }
+        if diff:
+            mismatches.append({'project_id': row.project_id, 'counters': diff})
+    
+    if repair and mismatches:
+        refresh_project_counters(session.connection(), [m['project_id'] for m in mismatches])
+        session.commit()
+    return mismatches
 
 # ==============================================
 # ユーティリティ関数
@@ -4,7 +4,7 @@ Garden 造園業向け統合業務管理システム
 仕様書準拠の見積管理機能
 """
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import and_, or_, func, desc
 from typing import List, Optional
@@ -23,15 +23,23 @@ from schemas import (
     EstimateSearchParams,
     BulkItemOperation
 )
+from services.auth_service import User, get_current_user_dependency
+from services.pagination import order_by_desc, paginate_keyset
+from services.number_allocator import number_allocator, ESTIMATE_NUMBER
+from services.totals_engine import estimate_totals_engine
 
 router = APIRouter()
 
+# 見積一覧の並び順（カーソルのキー）
+ESTIMATE_LIST_ORDER = order_by_desc(Estimate.created_at, Estimate.estimate_id)
+
 # =============================================================================
 # 見積管理エンドポイント
 # =============================================================================
 
 @router.get("/", response_model=List[EstimateSchema])
 async def get_estimates(
+    response: Response,
     status: Optional[str] = Query(None, description="ステータス絞り込み"),
     customer_id: Optional[int] = Query(None, description="顧客ID絞り込み"),
     date_from: Optional[date] = Query(None, description="見積日From"),
@@ -39,12 +47,13 @@ async def get_estimates(
     search_keyword: Optional[str] = Query(None, description="検索キーワード"),
     skip: int = Query(0, ge=0, description="スキップ件数"),
     limit: int = Query(100, ge=1, le=1000, description="取得件数"),
+    cursor: Optional[str] = Query(None, description="前ページの X-Next-Cursor"),
     db: Session = Depends(get_db)
 ):
     """
     見積一覧取得
     - 各種条件での絞り込み検索対応
-    - ページネーション対応
+    - ページネーション対応（cursor 指定時はキーセット、次ページのカーソルは X-Next-Cursor ヘッダー）
     """
     query = db.query(Estimate).options(
         joinedload(Estimate.customer),
@@ -69,13 +78,12 @@ async def get_estimates(
             )
         )
     
-    # ソートとページネーション
-    estimates = query.order_by(desc(Estimate.created_at))\
-                    .offset(skip)\
-                    .limit(limit)\
-                    .all()
+    # ソートとページネーション（(created_at, estimate_id) 降順のキーセット）
+    page = paginate_keyset(query, ESTIMATE_LIST_ORDER, limit, cursor=cursor, offset=skip)
+    if page.next_cursor:
+        response.headers["X-Next-Cursor"] = page.next_cursor
     
-    return estimates
+    return page.items
 
 @router.get("/{estimate_id}", response_model=EstimateSchema)
 async def get_estimate(
@@ -99,6 +107,7 @@ async def get_estimate(
 @router.post("/", response_model=EstimateSchema, status_code=status.HTTP_201_CREATED)
 async def create_estimate(
     estimate_data: EstimateCreate,
+    current_user: User = Depends(get_current_user_dependency),
     db: Session = Depends(get_db)
 ):
     """
@@ -114,24 +123,13 @@ async def create_estimate(
             detail="指定された顧客が見つかりません"
         )
     
-    # 見積番号の自動生成（年度-連番形式）
-    current_year = datetime.now().year
-    max_number = db.query(func.max(Estimate.estimate_number))\
-                   .filter(Estimate.estimate_number.like(f"{current_year}-%"))\
-                   .scalar()
-    
-    if max_number:
-        last_seq = int(max_number.split('-')[1])
-        new_seq = last_seq + 1
-    else:
-        new_seq = 1
-    
-    estimate_number = f"{current_year}-{new_seq:04d}"
+    # 見積番号の自動生成（年度-連番形式、ログインユーザーの会社×年のカウンターから採番）
+    estimate_number = number_allocator.next_number(db.get_bind(), ESTIMATE_NUMBER, current_user.company_id)
     
     # 見積作成
     db_estimate = Estimate(
-        **estimate_data.dict(),
-        company_id=1,  # TODO: JWT認証から取得
+        **estimate_data.dict(exclude={"estimate_number"}),  # 番号はサーバー側で採番
+        company_id=current_user.company_id,
         estimate_number=estimate_number,
         status="作成中"
     )
@@ -245,10 +243,12 @@ async def add_estimate_item(
     line_cost = 0
     
     if item_data.quantity and item_data.unit_price:
-        line_total = int(item_data.quantity * item_data.unit_price) + item_data.line_item_adjustment
+        line_total = estimate_totals_engine.line_amount(
+            item_data.quantity, item_data.unit_price, item_data.line_item_adjustment
+        )
     
     if item_data.quantity and item_data.purchase_price:
-        line_cost = int(item_data.quantity * item_data.purchase_price)
+        line_cost = estimate_totals_engine.line_amount(item_data.quantity, item_data.purchase_price)
     
     # 明細作成
     db_item = EstimateItem(
@@ -296,10 +296,12 @@ async def update_estimate_item(
     
     # 金額再計算
     if db_item.quantity and db_item.unit_price:
-        db_item.line_total = int(db_item.quantity * db_item.unit_price) + db_item.line_item_adjustment
+        db_item.line_total = estimate_totals_engine.line_amount(
+            db_item.quantity, db_item.unit_price, db_item.line_item_adjustment
+        )
     
     if db_item.quantity and db_item.purchase_price:
-        db_item.line_cost = int(db_item.quantity * db_item.purchase_price)
+        db_item.line_cost = estimate_totals_engine.line_amount(db_item.quantity, db_item.purchase_price)
     
     db_item.updated_at = datetime.now()
     db.commit()
@@ -465,18 +467,13 @@ def _recalculate_estimate_totals(estimate: Estimate, db: Session):
               .filter(EstimateItem.estimate_id == estimate.estimate_id)\
               .all()
     
-    subtotal = sum(item.line_total or 0 for item in items if item.item_type == "item")
-    total_cost = sum(item.line_cost or 0 for item in items if item.item_type == "item")
-    
-    estimate.subtotal_amount = subtotal
-    estimate.total_cost = total_cost
-    estimate.total_amount = subtotal + estimate.adjustment_amount
-    estimate.gross_profit = estimate.total_amount - total_cost
+    totals = estimate_totals_engine.estimate_totals(items, estimate.adjustment_amount)
     
-    if estimate.total_amount > 0:
-        estimate.gross_profit_rate = estimate.gross_profit / estimate.total_amount
-    else:
-        estimate.gross_profit_rate = 0.0
+    estimate.subtotal_amount = totals.subtotal
+    estimate.total_cost = totals.total_cost
+    estimate.total_amount = totals.total_amount
+    estimate.gross_profit = totals.gross_profit
+    estimate.gross_profit_rate = totals.gross_profit_rate
     
     estimate.updated_at = datetime.now()
     db.commit()
\ No newline at end of file
@@ -6,10 +6,11 @@ from sqlalchemy.orm import Session
 from ..database import get_db
 from ..models.invoice import (
     InvoiceCreate, InvoiceUpdate, InvoiceResponse, InvoiceListItem,
-    InvoiceSearchParams, InvoicePaymentCreate, InvoicePaymentResponse,
+    InvoiceSearchParams, InvoicePaymentCreate, InvoicePaymentResponse, InvoiceBatchFromEstimates,
     InvoiceStatus, PaymentStatus
 )
 from ..services.invoice_service import InvoiceService
+from ..services.overdue_sweeper import overdue_sweeper
 from ..middleware.auth_middleware import (
     get_current_user, get_current_company_id, CurrentUser,
     require_invoice_create, require_invoice_edit, require_invoice_send,
@@ -19,6 +20,15 @@ from ..pdf_service import InvoicePDFService
 
 router = APIRouter(prefix="/api/invoices", tags=["invoices"])
 
+@router.on_event("startup")
+async def start_overdue_sweeper():
+    """滞納ステータスの定期一括更新を開始"""
+    overdue_sweeper.start()
+
+@router.on_event("shutdown")
+async def stop_overdue_sweeper():
+    overdue_sweeper.stop()
+
 @router.get("/", response_model=dict)
 async def get_invoices(
     customer_id: Optional[int] = Query(None),
@@ -32,10 +42,12 @@ async def get_invoices(
     search_term: Optional[str] = Query(None),
     page: int = Query(1, ge=1),
     per_page: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="前ページの next_cursor"),
+    total_mode: str = Query("cached", pattern="^(cached|estimate|none)$", description="件数の取得方法"),
     db: Session = Depends(get_db),
     company_id: int = Depends(get_current_company_id)
 ):
-    """請求書一覧取得"""
+    """請求書一覧取得（cursor 指定時はキーセットページネーション）"""
     try:
         # 日付文字列をdateオブジェクトに変換
         from datetime import datetime
@@ -51,12 +63,16 @@ async def get_invoices(
             due_date_to=datetime.strptime(due_date_to, '%Y-%m-%d').date() if due_date_to else None,
             search_term=search_term,
             page=page,
-            per_page=per_page
+            per_page=per_page,
+            cursor=cursor,
+            total_mode=total_mode
         )
         
         service = InvoiceService(db)
         return service.get_invoices(company_id, params)
         
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=f"日付形式が正しくありません: {str(e)}")
     except Exception as e:
@@ -178,7 +194,7 @@ async def get_overdue_invoices(
     db: Session = Depends(get_db),
     company_id: int = Depends(get_current_company_id)
 ):
-    """期限切れ請求書一覧"""
+    """期限切れ請求書一覧（参照のみ）"""
     service = InvoiceService(db)
     return service.get_overdue_invoices(company_id)
 
@@ -266,38 +282,45 @@ async def get_invoice_history(
             detail=f"履歴取得に失敗しました: {str(e)}"
         )
 
+@router.post("/batch/from-estimates")
+async def batch_create_from_estimates(
+    request: InvoiceBatchFromEstimates,
+    db: Session = Depends(get_db),
+    company_id: int = Depends(get_current_company_id),
+    current_user: CurrentUser = Depends(require_invoice_create)
+):
+    """複数見積からの請求書一括生成（月末締め用）"""
+    service = InvoiceService(db)
+    return service.create_from_estimates(company_id, request, current_user.user_id)
+
+@router.post("/batch/reconcile-payments")
+async def batch_reconcile_payments(
+    file: UploadFile = File(...),
+    apply: bool = Query(True, description="false の場合は照合結果のみ返す"),
+    encoding: Optional[str] = Query(None, description="明細の文字コード（省略時は自動判定）"),
+    bank_name: Optional[str] = Query(None),
+    db: Session = Depends(get_db),
+    company_id: int = Depends(get_current_company_id),
+    current_user: CurrentUser = Depends(require_invoice_edit)
+):
+    """銀行入金明細CSVの一括消込"""
+    service = InvoiceService(db)
+    return service.reconcile_payments(company_id, file.file, apply, current_user.user_id, encoding, bank_name)
+
 @router.post("/batch/update-overdue")
 async def batch_update_overdue_status(
     db: Session = Depends(get_db),
     company_id: int = Depends(get_current_company_id),
     current_user: CurrentUser = Depends(require_invoice_edit)
 ):
-    """期限切れ請求書の一括ステータス更新"""
-    try:
-        service = InvoiceService(db)
-        overdue_invoices = service.get_overdue_invoices(company_id)
-        
-        updated_count = 0
-        for invoice in overdue_invoices:
-            if invoice.payment_status != PaymentStatus.OVERDUE:
-                service.update_status(
-                    company_id, 
-                    invoice.invoice_id, 
-                    invoice.status,  # ステータスは変更せず
-                    current_user.user_id
-                )
-                updated_count += 1
-        
-        return {
-            "message": f"{updated_count}件の請求書を滞納ステータスに更新しました",
-            "updated_count": updated_count
-        }
-        
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"一括更新に失敗しました: {str(e)}"
-        )
+    """期限切れ請求書の一括ステータス更新（定期ジョブと同じ処理を即時実行）"""
+    service = InvoiceService(db)
+    result = service.sweep_overdue_invoices(company_id, current_user.user_id)
+    
+    return {
+        "message": f"{result['updated_count']}件の請求書を滞納ステータスに更新しました",
+        "updated_count": result['updated_count']
+    }
 
 # エラーハンドリング用のヘルパー関数
 def handle_service_error(e: Exception):
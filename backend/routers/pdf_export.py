@@ -12,11 +12,13 @@ from datetime import datetime
 from database import get_db
 from models import Estimate, EstimateItem, Customer, Company
 from services.pdf_generator import GardenEstimatePDFGenerator
+from services.query_budget import query_budget
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
 @router.get("/{estimate_id}/pdf")
+@query_budget(max_queries=2)
 async def generate_estimate_pdf(
     estimate_id: int,
     db: Session = Depends(get_db)
@@ -72,6 +74,7 @@ async def generate_estimate_pdf(
         )
 
 @router.get("/{estimate_id}/preview")
+@query_budget(max_queries=2)
 async def preview_estimate_data(
     estimate_id: int,
     db: Session = Depends(get_db)
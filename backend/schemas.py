@@ -35,6 +35,7 @@ class Company(CompanyBase):
 
 class CustomerBase(BaseModel):
     customer_name: str = Field(..., description="顧客名")
+    customer_name_kana: Optional[str] = Field(None, description="顧客名カナ（振込名義）")
     customer_type: str = Field(default="個人", description="顧客種別")
     postal_code: Optional[str] = Field(None, description="郵便番号")
     address: Optional[str] = Field(None, description="住所")
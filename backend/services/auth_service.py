@@ -4,7 +4,7 @@ Garden 造園業向け統合業務管理システム
 RBAC (Role-Based Access Control) 実装
 """
 
-from fastapi import HTTPException, Depends, status
+from fastapi import HTTPException, Depends, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey
@@ -17,6 +17,9 @@ from typing import Optional, List, Dict, Any
 import logging
 
 from database import get_db
+from auth.permission_bits import PermissionTable, flatten_permission_matrix
+from auth.password_hashing import password_hasher
+from auth.request_context import resolve_token_payload, resolve_user
 
 logger = logging.getLogger(__name__)
 
@@ -25,7 +28,7 @@ SECRET_KEY = "garden-system-super-secret-key-2025"  # 本番では環境変数
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 480  # 8時間
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = password_hasher.context  # ワークファクターはPASSWORD_BCRYPT_ROUNDSで調整
 security = HTTPBearer()
 
 # =============================================================================
@@ -171,6 +174,20 @@ GARDEN_PERMISSIONS = {
     }
 }
 
+# ロール別権限ビットマスク（"resource:action" 単位でインポート時にコンパイル）
+GARDEN_PERMISSION_TABLE = PermissionTable(flatten_permission_matrix(GARDEN_PERMISSIONS))
+
+# フロントエンド用機能フラグの一括判定クエリ
+USER_FEATURE_FLAGS = GARDEN_PERMISSION_TABLE.batch({
+    "can_view_costs": "estimates:view_cost",
+    "can_view_profits": "estimates:view_profit",
+    "can_adjust_total": "estimates:adjust_total",
+    "can_approve_estimates": "estimates:approve",
+    "can_issue_invoices": "invoices:issue",
+    "can_manage_users": "system:user_management",
+    "can_view_dashboard": "dashboard:profitability",
+})
+
 # =============================================================================
 # 認証サービスクラス
 # =============================================================================
@@ -188,6 +205,16 @@ class AuthService:
         """パスワードハッシュ化"""
         return pwd_context.hash(password)
     
+    @staticmethod
+    async def verify_password_async(plain_password: str, hashed_password: str, host: Optional[str] = None) -> bool:
+        """パスワード検証（ハッシュプールで実行、イベントループを止めない）"""
+        return await password_hasher.verify(plain_password, hashed_password, host=host)
+    
+    @staticmethod
+    async def get_password_hash_async(password: str, host: Optional[str] = None) -> str:
+        """パスワードハッシュ化（ハッシュプールで実行）"""
+        return await password_hasher.hash(password, host=host)
+    
     @staticmethod
     def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
         """JWTアクセストークン生成 - 拡張済み"""
@@ -214,6 +241,15 @@ class AuthService:
             return None
         return user
     
+    @staticmethod
+    async def authenticate_user_async(db: Session, username: str, password: str,
+                                      host: Optional[str] = None) -> Optional[User]:
+        """ユーザー認証（非同期ハンドラー用）"""
+        user = db.query(User).filter(User.username == username).first()
+        if not user or not await AuthService.verify_password_async(password, user.hashed_password, host=host):
+            return None
+        return user
+    
     @staticmethod
     def get_current_user(db: Session, token: str) -> User:
         """現在ログイン中ユーザー取得"""
@@ -260,15 +296,7 @@ class PermissionChecker:
         if not user.is_active:
             return False
         
-        user_role = user.role
-        if user_role not in GARDEN_PERMISSIONS:
-            return False
-        
-        permissions = GARDEN_PERMISSIONS[user_role]
-        if resource not in permissions:
-            return False
-        
-        return permissions[resource].get(action, False)
+        return GARDEN_PERMISSION_TABLE.has(user.role, f"{resource}:{action}")
     
     @staticmethod
     def check_estimate_permission(user: User, action: str) -> bool:
@@ -333,13 +361,41 @@ class PermissionChecker:
 # FastAPI依存関数
 # =============================================================================
 
+def _decode_access_token(token: str) -> Optional[Dict[str, Any]]:
+    """JWTデコード（無効なトークンはNone）"""
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+
 async def get_current_user_dependency(
+    request: Request,
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db)
 ) -> User:
-    """現在ユーザー取得依存関数"""
-    token = credentials.credentials
-    return AuthService.get_current_user(db, token)
+    """
+    現在ユーザー取得依存関数
+    トークンのデコードとユーザー取得はリクエスト内で1回ずつ（request.state で共有）
+    """
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="認証情報が無効です",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    
+    payload = resolve_token_payload(request, _decode_access_token)
+    if payload is None or payload.get("sub") is None:
+        raise credentials_exception
+    
+    user = resolve_user(
+        request,
+        lambda p: db.query(User).filter(User.username == p.get("sub")).first(),
+        decoder=_decode_access_token,
+    )
+    if user is None:
+        raise credentials_exception
+    
+    return user
 
 def require_permission(resource: str, action: str):
     """権限要求デコレータ"""
@@ -376,19 +432,11 @@ def get_user_accessible_features(user: User) -> Dict[str, Any]:
     if user.role not in GARDEN_PERMISSIONS:
         return {}
     
-    permissions = GARDEN_PERMISSIONS[user.role]
-    
-    # フロントエンド用の機能フラグ
-    features = {
-        "can_view_costs": permissions["estimates"].get("view_cost", False),
-        "can_view_profits": permissions["estimates"].get("view_profit", False),
-        "can_adjust_total": permissions["estimates"].get("adjust_total", False),
-        "can_approve_estimates": permissions["estimates"].get("approve", False),
-        "can_issue_invoices": permissions["invoices"].get("issue", False),
-        "can_manage_users": permissions["system"].get("user_management", False),
-        "can_view_dashboard": permissions["dashboard"].get("profitability", False),
-        "role": user.role,
-        "role_display": "経営者" if user.role == "owner" else "従業員"
-    }
+    # フロントエンド用の機能フラグ（ビットマスクで一括判定）
+    features: Dict[str, Any] = USER_FEATURE_FLAGS.evaluate(
+        GARDEN_PERMISSION_TABLE.role_mask(user.role)
+    )
+    features["role"] = user.role
+    features["role_display"] = "経営者" if user.role == "owner" else "従業員"
     
     return features
\ No newline at end of file
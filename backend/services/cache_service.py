@@ -11,14 +11,22 @@ from functools import wraps
 import asyncio
 import logging
 
+from .prometheus_metrics import CACHE_HITS, CACHE_MISSES, FUNCTION_DURATION
+
 logger = logging.getLogger(__name__)
 
 class MemoryCache:
     """メモリベースキャッシュ（Redis代替）"""
     
-    def __init__(self, default_ttl: int = 300):  # 5分
+    def __init__(self, default_ttl: int = 300, name: str = "memory"):  # 5分
         self._cache: Dict[str, Dict[str, Any]] = {}
         self.default_ttl = default_ttl
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+    
+    def __len__(self) -> int:
+        return len(self._cache)
     
     def _is_expired(self, cache_entry: Dict[str, Any]) -> bool:
         """キャッシュエントリの期限切れチェック"""
@@ -37,13 +45,19 @@ class MemoryCache:
     def get(self, key: str) -> Optional[Any]:
         """キャッシュから値を取得"""
         if key not in self._cache:
+            self.misses += 1
+            CACHE_MISSES.inc(self.name)
             return None
         
         entry = self._cache[key]
         if self._is_expired(entry):
             del self._cache[key]
+            self.misses += 1
+            CACHE_MISSES.inc(self.name)
             return None
         
+        self.hits += 1
+        CACHE_HITS.inc(self.name)
         entry['access_count'] += 1
         entry['last_accessed'] = datetime.now()
         return entry['value']
@@ -84,6 +98,9 @@ class MemoryCache:
         return {
             'total_entries': len(self._cache),
             'total_access_count': total_access,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / (self.hits + self.misses) if self.hits + self.misses else None,
             'memory_usage_mb': len(str(self._cache)) / 1024 / 1024,
             'oldest_entry': min(
                 (entry['created_at'] for entry in self._cache.values()),
@@ -228,13 +245,14 @@ async def warm_up_cache():
 
 # パフォーマンス計測デコレータ
 def performance_monitor(func):
-    """パフォーマンス計測"""
+    """パフォーマンス計測（ログ出力と Prometheus の実行時間ヒストグラム）"""
     @wraps(func)
     async def async_wrapper(*args, **kwargs):
         start_time = datetime.now()
         try:
             result = await func(*args, **kwargs)
             duration = (datetime.now() - start_time).total_seconds()
+            FUNCTION_DURATION.observe(duration, func.__name__)
             logger.info(f"API {func.__name__} executed in {duration:.3f}s")
             return result
         except Exception as e:
@@ -248,6 +266,7 @@ def performance_monitor(func):
         try:
             result = func(*args, **kwargs)
             duration = (datetime.now() - start_time).total_seconds()
+            FUNCTION_DURATION.observe(duration, func.__name__)
             logger.info(f"Function {func.__name__} executed in {duration:.3f}s")
             return result
         except Exception as e:
@@ -0,0 +1,136 @@
+"""
+Garden DX - 単価カテゴリツリー
+カテゴリ階層を会社ごとに1クエリで取得し、メモリ上で O(n) で組み立てる。
+- 組み立て結果は会社ごとにキャッシュする。カテゴリ変更時はDBトリガーが会社の版番号
+  （price_category_versions）を進め、キャッシュは読み込みのたびに版番号を比較する
+- 各カテゴリは祖先IDを連ねた経路（category_path 例: /1/5/12/）を持ち、
+  配下のカテゴリは経路の前方一致1回で取得できる（経路の維持はDBトリガー）
+"""
+
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import BigInteger, Boolean, Column, Integer, MetaData, Select, String, Table, select, true
+from sqlalchemy.orm import Session
+
+from .cache_service import MemoryCache
+
+metadata = MetaData()
+
+price_categories = Table(
+    "price_categories", metadata,
+    Column("category_id", Integer, primary_key=True),
+    Column("company_id", Integer, nullable=False),
+    Column("parent_category_id", Integer),
+    Column("category_code", String(20), nullable=False),
+    Column("category_name", String(100), nullable=False),
+    Column("category_name_kana", String(100)),
+    Column("level_depth", Integer, default=1),
+    Column("sort_order", Integer, default=0),
+    Column("icon_name", String(50)),
+    Column("color_code", String(7)),
+    Column("is_leaf_category", Boolean, default=True),
+    Column("is_active", Boolean, default=True),
+    Column("category_path", String(255)),
+)
+
+# 会社ごとのカテゴリ版番号（カテゴリの登録・更新・削除時にトリガーで加算、migration 016）
+price_category_versions = Table(
+    "price_category_versions", metadata,
+    Column("company_id", Integer, primary_key=True),
+    Column("version", BigInteger, nullable=False, default=0),
+)
+
+# ツリーのノードに含める列（並び順を含む）
+NODE_COLUMNS = (
+    "category_id", "category_code", "category_name", "category_name_kana", "level_depth",
+    "sort_order", "icon_name", "color_code", "is_leaf_category", "category_path",
+)
+
+
+@dataclass
+class CategoryTree:
+    """会社のカテゴリツリー（roots）と、カテゴリID → 経路の索引"""
+    roots: List[Dict[str, Any]]
+    paths: Dict[int, str]
+
+
+def load_category_tree(db: Session, company_id: int) -> CategoryTree:
+    """有効なカテゴリを1クエリで取得してツリーを組み立て"""
+    columns = [price_categories.c[name] for name in NODE_COLUMNS]
+    rows = db.execute(
+        select(price_categories.c.parent_category_id, *columns)
+        .where(
+            price_categories.c.company_id == company_id,
+            price_categories.c.is_active == true(),
+        )
+        .order_by(price_categories.c.sort_order, price_categories.c.category_name)
+    ).all()
+    return build_category_tree(rows)
+
+def build_category_tree(rows) -> CategoryTree:
+    """
+    (sort_order, category_name) 順の行からツリーを組み立て（O(n)）
+    親が無効（行に無い）カテゴリは配下ごと除外する
+    """
+    nodes: Dict[int, Dict[str, Any]] = {}
+    for row in rows:
+        node = {name: getattr(row, name) for name in NODE_COLUMNS}
+        node["children"] = []
+        nodes[row.category_id] = node
+
+    roots = []
+    for row in rows:
+        node = nodes[row.category_id]
+        if row.parent_category_id is None:
+            roots.append(node)
+        elif row.parent_category_id in nodes:
+            nodes[row.parent_category_id]["children"].append(node)
+
+    # ルートから辿れるカテゴリのみ索引に含める
+    paths: Dict[int, str] = {}
+    stack = list(roots)
+    while stack:
+        node = stack.pop()
+        paths[node["category_id"]] = node["category_path"]
+        stack.extend(node["children"])
+    return CategoryTree(roots=roots, paths=paths)
+
+def subtree_category_ids(company_id: int, category_path: str) -> Select:
+    """経路配下（自身を含む）のカテゴリIDを返す副問い合わせ（無効なカテゴリも含む）"""
+    return select(price_categories.c.category_id).where(
+        price_categories.c.company_id == company_id,
+        price_categories.c.category_path.startswith(category_path, autoescape=True),
+    )
+
+
+def category_version(db: Session, company_id: int) -> int:
+    """会社のカテゴリ版番号（主キー1行の参照、行が無ければ0）"""
+    version = db.execute(
+        select(price_category_versions.c.version).where(price_category_versions.c.company_id == company_id)
+    ).scalar()
+    return version or 0
+
+
+class CategoryTreeCache:
+    """
+    会社ごとのカテゴリツリーキャッシュ
+    キーにDBの版番号を含め、読み込みのたびに版番号を取得して比較する（旧版のエントリは期限切れで削除）。
+    版番号はトリガーが進めるため、他のプロセスやSQLでの変更も反映される。
+    版番号を読んでから組み立てるため、変更と並行して組み立てたツリーは旧版のキーに入る
+    """
+
+    def __init__(self, cache: Optional[MemoryCache] = None, ttl_seconds: int = 300):
+        self.cache = cache if cache is not None else MemoryCache(default_ttl=ttl_seconds, name="category_tree")
+
+    def get_or_build(self, db: Session, company_id: int, build: Callable[[], CategoryTree]) -> CategoryTree:
+        key = f"category_tree:{company_id}:v{category_version(db, company_id)}"
+        tree = self.cache.get(key)
+        if tree is None:
+            tree = build()
+            self.cache.set(key, tree)
+        return tree
+
+
+# アプリ全体のカテゴリツリーキャッシュ
+category_tree_cache = CategoryTreeCache()
@@ -4,15 +4,16 @@ Garden 造園業向け統合業務管理システム
 Worker1 (見積書) ⇔ Worker3 (請求書) システム統合
 """
 
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload, selectinload
 from sqlalchemy import and_
 from typing import Dict, Any, Optional, List
 from datetime import datetime, date
 from decimal import Decimal
 import logging
 
-from models import Estimate, EstimateItem, Customer, Company
+from models import Estimate, EstimateItem, Company
 from schemas import EstimateCreate, EstimateUpdate
+from services.estimate_invoice_rules import estimate_invoice_amounts, estimate_invoice_issues
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +22,28 @@ class EstimateInvoiceIntegrationService:
     
     def __init__(self, db: Session):
         self.db = db
+        # リクエスト単位の見積グラフキャッシュ（検証と変換で同じ読み込み結果を共有）
+        self._estimate_graphs: Dict[int, Optional[Estimate]] = {}
+    
+    def load_estimate_graph(self, estimate_id: int) -> Optional[Estimate]:
+        """
+        見積・顧客・会社（JOIN）と明細（IN）をまとめて読み込む
+        同じサービスインスタンス内では再読み込みしない
+        """
+        if estimate_id not in self._estimate_graphs:
+            self._estimate_graphs[estimate_id] = self.db.query(Estimate)\
+                .options(
+                    joinedload(Estimate.customer),
+                    joinedload(Estimate.company),
+                    selectinload(Estimate.items),
+                )\
+                .filter(Estimate.estimate_id == estimate_id)\
+                .first()
+        return self._estimate_graphs[estimate_id]
+    
+    @staticmethod
+    def _sorted_items(estimate: Estimate) -> List[EstimateItem]:
+        return sorted(estimate.items, key=lambda item: item.sort_order or 0)
     
     def convert_estimate_to_invoice_data(self, estimate_id: int) -> Dict[str, Any]:
         """
@@ -34,28 +57,15 @@ class EstimateInvoiceIntegrationService:
             請求書生成用データ辞書
         """
         try:
-            # 見積データ取得（関連データ含む）
-            estimate = self.db.query(Estimate)\
-                              .filter(Estimate.estimate_id == estimate_id)\
-                              .first()
+            # 見積データ取得（顧客・会社・明細を含む。検証済みならキャッシュを使用）
+            estimate = self.load_estimate_graph(estimate_id)
             
             if not estimate:
                 raise ValueError(f"見積ID {estimate_id} が見つかりません")
             
-            # 顧客・会社情報取得
-            customer = self.db.query(Customer)\
-                             .filter(Customer.customer_id == estimate.customer_id)\
-                             .first()
-            
-            company = self.db.query(Company)\
-                            .filter(Company.company_id == estimate.company_id)\
-                            .first()
-            
-            # 見積明細取得
-            estimate_items = self.db.query(EstimateItem)\
-                                   .filter(EstimateItem.estimate_id == estimate_id)\
-                                   .order_by(EstimateItem.sort_order)\
-                                   .all()
+            customer = estimate.customer
+            company = estimate.company
+            estimate_items = self._sorted_items(estimate)
             
             # 請求書番号生成（見積番号ベース）
             invoice_number = self._generate_invoice_number(estimate.estimate_number)
@@ -137,24 +147,9 @@ class EstimateInvoiceIntegrationService:
     
     def _calculate_invoice_amounts(self, estimate: Estimate) -> Dict[str, Any]:
         """請求書金額計算（消費税対応）"""
-        subtotal = int(estimate.subtotal_amount or 0)
-        adjustment = int(estimate.adjustment_amount or 0)
-        subtotal_with_adjustment = subtotal + adjustment
-        
-        # 消費税計算（造園工事は標準税率10%）
-        tax_rate = Decimal('0.10')
-        tax_amount = int(subtotal_with_adjustment * tax_rate)
-        total_amount = subtotal_with_adjustment + tax_amount
-        
-        return {
-            "subtotal": subtotal,
-            "adjustment": adjustment,
-            "subtotal_with_adjustment": subtotal_with_adjustment,
-            "tax_rate": float(tax_rate),
-            "tax_amount": tax_amount,
-            "total_amount": total_amount,
-            "total_amount_text": self._amount_to_japanese_text(total_amount),
-        }
+        amounts = estimate_invoice_amounts(estimate.subtotal_amount, estimate.adjustment_amount)
+        amounts["total_amount_text"] = self._amount_to_japanese_text(amounts["total_amount"])
+        return amounts
     
     def _convert_estimate_items_to_invoice(self, estimate_items: List[EstimateItem]) -> List[Dict[str, Any]]:
         """見積明細から請求書明細への変換"""
@@ -274,9 +269,7 @@ class EstimateInvoiceIntegrationService:
     def validate_estimate_for_invoice_generation(self, estimate_id: int) -> Dict[str, Any]:
         """見積書の請求書生成可能性チェック"""
         try:
-            estimate = self.db.query(Estimate)\
-                              .filter(Estimate.estimate_id == estimate_id)\
-                              .first()
+            estimate = self.load_estimate_graph(estimate_id)
             
             if not estimate:
                 return {
@@ -284,31 +277,12 @@ class EstimateInvoiceIntegrationService:
                     "errors": ["指定された見積が見つかりません"],
                 }
             
-            errors = []
-            warnings = []
-            
-            # 基本データチェック
-            if not estimate.customer_id:
-                errors.append("顧客情報が設定されていません")
-            
-            if not estimate.estimate_number:
-                errors.append("見積番号が設定されていません")
-            
-            if estimate.total_amount <= 0:
-                errors.append("見積金額が0円以下です")
-            
-            # ステータスチェック
-            if estimate.status not in ['承認', '契約済', '完了']:
-                warnings.append(f"見積ステータスが '{estimate.status}' です。通常は承認済み見積から請求書を作成します。")
-            
-            # 明細チェック
-            items_count = self.db.query(EstimateItem)\
-                                .filter(EstimateItem.estimate_id == estimate_id)\
-                                .filter(EstimateItem.item_type == 'item')\
-                                .count()
-            
-            if items_count == 0:
-                errors.append("見積明細が登録されていません")
+            # 明細チェック（読み込み済みの明細から集計）
+            items_count = sum(1 for item in estimate.items if item.item_type == 'item')
+            errors, warnings = estimate_invoice_issues(
+                estimate.customer_id, estimate.estimate_number, estimate.total_amount,
+                estimate.status, items_count
+            )
             
             return {
                 "valid": len(errors) == 0,
@@ -0,0 +1,58 @@
+"""
+Garden DX - 見積→請求書変換の共通ルール
+見積1件の請求書化（EstimateInvoiceIntegrationService）と一括請求書化（InvoiceService）で
+同じ検証と金額計算を使う。モデルに依存せず、列の値を受け取る
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+from .totals_engine import TotalsEngine, ROUNDING_DOWN, STANDARD_TAX_RATE
+
+# 請求可能な見積ステータス（それ以外は警告のみ）
+INVOICEABLE_ESTIMATE_STATUSES = ('承認', '契約済', '完了')
+
+# 請求書化できない見積ステータス
+REJECTED_ESTIMATE_STATUSES = ('失注', 'キャンセル')
+
+# 請求書金額の消費税計算（従来どおり1円未満切り捨て）
+_tax_engine = TotalsEngine(tax_rounding=ROUNDING_DOWN)
+
+def estimate_invoice_issues(customer_id: Optional[int], estimate_number: Optional[str], total_amount: Any,
+                            status: Optional[str], items_count: int) -> Tuple[List[str], List[str]]:
+    """見積の請求書化チェック（エラー, 警告）"""
+    errors = []
+    warnings = []
+
+    if not customer_id:
+        errors.append("顧客情報が設定されていません")
+    if not estimate_number:
+        errors.append("見積番号が設定されていません")
+    if (total_amount or 0) <= 0:
+        errors.append("見積金額が0円以下です")
+
+    if status in REJECTED_ESTIMATE_STATUSES:
+        errors.append(f"見積ステータスが '{status}' のため請求書を作成できません")
+    elif status not in INVOICEABLE_ESTIMATE_STATUSES:
+        warnings.append(f"見積ステータスが '{status}' です。通常は承認済み見積から請求書を作成します。")
+
+    if items_count == 0:
+        errors.append("見積明細が登録されていません")
+
+    return errors, warnings
+
+def estimate_invoice_amounts(subtotal_amount: Any, adjustment_amount: Any,
+                             tax_rate: Any = STANDARD_TAX_RATE) -> Dict[str, Any]:
+    """見積の小計・調整額から請求金額を計算（造園工事は標準税率10%、1円未満切り捨て）"""
+    subtotal = int(subtotal_amount or 0)
+    adjustment = int(adjustment_amount or 0)
+    subtotal_with_adjustment = subtotal + adjustment
+    tax_amount = _tax_engine.tax_for(subtotal_with_adjustment, tax_rate)
+
+    return {
+        "subtotal": subtotal,
+        "adjustment": adjustment,
+        "subtotal_with_adjustment": subtotal_with_adjustment,
+        "tax_rate": float(tax_rate),
+        "tax_amount": tax_amount,
+        "total_amount": subtotal_with_adjustment + tax_amount,
+    }
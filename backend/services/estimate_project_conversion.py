@@ -0,0 +1,264 @@
+"""
+Garden DX - 見積→プロジェクト変換
+見積の大項目（header）を1クエリで読み込み、項目名をキーワードオートマトン（Aho–Corasick法）で
+工程カテゴリ・作業日数へ対応付け、工程順の依存関係からクリティカルパス法で日程を決める。
+キーワード数に関係なく、項目名の長さに比例する時間で全キーワードを照合する。
+"""
+
+from collections import deque
+from dataclasses import dataclass
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, func, select
+from sqlalchemy.orm import Session, aliased
+
+from ..models import Customer, Estimate, EstimateItem
+from .schedule_engine import ScheduleGraph
+
+# 工程カテゴリの着手順（同じ順位のカテゴリは並行して施工できる）
+PROCESS_PHASES = {
+    "survey": 0,
+    "design": 1,
+    "procurement": 2,
+    "demolition": 3,
+    "foundation": 4,
+    "planting": 5,
+    "decoration": 5,
+    "finishing": 6,
+    "delivery": 7,
+}
+
+# キーワード → (工程カテゴリ, 作業日数)
+PROCESS_KEYWORDS = {
+    "調査": ("survey", 1),
+    "測量": ("survey", 1),
+    "設計": ("design", 3),
+    "プラン": ("design", 3),
+    "資材": ("procurement", 2),
+    "発注": ("procurement", 2),
+    "準備": ("demolition", 1),
+    "撤去": ("demolition", 2),
+    "解体": ("demolition", 2),
+    "伐採": ("demolition", 2),
+    "整地": ("demolition", 2),
+    "基礎": ("foundation", 3),
+    "排水": ("foundation", 3),
+    "石工事": ("foundation", 4),
+    "植栽": ("planting", 5),
+    "樹木": ("planting", 3),
+    "芝": ("planting", 2),
+    "舗装": ("decoration", 3),
+    "外構": ("decoration", 7),
+    "照明": ("decoration", 2),
+    "フェンス": ("decoration", 2),
+    "仕上げ": ("finishing", 2),
+    "清掃": ("finishing", 1),
+    "検査": ("delivery", 1),
+    "引き渡し": ("delivery", 1),
+    "引渡": ("delivery", 1),
+}
+
+DEFAULT_CATEGORY = "other"
+DEFAULT_DURATION_DAYS = 3
+
+
+class KeywordAutomaton:
+    """Aho–Corasick法の複数キーワード照合（構築は1回、照合は文字列長＋一致数に比例）"""
+
+    def __init__(self, keywords: Iterable[str]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.outputs: List[Tuple[str, ...]] = [()]
+        for keyword in dict.fromkeys(keywords):
+            if keyword:
+                self._add(keyword)
+        self._link()
+
+    def _add(self, keyword: str):
+        node = 0
+        for char in keyword:
+            child = self.goto[node].get(char)
+            if child is None:
+                child = len(self.goto)
+                self.goto.append({})
+                self.fail.append(0)
+                self.outputs.append(())
+                self.goto[node][char] = child
+            node = child
+        self.outputs[node] += (keyword,)
+
+    def _link(self):
+        # 幅優先で失敗遷移を設定（遷移先は常に浅いノードのため、出力の合流も確定済み）
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self.goto[node].items():
+                fallback = self.fail[node]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                self.outputs[child] += self.outputs[self.fail[child]]
+                queue.append(child)
+
+    def find_all(self, text: str) -> List[Tuple[int, str]]:
+        """(開始位置, キーワード) の一覧（終了位置順）"""
+        matches = []
+        node = 0
+        for index, char in enumerate(text or ""):
+            while node and char not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(char, 0)
+            for keyword in self.outputs[node]:
+                matches.append((index - len(keyword) + 1, keyword))
+        return matches
+
+
+PROCESS_AUTOMATON = KeywordAutomaton(PROCESS_KEYWORDS)
+
+def classify_process(text: str) -> Optional[Tuple[str, int]]:
+    """
+    項目名から (工程カテゴリ, 作業日数) を判定（一致なしは None）
+    カテゴリは最も左（同位置なら最長）のキーワード、日数は一致したキーワードの最大値
+    """
+    matches = PROCESS_AUTOMATON.find_all(text)
+    if not matches:
+        return None
+    _, first = min(matches, key=lambda match: (match[0], -len(match[1])))
+    return PROCESS_KEYWORDS[first][0], max(PROCESS_KEYWORDS[keyword][1] for _, keyword in matches)
+
+
+@dataclass
+class EstimateHeader:
+    item_id: int
+    item_description: str
+    sort_order: int
+    line_total: Decimal
+    line_cost: Decimal
+
+
+@dataclass
+class EstimateSource:
+    estimate_id: int
+    customer_id: int
+    customer_name: Optional[str]
+    estimate_name: str
+    site_address: Optional[str]
+    total_amount: Decimal
+    total_cost: Decimal
+    headers: List[EstimateHeader]
+
+
+@dataclass
+class PlannedTask:
+    index: int                    # 計画内の番号（依存関係の参照先）
+    item_id: int
+    task_name: str
+    category: str
+    duration_days: int
+    dependencies: Tuple[int, ...]
+    budget_amount: Decimal
+    sort_order: int
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None   # 作業日に含む
+
+    def as_dict(self) -> Dict:
+        return {
+            "task_name": self.task_name,
+            "category": self.category,
+            "start_date": self.start_date,
+            "end_date": self.end_date,
+            "duration_days": self.duration_days,
+            "budget_amount": self.budget_amount,
+            "sort_order": self.sort_order,
+            "estimate_item_id": self.item_id,
+        }
+
+
+def project_name_from_estimate(source: EstimateSource) -> str:
+    """見積からプロジェクト名を生成"""
+    return f"{source.customer_name or '顧客'}邸 {source.estimate_name or '工事'}"
+
+def load_estimate_source(db: Session, estimate_id: int, company_id: int) -> Optional[EstimateSource]:
+    """
+    見積・顧客・大項目を1クエリで取得
+    大項目の金額は直下明細の合計（明細が無い場合は大項目自身の金額）
+    """
+    header = aliased(EstimateItem, name="header")
+    child = aliased(EstimateItem, name="child")
+    rows = db.execute(
+        select(
+            Estimate.estimate_id, Estimate.customer_id, Estimate.estimate_name,
+            Estimate.site_address, Estimate.total_amount, Estimate.total_cost,
+            Customer.customer_name,
+            header.item_id, header.item_description, header.sort_order,
+            func.coalesce(func.sum(child.line_total), header.line_total, 0).label("line_total"),
+            func.coalesce(func.sum(child.line_cost), header.line_cost, 0).label("line_cost"),
+        )
+        .select_from(Estimate)
+        .outerjoin(Customer, Customer.customer_id == Estimate.customer_id)
+        .outerjoin(header, and_(header.estimate_id == Estimate.estimate_id, header.item_type == "header"))
+        .outerjoin(child, child.parent_item_id == header.item_id)
+        .where(Estimate.estimate_id == estimate_id, Estimate.company_id == company_id)
+        .group_by(Estimate.estimate_id, Customer.customer_id, header.item_id)
+        .order_by(header.sort_order, header.item_id)
+    ).all()
+    if not rows:
+        return None
+
+    first = rows[0]
+    return EstimateSource(
+        estimate_id=first.estimate_id,
+        customer_id=first.customer_id,
+        customer_name=first.customer_name,
+        estimate_name=first.estimate_name,
+        site_address=first.site_address,
+        total_amount=Decimal(first.total_amount or 0),
+        total_cost=Decimal(first.total_cost or 0),
+        headers=[
+            EstimateHeader(row.item_id, row.item_description, row.sort_order,
+                           Decimal(row.line_total or 0), Decimal(row.line_cost or 0))
+            for row in rows if row.item_id is not None
+        ],
+    )
+
+def plan_project_tasks(headers: Iterable[EstimateHeader], start_date: date) -> List[PlannedTask]:
+    """
+    大項目からタスクと日程を作成
+    各タスクは直前の着手順位の全タスクに依存し（同じ順位は並行）、キーワードに一致しない項目は
+    見積上で直前の項目と同じ順位とする。日程は最早開始・終了（終了日は作業日に含む）。
+    """
+    tasks: List[PlannedTask] = []
+    phases: List[int] = []
+    for index, header in enumerate(headers):
+        matched = classify_process(header.item_description)
+        if matched:
+            category, duration_days = matched
+            phase = PROCESS_PHASES[category]
+        else:
+            category, duration_days = DEFAULT_CATEGORY, DEFAULT_DURATION_DAYS
+            phase = phases[-1] if phases else 0
+        phases.append(phase)
+        tasks.append(PlannedTask(
+            index, header.item_id, header.item_description, category, duration_days, (),
+            header.line_cost, index + 1
+        ))
+
+    by_phase: Dict[int, List[int]] = {}
+    for task, phase in zip(tasks, phases):
+        by_phase.setdefault(phase, []).append(task.index)
+    previous: Tuple[int, ...] = ()
+    for phase in sorted(by_phase):
+        for index in by_phase[phase]:
+            tasks[index].dependencies = previous
+        previous = tuple(by_phase[phase])
+
+    graph = ScheduleGraph(
+        {task.index: task.duration_days for task in tasks},
+        {task.index: task.dependencies for task in tasks},
+    )
+    for index, (task_start, task_end) in graph.compute().dates(start_date).items():
+        tasks[index].start_date = task_start
+        tasks[index].end_date = max(task_start, task_end - timedelta(days=1))
+    return tasks
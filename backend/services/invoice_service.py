@@ -1,17 +1,146 @@
-from typing import List, Optional, Dict, Any
-from datetime import datetime, date
+import time
+from typing import List, Optional, Dict, Any, BinaryIO
+from datetime import datetime, date, timedelta
 from decimal import Decimal
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, desc, asc
+from sqlalchemy import and_, or_, desc, asc, func, extract, text, bindparam, insert, select, update
+from sqlalchemy.sql import table, column
+from sqlalchemy.exc import IntegrityError
 from fastapi import HTTPException, status
 
 from ..models.invoice import (
-    Invoice, InvoiceItem, InvoiceHistory, InvoicePayment,
+    Invoice, InvoiceItem, InvoiceHistory, InvoicePayment, InvoiceMonthlySummary,
     InvoiceCreate, InvoiceUpdate, InvoiceResponse, InvoiceListItem,
-    InvoiceSearchParams, InvoicePaymentCreate,
-    InvoiceStatus, PaymentStatus,
-    calculate_invoice_totals, generate_invoice_number, check_overdue_invoices
+    InvoiceSearchParams, InvoicePaymentCreate, InvoiceBatchFromEstimates,
+    InvoiceStatus, PaymentStatus, PaymentMethod, InvoiceItemCreate,
+    overdue_invoices_query, mark_overdue_invoices
 )
+from .pagination import order_by_desc, paginate, count_cache
+from .number_allocator import number_allocator, INVOICE_NUMBER
+from .totals_engine import invoice_totals_engine
+from .estimate_invoice_rules import estimate_invoice_amounts, estimate_invoice_issues
+from .payment_reconciliation import (
+    InvoiceIndex, PaymentReconciler, StatementFormatError, MATCHED, CONFLICT,
+    iter_statement_lines, open_statement, summarize
+)
+
+# 請求書一覧の並び順（カーソルのキー）
+INVOICE_LIST_ORDER = order_by_desc(Invoice.created_at, Invoice.invoice_id)
+
+# 滞納スイープの多重実行防止用アドバイザリーロックキー（PostgreSQL）
+OVERDUE_SWEEP_LOCK_KEY = 7340033
+
+# 月次集計の保存と破棄を会社単位で直列化するアドバイザリーロックキー（PostgreSQL、会社IDと組で使用）
+MONTHLY_SUMMARY_LOCK_KEY = 7340034
+
+# 月次集計を保存する対象（締め済みの直近の月数）
+MONTHLY_SUMMARY_MONTHS = 12
+
+# 請求書の一意インデックスと、違反時の409メッセージ
+INVOICE_UNIQUE_CONFLICTS = (
+    ("idx_invoices_company_estimate_unique", "estimate_id", "既に請求書化された見積が含まれています"),
+    ("idx_invoices_company_number_unique", "invoice_number", "請求書番号が他の請求書と重複しました。再度実行してください"),
+)
+
+def invoice_conflict_detail(error: IntegrityError) -> str:
+    """一意インデックス違反の409メッセージ（PostgreSQLは制約名、SQLiteは列名で判定）"""
+    diag = getattr(error.orig, "diag", None)
+    constraint = getattr(diag, "constraint_name", None)
+    message = str(error.orig)
+    for index_name, column_name, detail in INVOICE_UNIQUE_CONFLICTS:
+        if constraint == index_name or (constraint is None and (index_name in message or column_name in message)):
+            return detail
+    return "請求書の一意制約に違反しました"
+
+def invoice_count_namespace(company_id: int) -> str:
+    """請求書一覧件数キャッシュの名前空間"""
+    return f"invoices:{company_id}"
+
+# 支払サマリーの集計列（件数, 請求額合計, 入金額合計）
+_SUMMARY_AGGREGATES = (
+    func.count(Invoice.invoice_id),
+    func.coalesce(func.sum(Invoice.total_amount), 0),
+    func.coalesce(func.sum(Invoice.paid_amount), 0),
+)
+
+# 一括請求書化で参照する見積・見積明細（見積モデルは別系統のため列を直接指定）
+# PostgreSQL では見積行をロックし、同じ見積の同時請求書化を直列化する
+_BATCH_ESTIMATES_SELECT = (
+    "SELECT estimate_id, company_id, customer_id, estimate_number, estimate_name, status, "
+    "subtotal_amount, adjustment_amount, total_amount, notes, terms_and_conditions "
+    "FROM estimates WHERE company_id = :company_id AND estimate_id IN :estimate_ids"
+)
+_BATCH_ESTIMATES_SQL = text(_BATCH_ESTIMATES_SELECT).bindparams(bindparam("estimate_ids", expanding=True))
+_BATCH_ESTIMATES_FOR_UPDATE_SQL = text(
+    _BATCH_ESTIMATES_SELECT + " ORDER BY estimate_id FOR UPDATE"
+).bindparams(bindparam("estimate_ids", expanding=True))
+
+_BATCH_ESTIMATE_ITEMS_SQL = text(
+    "SELECT estimate_id, item_type, item_description, specification, quantity, unit, "
+    "unit_price, line_total, level, sort_order "
+    "FROM estimate_items WHERE estimate_id IN :estimate_ids AND is_visible_to_customer "
+    "ORDER BY estimate_id, sort_order"
+).bindparams(bindparam("estimate_ids", expanding=True))
+
+# 入金消込で参照する顧客名（顧客モデルは別系統のため列を直接指定）
+_customers = table("customers", column("customer_id"), column("customer_name"), column("customer_name_kana"))
+
+# 入金消込の対象となる支払ステータス
+_RECONCILABLE_PAYMENT_STATUSES = (
+    PaymentStatus.UNPAID.value, PaymentStatus.PARTIAL.value, PaymentStatus.OVERDUE.value
+)
+
+# IN句1回あたりのID数
+_ID_CHUNK_SIZE = 1000
+
+def calculate_invoice_totals(items: List[InvoiceItemCreate], tax_rate: Decimal = Decimal('0.10')) -> Dict[str, Decimal]:
+    """請求書合計金額の計算（明細の税率別に消費税を集計）"""
+    return invoice_totals_engine.compute_items(items, tax_rate).as_dict()
+
+def generate_invoice_number(db: Session, company_id: int) -> str:
+    """請求書番号の自動生成（会社×月のカウンターから採番）"""
+    return number_allocator.next_number(db.get_bind(), INVOICE_NUMBER, company_id)
+
+def _next_month(month_start: date) -> date:
+    """翌月の月初日"""
+    if month_start.month == 12:
+        return date(month_start.year + 1, 1, 1)
+    return date(month_start.year, month_start.month + 1, 1)
+
+def _months_before(month_start: date, months: int) -> date:
+    """months か月前の月初日"""
+    index = month_start.year * 12 + month_start.month - 1 - months
+    return date(index // 12, index % 12 + 1, 1)
+
+def _build_payment_summary(rows: List[tuple]) -> Dict[str, Any]:
+    """集計行（月別・ステータス別）を支払サマリーに合算"""
+    total_invoices = 0
+    total_amount = Decimal('0')
+    paid_amount = Decimal('0')
+    status_summary = {}
+    payment_summary = {}
+    
+    for status_, payment_status, count, total, paid in rows:
+        total_invoices += count
+        total_amount += total
+        paid_amount += paid
+        
+        entry = status_summary.setdefault(status_, {'count': 0, 'amount': Decimal('0')})
+        entry['count'] += count
+        entry['amount'] += total
+        
+        entry = payment_summary.setdefault(payment_status, {'count': 0, 'amount': Decimal('0')})
+        entry['count'] += count
+        entry['amount'] += total
+    
+    return {
+        'total_invoices': total_invoices,
+        'total_amount': total_amount,
+        'paid_amount': paid_amount,
+        'outstanding_amount': total_amount - paid_amount,
+        'status_summary': status_summary,
+        'payment_summary': payment_summary
+    }
 
 class InvoiceService:
     """請求書サービスクラス"""
@@ -55,20 +184,19 @@ class InvoiceService:
             )
             query = query.filter(search_filter)
         
-        # 総件数
-        total = query.count()
-        
-        # ページネーション
-        offset = (params.page - 1) * params.per_page
-        invoices = query.order_by(desc(Invoice.created_at)).offset(offset).limit(params.per_page).all()
-        
-        return {
-            'items': invoices,
-            'total': total,
-            'page': params.page,
-            'per_page': params.per_page,
-            'pages': (total + params.per_page - 1) // params.per_page
-        }
+        # キーセットページネーション（(created_at, invoice_id) 降順）
+        # 件数は同一条件で短時間キャッシュし、ページ送りのたびに COUNT(*) しない
+        result = paginate(
+            query,
+            INVOICE_LIST_ORDER,
+            per_page=params.per_page,
+            namespace=invoice_count_namespace(company_id),
+            cursor=params.cursor,
+            page=params.page,
+            total_mode=params.total_mode,
+        )
+        result.extra['page'] = params.page
+        return result.to_dict(params.per_page)
     
     def get_invoice(self, company_id: int, invoice_id: int) -> Invoice:
         """請求書詳細取得"""
@@ -124,7 +252,7 @@ class InvoiceService:
             for i, item_data in enumerate(invoice_data.items):
                 db_item = InvoiceItem(
                     invoice_id=db_invoice.invoice_id,
-                    **item_data.dict(),
+                    **item_data.dict(exclude={'sort_order'}),
                     sort_order=i
                 )
                 self.db.add(db_item)
@@ -136,8 +264,10 @@ class InvoiceService:
                 f"請求書 {db_invoice.invoice_number} を作成しました",
                 user_id
             )
+            self._invalidate_monthly_summaries(company_id, db_invoice.invoice_date)
             
             self.db.commit()
+            count_cache.invalidate(invoice_count_namespace(company_id))
             self.db.refresh(db_invoice)
             
             return db_invoice
@@ -156,6 +286,7 @@ class InvoiceService:
         try:
             # 既存請求書の取得
             db_invoice = self.get_invoice(company_id, invoice_id)
+            original_invoice_date = db_invoice.invoice_date
             
             # 支払済みの場合は編集不可
             if db_invoice.payment_status == PaymentStatus.PAID:
@@ -194,7 +325,7 @@ class InvoiceService:
                 for i, item_data in enumerate(invoice_data.items):
                     db_item = InvoiceItem(
                         invoice_id=invoice_id,
-                        **item_data.dict(),
+                        **item_data.dict(exclude={'sort_order'}),
                         sort_order=i
                     )
                     self.db.add(db_item)
@@ -213,8 +344,10 @@ class InvoiceService:
                 f"請求書 {db_invoice.invoice_number} を更新しました",
                 user_id
             )
+            self._invalidate_monthly_summaries(company_id, original_invoice_date, db_invoice.invoice_date)
             
             self.db.commit()
+            count_cache.invalidate(invoice_count_namespace(company_id))
             self.db.refresh(db_invoice)
             
             return db_invoice
@@ -248,8 +381,10 @@ class InvoiceService:
                 user_id
             )
             
+            self._invalidate_monthly_summaries(company_id, db_invoice.invoice_date)
             self.db.delete(db_invoice)
             self.db.commit()
+            count_cache.invalidate(invoice_count_namespace(company_id))
             
             return True
             
@@ -278,8 +413,10 @@ class InvoiceService:
                 f"ステータスを '{old_status}' から '{new_status}' に変更しました",
                 user_id
             )
+            self._invalidate_monthly_summaries(company_id, db_invoice.invoice_date)
             
             self.db.commit()
+            count_cache.invalidate(invoice_count_namespace(company_id))
             self.db.refresh(db_invoice)
             
             return db_invoice
@@ -334,8 +471,10 @@ class InvoiceService:
                 f"{payment_data.payment_amount}円の入金を記録しました（{payment_data.payment_method}）",
                 user_id
             )
+            self._invalidate_monthly_summaries(company_id, db_invoice.invoice_date)
             
             self.db.commit()
+            count_cache.invalidate(invoice_count_namespace(company_id))
             self.db.refresh(db_payment)
             
             return db_payment
@@ -349,6 +488,174 @@ class InvoiceService:
                 detail=f"入金記録に失敗しました: {str(e)}"
             )
     
+    def reconcile_payments(self, company_id: int, stream: BinaryIO, apply: bool = True,
+                           user_id: Optional[int] = None, encoding: Optional[str] = None,
+                           bank_name: Optional[str] = None) -> Dict[str, Any]:
+        """
+        銀行入金明細の一括消込
+        明細を1行ずつ未入金請求書と照合し、apply 時は自動照合できた入金を1トランザクションで記録する
+        """
+        started = time.perf_counter()
+        rows = self.db.execute(
+            select(
+                Invoice.invoice_id, Invoice.invoice_number, Invoice.customer_id,
+                _customers.c.customer_name, _customers.c.customer_name_kana,
+                Invoice.total_amount, Invoice.paid_amount, Invoice.due_date, Invoice.invoice_date
+            ).outerjoin(_customers, _customers.c.customer_id == Invoice.customer_id).where(
+                Invoice.company_id == company_id,
+                Invoice.payment_status.in_(_RECONCILABLE_PAYMENT_STATUSES),
+                Invoice.status != InvoiceStatus.CANCELLED.value
+            )
+        )
+        index = InvoiceIndex.from_rows(rows)
+        indexed = time.perf_counter()
+        
+        try:
+            results = PaymentReconciler(index).reconcile(
+                iter_statement_lines(open_statement(stream, encoding)),
+                recorded_transactions=lambda ids: self._recorded_transactions(company_id, ids),
+                recorded_line_keys=lambda keys: self._recorded_line_keys(company_id, keys)
+            )
+        except StatementFormatError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        except UnicodeDecodeError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="入金明細の文字コードを判定できません（UTF-8 または Shift_JIS）"
+            )
+        matched_at = time.perf_counter()
+        
+        applied_count = self._apply_reconciliation(company_id, results, user_id, bank_name) if apply else 0
+        
+        summary = summarize(results)
+        summary.update({
+            'applied': apply,
+            'applied_payments': applied_count,
+            'open_invoices': index.size,
+            'elapsed_ms': {
+                'index': round((indexed - started) * 1000, 1),
+                'match': round((matched_at - indexed) * 1000, 1),
+                'apply': round((time.perf_counter() - matched_at) * 1000, 1),
+            },
+            'results': [result.to_dict() for result in results],
+        })
+        return summary
+    
+    def _recorded_transactions(self, company_id: int, transaction_ids: List[str]) -> set:
+        """入金記録済みの取引番号"""
+        return set(
+            transaction_id for (transaction_id,) in self.db.query(InvoicePayment.transaction_id).join(
+                Invoice, Invoice.invoice_id == InvoicePayment.invoice_id
+            ).filter(
+                Invoice.company_id == company_id,
+                InvoicePayment.transaction_id.in_(transaction_ids)
+            ).distinct()
+        )
+    
+    def _recorded_line_keys(self, company_id: int, line_keys: List[str]) -> set:
+        """入金記録済みの明細キー（取引番号の無い明細）"""
+        return set(
+            line_key for (line_key,) in self.db.query(InvoicePayment.statement_line_key).join(
+                Invoice, Invoice.invoice_id == InvoicePayment.invoice_id
+            ).filter(
+                Invoice.company_id == company_id,
+                InvoicePayment.statement_line_key.in_(line_keys)
+            ).distinct()
+        )
+    
+    def _apply_reconciliation(self, company_id: int, results: list, user_id: Optional[int] = None,
+                              bank_name: Optional[str] = None) -> int:
+        """
+        自動照合できた入金をまとめて記録（コミットまで1トランザクション）
+        照合後に入金状況が変わった請求書を含む明細は conflict にして記録しない
+        """
+        matched = [result for result in results if result.status == MATCHED]
+        if not matched:
+            return 0
+        
+        try:
+            invoice_ids = [invoice.invoice_id for result in matched for invoice, _ in result.allocations]
+            current = {}
+            for start in range(0, len(invoice_ids), _ID_CHUNK_SIZE):
+                current.update(
+                    (row.invoice_id, row) for row in self.db.execute(
+                        select(Invoice.invoice_id, Invoice.paid_amount, Invoice.payment_status)
+                        .where(Invoice.invoice_id.in_(invoice_ids[start:start + _ID_CHUNK_SIZE]))
+                        .with_for_update()
+                    )
+                )
+            
+            today = date.today()
+            now = datetime.utcnow()
+            payment_rows = []
+            invoice_rows = []
+            history_rows = []
+            invoice_dates = set()
+            for result in matched:
+                locked = [current.get(invoice.invoice_id) for invoice, _ in result.allocations]
+                if any(
+                    row is None
+                    or int(row.paid_amount or 0) != invoice.paid_amount
+                    or row.payment_status not in _RECONCILABLE_PAYMENT_STATUSES
+                    for row, (invoice, _) in zip(locked, result.allocations)
+                ):
+                    result.status = CONFLICT
+                    result.message = "照合後に請求書の入金状況が変更されました"
+                    continue
+                
+                line = result.line
+                payment_date = line.transaction_date or today
+                for invoice, amount in result.allocations:
+                    paid_amount = invoice.paid_amount + amount
+                    new_status = PaymentStatus.PAID.value if paid_amount >= invoice.total_amount else PaymentStatus.PARTIAL.value
+                    payment_rows.append({
+                        'invoice_id': invoice.invoice_id,
+                        'payment_amount': Decimal(amount),
+                        'payment_date': payment_date,
+                        'payment_method': PaymentMethod.BANK_TRANSFER.value,
+                        'bank_name': bank_name,
+                        'account_info': line.payer_name[:100] or None,
+                        'transaction_id': line.transaction_id,
+                        'statement_line_key': line.line_key,
+                        'notes': f"入金明細 {line.line_no}行目から消込（{result.strategy}）",
+                        'recorded_at': now,
+                        'recorded_by': user_id,
+                    })
+                    invoice_rows.append({
+                        'invoice_id': invoice.invoice_id,
+                        'paid_amount': Decimal(paid_amount),
+                        'payment_status': new_status,
+                        'paid_date': payment_date if new_status == PaymentStatus.PAID.value else None,
+                        'updated_at': now,
+                        'updated_by': user_id,
+                    })
+                    history_rows.append({
+                        'invoice_id': invoice.invoice_id,
+                        'action': "入金記録",
+                        'old_payment_status': current[invoice.invoice_id].payment_status,
+                        'new_payment_status': new_status,
+                        'change_summary': f"{amount}円の入金を入金明細から消込しました（{line.payer_name}）",
+                        'changed_at': now,
+                        'changed_by': user_id,
+                    })
+                    invoice_dates.add(invoice.invoice_date)
+            
+            if payment_rows:
+                self.db.execute(insert(InvoicePayment), payment_rows)
+                self.db.execute(update(Invoice), invoice_rows)
+                self.db.execute(insert(InvoiceHistory), history_rows)
+                self._invalidate_monthly_summaries(company_id, *invoice_dates)
+            self.db.commit()
+        except Exception as e:
+            self.db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"入金消込に失敗しました: {str(e)}"
+            )
+        
+        count_cache.invalidate(invoice_count_namespace(company_id))
+        return len(payment_rows)
+    
     def create_from_estimate(self, company_id: int, estimate_id: int, user_id: Optional[int] = None) -> Invoice:
         """見積から請求書自動生成"""
         try:
@@ -393,57 +700,370 @@ class InvoiceService:
                 detail=f"見積からの請求書生成に失敗しました: {str(e)}"
             )
     
+    def create_from_estimates(self, company_id: int, request: InvoiceBatchFromEstimates,
+                              user_id: Optional[int] = None) -> Dict[str, Any]:
+        """
+        複数見積から請求書を一括生成（1トランザクション）
+        見積・明細・既存請求書をそれぞれ1クエリで取得し、番号はまとめて採番、
+        請求書・明細・履歴は executemany で登録する。見積ごとの結果と処理件数/秒を返す。
+        検証と金額計算は見積1件の請求書化と共通（estimate_invoice_rules）。
+        見積行をロックしてから既存請求書を確認し、二重請求書化は一意インデックスでも防ぐ
+        """
+        started = time.perf_counter()
+        estimate_ids = list(dict.fromkeys(request.estimate_ids))
+        invoice_date = request.invoice_date or date.today()
+        due_date = invoice_date + timedelta(days=request.payment_term_days)
+        
+        estimates_sql = (
+            _BATCH_ESTIMATES_FOR_UPDATE_SQL if self.db.get_bind().dialect.name == "postgresql"
+            else _BATCH_ESTIMATES_SQL
+        )
+        estimates = {
+            row.estimate_id: row
+            for row in self.db.execute(
+                estimates_sql, {"company_id": company_id, "estimate_ids": estimate_ids}
+            )
+        }
+        items_by_estimate: Dict[int, list] = {}
+        if estimates:
+            for row in self.db.execute(_BATCH_ESTIMATE_ITEMS_SQL, {"estimate_ids": list(estimates)}):
+                items_by_estimate.setdefault(row.estimate_id, []).append(row)
+        invoiced = dict(
+            self.db.query(Invoice.estimate_id, Invoice.invoice_number).filter(
+                Invoice.company_id == company_id,
+                Invoice.estimate_id.in_(estimate_ids),
+                Invoice.status != InvoiceStatus.CANCELLED.value
+            ).all()
+        )
+        
+        # 見積ごとの検証
+        outcomes = []
+        convertible = []
+        for estimate_id in estimate_ids:
+            outcome = {'estimate_id': estimate_id, 'status': 'created', 'invoice_id': None,
+                       'invoice_number': None, 'errors': [], 'warnings': []}
+            outcomes.append(outcome)
+            estimate = estimates.get(estimate_id)
+            if estimate is None:
+                outcome['errors'].append("指定された見積が見つかりません")
+            elif estimate_id in invoiced:
+                outcome['status'] = 'skipped'
+                outcome['invoice_number'] = invoiced[estimate_id]
+                outcome['warnings'].append("この見積は既に請求書化されています")
+                continue
+            else:
+                items_count = sum(1 for item in items_by_estimate.get(estimate_id, []) if item.item_type == 'item')
+                outcome['errors'], outcome['warnings'] = estimate_invoice_issues(
+                    estimate.customer_id, estimate.estimate_number, estimate.total_amount,
+                    estimate.status, items_count
+                )
+            if outcome['errors']:
+                outcome['status'] = 'failed'
+            else:
+                convertible.append((outcome, estimate))
+        
+        if convertible:
+            try:
+                numbers = number_allocator.allocate(
+                    self.db.get_bind(), INVOICE_NUMBER, company_id, len(convertible),
+                    datetime.combine(invoice_date, datetime.min.time())
+                )
+                now = datetime.utcnow()
+                invoice_rows = []
+                for (outcome, estimate), invoice_number in zip(convertible, numbers):
+                    amounts = estimate_invoice_amounts(
+                        estimate.subtotal_amount, estimate.adjustment_amount, request.tax_rate
+                    )
+                    outcome['invoice_number'] = invoice_number
+                    outcome['total_amount'] = Decimal(amounts['total_amount'])
+                    invoice_rows.append({
+                        'company_id': company_id,
+                        'customer_id': estimate.customer_id,
+                        'estimate_id': estimate.estimate_id,
+                        'invoice_number': invoice_number,
+                        'invoice_date': invoice_date,
+                        'due_date': due_date,
+                        'subtotal': Decimal(amounts['subtotal_with_adjustment']),
+                        'tax_rate': request.tax_rate,
+                        'tax_amount': Decimal(amounts['tax_amount']),
+                        'total_amount': Decimal(amounts['total_amount']),
+                        'status': InvoiceStatus.DRAFT.value,
+                        'payment_status': PaymentStatus.UNPAID.value,
+                        'paid_amount': Decimal('0'),
+                        'notes': estimate.notes,
+                        'terms_and_conditions': estimate.terms_and_conditions,
+                        'created_at': now,
+                        'updated_at': now,
+                        'created_by': user_id,
+                        'updated_by': user_id,
+                    })
+                
+                self.db.execute(insert(Invoice), invoice_rows)
+                # 採番済みの番号で登録した請求書IDをまとめて取得
+                invoice_ids = dict(
+                    self.db.query(Invoice.invoice_number, Invoice.invoice_id).filter(
+                        Invoice.company_id == company_id,
+                        Invoice.invoice_number.in_(numbers)
+                    ).all()
+                )
+                
+                item_rows = []
+                history_rows = []
+                for outcome, estimate in convertible:
+                    invoice_id = outcome['invoice_id'] = invoice_ids[outcome['invoice_number']]
+                    for item in items_by_estimate[estimate.estimate_id]:
+                        item_rows.append({
+                            'invoice_id': invoice_id,
+                            'item_name': item.item_description,
+                            'item_description': item.specification,
+                            'quantity': item.quantity or 0,
+                            'unit': item.unit,
+                            'unit_price': item.unit_price or 0,
+                            'amount': item.line_total or 0,
+                            'sort_order': item.sort_order,
+                            'level': item.level or 1,
+                            'is_header': item.item_type == 'header',
+                            'created_at': now,
+                            'updated_at': now,
+                        })
+                    history_rows.append({
+                        'invoice_id': invoice_id,
+                        'action': "作成",
+                        'new_status': InvoiceStatus.DRAFT.value,
+                        'change_summary': f"見積 {estimate.estimate_number} から請求書 {outcome['invoice_number']} を作成しました",
+                        'changed_at': now,
+                        'changed_by': user_id,
+                    })
+                
+                self.db.execute(insert(InvoiceItem), item_rows)
+                self.db.execute(insert(InvoiceHistory), history_rows)
+                self._invalidate_monthly_summaries(company_id, invoice_date)
+                self.db.commit()
+            except IntegrityError as e:
+                # 同時に同じ見積が請求書化された、または請求書番号が重複した（一意インデックス違反）
+                self.db.rollback()
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail=invoice_conflict_detail(e)
+                )
+            except Exception as e:
+                self.db.rollback()
+                raise HTTPException(
+                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    detail=f"見積からの一括請求書生成に失敗しました: {str(e)}"
+                )
+            count_cache.invalidate(invoice_count_namespace(company_id))
+        
+        elapsed = time.perf_counter() - started
+        created_count = sum(1 for o in outcomes if o['status'] == 'created')
+        return {
+            'results': outcomes,
+            'requested': len(estimate_ids),
+            'created': created_count,
+            'skipped': sum(1 for o in outcomes if o['status'] == 'skipped'),
+            'failed': sum(1 for o in outcomes if o['status'] == 'failed'),
+            'elapsed_ms': round(elapsed * 1000, 1),
+            'invoices_per_second': round(created_count / elapsed, 1) if elapsed > 0 else None,
+        }
+    
     def get_overdue_invoices(self, company_id: int) -> List[Invoice]:
-        """期限切れ請求書取得"""
-        return check_overdue_invoices(self.db, company_id)
+        """期限切れ請求書取得（参照のみ。ステータス更新は sweep_overdue_invoices で行う）"""
+        return overdue_invoices_query(self.db, company_id).order_by(Invoice.due_date).all()
     
-    def get_payment_summary(self, company_id: int, year: Optional[int] = None, month: Optional[int] = None) -> Dict[str, Any]:
-        """支払サマリー取得"""
-        query = self.db.query(Invoice).filter(Invoice.company_id == company_id)
+    def sweep_overdue_invoices(self, company_id: Optional[int] = None, user_id: Optional[int] = None,
+                               today: Optional[date] = None) -> Dict[str, Any]:
+        """
+        期限切れ請求書を滞納ステータスに一括更新（company_id 未指定時は全社）
+        UPDATE ... RETURNING と履歴の一括INSERTを1トランザクションで実行する
+        """
+        try:
+            if not self._try_sweep_lock():
+                # 他のワーカーが実行中
+                return {'updated_count': 0, 'invoice_ids': [], 'skipped': True}
+            
+            rows = mark_overdue_invoices(self.db, company_id, today, user_id)
+            
+            dates_by_company: Dict[int, set] = {}
+            for row in rows:
+                dates_by_company.setdefault(row.company_id, set()).add(row.invoice_date)
+            for target_company_id, invoice_dates in dates_by_company.items():
+                self._invalidate_monthly_summaries(target_company_id, *invoice_dates)
+            
+            self.db.commit()
+        except Exception as e:
+            self.db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"滞納ステータスの更新に失敗しました: {str(e)}"
+            )
         
-        if year:
-            query = query.filter(Invoice.invoice_date >= date(year, 1, 1))
-            query = query.filter(Invoice.invoice_date <= date(year, 12, 31))
+        for target_company_id in dates_by_company:
+            count_cache.invalidate(invoice_count_namespace(target_company_id))
         
+        return {
+            'updated_count': len(rows),
+            'invoice_ids': [row.invoice_id for row in rows],
+            'skipped': False
+        }
+    
+    def _try_sweep_lock(self) -> bool:
+        """トランザクション単位のアドバイザリーロック取得（PostgreSQL以外は常に取得成功）"""
+        if self.db.get_bind().dialect.name != "postgresql":
+            return True
+        return bool(self.db.execute(
+            text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": OVERDUE_SWEEP_LOCK_KEY}
+        ).scalar())
+    
+    def get_payment_summary(self, company_id: int, year: Optional[int] = None, month: Optional[int] = None) -> Dict[str, Any]:
+        """
+        支払サマリー取得
+        ステータス×支払状況の GROUP BY 集計（請求書をロードしない）。
+        締め済みの月は月次集計テーブルから取得し、当月以降のみ都度集計する
+        """
         if month:
-            query = query.filter(Invoice.invoice_date >= date(year or date.today().year, month, 1))
-            next_month = month + 1 if month < 12 else 1
-            next_year = year if month < 12 else (year or date.today().year) + 1
-            query = query.filter(Invoice.invoice_date < date(next_year, next_month, 1))
+            target_year = year or date.today().year
+            start = date(target_year, month, 1)
+            end = _next_month(start)
+        elif year:
+            start = date(year, 1, 1)
+            end = date(year + 1, 1, 1)
+        else:
+            # 期間指定なしは全期間を1クエリで集計
+            return _build_payment_summary(self._aggregate_invoices(company_id))
         
-        invoices = query.all()
+        current_month = date.today().replace(day=1)
+        closed_months = []
+        month_start = start
+        while month_start < min(end, current_month):
+            closed_months.append(month_start)
+            month_start = _next_month(month_start)
         
-        total_amount = sum(inv.total_amount for inv in invoices)
-        paid_amount = sum(inv.paid_amount or Decimal('0') for inv in invoices)
-        outstanding_amount = total_amount - paid_amount
-        
-        status_summary = {}
-        payment_summary = {}
-        
-        for invoice in invoices:
-            # ステータス別集計
-            status = invoice.status
-            if status not in status_summary:
-                status_summary[status] = {'count': 0, 'amount': Decimal('0')}
-            status_summary[status]['count'] += 1
-            status_summary[status]['amount'] += invoice.total_amount
-            
-            # 支払状況別集計
-            payment_status = invoice.payment_status
-            if payment_status not in payment_summary:
-                payment_summary[payment_status] = {'count': 0, 'amount': Decimal('0')}
-            payment_summary[payment_status]['count'] += 1
-            payment_summary[payment_status]['amount'] += invoice.total_amount
+        rows = self._load_monthly_summaries(company_id, closed_months) if closed_months else []
+        if end > current_month:
+            rows += self._aggregate_invoices(company_id, max(start, current_month), end)
         
+        return _build_payment_summary(rows)
+    
+    def _aggregate_invoices(self, company_id: int, start: Optional[date] = None, end: Optional[date] = None) -> List[tuple]:
+        """(status, payment_status, 件数, 請求額, 入金額) の集計行"""
+        query = self.db.query(Invoice.status, Invoice.payment_status, *_SUMMARY_AGGREGATES)\
+            .filter(Invoice.company_id == company_id)
+        if start:
+            query = query.filter(Invoice.invoice_date >= start)
+        if end:
+            query = query.filter(Invoice.invoice_date < end)
+        rows = query.group_by(Invoice.status, Invoice.payment_status).all()
+        return [
+            (status_, payment_status, int(count), Decimal(total or 0), Decimal(paid or 0))
+            for status_, payment_status, count, total, paid in rows
+        ]
+    
+    def _stored_monthly_summaries(self, company_id: int, months: List[date]) -> Dict[date, list]:
+        """保存済みの月次集計（月初日 → 内訳）"""
         return {
-            'total_invoices': len(invoices),
-            'total_amount': total_amount,
-            'paid_amount': paid_amount,
-            'outstanding_amount': outstanding_amount,
-            'status_summary': status_summary,
-            'payment_summary': payment_summary
+            summary.month: summary.breakdown
+            for summary in self.db.query(InvoiceMonthlySummary).filter(
+                InvoiceMonthlySummary.company_id == company_id,
+                InvoiceMonthlySummary.month.in_(months)
+            ).all()
         }
     
+    def _compute_monthly_breakdowns(self, company_id: int, months: List[date]) -> Dict[date, list]:
+        """指定月（昇順）の内訳を請求書から1クエリで集計"""
+        year_col = extract('year', Invoice.invoice_date)
+        month_col = extract('month', Invoice.invoice_date)
+        rows = self.db.query(year_col, month_col, Invoice.status, Invoice.payment_status, *_SUMMARY_AGGREGATES)\
+            .filter(
+                Invoice.company_id == company_id,
+                Invoice.invoice_date >= months[0],
+                Invoice.invoice_date < _next_month(months[-1])
+            )\
+            .group_by(year_col, month_col, Invoice.status, Invoice.payment_status).all()
+        
+        computed = {m: [] for m in months}
+        for row_year, row_month, status_, payment_status, count, total, paid in rows:
+            key = date(int(row_year), int(row_month), 1)
+            if key in computed:
+                computed[key].append([status_, payment_status, int(count), str(total or 0), str(paid or 0)])
+        return computed
+    
+    def _load_monthly_summaries(self, company_id: int, months: List[date]) -> List[tuple]:
+        """
+        締め済み月の集計行（参照のみ）
+        未保存の月はその場で集計するが保存しない。保存は materialize_monthly_summaries で
+        破棄と同じロックを取って行うため、古い集計で新しい変更を上書きすることはない
+        """
+        stored = self._stored_monthly_summaries(company_id, months)
+        missing = [m for m in months if m not in stored]
+        if missing:
+            stored.update(self._compute_monthly_breakdowns(company_id, missing))
+        
+        return [
+            (status_, payment_status, count, Decimal(total), Decimal(paid))
+            for month_start in months
+            for status_, payment_status, count, total, paid in stored[month_start]
+        ]
+    
+    def materialize_monthly_summaries(self, company_id: Optional[int] = None,
+                                      months: int = MONTHLY_SUMMARY_MONTHS,
+                                      today: Optional[date] = None) -> int:
+        """
+        締め済みの直近 months か月のうち未保存の月次集計を保存（company_id 未指定時は全社）
+        会社ごとに破棄と同じアドバイザリーロックを取ってから集計するため、
+        集計中に請求書が変更された場合は変更側の破棄がこの保存の後に実行される。保存した月数を返す
+        """
+        current_month = (today or date.today()).replace(day=1)
+        window_start = _months_before(current_month, months)
+        year_col = extract('year', Invoice.invoice_date)
+        month_col = extract('month', Invoice.invoice_date)
+        
+        try:
+            query = self.db.query(Invoice.company_id, year_col, month_col).filter(
+                Invoice.invoice_date >= window_start,
+                Invoice.invoice_date < current_month
+            )
+            if company_id is not None:
+                query = query.filter(Invoice.company_id == company_id)
+            targets: Dict[int, set] = {}
+            for target_company_id, row_year, row_month in query.distinct().all():
+                targets.setdefault(target_company_id, set()).add(date(int(row_year), int(row_month), 1))
+            
+            saved = 0
+            for target_company_id in sorted(targets):
+                self._lock_monthly_summaries(target_company_id)
+                target_months = sorted(targets[target_company_id])
+                stored = self._stored_monthly_summaries(target_company_id, target_months)
+                missing = [m for m in target_months if m not in stored]
+                if not missing:
+                    continue
+                for month_start, breakdown in self._compute_monthly_breakdowns(target_company_id, missing).items():
+                    self.db.add(InvoiceMonthlySummary(company_id=target_company_id, month=month_start, breakdown=breakdown))
+                    saved += 1
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        return saved
+    
+    def _lock_monthly_summaries(self, company_id: int):
+        """会社の月次集計の保存・破棄を直列化（トランザクション終了まで保持。PostgreSQL以外は何もしない）"""
+        if self.db.get_bind().dialect.name == "postgresql":
+            self.db.execute(
+                text("SELECT pg_advisory_xact_lock(:key, :company_id)"),
+                {"key": MONTHLY_SUMMARY_LOCK_KEY, "company_id": company_id}
+            )
+    
+    def _invalidate_monthly_summaries(self, company_id: int, *invoice_dates: Optional[date]):
+        """請求書の変更で締め済み月の集計が変わる場合、その月の集計を破棄（コミットは呼び出し側）"""
+        current_month = date.today().replace(day=1)
+        months = {d.replace(day=1) for d in invoice_dates if d and d.replace(day=1) < current_month}
+        if months:
+            self._lock_monthly_summaries(company_id)
+            self.db.query(InvoiceMonthlySummary).filter(
+                InvoiceMonthlySummary.company_id == company_id,
+                InvoiceMonthlySummary.month.in_(months)
+            ).delete(synchronize_session=False)
+    
     def _add_history(self, invoice_id: int, action: str, summary: str, user_id: Optional[int] = None):
         """履歴記録"""
         history = InvoiceHistory(
@@ -0,0 +1,160 @@
+"""
+Garden DX - 書類番号の採番
+会社×書類種別×期間（月・年）ごとのカウンター行を UPDATE ... RETURNING で
+原子的に進めて連番を払い出す。最大番号の前方一致検索や重複時のリトライは不要。
+採番は独立した短いトランザクションで行うため、行ロックを保持したまま
+請求書の登録処理を待たせることはない（登録失敗時は欠番になる）。
+"""
+
+import os
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import Column, Integer, MetaData, String, Table, and_, select, text, update
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import IntegrityError
+
+# 1ワーカーが一度に確保する番号数（1ならブロック確保なし）
+DEFAULT_BLOCK_SIZE = int(os.getenv("DOCUMENT_NUMBER_BLOCK_SIZE", "1"))
+
+metadata = MetaData()
+
+document_number_sequences = Table(
+    "document_number_sequences",
+    metadata,
+    Column("company_id", Integer, primary_key=True),
+    Column("document_type", String(30), primary_key=True),
+    Column("period", String(10), primary_key=True),
+    Column("last_value", Integer, nullable=False, default=0),
+)
+
+@dataclass(frozen=True)
+class NumberFormat:
+    """書類番号の書式"""
+    document_type: str
+    period_format: str            # 期間キー（strftime書式）
+    template: str                 # {period} と {sequence} を含む番号書式
+    table: Optional[str] = None   # 既存番号から初期値を求める場合のテーブル
+    column: Optional[str] = None
+
+    def period(self, when: Optional[datetime] = None) -> str:
+        return (when or datetime.now()).strftime(self.period_format)
+
+    def prefix(self, period: str) -> str:
+        return self.template.split("{sequence")[0].format(period=period)
+
+    def format(self, period: str, sequence: int) -> str:
+        return self.template.format(period=period, sequence=sequence)
+
+# 請求書番号: INV-YYYYMM-001（999件を超えると桁が増える）
+INVOICE_NUMBER = NumberFormat("invoice", "%Y%m", "INV-{period}-{sequence:03d}", "invoices", "invoice_number")
+# 見積番号: YYYY-0001
+ESTIMATE_NUMBER = NumberFormat("estimate", "%Y", "{period}-{sequence:04d}", "estimates", "estimate_number")
+
+def _existing_max_sequence(conn: Connection, number_format: NumberFormat, company_id: int, period: str) -> int:
+    """カウンター導入前に発行済みの番号の最大連番"""
+    if not number_format.table:
+        return 0
+    prefix = number_format.prefix(period)
+    rows = conn.execute(
+        text(
+            f"SELECT {number_format.column} FROM {number_format.table} "
+            f"WHERE company_id = :company_id AND {number_format.column} LIKE :pattern"
+        ),
+        {"company_id": company_id, "pattern": f"{prefix}%"},
+    ).scalars()
+    suffixes = [number[len(prefix):] for number in rows]
+    return max((int(s) for s in suffixes if s.isdigit()), default=0)
+
+class DocumentNumberAllocator:
+    """
+    書類番号アロケーター
+    block_size > 1 の場合、ワーカー内で番号ブロックをまとめて確保して払い出す
+    （DBへの往復が減る代わりに、ワーカー間で番号順と登録順が一致しなくなり、再起動時は欠番になる）
+    """
+
+    def __init__(self, block_size: int = DEFAULT_BLOCK_SIZE):
+        self.block_size = max(1, block_size)
+        self._blocks: Dict[Tuple[int, str, str], List[int]] = {}  # key -> [次の番号, ブロック終端]
+        self._lock = threading.Lock()
+
+    def _reserve(self, bind: Engine, number_format: NumberFormat, company_id: int, period: str, count: int) -> int:
+        """カウンターを count 進め、確保した範囲の最後の番号を返す（独立トランザクション）"""
+        key_filter = and_(
+            document_number_sequences.c.company_id == company_id,
+            document_number_sequences.c.document_type == number_format.document_type,
+            document_number_sequences.c.period == period,
+        )
+        statement = update(document_number_sequences).where(key_filter)\
+            .values(last_value=document_number_sequences.c.last_value + count)\
+            .returning(document_number_sequences.c.last_value)
+
+        with bind.begin() as conn:
+            last_value = conn.execute(statement).scalar()
+            if last_value is not None:
+                return last_value
+
+        # 期間の最初の採番: カウンター行を作成（同時作成は一意制約で検出して再試行）
+        try:
+            with bind.begin() as conn:
+                initial = _existing_max_sequence(conn, number_format, company_id, period)
+                conn.execute(document_number_sequences.insert().values(
+                    company_id=company_id,
+                    document_type=number_format.document_type,
+                    period=period,
+                    last_value=initial + count,
+                ))
+                return initial + count
+        except IntegrityError:
+            with bind.begin() as conn:
+                return conn.execute(statement).scalar()
+
+    def allocate(self, bind: Engine, number_format: NumberFormat, company_id: int,
+                 count: int = 1, when: Optional[datetime] = None) -> List[str]:
+        """書類番号を count 件払い出す"""
+        period = number_format.period(when)
+        if self.block_size == 1:
+            last = self._reserve(bind, number_format, company_id, period, count)
+            sequences = range(last - count + 1, last + 1)
+        else:
+            sequences = self._take_from_block(bind, number_format, company_id, period, count)
+        return [number_format.format(period, sequence) for sequence in sequences]
+
+    def next_number(self, bind: Engine, number_format: NumberFormat, company_id: int,
+                    when: Optional[datetime] = None) -> str:
+        """書類番号を1件払い出す"""
+        return self.allocate(bind, number_format, company_id, 1, when)[0]
+
+    def _take_from_block(self, bind: Engine, number_format: NumberFormat, company_id: int,
+                         period: str, count: int) -> List[int]:
+        key = (company_id, number_format.document_type, period)
+        with self._lock:
+            sequences: List[int] = []
+            block = self._blocks.get(key)
+            while len(sequences) < count:
+                if block is None or block[0] > block[1]:
+                    reserve = max(self.block_size, count - len(sequences))
+                    last = self._reserve(bind, number_format, company_id, period, reserve)
+                    block = self._blocks[key] = [last - reserve + 1, last]
+                take = min(count - len(sequences), block[1] - block[0] + 1)
+                sequences.extend(range(block[0], block[0] + take))
+                block[0] += take
+            return sequences
+
+    def current_value(self, bind: Engine, number_format: NumberFormat, company_id: int,
+                      when: Optional[datetime] = None) -> int:
+        """カウンターの現在値（払い出し済みの最大連番、ワーカー確保分を含む）"""
+        with bind.connect() as conn:
+            value = conn.execute(
+                select(document_number_sequences.c.last_value).where(and_(
+                    document_number_sequences.c.company_id == company_id,
+                    document_number_sequences.c.document_type == number_format.document_type,
+                    document_number_sequences.c.period == number_format.period(when),
+                ))
+            ).scalar()
+        return value or 0
+
+# グローバルアロケーター
+number_allocator = DocumentNumberAllocator()
@@ -0,0 +1,72 @@
+"""
+Garden DX - 滞納請求書スイーパー
+支払期限を過ぎた未払い請求書の滞納ステータス更新を、
+リクエスト処理から切り離してプロセス内の定期ジョブとして実行する。
+あわせて締め済み月の支払サマリーを保存する（参照APIは保存しない）
+"""
+
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from ..database import SessionLocal
+from .invoice_service import InvoiceService
+
+logger = logging.getLogger("garden_overdue_sweeper")
+
+# 実行間隔（秒）
+DEFAULT_SWEEP_INTERVAL_SECONDS = float(os.getenv("OVERDUE_SWEEP_INTERVAL_SECONDS", "3600"))
+
+class OverdueSweeper:
+    """滞納ステータスの定期一括更新ジョブ"""
+
+    def __init__(self, session_factory: Callable[[], Any] = SessionLocal,
+                 interval_seconds: float = DEFAULT_SWEEP_INTERVAL_SECONDS):
+        self.session_factory = session_factory
+        self.interval_seconds = interval_seconds
+        self.last_run_at: Optional[datetime] = None
+        self.last_result: Optional[Dict[str, Any]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def run_once(self) -> Dict[str, Any]:
+        """全社分を1回スイープし、未保存の月次集計を保存（同期。スレッドプール上で実行される）"""
+        db = self.session_factory()
+        try:
+            service = InvoiceService(db)
+            result = service.sweep_overdue_invoices()
+            result['summaries_saved'] = service.materialize_monthly_summaries()
+        finally:
+            db.close()
+        self.last_run_at = datetime.now()
+        self.last_result = result
+        if result['updated_count']:
+            logger.info(f"滞納ステータスに更新: {result['updated_count']}件")
+        return result
+
+    async def _sweep_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await loop.run_in_executor(None, self.run_once)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("滞納請求書スイープに失敗しました")
+            await asyncio.sleep(self.interval_seconds)
+
+    def start(self) -> asyncio.Task:
+        """定期実行開始（起動イベントから呼び出す。起動直後に1回実行）"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._sweep_loop())
+        return self._task
+
+    def stop(self) -> None:
+        """定期実行停止"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+# グローバルスイーパー
+overdue_sweeper = OverdueSweeper()
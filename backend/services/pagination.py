@@ -0,0 +1,339 @@
+"""
+Garden DX - キーセット（カーソル）ページネーション
+OFFSET は読み飛ばす行数に比例して遅くなり、COUNT(*) は条件に合う全行を走査するため、
+(並び順カラム..., 主キー) の位置を不透明カーソルで受け渡して次ページを索引範囲検索で取得する。
+請求書・見積・プロジェクト・単価マスターの一覧で共通利用する。
+"""
+
+import base64
+import hashlib
+import json
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import and_, or_, tuple_
+from sqlalchemy.orm import Query
+
+# 件数の取得方法
+TOTAL_MODE_CACHED = "cached"      # 正確な件数（短時間キャッシュ）
+TOTAL_MODE_ESTIMATE = "estimate"  # PostgreSQLの実行計画による推定件数
+TOTAL_MODE_NONE = "none"          # 件数を返さない
+TOTAL_MODES = (TOTAL_MODE_CACHED, TOTAL_MODE_ESTIMATE, TOTAL_MODE_NONE)
+
+@dataclass(frozen=True)
+class KeysetOrder:
+    """
+    並び順カラム（最後は主キーで一意にすること）
+    NULL を含み得るカラムは nullable=True を指定する（昇順・降順とも NULL は末尾に並べる）
+    """
+    column: Any
+    descending: bool = True
+    nullable: bool = False
+
+    @property
+    def key(self) -> str:
+        return self.column.key
+
+def column_is_nullable(column: Any) -> bool:
+    """マップ済み属性・Column の NULL 許可（判定できない場合は NULL 許可として扱う）"""
+    return bool(getattr(getattr(column, "expression", column), "nullable", True))
+
+def order_by_desc(*columns) -> Tuple[KeysetOrder, ...]:
+    """全カラム降順の並び順"""
+    return tuple(KeysetOrder(column, True) for column in columns)
+
+def order_by_asc(*columns) -> Tuple[KeysetOrder, ...]:
+    """全カラム昇順の並び順"""
+    return tuple(KeysetOrder(column, False) for column in columns)
+
+@dataclass
+class KeysetPage:
+    """1ページ分の取得結果"""
+    items: List[Any]
+    next_cursor: Optional[str] = None
+    has_more: bool = False
+    total: Optional[int] = None
+    total_is_estimate: bool = False
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+    def to_dict(self, per_page: int) -> Dict[str, Any]:
+        """API応答用の辞書（従来の page/pages 形式と互換）"""
+        result = {
+            "items": self.items,
+            "next_cursor": self.next_cursor,
+            "has_more": self.has_more,
+            "total": self.total,
+            "total_is_estimate": self.total_is_estimate,
+            "per_page": per_page,
+            "pages": (self.total + per_page - 1) // per_page if self.total is not None else None,
+        }
+        result.update(self.extra)
+        return result
+
+# ======================================
+# 不透明カーソル
+# ======================================
+
+def _order_signature(order: Sequence[KeysetOrder]) -> str:
+    """並び順の識別子（別の並び順で発行されたカーソルを拒否する）"""
+    raw = ",".join(f"{o.key}:{'d' if o.descending else 'a'}{'n' if o.nullable else ''}" for o in order)
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=4).hexdigest()
+
+def _encode_value(value: Any) -> List[Any]:
+    if value is None:
+        return ["n", None]
+    if isinstance(value, datetime):
+        return ["dt", value.isoformat()]
+    if isinstance(value, date):
+        return ["d", value.isoformat()]
+    if isinstance(value, Decimal):
+        return ["dec", str(value)]
+    if isinstance(value, (bool, int, float, str)):
+        return ["v", value]
+    # Enum など
+    return ["v", getattr(value, "value", str(value))]
+
+def _decode_value(tagged: Sequence[Any]) -> Any:
+    tag, value = tagged
+    if tag == "n":
+        return None
+    if tag == "dt":
+        return datetime.fromisoformat(value)
+    if tag == "d":
+        return date.fromisoformat(value)
+    if tag == "dec":
+        return Decimal(value)
+    if tag == "v":
+        return value
+    raise ValueError(f"unknown cursor tag: {tag}")
+
+def encode_cursor(order: Sequence[KeysetOrder], values: Sequence[Any]) -> str:
+    """並び順カラムの値から不透明カーソルを生成"""
+    payload = {"k": _order_signature(order), "v": [_encode_value(v) for v in values]}
+    raw = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(order: Sequence[KeysetOrder], cursor: str) -> List[Any]:
+    """不透明カーソルを並び順カラムの値に復元（不正なカーソルは400）"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if payload["k"] != _order_signature(order) or len(payload["v"]) != len(order):
+            raise ValueError("cursor does not match ordering")
+        values = [_decode_value(v) for v in payload["v"]]
+    except (ValueError, KeyError, TypeError, UnicodeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="カーソルが不正です"
+        )
+    if any(v is None and not o.nullable for o, v in zip(order, values)):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="カーソルが不正です"
+        )
+    return values
+
+# ======================================
+# キーセット条件
+# ======================================
+
+def keyset_condition(order: Sequence[KeysetOrder], values: Sequence[Any]):
+    """
+    カーソル位置より後ろの行を表す条件
+    全カラム同方向かつ NOT NULL なら行値比較 (a, b) < (:a, :b)（複合インデックスの範囲検索になる）、
+    それ以外は (a < :a) OR (a = :a AND b > :b) ... に展開する。
+    NULL は末尾に並ぶため、値の後ろには NULL の行が、NULL の後ろには後続カラムが大きい NULL の行のみが続く
+    """
+    directions = {o.descending for o in order}
+    if len(directions) == 1 and not any(o.nullable for o in order):
+        columns = tuple_(*(o.column for o in order))
+        bound = tuple_(*values)
+        return columns < bound if order[0].descending else columns > bound
+
+    clauses = []
+    equal_prefix = []
+    for current, value in zip(order, values):
+        if value is None:
+            after = None
+            equal = current.column.is_(None)
+        else:
+            after = current.column < value if current.descending else current.column > value
+            if current.nullable:
+                after = or_(after, current.column.is_(None))
+            equal = current.column == value
+        if after is not None:
+            clauses.append(and_(*equal_prefix, after))
+        equal_prefix.append(equal)
+    return or_(*clauses)
+
+def apply_order(query: Query, order: Sequence[KeysetOrder]) -> Query:
+    """並び順を適用（既存の ORDER BY は置き換える）"""
+    return query.order_by(None).order_by(*(_order_clause(o) for o in order))
+
+def _order_clause(order: KeysetOrder):
+    clause = order.column.desc() if order.descending else order.column.asc()
+    return clause.nulls_last() if order.nullable else clause
+
+def _row_values(row: Any, order: Sequence[KeysetOrder]) -> List[Any]:
+    return [getattr(row, o.key) for o in order]
+
+def paginate_keyset(
+    query: Query,
+    order: Sequence[KeysetOrder],
+    limit: int,
+    cursor: Optional[str] = None,
+    offset: int = 0,
+) -> KeysetPage:
+    """
+    キーセットページネーション
+    limit+1 件取得して次ページの有無を判定し、最終行から次カーソルを生成する。
+    cursor が無い場合のみ offset を使う（ページ番号指定の直接アクセス用）
+    """
+    if cursor:
+        query = query.filter(keyset_condition(order, decode_cursor(order, cursor)))
+    query = apply_order(query, order)
+    if offset and not cursor:
+        query = query.offset(offset)
+
+    rows = query.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_cursor(order, _row_values(rows[-1], order)) if has_more else None
+    return KeysetPage(items=rows, next_cursor=next_cursor, has_more=has_more)
+
+# ======================================
+# 件数キャッシュ・推定件数
+# ======================================
+
+def query_signature(query: Query) -> str:
+    """クエリ（SQL＋パラメータ）の識別子"""
+    compiled = query.order_by(None).statement.compile()
+    params = sorted((k, repr(v)) for k, v in compiled.params.items())
+    raw = f"{compiled}|{params}"
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+def estimate_row_count(query: Query) -> Optional[int]:
+    """
+    PostgreSQLの実行計画から推定行数を取得（テーブル走査なし）
+    PostgreSQL以外や取得失敗時は None
+    """
+    session = query.session
+    bind = session.get_bind()
+    if bind.dialect.name != "postgresql":
+        return None
+    compiled = query.order_by(None).statement.compile(
+        dialect=bind.dialect, compile_kwargs={"render_postcompile": True}
+    )
+    try:
+        plan = session.connection().exec_driver_sql(
+            f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params
+        ).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+    except Exception:
+        return None
+
+class CountCache:
+    """
+    一覧件数の短時間キャッシュ
+    同じ絞り込み条件でページを送る間は COUNT(*) を繰り返さない。
+    登録・削除時は namespace 単位で invalidate する。
+    キャッシュはプロセスごとで、invalidate は呼び出したワーカーにしか効かない。
+    他のワーカーでは最大 ttl_seconds の間、古い件数が返り得る（件数は目安として扱う）
+    """
+
+    def __init__(self, ttl_seconds: float = 60.0, max_entries: int = 10_000,
+                 clock: Callable[[], float] = time.monotonic):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries: Dict[str, Tuple[float, int, bool]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, key: str) -> Optional[Tuple[int, bool]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= self.clock():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def _set(self, key: str, total: int, estimated: bool) -> None:
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                now = self.clock()
+                for stale in [k for k, e in self._entries.items() if e[0] <= now]:
+                    del self._entries[stale]
+                if len(self._entries) >= self.max_entries:
+                    self._entries.pop(next(iter(self._entries)))
+            self._entries[key] = (self.clock() + self.ttl_seconds, total, estimated)
+
+    def total(self, query: Query, namespace: str, mode: str = TOTAL_MODE_CACHED) -> Tuple[Optional[int], bool]:
+        """(件数, 推定値か) を返す。mode=none の場合は (None, False)"""
+        if mode == TOTAL_MODE_NONE:
+            return None, False
+
+        key = f"{namespace}|{mode}|{query_signature(query)}"
+        cached = self._get(key)
+        if cached is not None:
+            return cached
+
+        estimated = False
+        total = None
+        if mode == TOTAL_MODE_ESTIMATE:
+            total = estimate_row_count(query)
+            estimated = total is not None
+        if total is None:
+            total = query.order_by(None).count()
+        self._set(key, total, estimated)
+        return total, estimated
+
+    def invalidate(self, namespace: str) -> int:
+        """namespace（例: "invoices:1"）のキャッシュを削除"""
+        prefix = f"{namespace}|"
+        with self._lock:
+            keys = [k for k in self._entries if k.startswith(prefix)]
+            for key in keys:
+                del self._entries[key]
+        return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+# グローバル件数キャッシュ
+count_cache = CountCache()
+
+def paginate(
+    query: Query,
+    order: Sequence[KeysetOrder],
+    per_page: int,
+    namespace: str,
+    cursor: Optional[str] = None,
+    page: int = 1,
+    total_mode: str = TOTAL_MODE_CACHED,
+    cache: Optional[CountCache] = None,
+) -> KeysetPage:
+    """
+    一覧取得の共通処理（キーセットページ＋件数）
+    cursor 指定時はキーセット、未指定時は page 番号の位置から取得する
+    """
+    if total_mode not in TOTAL_MODES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"total_mode は {', '.join(TOTAL_MODES)} のいずれかを指定してください"
+        )
+    offset = 0 if cursor else (page - 1) * per_page
+    result = paginate_keyset(query, order, per_page, cursor=cursor, offset=offset)
+    result.total, result.total_is_estimate = (cache or count_cache).total(query, namespace, total_mode)
+    return result
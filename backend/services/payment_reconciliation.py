@@ -0,0 +1,494 @@
+"""
+Garden DX - 入金消込（銀行入金明細の一括照合）
+入金明細CSVを1行ずつ読み込み、未入金の請求書を残高（円）と
+正規化した顧客名カナのインデックスで照合する。
+照合順は 名義+金額の完全一致 → 名義のあいまい一致 → 同一顧客の合計額一致 →
+金額のみ一致（確認待ち）→ 振込手数料差引（確認待ち）。
+自動で消し込むのは matched のみで、その他は候補付きで返す。
+取込済み・同じファイル内で重複した明細は、取引番号（無ければ取引日・名義・金額・行内容の
+ハッシュ）で検出して duplicate にする。
+DBへの反映は InvoiceService.reconcile_payments で1トランザクションにまとめて行う。
+"""
+
+import codecs
+import csv
+import hashlib
+import re
+import unicodedata
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+# 照合結果ステータス
+MATCHED = "matched"          # 自動消込対象
+SUGGESTED = "suggested"      # 候補1件（要確認）
+AMBIGUOUS = "ambiguous"      # 候補複数（要確認）
+UNMATCHED = "unmatched"
+DUPLICATE = "duplicate"      # 取込済み・ファイル内で重複した明細
+CONFLICT = "conflict"        # 照合後に請求書の入金状況が変わった
+ERROR = "error"              # 明細行の形式エラー
+
+# 照合方法
+STRATEGY_EXACT = "exact"                    # 名義・金額とも一致
+STRATEGY_FUZZY_NAME = "fuzzy_name"          # 名義のあいまい一致・金額一致
+STRATEGY_CUSTOMER_TOTAL = "customer_total"  # 同一顧客の複数請求の合計額と一致
+STRATEGY_AMOUNT_ONLY = "amount_only"        # 金額のみ一致
+STRATEGY_FEE_DEDUCTED = "fee_deducted"      # 振込手数料を差し引いた金額
+
+# 名義のあいまい一致の閾値（バイグラムのDice係数）
+DEFAULT_NAME_THRESHOLD = 0.75
+# 振込手数料として差し引かれうる上限（円）
+DEFAULT_FEE_TOLERANCE = 880
+# 結果に含める候補数の上限
+MAX_CANDIDATES = 5
+
+# 明細CSVの列名（銀行ごとの表記ゆれ）
+STATEMENT_COLUMNS = {
+    'transaction_date': ('取引日', '入金日', '勘定日', '日付', '年月日', 'date', 'transaction_date'),
+    'amount': ('入金額', '入金金額', 'お預り金額', '預入金額', '金額', 'amount', 'deposit'),
+    'payer_name': ('振込依頼人名', '依頼人名', '振込人名', 'お取引内容', '摘要', '内容', 'payer_name', 'name'),
+    'transaction_id': ('取引番号', '照会番号', '問合せ番号', 'transaction_id', 'reference'),
+}
+
+_DATE_FORMATS = ('%Y-%m-%d', '%Y/%m/%d', '%Y%m%d', '%Y.%m.%d')
+
+# 法人格の略号（全銀フォーマットの カ) / (カ など）と正式表記
+_CORPORATE_ABBREVIATIONS = ('カ', 'ユ', 'ド', 'メ', 'シ', 'イ', 'ザイ', 'シヤ', 'ガク', 'フク', 'トクヒ')
+_CORPORATE_ABBREVIATION_PATTERN = re.compile(
+    r"\((?:%s)\)|^(?:%s)\)|\((?:%s)$" % (('|'.join(_CORPORATE_ABBREVIATIONS),) * 3)
+)
+_CORPORATE_WORDS = re.compile(
+    "株式会社|有限会社|合同会社|合名会社|合資会社|医療法人|"
+    "カブシキガイシヤ|カブシキカイシヤ|ユウゲンガイシヤ|ユウゲンカイシヤ|ゴウドウガイシヤ|ゴウドウカイシヤ"
+)
+_SMALL_KANA = str.maketrans('ァィゥェォッャュョヮヵヶ', 'アイウエオツヤユヨワカケ')
+_IGNORED_CHARACTERS = re.compile(r"[\s　・･.,\-ー−‐－()（）「」\"'／/]")
+
+def normalize_kana(name: Optional[str]) -> str:
+    """
+    振込依頼人名・顧客名カナを照合用キーに正規化
+    半角カナ→全角、ひらがな→カタカナ、小書き文字→大文字（銀行表記に合わせる）、
+    法人格の略号・記号・空白を除去する
+    """
+    if not name:
+        return ""
+    text = unicodedata.normalize("NFKC", name).upper()
+    text = ''.join(chr(ord(c) + 0x60) if 'ぁ' <= c <= 'ゖ' else c for c in text)
+    text = text.translate(_SMALL_KANA).replace(' ', '').replace('　', '')
+    text = _CORPORATE_ABBREVIATION_PATTERN.sub('', text)
+    text = _CORPORATE_WORDS.sub('', text)
+    return _IGNORED_CHARACTERS.sub('', text)
+
+def _bigrams(key: str) -> set:
+    if len(key) < 2:
+        return {key} if key else set()
+    return {key[i:i + 2] for i in range(len(key) - 1)}
+
+def _is_truncated(a: str, b: str) -> bool:
+    """銀行側で途中まで切られた名義（4文字以上の前方一致）"""
+    shorter, longer = (a, b) if len(a) <= len(b) else (b, a)
+    return len(shorter) >= 4 and longer.startswith(shorter)
+
+def name_similarity(a: str, b: str) -> float:
+    """正規化済みキー同士の類似度（0〜1、バイグラムのDice係数。前方一致は0.9）"""
+    if not a or not b:
+        return 0.0
+    if a == b:
+        return 1.0
+    grams_a, grams_b = _bigrams(a), _bigrams(b)
+    dice = 2 * len(grams_a & grams_b) / (len(grams_a) + len(grams_b))
+    return max(dice, 0.9) if _is_truncated(a, b) else dice
+
+# ---------------------------------------------------------------------------
+# 入金明細の読み込み
+# ---------------------------------------------------------------------------
+
+def statement_line_key(transaction_date: Optional[date], name_key: str, amount: int,
+                       cells: Iterable[str] = ()) -> str:
+    """取引番号の無い明細の重複検出キー（取引日・名義・金額・行内容のハッシュ）"""
+    parts = [transaction_date.isoformat() if transaction_date else "", name_key, str(amount)]
+    parts.extend(unicodedata.normalize("NFKC", cell).strip() for cell in cells)
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+@dataclass
+class StatementLine:
+    """入金明細1行"""
+    line_no: int
+    transaction_date: Optional[date]
+    amount: int
+    payer_name: str
+    transaction_id: Optional[str] = None
+    name_key: str = ""
+    line_key: str = ""
+
+    def __post_init__(self):
+        if not self.line_key:
+            self.line_key = statement_line_key(self.transaction_date, self.name_key, self.amount)
+
+    @property
+    def dedup_key(self) -> str:
+        """重複検出キー（取引番号、無ければ行のハッシュ）"""
+        return f"id:{self.transaction_id}" if self.transaction_id else f"line:{self.line_key}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'line_no': self.line_no,
+            'transaction_date': self.transaction_date,
+            'amount': self.amount,
+            'payer_name': self.payer_name,
+            'transaction_id': self.transaction_id,
+        }
+
+class StatementFormatError(ValueError):
+    """明細行の形式エラー"""
+
+    def __init__(self, line_no: int, message: str):
+        super().__init__(message)
+        self.line_no = line_no
+
+def _parse_amount(value: str) -> Optional[int]:
+    text = unicodedata.normalize("NFKC", value or "").replace(',', '').replace('円', '').replace('¥', '').strip()
+    if not text:
+        return None
+    try:
+        amount = Decimal(text)
+    except InvalidOperation:
+        raise ValueError(f"金額を読み取れません: {value}")
+    if amount != amount.to_integral_value():
+        raise ValueError(f"金額に1円未満が含まれています: {value}")
+    return int(amount)
+
+def _parse_date(value: str) -> Optional[date]:
+    text = unicodedata.normalize("NFKC", value or "").strip()
+    if not text:
+        return None
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"日付を読み取れません: {value}")
+
+def _resolve_columns(header: List[str]) -> Dict[str, int]:
+    normalized = [unicodedata.normalize("NFKC", h or "").strip().lower() for h in header]
+    columns = {}
+    for key, aliases in STATEMENT_COLUMNS.items():
+        for alias in aliases:
+            if alias.lower() in normalized:
+                columns[key] = normalized.index(alias.lower())
+                break
+    missing = [key for key in ('amount', 'payer_name') if key not in columns]
+    if missing:
+        raise StatementFormatError(1, f"入金明細の必須列がありません: {', '.join(missing)}")
+    return columns
+
+def iter_statement_lines(lines: Iterable[str]) -> Iterator[Any]:
+    """
+    入金明細CSV（1行目はヘッダー）を1行ずつ StatementLine に変換
+    入金額が空の行（出金など）は読み飛ばし、形式エラーの行は StatementFormatError を返す
+    """
+    reader = csv.reader(lines)
+    header = next(reader, None)
+    if header is None:
+        return
+    columns = _resolve_columns(header)
+    for row in reader:
+        line_no = reader.line_num
+        if not any(cell.strip() for cell in row):
+            continue
+        cell = lambda key: row[columns[key]] if key in columns and columns[key] < len(row) else ""
+        try:
+            amount = _parse_amount(cell('amount'))
+            if amount is None or amount <= 0:
+                continue
+            payer_name = cell('payer_name').strip()
+            transaction_date = _parse_date(cell('transaction_date'))
+            name_key = normalize_kana(payer_name)
+            yield StatementLine(
+                line_no=line_no,
+                transaction_date=transaction_date,
+                amount=amount,
+                payer_name=payer_name,
+                transaction_id=cell('transaction_id').strip() or None,
+                name_key=name_key,
+                line_key=statement_line_key(transaction_date, name_key, amount, row),
+            )
+        except ValueError as e:
+            yield StatementFormatError(line_no, str(e))
+
+def detect_encoding(head: bytes) -> str:
+    """明細ファイル先頭のバイト列から文字コードを判定（UTF-8 以外は Shift_JIS 系とみなす）"""
+    if head.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        return "cp932"
+
+def open_statement(stream: BinaryIO, encoding: Optional[str] = None) -> Iterator[str]:
+    """アップロードされた明細ファイルを全体を読み込まずに行単位で読む"""
+    if encoding is None:
+        if stream.seekable():
+            encoding = detect_encoding(stream.read(64 * 1024))
+            stream.seek(0)
+        else:
+            encoding = "utf-8-sig"
+    return codecs.getreader(encoding)(stream)
+
+# ---------------------------------------------------------------------------
+# 未入金請求書のインデックスと照合
+# ---------------------------------------------------------------------------
+
+@dataclass
+class OpenInvoice:
+    """消込対象の請求書（金額は円の整数）"""
+    invoice_id: int
+    invoice_number: str
+    customer_id: Optional[int]
+    customer_name: str
+    name_key: str
+    total_amount: int
+    paid_amount: int
+    due_date: Optional[date] = None
+    invoice_date: Optional[date] = None
+    consumed: bool = False
+
+    @property
+    def outstanding(self) -> int:
+        return self.total_amount - self.paid_amount
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'invoice_id': self.invoice_id,
+            'invoice_number': self.invoice_number,
+            'customer_id': self.customer_id,
+            'customer_name': self.customer_name,
+            'outstanding_amount': self.outstanding,
+            'due_date': self.due_date,
+        }
+
+def _due_order(invoice: OpenInvoice) -> Tuple:
+    return (invoice.due_date or date.max, invoice.invoice_id)
+
+class InvoiceIndex:
+    """未入金請求書の索引（残高→請求書、名義キー→請求書、バイグラム→名義キー）"""
+
+    def __init__(self, invoices: Iterable[OpenInvoice]):
+        self.by_amount: Dict[int, List[OpenInvoice]] = {}
+        self.by_name: Dict[str, List[OpenInvoice]] = {}
+        self.by_gram: Dict[str, List[str]] = {}
+        self.gram_sizes: Dict[str, int] = {}
+        self.size = 0
+        for invoice in invoices:
+            self.size += 1
+            self.by_amount.setdefault(invoice.outstanding, []).append(invoice)
+            if invoice.name_key:
+                self.by_name.setdefault(invoice.name_key, []).append(invoice)
+        # 支払期限の古い順に消し込む
+        for bucket in self.by_amount.values():
+            bucket.sort(key=_due_order)
+        for bucket in self.by_name.values():
+            bucket.sort(key=_due_order)
+        for key in self.by_name:
+            grams = _bigrams(key)
+            self.gram_sizes[key] = len(grams)
+            for gram in grams:
+                self.by_gram.setdefault(gram, []).append(key)
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Any]) -> "InvoiceIndex":
+        """
+        (invoice_id, invoice_number, customer_id, customer_name, customer_name_kana,
+         total_amount, paid_amount, due_date, invoice_date) の行から作成
+        """
+        return cls(
+            OpenInvoice(
+                invoice_id=row.invoice_id,
+                invoice_number=row.invoice_number,
+                customer_id=row.customer_id,
+                customer_name=row.customer_name or "",
+                name_key=normalize_kana(row.customer_name_kana or row.customer_name),
+                total_amount=int(row.total_amount or 0),
+                paid_amount=int(row.paid_amount or 0),
+                due_date=row.due_date,
+                invoice_date=row.invoice_date,
+            )
+            for row in rows
+        )
+
+    def open_by_amount(self, amount: int) -> List[OpenInvoice]:
+        return [invoice for invoice in self.by_amount.get(amount, ()) if not invoice.consumed]
+
+    def open_by_name(self, name_key: str) -> List[OpenInvoice]:
+        return [invoice for invoice in self.by_name.get(name_key, ()) if not invoice.consumed]
+
+    def similar_names(self, name_key: str, threshold: float) -> List[Tuple[float, str]]:
+        """類似度が閾値以上の名義キー（類似度の高い順、完全一致を除く）"""
+        if not name_key:
+            return []
+        grams = _bigrams(name_key)
+        # 共通バイグラム数を転置索引から数えて Dice 係数を求める
+        shared: Dict[str, int] = {}
+        for gram in grams:
+            for key in self.by_gram.get(gram, ()):
+                shared[key] = shared.get(key, 0) + 1
+        scored = []
+        for key, count in shared.items():
+            if key == name_key:
+                continue
+            score = 2 * count / (len(grams) + self.gram_sizes[key])
+            if _is_truncated(name_key, key):
+                score = max(score, 0.9)
+            if score >= threshold:
+                scored.append((score, key))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return scored
+
+@dataclass
+class LineMatch:
+    """明細1行の照合結果"""
+    line: Optional[StatementLine]
+    status: str
+    strategy: Optional[str] = None
+    allocations: List[Tuple[OpenInvoice, int]] = field(default_factory=list)
+    candidates: List[OpenInvoice] = field(default_factory=list)
+    message: Optional[str] = None
+    line_no: Optional[int] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        result = {
+            'line_no': self.line.line_no if self.line else self.line_no,
+            'status': self.status,
+            'strategy': self.strategy,
+            'allocations': [
+                {'invoice_id': invoice.invoice_id, 'invoice_number': invoice.invoice_number, 'amount': amount}
+                for invoice, amount in self.allocations
+            ],
+            'candidates': [invoice.to_dict() for invoice in self.candidates[:MAX_CANDIDATES]],
+            'message': self.message,
+        }
+        if self.line:
+            result['line'] = self.line.to_dict()
+        return result
+
+class PaymentReconciler:
+    """
+    入金明細の照合エンジン
+    照合した請求書は consumed にして、同じ明細ファイル内で二重に消し込まない
+    """
+
+    def __init__(self, index: InvoiceIndex, name_threshold: float = DEFAULT_NAME_THRESHOLD,
+                 fee_tolerance: int = DEFAULT_FEE_TOLERANCE):
+        self.index = index
+        self.name_threshold = name_threshold
+        self.fee_tolerance = fee_tolerance
+
+    def _claim(self, line: StatementLine, strategy: str, invoices: List[OpenInvoice]) -> LineMatch:
+        for invoice in invoices:
+            invoice.consumed = True
+        return LineMatch(line, MATCHED, strategy, [(invoice, invoice.outstanding) for invoice in invoices])
+
+    def match(self, line: StatementLine) -> LineMatch:
+        """明細1行を照合"""
+        index = self.index
+        amount = line.amount
+
+        # 1. 名義・金額とも一致（同額が複数あれば支払期限の古い請求書から）
+        same_name = index.open_by_name(line.name_key) if line.name_key else []
+        exact = [invoice for invoice in same_name if invoice.outstanding == amount]
+        if exact:
+            return self._claim(line, STRATEGY_EXACT, exact[:1])
+
+        # 2. 名義のあいまい一致（最も近い名義が1つに決まる場合のみ）
+        similar = index.similar_names(line.name_key, self.name_threshold)
+        fuzzy_groups: Dict[float, List[OpenInvoice]] = {}
+        for score, key in similar:
+            hits = [invoice for invoice in index.open_by_name(key) if invoice.outstanding == amount]
+            if hits:
+                fuzzy_groups.setdefault(score, []).append(hits[0])
+        if fuzzy_groups:
+            best = fuzzy_groups[max(fuzzy_groups)]
+            if len(best) == 1:
+                return self._claim(line, STRATEGY_FUZZY_NAME, best)
+            return LineMatch(line, AMBIGUOUS, STRATEGY_FUZZY_NAME, candidates=best,
+                             message="名義の近い顧客が複数あります")
+
+        # 3. 同一顧客の複数請求をまとめて振り込んだ場合
+        named = same_name or (index.open_by_name(similar[0][1]) if len(similar) == 1 else [])
+        if len(named) > 1 and sum(invoice.outstanding for invoice in named) == amount:
+            return self._claim(line, STRATEGY_CUSTOMER_TOTAL, named)
+
+        # 4. 金額のみ一致（名義が異なる振込は自動消込しない）
+        by_amount = index.open_by_amount(amount)
+        if len(by_amount) == 1:
+            return LineMatch(line, SUGGESTED, STRATEGY_AMOUNT_ONLY, candidates=by_amount,
+                             message="金額のみ一致しました（振込名義を確認してください）")
+        if by_amount:
+            return LineMatch(line, AMBIGUOUS, STRATEGY_AMOUNT_ONLY, candidates=by_amount,
+                             message="同額の未入金請求書が複数あります")
+
+        # 5. 振込手数料を差し引いて振り込まれた場合
+        if self.fee_tolerance and named:
+            short = [invoice for invoice in named if 0 < invoice.outstanding - amount <= self.fee_tolerance]
+            if short:
+                return LineMatch(line, SUGGESTED, STRATEGY_FEE_DEDUCTED, candidates=short,
+                                 message=f"請求額との差額 {short[0].outstanding - amount}円（振込手数料の可能性）")
+
+        return LineMatch(line, UNMATCHED, candidates=named, message="該当する未入金請求書がありません")
+
+    def reconcile(self, lines: Iterable[Any],
+                  recorded_transactions: Optional[Callable[[List[str]], Set[str]]] = None,
+                  chunk_size: int = 1000,
+                  recorded_line_keys: Optional[Callable[[List[str]], Set[str]]] = None) -> List[LineMatch]:
+        """
+        明細を順に照合（iter_statement_lines の出力をそのまま渡せる）
+        recorded_transactions: 取引番号のリストから記録済みのものを返す関数（chunk_size 行ごとに1回呼ぶ）
+        recorded_line_keys: 取引番号の無い明細の line_key のリストから記録済みのものを返す関数
+        同じファイル内で取引番号（無ければ line_key）が重複した2行目以降も duplicate にする
+        """
+        results = []
+        chunk: List[Any] = []
+        seen: Set[str] = set()
+
+        def flush():
+            statement_lines = [line for line in chunk if isinstance(line, StatementLine)]
+            ids = [line.transaction_id for line in statement_lines if line.transaction_id]
+            keys = [line.line_key for line in statement_lines if not line.transaction_id]
+            recorded = recorded_transactions(ids) if recorded_transactions and ids else set()
+            recorded_keys = recorded_line_keys(keys) if recorded_line_keys and keys else set()
+            for line in chunk:
+                if isinstance(line, StatementFormatError):
+                    results.append(LineMatch(None, ERROR, message=str(line), line_no=line.line_no))
+                elif line.transaction_id and line.transaction_id in recorded:
+                    results.append(LineMatch(line, DUPLICATE, message="この取引番号の入金は記録済みです"))
+                elif not line.transaction_id and line.line_key in recorded_keys:
+                    results.append(LineMatch(line, DUPLICATE, message="同じ内容の入金は記録済みです"))
+                elif line.dedup_key in seen:
+                    results.append(LineMatch(line, DUPLICATE, message="入金明細ファイル内で同じ明細が重複しています"))
+                else:
+                    seen.add(line.dedup_key)
+                    results.append(self.match(line))
+            chunk.clear()
+
+        for line in lines:
+            chunk.append(line)
+            if len(chunk) >= chunk_size:
+                flush()
+        flush()
+        return results
+
+def summarize(results: List[LineMatch]) -> Dict[str, Any]:
+    """照合結果の件数・金額集計"""
+    counts: Dict[str, int] = {}
+    matched_amount = 0
+    for result in results:
+        counts[result.status] = counts.get(result.status, 0) + 1
+        if result.status == MATCHED:
+            matched_amount += sum(amount for _, amount in result.allocations)
+    return {
+        'total_lines': len(results),
+        'status_counts': counts,
+        'matched_amount': matched_amount,
+    }
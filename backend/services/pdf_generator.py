@@ -27,6 +27,9 @@ import logging
 from functools import lru_cache
 import time
 
+from .totals_engine import estimate_totals_engine
+from .prometheus_metrics import CACHE_HITS, CACHE_MISSES, PDF_GENERATION_ERRORS, PDF_RENDER_DURATION
+
 # ロギング設定
 logger = logging.getLogger(__name__)
 
@@ -237,9 +240,32 @@ class GardenEstimatePDFGenerator:
             cache_key = self._cache.get_key(estimate_data)
             cached_pdf = self._cache.get(cache_key)
             if cached_pdf:
+                CACHE_HITS.inc("pdf")
                 logger.info("PDFキャッシュヒット")
                 return BytesIO(cached_pdf)
+            CACHE_MISSES.inc("pdf")
+        
+        started = time.perf_counter()
+        try:
+            buffer = self._render_estimate_pdf(estimate_data)
+        except Exception:
+            PDF_GENERATION_ERRORS.inc("estimate")
+            raise
+        PDF_RENDER_DURATION.observe(time.perf_counter() - started, "estimate")
         
+        # キャッシュに保存
+        if self.enable_cache:
+            pdf_data = buffer.getvalue()
+            self._cache.set(cache_key, pdf_data)
+            buffer.seek(0)
+        
+        # メモリ最適化
+        gc.collect()
+        
+        return buffer
+    
+    def _render_estimate_pdf(self, estimate_data: Dict[str, Any]) -> BytesIO:
+        """見積書PDFの描画"""
         buffer = BytesIO()
         doc = SimpleDocTemplate(
             buffer,
@@ -284,16 +310,6 @@ class GardenEstimatePDFGenerator:
         # PDF生成
         doc.build(story)
         buffer.seek(0)
-        
-        # キャッシュに保存
-        if self.enable_cache:
-            pdf_data = buffer.getvalue()
-            self._cache.set(cache_key, pdf_data)
-            buffer.seek(0)
-        
-        # メモリ最適化
-        gc.collect()
-        
         return buffer
     
     def _create_cover_page(self, estimate_data: Dict[str, Any]) -> List:
@@ -451,12 +467,8 @@ class GardenEstimatePDFGenerator:
         adjustment = estimate_data.get('adjustment_amount', 0)
         total_before_tax = subtotal + adjustment
         
-        # 消費税計算（標準税率10%、軽減税率8%対応）
-        tax_rate_standard = 0.10
-        tax_rate_reduced = 0.08
-        
-        # 項目別税率判定（簡略化：植栽関連は軽減税率対象外、資材等は標準税率）
-        standard_tax_amount = int(total_before_tax * tax_rate_standard)
+        # 消費税計算（標準税率10%、1円未満切り捨て）
+        standard_tax_amount = estimate_totals_engine.tax_for(total_before_tax)
         total_with_tax = total_before_tax + standard_tax_amount
         
         # 金額表示テーブル
@@ -559,7 +571,7 @@ class GardenEstimatePDFGenerator:
         summary_data.append(['小計', f"¥ {total_amount:,}", ''])
         
         # 消費税・合計
-        tax_amount = int(total_amount * 0.10)
+        tax_amount = estimate_totals_engine.tax_for(total_amount)
         final_total = total_amount + tax_amount
         
         summary_data.append(['消費税（10%）', f"¥ {tax_amount:,}", ''])
@@ -634,7 +646,9 @@ class GardenEstimatePDFGenerator:
                     # 明細行
                     quantity = item.get('quantity', 0)
                     unit_price = item.get('unit_price', 0)
-                    line_total = quantity * unit_price + item.get('line_item_adjustment', 0)
+                    line_total = estimate_totals_engine.line_amount(
+                        quantity, unit_price, item.get('line_item_adjustment', 0)
+                    )
                     
                     detail_data.append([
                         f"  {item.get('item_description', '')}",
@@ -753,8 +767,9 @@ class GardenEstimatePDFGenerator:
             elif item.get('item_type') == 'item':
                 quantity = item.get('quantity', 0)
                 unit_price = item.get('unit_price', 0)
-                adjustment = item.get('line_item_adjustment', 0)
-                line_total = quantity * unit_price + adjustment
+                line_total = estimate_totals_engine.line_amount(
+                    quantity, unit_price, item.get('line_item_adjustment', 0)
+                )
                 
                 if current_category not in category_totals:
                     category_totals[current_category] = 0
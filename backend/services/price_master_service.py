@@ -11,9 +11,12 @@ import pandas as pd
 import io
 import json
 from decimal import Decimal
+from fastapi import HTTPException
 
 from ..database.database import get_db
 from ..models.models import PriceMaster, PriceCategory, PriceHistory, SeasonalPricing, Supplier, ItemSupplier
+from .category_tree import CategoryTree, category_tree_cache, load_category_tree, subtree_category_ids
+from .pagination import KeysetOrder, column_is_nullable, paginate
 
 
 class PriceMasterService:
@@ -28,53 +31,16 @@ class PriceMasterService:
     # ======================================
     
     def get_category_tree(self) -> List[Dict[str, Any]]:
-        """カテゴリ階層ツリー取得"""
+        """カテゴリ階層ツリー取得（1クエリで組み立て、会社ごとにキャッシュ）"""
         try:
-            # ルートカテゴリ取得
-            root_categories = self.db.query(PriceCategory).filter(
-                and_(
-                    PriceCategory.company_id == self.company_id,
-                    PriceCategory.parent_category_id.is_(None),
-                    PriceCategory.is_active == True
-                )
-            ).order_by(PriceCategory.sort_order, PriceCategory.category_name).all()
-            
-            tree = []
-            for root in root_categories:
-                tree.append(self._build_category_node(root))
-            
-            return tree
+            return self._category_tree().roots
         except Exception as e:
             raise Exception(f"カテゴリツリー取得エラー: {str(e)}")
     
-    def _build_category_node(self, category: PriceCategory) -> Dict[str, Any]:
-        """カテゴリノード構築（再帰）"""
-        node = {
-            "category_id": category.category_id,
-            "category_code": category.category_code,
-            "category_name": category.category_name,
-            "category_name_kana": category.category_name_kana,
-            "level_depth": category.level_depth,
-            "sort_order": category.sort_order,
-            "icon_name": category.icon_name,
-            "color_code": category.color_code,
-            "is_leaf_category": category.is_leaf_category,
-            "children": []
-        }
-        
-        # 子カテゴリ取得
-        children = self.db.query(PriceCategory).filter(
-            and_(
-                PriceCategory.company_id == self.company_id,
-                PriceCategory.parent_category_id == category.category_id,
-                PriceCategory.is_active == True
-            )
-        ).order_by(PriceCategory.sort_order, PriceCategory.category_name).all()
-        
-        for child in children:
-            node["children"].append(self._build_category_node(child))
-        
-        return node
+    def _category_tree(self) -> CategoryTree:
+        return category_tree_cache.get_or_build(
+            self.db, self.company_id, lambda: load_category_tree(self.db, self.company_id)
+        )
     
     def create_category(self, category_data: Dict[str, Any]) -> Dict[str, Any]:
         """カテゴリ作成"""
@@ -124,14 +90,17 @@ class PriceMasterService:
     def search_price_items(self, 
                           search_text: Optional[str] = None,
                           category_id: Optional[int] = None,
+                          include_subcategories: bool = False,
                           supplier_id: Optional[int] = None,
                           price_range: Optional[Dict[str, float]] = None,
                           is_active: bool = True,
                           sort_by: str = "item_name",
                           sort_order: str = "asc",
                           page: int = 1,
-                          per_page: int = 50) -> Dict[str, Any]:
-        """単価マスター検索"""
+                          per_page: int = 50,
+                          cursor: Optional[str] = None,
+                          total_mode: str = "cached") -> Dict[str, Any]:
+        """単価マスター検索（cursor 指定時はキーセットページネーション）"""
         try:
             query = self.db.query(PriceMaster).filter(
                 and_(
@@ -153,9 +122,15 @@ class PriceMasterService:
                         )
                     )
             
-            # カテゴリフィルター
+            # カテゴリフィルター（include_subcategories 指定時は経路の前方一致で配下も含める）
             if category_id:
-                query = query.filter(PriceMaster.category_id == category_id)
+                category_path = self._category_tree().paths.get(category_id) if include_subcategories else None
+                if category_path:
+                    query = query.filter(
+                        PriceMaster.category_id.in_(subtree_category_ids(self.company_id, category_path))
+                    )
+                else:
+                    query = query.filter(PriceMaster.category_id == category_id)
             
             # 仕入先フィルター
             if supplier_id:
@@ -170,17 +145,23 @@ class PriceMasterService:
                 if price_range.get("max"):
                     query = query.filter(PriceMaster.final_price <= price_range["max"])
             
-            # ソート
-            sort_column = getattr(PriceMaster, sort_by, PriceMaster.item_name)
-            if sort_order == "desc":
-                query = query.order_by(desc(sort_column))
-            else:
-                query = query.order_by(asc(sort_column))
-            
-            # ページネーション
-            total_count = query.count()
-            offset = (page - 1) * per_page
-            items = query.offset(offset).limit(per_page).all()
+            # ソート・ページネーション（(ソート項目, item_id) のキーセット）
+            # ソート項目はテーブルのカラムに限定（NULL を含み得るカラムは末尾に並べる）
+            if sort_by not in PriceMaster.__table__.columns:
+                sort_by = "item_name"
+            sort_column = getattr(PriceMaster, sort_by)
+            descending = sort_order == "desc"
+            order = (
+                KeysetOrder(sort_column, descending, nullable=column_is_nullable(sort_column)),
+                KeysetOrder(PriceMaster.item_id, descending),
+            )
+            result = paginate(
+                query, order, per_page,
+                namespace=f"price_master:{self.company_id}",
+                cursor=cursor, page=page, total_mode=total_mode,
+            )
+            total_count = result.total
+            items = result.items
             
             # 結果変換
             result_items = []
@@ -208,8 +189,12 @@ class PriceMasterService:
                 "total_count": total_count,
                 "page": page,
                 "per_page": per_page,
-                "total_pages": (total_count + per_page - 1) // per_page
+                "total_pages": (total_count + per_page - 1) // per_page if total_count is not None else None,
+                "next_cursor": result.next_cursor,
+                "has_more": result.has_more
             }
+        except HTTPException:
+            raise
         except Exception as e:
             raise Exception(f"単価マスター検索エラー: {str(e)}")
     
@@ -0,0 +1,373 @@
+"""
+Garden DX - Prometheus メトリクス
+/metrics（Prometheus テキスト形式 0.0.4）で公開する計測値の定義と集計。
+- 記録はスレッドごとのシャードへの加算のみ（ロックなし）。公開時に全シャードを合算する
+- gunicorn 等の複数ワーカーでは PROMETHEUS_MULTIPROC_DIR にワーカーごとの集計を定期的に書き出し、
+  公開時に全ワーカー分を合算する（カウンター・ヒストグラムは終了したワーカー分も含め、ゲージは稼働中のみ）
+- HTTP（ルート別レイテンシ・実行中リクエスト数）、DBクエリ（SQLAlchemy イベント）、PDF生成、キャッシュ
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# レイテンシのバケット上限（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+
+
+class _Metric:
+    """
+    メトリクスの基底クラス
+    値はスレッドローカルのシャード（ラベル値 → 値）に書き込み、他スレッドとは共有しない。
+    シャードの登録（スレッドごとに初回のみ）も list.append のみで、GILにより不可分。
+    """
+
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._local = threading.local()
+        self._shards: List[Dict[LabelValues, Any]] = []
+
+    def _shard(self) -> Dict[LabelValues, Any]:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            self._shards.append(shard)
+            return shard
+
+    def _values(self) -> Iterable[Tuple[LabelValues, Any]]:
+        # list() による dict のコピーはGILを保持したまま行われるため、書き込み中のスレッドがあっても安全
+        for shard in list(self._shards):
+            yield from list(shard.items())
+
+    def state(self) -> Dict[str, Any]:
+        return {
+            "type": self.type_name,
+            "help": self.documentation,
+            "labels": list(self.label_names),
+            "samples": self._merge(),
+        }
+
+    def _merge(self) -> Dict[LabelValues, Any]:
+        merged: Dict[LabelValues, float] = {}
+        for labels, value in self._values():
+            merged[labels] = merged.get(labels, 0) + value
+        return merged
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def inc(self, *labels: str, amount: float = 1):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    """加算型ゲージ（実行中リクエスト数など、inc/dec の合計が値になるもの）"""
+
+    type_name = "gauge"
+
+    def inc(self, *labels: str, amount: float = 1):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def dec(self, *labels: str, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels: str):
+        shard = self._shard()
+        counts = shard.get(labels)
+        if counts is None:
+            # バケットごとの件数（最後は上限超過）＋合計値
+            counts = shard[labels] = [0] * (len(self.buckets) + 2)
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def state(self) -> Dict[str, Any]:
+        state = super().state()
+        state["buckets"] = list(self.buckets)
+        return state
+
+    def _merge(self) -> Dict[LabelValues, List[float]]:
+        merged: Dict[LabelValues, List[float]] = {}
+        for labels, counts in self._values():
+            total = merged.get(labels)
+            if total is None:
+                merged[labels] = list(counts)
+            else:
+                for index, value in enumerate(counts):
+                    total[index] += value
+        return merged
+
+
+class MetricsRegistry:
+    """メトリクスの登録と集計"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"メトリクス {metric.name} は登録済みです")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, label_names))
+
+    def gauge(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, label_names))
+
+    def histogram(self, name: str, documentation: str, label_names: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, label_names, buckets))
+
+    def collect(self) -> Dict[str, Dict[str, Any]]:
+        """名前 → {type, help, labels, samples[, buckets]}"""
+        return {name: metric.state() for name, metric in self._metrics.items()}
+
+
+def merge_states(states: Iterable[Dict[str, Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+    """複数ワーカーの集計を合算"""
+    merged: Dict[str, Dict[str, Any]] = {}
+    for state in states:
+        for name, family in state.items():
+            target = merged.get(name)
+            if target is None:
+                merged[name] = dict(family, samples=dict(family["samples"]))
+                continue
+            samples = target["samples"]
+            for labels, value in family["samples"].items():
+                current = samples.get(labels)
+                if current is None:
+                    samples[labels] = list(value) if isinstance(value, list) else value
+                elif isinstance(value, list):
+                    samples[labels] = [a + b for a, b in zip(current, value)]
+                else:
+                    samples[labels] = current + value
+    return merged
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def render(state: Dict[str, Dict[str, Any]]) -> str:
+    """Prometheus テキスト形式へ変換"""
+    lines = []
+    for name in sorted(state):
+        family = state[name]
+        help_text = family["help"].replace("\\", "\\\\").replace("\n", "\\n")
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {family['type']}")
+        names = family["labels"]
+        for labels in sorted(family["samples"]):
+            value = family["samples"][labels]
+            if family["type"] != "histogram":
+                lines.append(f"{name}{_format_labels(names, labels)} {_format_value(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(list(family["buckets"]) + [math.inf], value[:-1]):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{name}_bucket{_format_labels(names, labels, le)} {_format_value(cumulative)}")
+            lines.append(f"{name}_sum{_format_labels(names, labels)} {_format_value(value[-1])}")
+            lines.append(f"{name}_count{_format_labels(names, labels)} {_format_value(cumulative)}")
+    return "\n".join(lines) + "\n"
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class MultiprocessExporter:
+    """
+    複数ワーカーの集計（ワーカーごとのファイルを合算）
+    各ワーカーは interval_seconds ごとに自身の集計を書き出し、公開するワーカーは直前に自身の分を書き出す。
+    ディレクトリはマスター起動前に空にすること（前回起動時のファイルが残ると合算される）。
+    """
+
+    PREFIX = "metrics_"
+
+    def __init__(self, registry: MetricsRegistry, directory: str, interval_seconds: float = 5.0,
+                 pid: Callable[[], int] = os.getpid, pid_alive: Callable[[int], bool] = _pid_alive):
+        self.registry = registry
+        self.directory = directory
+        self.interval_seconds = interval_seconds
+        self.pid = pid
+        self.pid_alive = pid_alive
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def flush(self):
+        """自ワーカーの集計を書き出し（一時ファイルから置き換え、読み込み側が途中の内容を見ないように）"""
+        pid = self.pid()
+        state = {
+            name: dict(family, samples=[[list(labels), value] for labels, value in family["samples"].items()])
+            for name, family in self.registry.collect().items()
+        }
+        path = os.path.join(self.directory, f"{self.PREFIX}{pid}.json")
+        temporary = f"{path}.{threading.get_ident()}.tmp"
+        with open(temporary, "w") as output:
+            json.dump(state, output)
+        os.replace(temporary, path)
+
+    def collect(self) -> Dict[str, Dict[str, Any]]:
+        self.flush()
+        states = []
+        for filename in os.listdir(self.directory):
+            if not (filename.startswith(self.PREFIX) and filename.endswith(".json")):
+                continue
+            try:
+                pid = int(filename[len(self.PREFIX):-len(".json")])
+                with open(os.path.join(self.directory, filename)) as source:
+                    state = json.load(source)
+            except (ValueError, OSError):
+                continue
+            alive = self.pid_alive(pid)
+            states.append({
+                name: dict(family, samples={tuple(labels): value for labels, value in family["samples"]})
+                for name, family in state.items()
+                if alive or family["type"] != "gauge"
+            })
+        return merge_states(states)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="metrics-flush", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.flush()
+
+    def _run(self):
+        while not self._stop.wait(self.interval_seconds):
+            self.flush()
+
+
+# ==============================================
+# アプリ全体のメトリクス
+# ==============================================
+
+registry = MetricsRegistry()
+
+HTTP_REQUESTS = registry.counter(
+    "http_requests_total", "HTTPリクエスト数", ("method", "route", "status"))
+HTTP_REQUEST_DURATION = registry.histogram(
+    "http_request_duration_seconds", "HTTPリクエストの処理時間（秒）", ("method", "route"))
+HTTP_REQUESTS_IN_FLIGHT = registry.gauge(
+    "http_requests_in_flight", "処理中のHTTPリクエスト数")
+DB_QUERIES = registry.counter(
+    "garden_db_queries_total", "DBクエリ数", ("operation",))
+DB_QUERY_DURATION = registry.histogram(
+    "garden_db_query_duration_seconds", "DBクエリの実行時間（秒）", ("operation",))
+DB_QUERY_ERRORS = registry.counter(
+    "garden_db_query_errors_total", "DBクエリのエラー数", ("operation",))
+SLOW_QUERIES = registry.counter(
+    "garden_slow_queries_total", "実行時間がしきい値を超えたDBクエリ数", ("operation",))
+PDF_RENDER_DURATION = registry.histogram(
+    "garden_pdf_render_duration_seconds", "PDF生成時間（秒）", ("document",),
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0))
+PDF_GENERATION_ERRORS = registry.counter(
+    "garden_pdf_generation_errors_total", "PDF生成エラー数", ("document",))
+FUNCTION_DURATION = registry.histogram(
+    "garden_function_duration_seconds", "performance_monitor 対象関数の実行時間（秒）", ("function",))
+CACHE_HITS = registry.counter(
+    "garden_cache_hits_total", "キャッシュヒット数", ("cache",))
+CACHE_MISSES = registry.counter(
+    "garden_cache_misses_total", "キャッシュミス数", ("cache",))
+HTTP_REQUEST_QUERIES = registry.histogram(
+    "garden_http_request_queries", "1リクエストあたりのDBクエリ数", ("route",),
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200))
+QUERY_BUDGET_EXCEEDED = registry.counter(
+    "garden_query_budget_exceeded_total", "クエリ予算を超過したリクエスト数", ("route", "reason"))
+
+# PROMETHEUS_MULTIPROC_DIR を指定すると複数ワーカーの合算を公開
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+multiprocess_exporter = MultiprocessExporter(registry, MULTIPROC_DIR) if MULTIPROC_DIR else None
+
+def generate_latest() -> str:
+    """/metrics の応答本文"""
+    if multiprocess_exporter is not None:
+        return render(multiprocess_exporter.collect())
+    return render(registry.collect())
+
+
+_OPERATIONS = ("SELECT", "INSERT", "UPDATE", "DELETE")
+
+def query_operation(statement: str) -> str:
+    head = statement.lstrip()[:6].upper()
+    return head if head in _OPERATIONS else "OTHER"
+
+def instrument_engine(engine, slow_query_seconds: float = 1.0):
+    """SQLAlchemy エンジンのクエリ数・実行時間を計測（カーソル実行の前後イベント）"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_query(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def end_query(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["metrics_query_start"].pop()
+        operation = query_operation(statement)
+        DB_QUERIES.inc(operation)
+        DB_QUERY_DURATION.observe(elapsed, operation)
+        if elapsed >= slow_query_seconds:
+            SLOW_QUERIES.inc(operation)
+
+    @event.listens_for(engine, "handle_error")
+    def failed_query(exception_context):
+        connection = exception_context.connection
+        starts = connection.info.get("metrics_query_start") if connection is not None else None
+        if starts:
+            starts.pop()
+        DB_QUERY_ERRORS.inc(query_operation(exception_context.statement or ""))
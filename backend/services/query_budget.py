@@ -0,0 +1,183 @@
+"""
+Garden DX - クエリ予算・N+1検出
+SQLAlchemy のカーソル実行イベントで、リクエストごとのクエリ数と
+同一形状のクエリ（リテラル・バインド変数を除いた指紋）の繰り返し回数を集計する。
+- ルートごとの予算は @query_budget(max_queries=..., max_repeats=...) で宣言
+- strict（テスト・開発時）: 予算超過で QueryBudgetExceeded を送出し、テストを失敗させる
+- warn（本番の既定）: 予算超過を Prometheus カウンターとログ警告で通知
+- off: 集計しない
+モードは QUERY_BUDGET_MODE（未指定時は DEBUG=true なら strict、それ以外は warn）。
+"""
+
+import logging
+import os
+import re
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+
+from .prometheus_metrics import HTTP_REQUEST_QUERIES, QUERY_BUDGET_EXCEEDED
+
+logger = logging.getLogger(__name__)
+
+MODES = ("strict", "warn", "off")
+
+# 予算を宣言していないルートにも適用する、同一クエリの繰り返し上限（N+1の検出）
+DEFAULT_MAX_REPEATS = 10
+
+QUERY_BUDGET_MODE = os.getenv(
+    "QUERY_BUDGET_MODE",
+    "strict" if os.getenv("DEBUG", "false").lower() == "true" else "warn"
+)
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_PARAMETER = re.compile(r"%\(\w+\)s|(?<![:\w]):(?!:)\w+|\$\d+|\b\d+(?:\.\d+)?\b")
+_PARAMETER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(statement: str) -> str:
+    """
+    クエリの指紋（リテラル・バインド変数を ? に、IN リストを (?) にまとめる）
+    ORM が生成する文字列は同じものが繰り返されるため、結果をキャッシュする
+    """
+    normalized = _STRING_LITERAL.sub("?", statement)
+    normalized = _PARAMETER.sub("?", normalized)
+    normalized = _PARAMETER_LIST.sub("(?)", normalized)
+    return _WHITESPACE.sub(" ", normalized).strip()
+
+
+class QueryStats:
+    """1リクエスト（または track_queries ブロック）内で実行されたクエリの集計"""
+
+    def __init__(self):
+        self.count = 0
+        self.fingerprints: Counter = Counter()
+
+    def record(self, statement: str):
+        self.count += 1
+        self.fingerprints[fingerprint(statement)] += 1
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """threshold 回以上実行された指紋（回数の多い順）"""
+        return [(key, count) for key, count in self.fingerprints.most_common() if count >= threshold]
+
+
+@dataclass(frozen=True)
+class QueryBudget:
+    """ルートのクエリ予算（max_queries=None はクエリ数の上限なし）"""
+    max_queries: Optional[int] = None
+    max_repeats: int = DEFAULT_MAX_REPEATS
+
+    def violations(self, stats: QueryStats) -> List[str]:
+        reasons = []
+        if self.max_queries is not None and stats.count > self.max_queries:
+            reasons.append("max_queries")
+        if stats.repeated(self.max_repeats + 1):
+            reasons.append("repeated")
+        return reasons
+
+
+class QueryBudgetExceeded(Exception):
+    """クエリ予算超過（strict モード）"""
+
+    def __init__(self, route: str, stats: QueryStats, budget: QueryBudget, reasons: List[str]):
+        self.route = route
+        self.stats = stats
+        self.budget = budget
+        self.reasons = reasons
+        super().__init__(describe_violation(route, stats, budget))
+
+
+def describe_violation(route: str, stats: QueryStats, budget: QueryBudget) -> str:
+    message = f"クエリ予算超過: {route}（{stats.count}件 / 予算 {budget.max_queries or '上限なし'}）"
+    top = stats.repeated(2)[:3]
+    if top:
+        message += "\n繰り返し実行されたクエリ:\n" + "\n".join(f"  {count}回: {key}" for key, count in top)
+    return message
+
+
+def query_budget(max_queries: Optional[int] = None, max_repeats: int = DEFAULT_MAX_REPEATS):
+    """
+    ルートのクエリ予算を宣言するデコレーター
+    関数をラップせず属性を付与するだけのため、FastAPI の引数解決には影響しない
+    """
+    budget = QueryBudget(max_queries=max_queries, max_repeats=max_repeats)
+
+    def decorator(func):
+        func.__query_budget__ = budget
+        return func
+
+    return decorator
+
+
+# 現在のリクエストの集計（同期エンドポイントのスレッドプールにもコンテキストごと引き継がれる）
+_current_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+@contextmanager
+def track_queries() -> Iterator[QueryStats]:
+    """ブロック内で実行されたクエリを集計（バッチ処理・テスト用）"""
+    stats = QueryStats()
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+def track_engine(engine):
+    """エンジンのクエリを実行中の集計に記録（集計中でなければ何もしない）"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def record_query(conn, cursor, statement, parameters, context, executemany):
+        stats = _current_stats.get()
+        if stats is not None:
+            stats.record(statement)
+
+def enforce_budget(stats: QueryStats, budget: QueryBudget, route: str, mode: str = QUERY_BUDGET_MODE) -> List[str]:
+    """予算超過の判定（strict は例外、warn はメトリクスとログ）。超過理由を返す"""
+    HTTP_REQUEST_QUERIES.observe(stats.count, route)
+    reasons = budget.violations(stats)
+    if not reasons:
+        return reasons
+    if mode == "strict":
+        raise QueryBudgetExceeded(route, stats, budget, reasons)
+    for reason in reasons:
+        QUERY_BUDGET_EXCEEDED.inc(route, reason)
+    logger.warning(describe_violation(route, stats, budget))
+    return reasons
+
+
+class QueryBudgetMiddleware:
+    """リクエストごとにクエリを集計し、ルートの予算（未宣言なら default_budget）と照合するASGIミドルウェア"""
+
+    def __init__(
+        self,
+        app,
+        mode: str = QUERY_BUDGET_MODE,
+        default_budget: QueryBudget = QueryBudget(),
+        exempt_paths: Iterable[str] = ("/health", "/metrics"),
+    ):
+        if mode not in MODES:
+            raise ValueError(f"QUERY_BUDGET_MODE は {', '.join(MODES)} のいずれかです: {mode}")
+        self.app = app
+        self.mode = mode
+        self.default_budget = default_budget
+        self.exempt_paths = tuple(exempt_paths)
+
+    async def __call__(self, scope, receive, send):
+        if self.mode == "off" or scope["type"] != "http" or scope["path"].startswith(self.exempt_paths):
+            await self.app(scope, receive, send)
+            return
+
+        with track_queries() as stats:
+            await self.app(scope, receive, send)
+
+        route = scope.get("route")
+        budget = getattr(getattr(route, "endpoint", None), "__query_budget__", self.default_budget)
+        enforce_budget(stats, budget, getattr(route, "path", "unmatched"), self.mode)
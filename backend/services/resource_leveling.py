@@ -0,0 +1,278 @@
+"""
+Garden DX - 資源平準化（班・重機の重複割当チェック）
+会社内の進行中プロジェクトのタスクを担当（班・重機）ごとの区間索引にまとめ、
+同じ資源の期間重複を O(n log n) で検出する。
+平準化は優先規則によるリストスケジューリングで、余裕日数の少ないタスクから資源を確保し、
+重複する非クリティカルタスクを余裕日数の範囲で資源が空く日まで後ろ倒しにする。
+クリティカルタスク（余裕0日）は動かさず、余裕日数を超える移動が必要な重複は未解消として報告する。
+日付は開始日・終了日とも作業日に含む（ProjectTask と同じ）。
+"""
+
+import heapq
+import re
+from bisect import bisect_right
+from dataclasses import dataclass, field, replace
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .schedule_engine import ScheduleGraph
+
+ONE_DAY = timedelta(days=1)
+
+# 担当欄の区切り（「田中班、バックホウ1号」など複数資源の指定）
+RESOURCE_SEPARATOR = re.compile(r"[,、，/／;；]")
+
+def parse_resources(assigned_to: Optional[str]) -> Tuple[str, ...]:
+    """担当欄を資源名のタプルへ（空白のみ・重複は除く）"""
+    if not assigned_to:
+        return ()
+    names = (name.strip() for name in RESOURCE_SEPARATOR.split(assigned_to))
+    return tuple(dict.fromkeys(name for name in names if name))
+
+
+@dataclass
+class ResourceTask:
+    task_id: int
+    project_id: int
+    resources: Tuple[str, ...]
+    start_date: date
+    end_date: date
+    dependencies: Tuple[int, ...] = ()
+    priority: int = 0          # 大きいほど優先（同じ余裕日数の場合）
+    locked: bool = False       # 着手済みなど、移動しないタスク
+    slack_days: int = 0        # トータルフロート（compute_slack で設定）
+
+    @property
+    def duration(self) -> timedelta:
+        return self.end_date - self.start_date
+
+
+@dataclass
+class ResourceConflict:
+    resource: str
+    first_task_id: int
+    second_task_id: int
+    overlap_start: date
+    overlap_end: date
+
+    @property
+    def overlap_days(self) -> int:
+        return (self.overlap_end - self.overlap_start).days + 1
+
+    def as_dict(self) -> Dict:
+        return {
+            "resource": self.resource,
+            "task_ids": [self.first_task_id, self.second_task_id],
+            "overlap_start": self.overlap_start,
+            "overlap_end": self.overlap_end,
+            "overlap_days": self.overlap_days,
+        }
+
+
+@dataclass
+class LevelingMove:
+    task_id: int
+    project_id: int
+    previous_start_date: date
+    previous_end_date: date
+    start_date: date
+    end_date: date
+    slack_days: int
+
+    @property
+    def days(self) -> int:
+        return (self.start_date - self.previous_start_date).days
+
+    @property
+    def exceeds_slack(self) -> bool:
+        """余裕日数を超える移動（工期に影響）"""
+        return self.days > self.slack_days
+
+    def as_dict(self) -> Dict:
+        return {
+            "task_id": self.task_id,
+            "project_id": self.project_id,
+            "previous_start_date": self.previous_start_date,
+            "previous_end_date": self.previous_end_date,
+            "start_date": self.start_date,
+            "end_date": self.end_date,
+            "days": self.days,
+            "slack_days": self.slack_days,
+            "exceeds_slack": self.exceeds_slack,
+        }
+
+
+@dataclass
+class LevelingResult:
+    moves: List[LevelingMove] = field(default_factory=list)
+    unresolved: List[ResourceConflict] = field(default_factory=list)  # 余裕日数内の移動で解消できない重複
+
+
+def find_conflicts(tasks: Iterable[ResourceTask]) -> List[ResourceConflict]:
+    """
+    資源ごとの期間重複を検出
+    資源別に開始日順へ並べ、終了日のヒープで実行中のタスクを管理する（O(n log n + 重複数)）
+    """
+    by_resource: Dict[str, List[ResourceTask]] = {}
+    for task in tasks:
+        for resource in task.resources:
+            by_resource.setdefault(resource, []).append(task)
+
+    conflicts = []
+    for resource, resource_tasks in by_resource.items():
+        resource_tasks.sort(key=lambda task: (task.start_date, task.task_id))
+        active: List[Tuple[date, int, ResourceTask]] = []
+        for task in resource_tasks:
+            while active and active[0][0] < task.start_date:
+                heapq.heappop(active)
+            for end_date, _, other in active:
+                conflicts.append(ResourceConflict(
+                    resource, other.task_id, task.task_id, task.start_date, min(end_date, task.end_date)
+                ))
+            heapq.heappush(active, (task.end_date, task.task_id, task))
+    return conflicts
+
+
+def compute_slack(tasks: Iterable[ResourceTask]) -> Dict[int, ResourceTask]:
+    """
+    プロジェクト別に現在の日程での余裕日数（最遅開始 - 開始）を設定
+    最遅終了は後続タスクの最遅開始の前日、後続が無ければプロジェクトの最終終了日
+    """
+    by_id = {task.task_id: task for task in tasks}
+    by_project: Dict[int, List[ResourceTask]] = {}
+    for task in by_id.values():
+        by_project.setdefault(task.project_id, []).append(task)
+
+    for project_tasks in by_project.values():
+        ids = {task.task_id for task in project_tasks}
+        graph = ScheduleGraph(
+            dict.fromkeys(ids, 0),
+            {task.task_id: [d for d in task.dependencies if d in ids] for task in project_tasks}
+        )
+        project_end = max(task.end_date for task in project_tasks)
+        late_start: Dict[int, date] = {}
+        for task_id in reversed(graph.topological_order()):
+            task = by_id[task_id]
+            late_finish = min(
+                (late_start[successor] - ONE_DAY for successor in graph.successors[task_id]),
+                default=project_end,
+            )
+            late_start[task_id] = late_finish - task.duration
+            task.slack_days = max(0, (late_start[task_id] - task.start_date).days)
+    return by_id
+
+
+class ResourceCalendar:
+    """資源ごとの確保済み期間（開始日順、重なる・隣接する区間は結合して保持）"""
+
+    def __init__(self):
+        self.starts: Dict[str, List[date]] = {}
+        self.ends: Dict[str, List[date]] = {}
+
+    def blocking_end(self, resource: str, start_date: date, end_date: date) -> Optional[date]:
+        """期間と重なる確保済み区間の終了日（区間は重ならないため、end_date 以前に始まる最後の区間のみ確認）"""
+        starts = self.starts.get(resource)
+        if not starts:
+            return None
+        index = bisect_right(starts, end_date) - 1
+        if index >= 0 and self.ends[resource][index] >= start_date:
+            return self.ends[resource][index]
+        return None
+
+    def earliest_start(self, resources: Iterable[str], start_date: date, duration: timedelta) -> date:
+        """全資源が空いている最早開始日"""
+        resources = tuple(resources)
+        moved = True
+        while moved:
+            moved = False
+            for resource in resources:
+                blocking_end = self.blocking_end(resource, start_date, start_date + duration)
+                if blocking_end is not None:
+                    start_date = blocking_end + ONE_DAY
+                    moved = True
+        return start_date
+
+    def book(self, resource: str, start_date: date, end_date: date):
+        starts = self.starts.setdefault(resource, [])
+        ends = self.ends.setdefault(resource, [])
+        # 重なる・隣接する区間 [low, high) を1つに結合
+        low = bisect_right(starts, start_date)
+        if low > 0 and ends[low - 1] + ONE_DAY >= start_date:
+            low -= 1
+        high = bisect_right(starts, end_date + ONE_DAY)
+        if low < high:
+            start_date = min(start_date, starts[low])
+            end_date = max(end_date, ends[high - 1])
+        starts[low:high] = [start_date]
+        ends[low:high] = [end_date]
+
+
+def level_resources(tasks: Iterable[ResourceTask]) -> LevelingResult:
+    """
+    優先規則によるリストスケジューリング
+    先行タスクが確定したタスクを（余裕日数, 開始可能日, -優先度）の順に取り出し、
+    全資源が空く最早日に確保する。未確定の先行タスク数（waiting）が0になったタスクだけを
+    候補に加えるため、タスクはトポロジカル順に確定し、先行が常に後続より先に確定する。
+    移動しないタスク（locked）とクリティカルタスク（余裕0日）は元の日程で先に確保する。
+    クリティカルタスクと、資源が空く日が余裕日数を超えるタスクは工期に影響するため
+    資源の都合では移動せず（先行タスクの後ろ倒し分のみ移動）、残った重複を unresolved に返す
+    """
+    by_id = compute_slack(tasks)
+    result = LevelingResult()
+
+    # 資源の都合では移動しないタスクを先に確保
+    fixed = [task for task in by_id.values() if task.locked or task.slack_days == 0]
+    calendar = ResourceCalendar()
+    for task in fixed:
+        for resource in task.resources:
+            calendar.book(resource, task.start_date, task.end_date)
+
+    successors: Dict[int, List[int]] = {}
+    waiting: Dict[int, int] = {}
+    for task in by_id.values():
+        dependencies = [d for d in task.dependencies if d in by_id]
+        waiting[task.task_id] = len(dependencies)
+        for dependency in dependencies:
+            successors.setdefault(dependency, []).append(task.task_id)
+
+    ready_date: Dict[int, date] = {task_id: by_id[task_id].start_date for task_id in by_id}
+    heap = [
+        (task.slack_days, task.start_date, -task.priority, task.task_id)
+        for task in by_id.values() if waiting[task.task_id] == 0
+    ]
+    heapq.heapify(heap)
+    placed: List[ResourceTask] = []
+    while heap:
+        _, _, _, task_id = heapq.heappop(heap)
+        task = by_id[task_id]
+        start_date = task.start_date
+        if not task.locked:
+            start_date = ready_date[task_id]
+            if task.slack_days > 0:
+                leveled = calendar.earliest_start(task.resources, start_date, task.duration)
+                # 余裕日数を超える移動は行わない（重複は未解消として残る）
+                if (leveled - task.start_date).days <= task.slack_days:
+                    start_date = leveled
+            for resource in task.resources:
+                calendar.book(resource, start_date, start_date + task.duration)
+            if start_date != task.start_date:
+                result.moves.append(LevelingMove(
+                    task.task_id, task.project_id, task.start_date, task.end_date,
+                    start_date, start_date + task.duration, task.slack_days
+                ))
+        end_date = start_date + task.duration
+        placed.append(replace(task, start_date=start_date, end_date=end_date))
+
+        for successor in successors.get(task_id, ()):
+            if end_date + ONE_DAY > ready_date[successor]:
+                ready_date[successor] = end_date + ONE_DAY
+            waiting[successor] -= 1
+            if waiting[successor] == 0:
+                successor_task = by_id[successor]
+                heapq.heappush(heap, (
+                    successor_task.slack_days, ready_date[successor], -successor_task.priority, successor
+                ))
+
+    # 平準化後の日程に残る重複（移動しないタスク同士・余裕日数内で解消できないもの）
+    result.unresolved = find_conflicts(placed)
+    return result
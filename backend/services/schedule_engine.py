@@ -0,0 +1,293 @@
+"""
+Garden DX - 工程スケジューリングエンジン（クリティカルパス法）
+タスクの所要日数と依存関係（先行タスク）から、トポロジカル順の前進計算・後退計算で
+最早/最遅開始・終了、余裕日数（トータルフロート）、クリティカルパスを O(V+E) で求める。
+所要日数は分単位の整数に換算して計算するため、0.5日などの端数でも誤差なく比較できる。
+"""
+
+from collections import deque
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Dict, Hashable, Iterable, List, Mapping, Optional, Tuple
+
+# 1日あたりの計算単位（分）
+TICKS_PER_DAY = 1440
+
+TaskId = Hashable
+
+def days_to_ticks(days: float) -> int:
+    return int(round(float(days) * TICKS_PER_DAY))
+
+def ticks_to_days(ticks: int) -> float:
+    return ticks / TICKS_PER_DAY
+
+def ticks_to_dates(base_date: date, start: int, finish: int) -> Tuple[date, date]:
+    """開始・終了オフセットを日付へ（開始は切り捨て、終了は切り上げ）"""
+    return (
+        base_date + timedelta(days=start // TICKS_PER_DAY),
+        base_date + timedelta(days=-(-finish // TICKS_PER_DAY)),
+    )
+
+
+class ScheduleError(ValueError):
+    """工程の依存関係が不正"""
+
+
+class ScheduleCycleError(ScheduleError):
+    """依存関係に循環がある"""
+
+    def __init__(self, cycle: List[TaskId]):
+        self.cycle = cycle
+        super().__init__("依存関係が循環しています: " + " → ".join(str(task_id) for task_id in cycle))
+
+
+@dataclass
+class ScheduledTask:
+    task_id: TaskId
+    duration: int
+    early_start: int
+    early_finish: int
+    late_start: int = 0
+    late_finish: int = 0
+
+    @property
+    def slack(self) -> int:
+        return self.late_start - self.early_start
+
+    @property
+    def critical(self) -> bool:
+        return self.slack == 0
+
+    def as_dict(self) -> Dict:
+        return {
+            "task_id": self.task_id,
+            "duration": ticks_to_days(self.duration),
+            "early_start": ticks_to_days(self.early_start),
+            "early_finish": ticks_to_days(self.early_finish),
+            "late_start": ticks_to_days(self.late_start),
+            "late_finish": ticks_to_days(self.late_finish),
+            "slack": ticks_to_days(self.slack),
+            "critical": self.critical,
+        }
+
+
+@dataclass
+class CriticalPathResult:
+    tasks: Dict[TaskId, ScheduledTask]
+    order: List[TaskId]      # トポロジカル順
+    project_duration: int    # 計算単位
+
+    @property
+    def critical_tasks(self) -> List[TaskId]:
+        return [task_id for task_id in self.order if self.tasks[task_id].critical]
+
+    @property
+    def project_days(self) -> float:
+        return ticks_to_days(self.project_duration)
+
+    def dates(self, base_date: date) -> Dict[TaskId, Tuple[date, date]]:
+        """最早開始・終了日"""
+        return {
+            task_id: ticks_to_dates(base_date, task.early_start, task.early_finish)
+            for task_id, task in self.tasks.items()
+        }
+
+
+class ScheduleGraph:
+    """工程の依存グラフ（先行・後続の隣接リスト）"""
+
+    def __init__(self, durations: Mapping[TaskId, float], dependencies: Mapping[TaskId, Iterable[TaskId]]):
+        self.durations: Dict[TaskId, int] = {task_id: days_to_ticks(days) for task_id, days in durations.items()}
+        self.predecessors: Dict[TaskId, List[TaskId]] = {task_id: [] for task_id in self.durations}
+        self.successors: Dict[TaskId, List[TaskId]] = {task_id: [] for task_id in self.durations}
+        for task_id, depends_on in dependencies.items():
+            if task_id not in self.durations:
+                raise ScheduleError(f"タスク {task_id} が存在しません")
+            for predecessor in dict.fromkeys(depends_on):
+                if predecessor not in self.durations:
+                    raise ScheduleError(f"タスク {task_id} の依存先 {predecessor} が存在しません")
+                self.predecessors[task_id].append(predecessor)
+                self.successors[predecessor].append(task_id)
+        for task_id, ticks in self.durations.items():
+            if ticks < 0:
+                raise ScheduleError(f"タスク {task_id} の所要日数が負です")
+
+    @classmethod
+    def from_tasks(cls, tasks: Iterable[Mapping], id_key: str = "id") -> "ScheduleGraph":
+        """工程タスク（id・duration・dependencies を持つ辞書）から作成"""
+        durations, dependencies = {}, {}
+        for task in tasks:
+            durations[task[id_key]] = task.get("duration") or 0
+            dependencies[task[id_key]] = task.get("dependencies") or []
+        return cls(durations, dependencies)
+
+    def topological_order(self) -> List[TaskId]:
+        """Kahn法（循環があれば ScheduleCycleError）"""
+        indegree = {task_id: len(predecessors) for task_id, predecessors in self.predecessors.items()}
+        queue = deque(task_id for task_id, count in indegree.items() if count == 0)
+        order = []
+        while queue:
+            task_id = queue.popleft()
+            order.append(task_id)
+            for successor in self.successors[task_id]:
+                indegree[successor] -= 1
+                if indegree[successor] == 0:
+                    queue.append(successor)
+        if len(order) != len(indegree):
+            raise ScheduleCycleError(self._find_cycle({task_id for task_id, count in indegree.items() if count > 0}))
+        return order
+
+    def _find_cycle(self, remaining: set) -> List[TaskId]:
+        # 残ったタスクは全て先行タスクを残りの中に持つため、先行を辿れば必ず循環に入る
+        task_id = next(iter(remaining))
+        seen: Dict[TaskId, int] = {}
+        path = []
+        while task_id not in seen:
+            seen[task_id] = len(path)
+            path.append(task_id)
+            task_id = next(p for p in self.predecessors[task_id] if p in remaining)
+        cycle = path[seen[task_id]:]
+        cycle.reverse()
+        return cycle + [cycle[0]]
+
+    def compute(self, earliest_starts: Optional[Mapping[TaskId, float]] = None,
+                project_duration: Optional[float] = None) -> CriticalPathResult:
+        """
+        前進計算・後退計算
+        earliest_starts: タスクごとの開始可能日（開始日からの日数）
+        project_duration: 工期（省略時は最終タスクの最早終了）
+        """
+        order = self.topological_order()
+        durations = self.durations
+        predecessors = self.predecessors
+        successors = self.successors
+        release = {task_id: days_to_ticks(days) for task_id, days in (earliest_starts or {}).items()}
+
+        tasks: Dict[TaskId, ScheduledTask] = {}
+        finish = 0
+        for task_id in order:
+            start = release.get(task_id, 0)
+            for predecessor in predecessors[task_id]:
+                predecessor_finish = tasks[predecessor].early_finish
+                if predecessor_finish > start:
+                    start = predecessor_finish
+            task = ScheduledTask(task_id, durations[task_id], start, start + durations[task_id])
+            tasks[task_id] = task
+            if task.early_finish > finish:
+                finish = task.early_finish
+
+        if project_duration is not None:
+            finish = max(finish, days_to_ticks(project_duration))
+        for task_id in reversed(order):
+            task = tasks[task_id]
+            late_finish = finish
+            for successor in successors[task_id]:
+                successor_start = tasks[successor].late_start
+                if successor_start < late_finish:
+                    late_finish = successor_start
+            task.late_finish = late_finish
+            task.late_start = late_finish - task.duration
+
+        return CriticalPathResult(tasks, order, finish)
+
+
+def critical_path_delay(tasks: Iterable[Mapping], today: date) -> Tuple[int, List[TaskId]]:
+    """
+    クリティカルパス上の遅延日数
+    未完了のクリティカルタスクが終了予定日を過ぎている日数の最大値（工期への影響日数）
+    """
+    tasks = list(tasks)
+    if not tasks:
+        return 0, []
+    result = ScheduleGraph.from_tasks(tasks).compute()
+    critical = set(result.critical_tasks)
+    delay = 0
+    for task in tasks:
+        if task["id"] in critical and task.get("status") != "completed" and task["end_date"] < today:
+            delay = max(delay, (today - task["end_date"]).days)
+    return delay, result.critical_tasks
+
+
+@dataclass
+class TaskShift:
+    """再計算で移動したタスク（差分）"""
+    task_id: TaskId
+    previous_start_date: date
+    previous_end_date: date
+    start_date: date
+    end_date: date
+
+    @property
+    def days(self) -> int:
+        return (self.start_date - self.previous_start_date).days
+
+    def as_dict(self) -> Dict:
+        return {
+            "task_id": self.task_id,
+            "previous_start_date": self.previous_start_date,
+            "previous_end_date": self.previous_end_date,
+            "start_date": self.start_date,
+            "end_date": self.end_date,
+            "days": self.days,
+        }
+
+
+def propagate_shifts(sources: Iterable[TaskId],
+                     successors: Mapping[TaskId, Iterable[TaskId]],
+                     predecessors: Mapping[TaskId, Iterable[TaskId]],
+                     dates: Mapping[TaskId, Tuple[date, date]],
+                     gap_days: int = 0) -> List[TaskShift]:
+    """
+    変更タスクの後続だけを再計算（後ろ倒しのみ、作業日数は維持）
+    sources: 日程が変わったタスク（日付は dates に反映済み）
+    successors / predecessors: 依存関係（後続は影響範囲内、先行は影響範囲のタスク分があればよい）
+    dates: 影響範囲のタスクとその先行タスクの (開始日, 終了日)
+    gap_days: 先行タスクの終了日から後続タスクの開始日までの最小日数（終了日を含む場合は1）
+    計算量は影響範囲（推移的な後続）の頂点数+辺数に比例する。
+    """
+    sources = list(dict.fromkeys(sources))
+
+    # 影響範囲（推移的な後続）
+    affected: Dict[TaskId, int] = {}
+    stack = list(sources)
+    while stack:
+        task_id = stack.pop()
+        for successor in successors.get(task_id, ()):
+            if successor not in affected:
+                affected[successor] = 0
+                stack.append(successor)
+
+    # 影響範囲内でのトポロジカル順に、先行タスクが動いたタスクのみ再計算
+    for task_id in affected:
+        affected[task_id] = sum(1 for predecessor in predecessors.get(task_id, ()) if predecessor in affected)
+    queue = deque(task_id for task_id, count in affected.items() if count == 0)
+    moved = set(sources)
+    current = {}
+    shifts = []
+    processed = 0
+    gap = timedelta(days=gap_days)
+    while queue:
+        task_id = queue.popleft()
+        processed += 1
+        task_predecessors = predecessors.get(task_id, ())
+        if any(predecessor in moved for predecessor in task_predecessors):
+            start_date, end_date = dates[task_id]
+            required = max(current.get(p, dates[p])[1] + gap for p in task_predecessors)
+            if required > start_date:
+                shift = TaskShift(task_id, start_date, end_date, required, end_date + (required - start_date))
+                current[task_id] = (shift.start_date, shift.end_date)
+                moved.add(task_id)
+                shifts.append(shift)
+        for successor in successors.get(task_id, ()):
+            affected[successor] -= 1
+            if affected[successor] == 0:
+                queue.append(successor)
+
+    if processed != len(affected):
+        remaining = {task_id for task_id, count in affected.items() if count > 0}
+        graph = ScheduleGraph(
+            dict.fromkeys(remaining, 0),
+            {task_id: [p for p in predecessors.get(task_id, ()) if p in remaining] for task_id in remaining}
+        )
+        raise ScheduleCycleError(graph._find_cycle(remaining))
+    return shifts
@@ -0,0 +1,684 @@
+"""
+Garden DX - 工程表ストア
+工程表（process_schedules）・工程タスク（process_tasks）・タスク間の依存関係
+（process_task_dependencies）を行単位で保存する。
+工程表はプロジェクトIDと工程表IDの索引で引き、タスクの追加・更新・削除は
+該当行だけを書き換える（工程表全体は書き直さない）。
+タスクの日程変更時は、依存関係を再帰CTEで辿った後続タスクだけを再計算する。
+進捗レポート用に、カテゴリ×ステータス別のタスク数・進捗合計（process_schedule_rollups）と
+日別の進捗スナップショット（process_progress_snapshots）をタスク更新時に差分で維持する
+（更新前の値はタスク行をロックして読む。ずれた場合は rebuild_rollups で再計算）。
+"""
+
+import math
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import (
+    Column, Date, DateTime, Float, ForeignKey, ForeignKeyConstraint, Index, Integer, MetaData,
+    String, Table, Text, and_, bindparam, delete, func, insert, or_, select, update
+)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from .schedule_engine import ScheduleError, TaskShift, propagate_shifts
+
+metadata = MetaData()
+
+process_schedules = Table(
+    "process_schedules",
+    metadata,
+    Column("schedule_id", Integer, primary_key=True, autoincrement=True),
+    Column("project_id", Integer, nullable=False),
+    Column("name", String(255), nullable=False),
+    Column("description", Text, nullable=False, default=""),
+    Column("start_date", Date, nullable=False),
+    Column("end_date", Date, nullable=False),
+    Column("template_id", String(50)),
+    Column("created_at", DateTime, nullable=False, default=datetime.now),
+    Column("updated_at", DateTime, nullable=False, default=datetime.now),
+    Index("idx_process_schedules_project", "project_id", "schedule_id"),
+)
+
+process_tasks = Table(
+    "process_tasks",
+    metadata,
+    Column("schedule_id", Integer, ForeignKey("process_schedules.schedule_id", ondelete="CASCADE"), primary_key=True),
+    Column("task_id", Integer, primary_key=True, autoincrement=False),  # 工程表内の連番
+    Column("name", String(255), nullable=False),
+    Column("description", Text, nullable=False, default=""),
+    Column("start_date", Date, nullable=False),
+    Column("end_date", Date, nullable=False),
+    Column("duration", Float, nullable=False, default=0),
+    Column("progress", Integer, nullable=False, default=0),
+    Column("category", String(50), nullable=False),
+    Column("assigned_to", String(100), nullable=False, default=""),
+    Column("status", String(20), nullable=False, default="planned"),
+    Column("priority", String(20), nullable=False, default="medium"),
+    Column("updated_at", DateTime, nullable=False, default=datetime.now),
+)
+
+process_task_dependencies = Table(
+    "process_task_dependencies",
+    metadata,
+    Column("schedule_id", Integer, primary_key=True),
+    Column("task_id", Integer, primary_key=True),
+    Column("depends_on_task_id", Integer, primary_key=True),
+    ForeignKeyConstraint(
+        ["schedule_id", "task_id"], ["process_tasks.schedule_id", "process_tasks.task_id"], ondelete="CASCADE"
+    ),
+    ForeignKeyConstraint(
+        ["schedule_id", "depends_on_task_id"], ["process_tasks.schedule_id", "process_tasks.task_id"],
+        ondelete="CASCADE"
+    ),
+    # 後続タスクの逆引き
+    Index("idx_process_task_dependencies_predecessor", "schedule_id", "depends_on_task_id"),
+)
+
+# 進捗集計（カテゴリ×ステータス別の件数・進捗合計）
+process_schedule_rollups = Table(
+    "process_schedule_rollups",
+    metadata,
+    Column("schedule_id", Integer, ForeignKey("process_schedules.schedule_id", ondelete="CASCADE"), primary_key=True),
+    Column("category", String(50), primary_key=True),
+    Column("status", String(20), primary_key=True),
+    Column("task_count", Integer, nullable=False, default=0),
+    Column("progress_sum", Integer, nullable=False, default=0),
+)
+
+# 日別進捗（バーンアップ用、その日の最終状態）
+process_progress_snapshots = Table(
+    "process_progress_snapshots",
+    metadata,
+    Column("schedule_id", Integer, ForeignKey("process_schedules.schedule_id", ondelete="CASCADE"), primary_key=True),
+    Column("snapshot_date", Date, primary_key=True),
+    Column("total_tasks", Integer, nullable=False, default=0),
+    Column("completed_tasks", Integer, nullable=False, default=0),
+    Column("progress_sum", Integer, nullable=False, default=0),
+    Column("updated_at", DateTime, nullable=False, default=datetime.now),
+)
+
+COMPLETED_STATUS = "completed"
+DELAYED_STATUS = "delayed"
+# 日別進捗の期間指定の上限（1日1行に埋めるため）
+MAX_HISTORY_DAYS = 366
+# 集計に影響するタスク項目
+ROLLUP_FIELDS = ("category", "status", "progress")
+
+RollupKey = Tuple[str, str]
+
+# process_tasks の列として保存するタスク項目
+TASK_FIELDS = (
+    "name", "description", "start_date", "end_date", "duration", "progress",
+    "category", "assigned_to", "status", "priority",
+)
+SCHEDULE_FIELDS = ("name", "description", "start_date", "end_date")
+
+def _task_row(schedule_id: int, task: Dict[str, Any], now: datetime) -> Dict[str, Any]:
+    # 省略された項目は列の既定値で埋める（一括登録では先頭行の列だけが使われるため）
+    row = {
+        field: task[field] if field in task else process_tasks.c[field].default.arg
+        for field in TASK_FIELDS if field in task or process_tasks.c[field].default is not None
+    }
+    row.update(schedule_id=schedule_id, task_id=task["id"], updated_at=now)
+    return row
+
+def _rollup_deltas(tasks: Iterable[Dict[str, Any]], sign: int = 1,
+                   deltas: Optional[Dict[RollupKey, List[int]]] = None) -> Dict[RollupKey, List[int]]:
+    """タスクを (カテゴリ, ステータス) 別の [件数, 進捗合計] の増減にまとめる"""
+    deltas = {} if deltas is None else deltas
+    for task in tasks:
+        delta = deltas.setdefault((task["category"], task.get("status") or "planned"), [0, 0])
+        delta[0] += sign
+        delta[1] += sign * (task.get("progress") or 0)
+    return deltas
+
+def _percent(progress_sum: int, count: int) -> int:
+    return progress_sum // count if count > 0 else 0
+
+def _dependency_rows(schedule_id: int, task_id: int, dependencies: Iterable[int]) -> List[Dict[str, int]]:
+    return [
+        {"schedule_id": schedule_id, "task_id": task_id, "depends_on_task_id": depends_on}
+        for depends_on in sorted(set(dependencies))
+    ]
+
+class ProcessScheduleStore:
+    """工程表の保存・取得"""
+
+    def __init__(self, db: Session, today: Callable[[], date] = date.today):
+        self.db = db
+        self.today = today  # スナップショットの日付
+
+    # ------------------------------------------------------------------
+    # 取得
+    # ------------------------------------------------------------------
+
+    def get_schedule(self, schedule_id: int) -> Optional[Dict[str, Any]]:
+        """工程表をタスク付きで取得（工程表・タスク・依存関係の3クエリ）"""
+        row = self.db.execute(
+            select(process_schedules).where(process_schedules.c.schedule_id == schedule_id)
+        ).mappings().first()
+        return self._with_tasks(row) if row else None
+
+    def get_project_schedule(self, project_id: int) -> Optional[Dict[str, Any]]:
+        """プロジェクトの工程表（複数ある場合は最初に作成したもの）"""
+        row = self.db.execute(
+            select(process_schedules)
+            .where(process_schedules.c.project_id == project_id)
+            .order_by(process_schedules.c.schedule_id)
+            .limit(1)
+        ).mappings().first()
+        return self._with_tasks(row) if row else None
+
+    def get_task(self, schedule_id: int, task_id: int) -> Optional[Dict[str, Any]]:
+        tasks = self._load_tasks(schedule_id, task_id)
+        return tasks[0] if tasks else None
+
+    def _with_tasks(self, row) -> Dict[str, Any]:
+        schedule = dict(row)
+        schedule["id"] = schedule.pop("schedule_id")
+        schedule["tasks"] = self._load_tasks(schedule["id"])
+        return schedule
+
+    def _load_tasks(self, schedule_id: int, task_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        task_query = select(process_tasks).where(process_tasks.c.schedule_id == schedule_id)
+        dependency_query = select(
+            process_task_dependencies.c.task_id, process_task_dependencies.c.depends_on_task_id
+        ).where(process_task_dependencies.c.schedule_id == schedule_id)
+        if task_id is not None:
+            task_query = task_query.where(process_tasks.c.task_id == task_id)
+            dependency_query = dependency_query.where(process_task_dependencies.c.task_id == task_id)
+
+        dependencies: Dict[int, List[int]] = {}
+        for dependent, depends_on in self.db.execute(
+            dependency_query.order_by(process_task_dependencies.c.task_id, process_task_dependencies.c.depends_on_task_id)
+        ):
+            dependencies.setdefault(dependent, []).append(depends_on)
+
+        tasks = []
+        for row in self.db.execute(task_query.order_by(process_tasks.c.task_id)).mappings():
+            task = {field: row[field] for field in TASK_FIELDS}
+            task["id"] = row["task_id"]
+            task["dependencies"] = dependencies.get(row["task_id"], [])
+            tasks.append(task)
+        return tasks
+
+    def get_schedule_header(self, schedule_id: int) -> Optional[Dict[str, Any]]:
+        """工程表の行のみ（タスクは読み込まない）"""
+        row = self.db.execute(
+            select(process_schedules).where(process_schedules.c.schedule_id == schedule_id)
+        ).mappings().first()
+        return dict(row) if row else None
+
+    def progress_summary(self, schedule_id: int) -> Dict[str, Any]:
+        """集計行から進捗を算出（カテゴリ数×ステータス数の行のみ読む）"""
+        rows = self.db.execute(
+            select(
+                process_schedule_rollups.c.category, process_schedule_rollups.c.status,
+                process_schedule_rollups.c.task_count, process_schedule_rollups.c.progress_sum,
+            )
+            .where(and_(process_schedule_rollups.c.schedule_id == schedule_id,
+                        process_schedule_rollups.c.task_count > 0))
+            .order_by(process_schedule_rollups.c.category)
+        ).all()
+
+        categories: Dict[str, List[int]] = {}
+        counts = {"total": 0, COMPLETED_STATUS: 0, DELAYED_STATUS: 0}
+        progress_sum = 0
+        for category, task_status, task_count, category_progress in rows:
+            totals = categories.setdefault(category, [0, 0])
+            totals[0] += task_count
+            totals[1] += category_progress
+            counts["total"] += task_count
+            progress_sum += category_progress
+            if task_status in counts:
+                counts[task_status] += task_count
+
+        return {
+            "overall_progress": _percent(progress_sum, counts["total"]),
+            "completed_tasks": counts[COMPLETED_STATUS],
+            "total_tasks": counts["total"],
+            "delayed_tasks": counts[DELAYED_STATUS],
+            "category_progress": [
+                {"category": category, "progress": _percent(total, count), "tasks_count": count}
+                for category, (count, total) in categories.items()
+            ],
+        }
+
+    def progress_history(self, schedule_id: int, date_from: Optional[date] = None,
+                         date_to: Optional[date] = None) -> List[Dict[str, Any]]:
+        """
+        日別進捗（バーンアップ用）
+        期間を両方指定した場合は、更新の無かった日を直前の値で埋めて1日1行にする
+        （期間は MAX_HISTORY_DAYS 日まで）
+        """
+        if date_from is not None and date_to is not None:
+            if date_from > date_to:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="期間の指定が不正です")
+            if (date_to - date_from).days + 1 > MAX_HISTORY_DAYS:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"期間は{MAX_HISTORY_DAYS}日以内で指定してください"
+                )
+        snapshots = process_progress_snapshots
+        query = select(
+            snapshots.c.snapshot_date, snapshots.c.total_tasks,
+            snapshots.c.completed_tasks, snapshots.c.progress_sum,
+        ).where(snapshots.c.schedule_id == schedule_id)
+        if date_to is not None:
+            query = query.where(snapshots.c.snapshot_date <= date_to)
+
+        carried = None
+        if date_from is not None:
+            carried = self.db.execute(
+                query.where(snapshots.c.snapshot_date < date_from)
+                .order_by(snapshots.c.snapshot_date.desc()).limit(1)
+            ).first()
+            query = query.where(snapshots.c.snapshot_date >= date_from)
+        rows = self.db.execute(query.order_by(snapshots.c.snapshot_date)).all()
+
+        def point(day, row):
+            return {
+                "date": day,
+                "total_tasks": row.total_tasks,
+                "completed_tasks": row.completed_tasks,
+                "overall_progress": _percent(row.progress_sum, row.total_tasks),
+            }
+
+        if date_from is None or date_to is None:
+            return [point(row.snapshot_date, row) for row in rows]
+
+        history = []
+        by_date = {row.snapshot_date: row for row in rows}
+        day = date_from
+        while day <= date_to:
+            carried = by_date.get(day, carried)
+            if carried is not None:
+                history.append(point(day, carried))
+            day += timedelta(days=1)
+        return history
+
+    # ------------------------------------------------------------------
+    # 登録・更新
+    # ------------------------------------------------------------------
+
+    def create_schedule(self, project_id: int, name: str, description: str, start_date: date,
+                        tasks: List[Dict[str, Any]], template_id: Optional[str] = None) -> Dict[str, Any]:
+        """工程表をタスク・依存関係とまとめて登録"""
+        task_ids = [task["id"] for task in tasks]
+        if len(task_ids) != len(set(task_ids)):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="タスクIDが重複しています")
+        self._validate_dependencies(tasks, set(task_ids))
+
+        now = datetime.now()
+        end_date = max((task["end_date"] for task in tasks), default=start_date)
+        try:
+            schedule_id = self.db.execute(
+                insert(process_schedules).values(
+                    project_id=project_id, name=name, description=description,
+                    start_date=start_date, end_date=end_date, template_id=template_id,
+                    created_at=now, updated_at=now,
+                )
+            ).inserted_primary_key[0]
+            if tasks:
+                self.db.execute(insert(process_tasks), [_task_row(schedule_id, task, now) for task in tasks])
+                self._insert_dependencies(schedule_id, tasks)
+            self._apply_rollup(schedule_id, _rollup_deltas(tasks), now)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        return self.get_schedule(schedule_id)
+
+    def update_schedule(self, schedule_id: int, changes: Dict[str, Any],
+                        tasks: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """工程表の項目を更新（tasks を指定した場合のみタスクを置き換え）"""
+        values = {field: changes[field] for field in SCHEDULE_FIELDS if changes.get(field) is not None}
+        values["updated_at"] = datetime.now()
+        try:
+            self.db.execute(
+                update(process_schedules).where(process_schedules.c.schedule_id == schedule_id).values(**values)
+            )
+            if tasks is not None:
+                task_ids = [task["id"] for task in tasks]
+                if len(task_ids) != len(set(task_ids)):
+                    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="タスクIDが重複しています")
+                self._validate_dependencies(tasks, set(task_ids))
+                self.db.execute(delete(process_task_dependencies).where(
+                    process_task_dependencies.c.schedule_id == schedule_id
+                ))
+                self.db.execute(delete(process_tasks).where(process_tasks.c.schedule_id == schedule_id))
+                if tasks:
+                    self.db.execute(
+                        insert(process_tasks), [_task_row(schedule_id, task, values["updated_at"]) for task in tasks]
+                    )
+                    self._insert_dependencies(schedule_id, tasks)
+                self._refresh_end_date(schedule_id)
+                self.db.execute(delete(process_schedule_rollups).where(
+                    process_schedule_rollups.c.schedule_id == schedule_id
+                ))
+                self._apply_rollup(schedule_id, _rollup_deltas(tasks), values["updated_at"])
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        return self.get_schedule(schedule_id)
+
+    def add_task(self, schedule_id: int, task: Dict[str, Any]) -> Dict[str, Any]:
+        """タスクを1行追加（タスクIDは工程表内の最大値+1）"""
+        try:
+            # 工程表行を更新してロックし、同時追加でのタスクID重複を防ぐ
+            now = datetime.now()
+            self.db.execute(
+                update(process_schedules).where(process_schedules.c.schedule_id == schedule_id).values(updated_at=now)
+            )
+            task_id = self.db.execute(
+                select(func.coalesce(func.max(process_tasks.c.task_id), 0) + 1)
+                .where(process_tasks.c.schedule_id == schedule_id)
+            ).scalar()
+            task = dict(task, id=task_id)
+            self._validate_dependencies([task], self._task_ids(schedule_id))
+            self.db.execute(insert(process_tasks).values(**_task_row(schedule_id, task, now)))
+            self._insert_dependencies(schedule_id, [task])
+            self._extend_end_date(schedule_id, task["end_date"])
+            self._apply_rollup(schedule_id, _rollup_deltas([task]), now)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        return self.get_task(schedule_id, task_id)
+
+    def update_task(self, schedule_id: int, task_id: int, changes: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        タスク1行だけを更新（依存関係は指定された場合のみ置き換え）
+        日程・所要日数・依存関係が変わった場合は後続タスクを再計算し、
+        移動したタスクを "rescheduled" に返す
+        """
+        now = datetime.now()
+        values = {field: changes[field] for field in TASK_FIELDS if changes.get(field) is not None}
+        dependencies = changes.get("dependencies")
+        rollup_changed = bool(values.keys() & set(ROLLUP_FIELDS))
+        try:
+            current = None
+            if rollup_changed or values.keys() & {"start_date", "end_date", "duration"}:
+                # 同じタスクへの同時更新が同じ旧値から集計を差し引かないよう、行をロックして読む
+                current = self.db.execute(
+                    select(
+                        process_tasks.c.start_date, process_tasks.c.end_date,
+                        process_tasks.c.category, process_tasks.c.status, process_tasks.c.progress
+                    ).where(and_(
+                        process_tasks.c.schedule_id == schedule_id, process_tasks.c.task_id == task_id
+                    )).with_for_update()
+                ).first()
+                if current is None:
+                    return None
+            if values.keys() & {"start_date", "end_date", "duration"}:
+                if "end_date" not in values:
+                    # 開始日の変更は期間を維持、所要日数の変更は終了日を再計算
+                    start_date = values.get("start_date", current.start_date)
+                    if "duration" in values:
+                        values["end_date"] = start_date + timedelta(days=math.ceil(values["duration"]))
+                    else:
+                        values["end_date"] = start_date + (current.end_date - current.start_date)
+
+            result = self.db.execute(
+                update(process_tasks)
+                .where(and_(process_tasks.c.schedule_id == schedule_id, process_tasks.c.task_id == task_id))
+                .values(updated_at=now, **values)
+            )
+            if result.rowcount == 0:
+                self.db.rollback()
+                return None
+            if dependencies is not None:
+                task = {"id": task_id, "dependencies": dependencies}
+                self._validate_dependencies([task], self._task_ids(schedule_id))
+                self.db.execute(delete(process_task_dependencies).where(and_(
+                    process_task_dependencies.c.schedule_id == schedule_id,
+                    process_task_dependencies.c.task_id == task_id,
+                )))
+                self._insert_dependencies(schedule_id, [task])
+
+            if rollup_changed:
+                previous = dict(current._mapping)
+                deltas = _rollup_deltas([previous], -1)
+                self._apply_rollup(schedule_id, _rollup_deltas([dict(previous, **values)], 1, deltas), now)
+
+            shifts = []
+            if values.keys() & {"start_date", "end_date"}:
+                shifts = self._propagate(schedule_id, [task_id], now)
+            elif dependencies:
+                # 新しい先行タスクを起点にして、このタスク自身も再計算対象にする
+                shifts = self._propagate(schedule_id, dependencies, now)
+
+            schedule_values = {"updated_at": now}
+            if "end_date" in values or shifts:
+                schedule_values["end_date"] = self._end_date_expression(schedule_id)
+            self.db.execute(
+                update(process_schedules).where(process_schedules.c.schedule_id == schedule_id).values(**schedule_values)
+            )
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        task = self.get_task(schedule_id, task_id)
+        task["rescheduled"] = [shift.as_dict() for shift in shifts]
+        return task
+
+    def delete_task(self, schedule_id: int, task_id: int) -> bool:
+        """タスク1行と、そのタスクに関わる依存関係を削除"""
+        try:
+            current = self.db.execute(
+                select(process_tasks.c.category, process_tasks.c.status, process_tasks.c.progress).where(and_(
+                    process_tasks.c.schedule_id == schedule_id, process_tasks.c.task_id == task_id
+                )).with_for_update()
+            ).first()
+            if current is None:
+                return False
+            self.db.execute(delete(process_task_dependencies).where(and_(
+                process_task_dependencies.c.schedule_id == schedule_id,
+                or_(process_task_dependencies.c.task_id == task_id,
+                    process_task_dependencies.c.depends_on_task_id == task_id),
+            )))
+            result = self.db.execute(delete(process_tasks).where(and_(
+                process_tasks.c.schedule_id == schedule_id, process_tasks.c.task_id == task_id
+            )))
+            if result.rowcount == 0:
+                self.db.rollback()
+                return False
+            self._refresh_end_date(schedule_id)
+            self._apply_rollup(schedule_id, _rollup_deltas([dict(current._mapping)], -1), datetime.now())
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        return True
+
+    def rebuild_rollups(self, schedule_id: int) -> Optional[List[Dict[str, Any]]]:
+        """
+        集計行をタスクから再計算し、ずれていた (カテゴリ, ステータス) を返す（工程表が無ければ None）
+        工程表行を更新してロックし、再計算中のタスク追加・更新と競合しないようにする
+        """
+        rollups = process_schedule_rollups
+        try:
+            now = datetime.now()
+            result = self.db.execute(
+                update(process_schedules).where(process_schedules.c.schedule_id == schedule_id).values(updated_at=now)
+            )
+            if result.rowcount == 0:
+                self.db.rollback()
+                return None
+            tasks = self.db.execute(
+                select(process_tasks.c.category, process_tasks.c.status, process_tasks.c.progress)
+                .where(process_tasks.c.schedule_id == schedule_id)
+                .with_for_update()
+            ).mappings().all()
+            actual = _rollup_deltas(tasks)
+            stored = {
+                (row.category, row.status): [row.task_count, row.progress_sum]
+                for row in self.db.execute(
+                    select(rollups.c.category, rollups.c.status, rollups.c.task_count, rollups.c.progress_sum)
+                    .where(rollups.c.schedule_id == schedule_id)
+                )
+                if row.task_count != 0 or row.progress_sum != 0
+            }
+            mismatches = [
+                {"category": category, "status": task_status,
+                 "stored": stored.get((category, task_status), [0, 0]),
+                 "actual": actual.get((category, task_status), [0, 0])}
+                for category, task_status in sorted(stored.keys() | actual.keys())
+                if stored.get((category, task_status)) != actual.get((category, task_status))
+            ]
+            if mismatches:
+                self.db.execute(delete(rollups).where(rollups.c.schedule_id == schedule_id))
+                self._apply_rollup(schedule_id, actual, now)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        return mismatches
+
+    # ------------------------------------------------------------------
+    # 内部処理
+    # ------------------------------------------------------------------
+
+    def _task_ids(self, schedule_id: int) -> set:
+        return set(self.db.execute(
+            select(process_tasks.c.task_id).where(process_tasks.c.schedule_id == schedule_id)
+        ).scalars())
+
+    @staticmethod
+    def _validate_dependencies(tasks: List[Dict[str, Any]], task_ids: set):
+        for task in tasks:
+            for depends_on in task.get("dependencies") or []:
+                if depends_on == task["id"] or depends_on not in task_ids:
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail=f"タスク {task['id']} の依存先 {depends_on} が不正です"
+                    )
+
+    def _insert_dependencies(self, schedule_id: int, tasks: List[Dict[str, Any]]):
+        rows = [
+            row for task in tasks
+            for row in _dependency_rows(schedule_id, task["id"], task.get("dependencies") or [])
+        ]
+        if rows:
+            self.db.execute(insert(process_task_dependencies), rows)
+
+    def _propagate(self, schedule_id: int, sources: List[int], now: datetime) -> List[TaskShift]:
+        """変更タスクの推移的な後続だけを読み込んで再計算し、移動したタスクを一括更新"""
+        dependencies = process_task_dependencies
+        descendants = (
+            select(dependencies.c.task_id)
+            .where(and_(dependencies.c.schedule_id == schedule_id, dependencies.c.depends_on_task_id.in_(sources)))
+            .cte("descendants", recursive=True)
+        )
+        descendants = descendants.union(
+            select(dependencies.c.task_id)
+            .join(descendants, dependencies.c.depends_on_task_id == descendants.c.task_id)
+            .where(dependencies.c.schedule_id == schedule_id)
+        )
+        edges = self.db.execute(
+            select(dependencies.c.task_id, dependencies.c.depends_on_task_id).where(and_(
+                dependencies.c.schedule_id == schedule_id,
+                dependencies.c.task_id.in_(select(descendants.c.task_id)),
+            ))
+        ).all()
+        if not edges:
+            return []
+
+        successors: Dict[int, List[int]] = {}
+        predecessors: Dict[int, List[int]] = {}
+        for task_id, depends_on in edges:
+            successors.setdefault(depends_on, []).append(task_id)
+            predecessors.setdefault(task_id, []).append(depends_on)
+        task_ids = set(successors) | set(predecessors)
+        dates = {
+            row.task_id: (row.start_date, row.end_date)
+            for row in self.db.execute(
+                select(process_tasks.c.task_id, process_tasks.c.start_date, process_tasks.c.end_date).where(and_(
+                    process_tasks.c.schedule_id == schedule_id, process_tasks.c.task_id.in_(task_ids)
+                ))
+            )
+        }
+        try:
+            shifts = propagate_shifts(sources, successors, predecessors, dates)
+        except ScheduleError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        if shifts:
+            self.db.execute(
+                update(process_tasks)
+                .where(and_(process_tasks.c.schedule_id == schedule_id,
+                            process_tasks.c.task_id == bindparam("shift_task_id")))
+                .values(start_date=bindparam("shift_start_date"), end_date=bindparam("shift_end_date"), updated_at=now),
+                [{"shift_task_id": shift.task_id, "shift_start_date": shift.start_date,
+                  "shift_end_date": shift.end_date} for shift in shifts]
+            )
+        return shifts
+
+    def _upsert(self, table: Table):
+        """INSERT … ON CONFLICT DO UPDATE 用の insert（PostgreSQL、テスト用の SQLite）"""
+        dialect = postgresql if self.db.get_bind().dialect.name == "postgresql" else sqlite
+        return dialect.insert(table)
+
+    def _apply_rollup(self, schedule_id: int, deltas: Dict[RollupKey, List[int]], now: datetime):
+        """
+        集計行へ増減を反映し、当日のスナップショットを更新
+        同じ集計行への同時登録でも一意制約違反にならないよう1文で加算する
+        """
+        rollups = process_schedule_rollups
+        rows = [
+            {"schedule_id": schedule_id, "category": category, "status": task_status,
+             "task_count": count, "progress_sum": progress_sum}
+            for (category, task_status), (count, progress_sum) in sorted(deltas.items())
+            if count != 0 or progress_sum != 0
+        ]
+        if rows:
+            statement = self._upsert(rollups)
+            self.db.execute(statement.on_conflict_do_update(
+                index_elements=[rollups.c.schedule_id, rollups.c.category, rollups.c.status],
+                set_={
+                    "task_count": rollups.c.task_count + statement.excluded.task_count,
+                    "progress_sum": rollups.c.progress_sum + statement.excluded.progress_sum,
+                },
+            ), rows)
+        self._record_snapshot(schedule_id, now)
+
+    def _record_snapshot(self, schedule_id: int, now: datetime):
+        rollups = process_schedule_rollups
+        snapshots = process_progress_snapshots
+        total_tasks, completed_tasks, progress_sum = self.db.execute(
+            select(
+                func.coalesce(func.sum(rollups.c.task_count), 0),
+                func.coalesce(func.sum(rollups.c.task_count).filter(rollups.c.status == COMPLETED_STATUS), 0),
+                func.coalesce(func.sum(rollups.c.progress_sum), 0),
+            ).where(rollups.c.schedule_id == schedule_id)
+        ).one()
+        values = dict(total_tasks=total_tasks, completed_tasks=completed_tasks,
+                      progress_sum=progress_sum, updated_at=now)
+        statement = self._upsert(snapshots).values(schedule_id=schedule_id, snapshot_date=self.today(), **values)
+        self.db.execute(statement.on_conflict_do_update(
+            index_elements=[snapshots.c.schedule_id, snapshots.c.snapshot_date], set_=values
+        ))
+
+    def _end_date_expression(self, schedule_id: int):
+        """タスクの最終終了日（タスクが無ければ開始日）"""
+        return func.coalesce(
+            select(func.max(process_tasks.c.end_date))
+            .where(process_tasks.c.schedule_id == schedule_id)
+            .scalar_subquery(),
+            process_schedules.c.start_date,
+        )
+
+    def _refresh_end_date(self, schedule_id: int):
+        self.db.execute(
+            update(process_schedules).where(process_schedules.c.schedule_id == schedule_id)
+            .values(end_date=self._end_date_expression(schedule_id), updated_at=datetime.now())
+        )
+
+    def _extend_end_date(self, schedule_id: int, end_date: date):
+        self.db.execute(
+            update(process_schedules)
+            .where(and_(process_schedules.c.schedule_id == schedule_id, process_schedules.c.end_date < end_date))
+            .values(end_date=end_date)
+        )
@@ -0,0 +1,317 @@
+"""
+Garden DX - システムメトリクス収集
+ヘルスチェック・システム状態APIの実測値（固定値ではなく）を提供する。
+- リクエストレイテンシ: 固定バケットのヒストグラム（ASGIミドルウェアで記録）
+- DB接続プール: 使用中・待機・オーバーフロー数（engine.pool）
+- プロセス: RSS・CPU使用率（/proc、無い環境では resource で代替）
+- キャッシュ: ヒット率
+- DBサイズ: pg_database_size（PostgreSQLのみ）
+収集結果は短時間キャッシュし、ヘルスチェックを高頻度に呼んでも負荷にならないようにする。
+"""
+
+import os
+import shutil
+import threading
+import time
+from bisect import bisect_left
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Optional, Sequence
+
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from .cache_service import cache as default_cache
+from .prometheus_metrics import HTTP_REQUEST_DURATION, HTTP_REQUESTS, HTTP_REQUESTS_IN_FLIGHT
+
+# レイテンシのバケット上限（ミリ秒）
+DEFAULT_LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+PROCESS_STARTED_AT = time.time()
+
+
+class LatencyHistogram:
+    """固定バケットのレイテンシヒストグラム（メモリは一定、記録は二分探索1回）"""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS_MS):
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counts = [0] * (len(self.buckets) + 1)   # 最後は上限超過
+            self.count = 0
+            self.total = 0.0
+            self.max = 0.0
+
+    def observe(self, value_ms: float):
+        index = bisect_left(self.buckets, value_ms)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += value_ms
+            if value_ms > self.max:
+                self.max = value_ms
+
+    def quantile(self, q: float) -> float:
+        """バケット内を線形補間した分位点（上限超過のバケットは最大値）"""
+        with self._lock:
+            counts, count, maximum = list(self.counts), self.count, self.max
+        if not count:
+            return 0.0
+        rank = q * count
+        cumulative = 0
+        for index, bucket_count in enumerate(counts):
+            if bucket_count and cumulative + bucket_count >= rank:
+                if index == len(self.buckets):
+                    return maximum
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = min(self.buckets[index], maximum)
+                return lower + (upper - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+        return maximum
+
+    def snapshot(self) -> Dict[str, Any]:
+        count = self.count
+        return {
+            "count": count,
+            "average_ms": round(self.total / count, 2) if count else 0.0,
+            "p50_ms": round(self.quantile(0.5), 2),
+            "p95_ms": round(self.quantile(0.95), 2),
+            "p99_ms": round(self.quantile(0.99), 2),
+            "max_ms": round(self.max, 2),
+        }
+
+
+# アプリ全体のリクエストレイテンシ
+request_latency = LatencyHistogram()
+
+
+class RequestMetricsMiddleware:
+    """
+    リクエストの計測を行うASGIミドルウェア
+    レイテンシヒストグラムに加え、Prometheus のルート別件数・処理時間・処理中件数を記録する
+    （ルートはパスではなくテンプレート（/api/projects/{project_id}）でラベル付けする）
+    """
+
+    def __init__(
+        self,
+        app,
+        histogram: LatencyHistogram = request_latency,
+        exempt_paths: Iterable[str] = ("/health", "/api/integration/health", "/metrics"),
+        clock: Callable[[], float] = time.perf_counter,
+    ):
+        self.app = app
+        self.histogram = histogram
+        self.exempt_paths = tuple(exempt_paths)
+        self.clock = clock
+        self._endpoint_routes: Optional[Dict[Any, str]] = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.exempt_paths):
+            await self.app(scope, receive, send)
+            return
+
+        started = self.clock()
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = self.clock() - started
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            route = self._route_template(scope)
+            HTTP_REQUESTS.inc(scope["method"], route, str(status_code))
+            HTTP_REQUEST_DURATION.observe(elapsed, scope["method"], route)
+            self.histogram.observe(elapsed * 1000)
+
+    def _route_template(self, scope) -> str:
+        route = scope.get("route")
+        if route is not None:
+            return getattr(route, "path", "unmatched")
+        # scope に route を設定しない旧バージョンの Starlette ではエンドポイントから逆引き
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        if self._endpoint_routes is None:
+            routes = getattr(getattr(scope.get("app"), "router", None), "routes", ())
+            self._endpoint_routes = {
+                getattr(candidate, "endpoint", None): candidate.path for candidate in routes if hasattr(candidate, "path")
+            }
+        return self._endpoint_routes.get(endpoint, "unmatched")
+
+
+def read_process_stats() -> Dict[str, Any]:
+    """RSS（バイト）・CPU時間（秒）・スレッド数を /proc から取得"""
+    try:
+        with open("/proc/self/statm") as statm:
+            rss_bytes = int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        with open("/proc/self/stat") as stat:
+            # コマンド名に空白を含み得るため、")" 以降を分割（状態が先頭）
+            fields = stat.read().rsplit(")", 1)[1].split()
+        ticks = os.sysconf("SC_CLK_TCK")
+        return {
+            "rss_bytes": rss_bytes,
+            "cpu_seconds": (int(fields[11]) + int(fields[12])) / ticks,
+            "threads": int(fields[17]),
+        }
+    except (OSError, ValueError, IndexError):
+        import resource
+
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        return {
+            "rss_bytes": usage.ru_maxrss * 1024,   # /proc が無い環境では最大RSS
+            "cpu_seconds": usage.ru_utime + usage.ru_stime,
+            "threads": threading.active_count(),
+        }
+
+def read_total_memory() -> Optional[int]:
+    """物理メモリ量（バイト）"""
+    try:
+        with open("/proc/meminfo") as meminfo:
+            for line in meminfo:
+                if line.startswith("MemTotal:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (OSError, ValueError):
+        return None
+
+def pool_stats(engine) -> Dict[str, Any]:
+    """接続プールの状態（QueuePool 以外は取得できる項目のみ）"""
+    pool = engine.pool
+    stats: Dict[str, Any] = {"pool": type(pool).__name__}
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        method = getattr(pool, name, None)
+        if callable(method):
+            stats[name] = method()
+    if "overflow" in stats:
+        # QueuePool はプール上限に達するまで負の値を返す
+        stats["overflow"] = max(0, stats["overflow"])
+    return stats
+
+def database_size_bytes(db: Session) -> Optional[int]:
+    """DBサイズ（PostgreSQL以外・取得失敗時は None）"""
+    if db.get_bind().dialect.name != "postgresql":
+        return None
+    try:
+        return db.execute(text("SELECT pg_database_size(current_database())")).scalar()
+    except SQLAlchemyError:
+        db.rollback()
+        return None
+
+def format_bytes(size: Optional[int]) -> str:
+    """バイト数を表示用に（例: 245.3 MB）"""
+    if size is None:
+        return "不明"
+    value = float(size)
+    for unit in ("B", "KB", "MB"):
+        if value < 1024:
+            return f"{value:.0f} {unit}" if unit == "B" else f"{value:.1f} {unit}"
+        value /= 1024
+    return f"{value:.1f} GB"
+
+
+class SystemMetricsCollector:
+    """
+    システムメトリクスの収集（結果を ttl_seconds 秒キャッシュ）
+    DBサイズは集計コストが高いため、別の長いキャッシュ期間とする
+    """
+
+    def __init__(
+        self,
+        histogram: LatencyHistogram = request_latency,
+        cache=default_cache,
+        ttl_seconds: float = 5.0,
+        database_size_ttl_seconds: float = 300.0,
+        clock: Callable[[], float] = time.monotonic,
+        process_reader: Callable[[], Dict[str, Any]] = read_process_stats,
+    ):
+        self.histogram = histogram
+        self.cache = cache
+        self.ttl_seconds = ttl_seconds
+        self.database_size_ttl_seconds = database_size_ttl_seconds
+        self.clock = clock
+        self.process_reader = process_reader
+        self._lock = threading.Lock()
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self._snapshot_at = 0.0
+        self._database_size: Optional[int] = None
+        self._database_size_at: Optional[float] = None
+        self._cpu_sample: Optional[tuple] = None
+        self._total_memory = read_total_memory()
+
+    def collect(self, db: Session) -> Dict[str, Any]:
+        """メトリクス取得（キャッシュ期間内は前回の値）"""
+        now = self.clock()
+        with self._lock:
+            if self._snapshot is None or now - self._snapshot_at >= self.ttl_seconds:
+                self._snapshot = self._sample(db, now)
+                self._snapshot_at = now
+            return self._snapshot
+
+    def _sample(self, db: Session, now: float) -> Dict[str, Any]:
+        if self._database_size_at is None or now - self._database_size_at >= self.database_size_ttl_seconds:
+            self._database_size = database_size_bytes(db)
+            self._database_size_at = now
+
+        process = self.process_reader()
+        rss_bytes = process["rss_bytes"]
+        return {
+            "sampled_at": datetime.now(),
+            "request_latency": self.histogram.snapshot(),
+            "database_pool": pool_stats(db.get_bind()),
+            "process": {
+                "rss_mb": round(rss_bytes / 1024 / 1024, 1),
+                "memory_percent": round(rss_bytes * 100 / self._total_memory, 1) if self._total_memory else None,
+                "cpu_percent": self._cpu_percent(process["cpu_seconds"], now),
+                "threads": process["threads"],
+                "uptime_seconds": round(time.time() - PROCESS_STARTED_AT),
+            },
+            "cache": self._cache_stats(),
+            "database_size_bytes": self._database_size,
+            "disk_usage_percent": self._disk_usage_percent(),
+        }
+
+    def _cpu_percent(self, cpu_seconds: float, now: float) -> float:
+        """前回の収集からのCPU使用率（初回は起動からの平均）"""
+        previous = self._cpu_sample
+        self._cpu_sample = (now, cpu_seconds)
+        if previous is None:
+            elapsed = time.time() - PROCESS_STARTED_AT
+            used = cpu_seconds
+        else:
+            elapsed = now - previous[0]
+            used = cpu_seconds - previous[1]
+        return round(used * 100 / elapsed, 1) if elapsed > 0 else 0.0
+
+    def _cache_stats(self) -> Dict[str, Any]:
+        hits, misses = self.cache.hits, self.cache.misses
+        return {
+            "entries": len(self.cache),
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 3) if hits + misses else None,
+        }
+
+    @staticmethod
+    def _disk_usage_percent() -> Optional[float]:
+        try:
+            usage = shutil.disk_usage(os.getcwd())
+        except OSError:
+            return None
+        return round(usage.used * 100 / usage.total, 1)
+
+
+# アプリ全体のメトリクス収集
+system_metrics = SystemMetricsCollector()
@@ -0,0 +1,237 @@
+"""
+Garden DX - 金額計算エンジン（見積・請求書共通）
+数量は0.01単位、単価・金額は円単位の整数配列で受け取り、
+明細金額・小計・税率別（10%/軽減8%）の消費税・端数処理を1パスで計算する。
+内部計算は整数のみで行うため Decimal と同じ結果になり、浮動小数点誤差は発生しない。
+"""
+
+from array import array
+from dataclasses import dataclass, field
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+# 数量の桁（DECIMAL(10, 2)）
+QUANTITY_SCALE = 100
+# 税率の桁（0.10 → 1000 ベーシスポイント）
+RATE_SCALE = 10_000
+
+STANDARD_TAX_RATE = Decimal('0.10')
+REDUCED_TAX_RATE = Decimal('0.08')
+
+# 端数処理
+ROUNDING_DOWN = "down"            # 切り捨て（0方向、int() と同じ）
+ROUNDING_FLOOR = "floor"          # 切り下げ（-∞方向）
+ROUNDING_CEIL = "ceil"            # 切り上げ（+∞方向）
+ROUNDING_HALF_UP = "half_up"      # 四捨五入（0から遠い方へ）
+ROUNDING_HALF_EVEN = "half_even"  # 銀行丸め（Decimal.quantize の既定）
+ROUNDING_MODES = (ROUNDING_DOWN, ROUNDING_FLOOR, ROUNDING_CEIL, ROUNDING_HALF_UP, ROUNDING_HALF_EVEN)
+
+def divide_round(numerator: int, denominator: int, mode: str) -> int:
+    """整数除算を指定の端数処理で丸める（denominator > 0）"""
+    quotient, remainder = divmod(numerator, denominator)
+    if remainder == 0 or mode == ROUNDING_FLOOR:
+        return quotient
+    if mode == ROUNDING_DOWN:
+        return quotient + 1 if numerator < 0 else quotient
+    if mode == ROUNDING_CEIL:
+        return quotient + 1
+    twice = remainder * 2
+    if twice > denominator:
+        return quotient + 1
+    if twice < denominator:
+        return quotient
+    # ちょうど0.5
+    if mode == ROUNDING_HALF_UP:
+        # 0から遠い方へ（負数は divmod が切り下げているため quotient のまま）
+        return quotient + 1 if numerator > 0 else quotient
+    if mode == ROUNDING_HALF_EVEN:
+        return quotient + (quotient & 1)
+    raise ValueError(f"unknown rounding mode: {mode}")
+
+def to_scaled(value: Any, scale: int) -> int:
+    """Decimal/数値を scale 倍の整数に変換（桁あふれ分は四捨五入）"""
+    scaled = Decimal(value or 0) * scale
+    return int(scaled.to_integral_value(rounding=ROUND_HALF_UP))
+
+def rate_to_bp(rate: Any) -> int:
+    """税率（Decimal('0.08') など）をベーシスポイントに変換"""
+    return to_scaled(rate, RATE_SCALE)
+
+@dataclass
+class TaxBucket:
+    """税率別の集計"""
+    rate: Decimal
+    taxable_amount: Decimal
+    tax_amount: Decimal
+
+@dataclass
+class Totals:
+    """計算結果（金額は Decimal）"""
+    subtotal: Decimal
+    tax_amount: Decimal
+    total_amount: Decimal
+    buckets: List[TaxBucket] = field(default_factory=list)
+    line_amounts: List[Decimal] = field(default_factory=list)
+
+    def as_dict(self) -> Dict[str, Decimal]:
+        """請求書モデル用（subtotal / tax_amount / total_amount）"""
+        return {
+            'subtotal': self.subtotal,
+            'tax_amount': self.tax_amount,
+            'total_amount': self.total_amount,
+        }
+
+    def tax_breakdown(self) -> List[Dict[str, Any]]:
+        """税率別内訳（適格請求書の記載事項）"""
+        return [
+            {'rate': b.rate, 'taxable_amount': b.taxable_amount, 'tax_amount': b.tax_amount}
+            for b in self.buckets
+        ]
+
+@dataclass
+class EstimateTotals:
+    """見積の合計（円。total_amount は小計＋調整額の税抜金額）"""
+    subtotal: int
+    total_cost: int
+    total_amount: int
+    gross_profit: int
+    gross_profit_rate: float
+
+class TotalsEngine:
+    """
+    金額計算エンジン
+    - tax_rounding: 消費税の端数処理（税率ごとに1回）
+    - line_rounding: 明細金額の端数処理（None なら0.01円単位のまま集計）
+    """
+
+    def __init__(self, tax_rounding: str = ROUNDING_HALF_EVEN, line_rounding: Optional[str] = None):
+        if tax_rounding not in ROUNDING_MODES or (line_rounding and line_rounding not in ROUNDING_MODES):
+            raise ValueError("unknown rounding mode")
+        self.tax_rounding = tax_rounding
+        self.line_rounding = line_rounding
+
+    def compute(
+        self,
+        quantities: Sequence[int],
+        unit_prices: Sequence[int],
+        rates_bp: Optional[Sequence[int]] = None,
+        adjustments: Optional[Sequence[int]] = None,
+        default_rate_bp: int = 1000,
+        keep_lines: bool = False,
+    ) -> Totals:
+        """
+        quantities: 数量×100 の整数配列、unit_prices: 単価（円）の整数配列
+        rates_bp: 明細ごとの税率（ベーシスポイント、省略時は default_rate_bp）
+        adjustments: 明細ごとの調整額（円）
+        """
+        count = len(quantities)
+        if len(unit_prices) != count:
+            raise ValueError("quantities and unit_prices must have the same length")
+
+        line_rounding = self.line_rounding
+        buckets: Dict[int, int] = {}
+        lines: List[int] = []
+        subtotal = 0
+        for i in range(count):
+            # 0.01円単位の明細金額
+            amount = quantities[i] * unit_prices[i]
+            if adjustments is not None:
+                amount += adjustments[i] * QUANTITY_SCALE
+            if line_rounding:
+                amount = divide_round(amount, QUANTITY_SCALE, line_rounding) * QUANTITY_SCALE
+            rate = rates_bp[i] if rates_bp is not None else default_rate_bp
+            buckets[rate] = buckets.get(rate, 0) + amount
+            subtotal += amount
+            if keep_lines:
+                lines.append(amount)
+
+        return self._finish(subtotal, buckets, lines)
+
+    def compute_amounts(self, amounts: Sequence[int], rates_bp: Optional[Sequence[int]] = None,
+                        default_rate_bp: int = 1000) -> Totals:
+        """計算済みの明細金額（円）から小計・税額を計算"""
+        buckets: Dict[int, int] = {}
+        subtotal = 0
+        for i in range(len(amounts)):
+            amount = amounts[i] * QUANTITY_SCALE
+            rate = rates_bp[i] if rates_bp is not None else default_rate_bp
+            buckets[rate] = buckets.get(rate, 0) + amount
+            subtotal += amount
+        return self._finish(subtotal, buckets, [])
+
+    def line_amount(self, quantity: Any, unit_price: Any, adjustment: Any = 0) -> int:
+        """数量×単価を円単位に端数処理（line_rounding、未指定は切り捨て）し、明細の調整額を加算"""
+        amount = to_scaled(quantity, QUANTITY_SCALE) * to_scaled(unit_price, 1)
+        return divide_round(amount, QUANTITY_SCALE, self.line_rounding or ROUNDING_DOWN) + int(adjustment or 0)
+
+    def estimate_totals(self, items: Iterable[Any], adjustment: Any = 0) -> EstimateTotals:
+        """item_type が 'item' の明細の line_total / line_cost と見積の調整額から合計・粗利を計算"""
+        subtotal = 0
+        total_cost = 0
+        for item in items:
+            if item.item_type == "item":
+                subtotal += int(item.line_total or 0)
+                total_cost += int(item.line_cost or 0)
+        total_amount = subtotal + int(adjustment or 0)
+        gross_profit = total_amount - total_cost
+        return EstimateTotals(
+            subtotal=subtotal,
+            total_cost=total_cost,
+            total_amount=total_amount,
+            gross_profit=gross_profit,
+            gross_profit_rate=gross_profit / total_amount if total_amount > 0 else 0.0,
+        )
+
+    def tax_for(self, amount: int, rate: Any = STANDARD_TAX_RATE) -> int:
+        """税抜金額（円）1件に対する消費税額（円）"""
+        return divide_round(amount * rate_to_bp(rate), RATE_SCALE, self.tax_rounding)
+
+    def _finish(self, subtotal: int, buckets: Dict[int, int], lines: List[int]) -> Totals:
+        tax_total = 0
+        tax_buckets = []
+        for rate_bp in sorted(buckets, reverse=True):
+            taxable = buckets[rate_bp]
+            # 0.01円単位 × ベーシスポイント → 円
+            tax = divide_round(taxable * rate_bp, QUANTITY_SCALE * RATE_SCALE, self.tax_rounding)
+            tax_total += tax
+            tax_buckets.append(TaxBucket(
+                rate=Decimal(rate_bp) / RATE_SCALE,
+                taxable_amount=_to_decimal(taxable),
+                tax_amount=Decimal(tax),
+            ))
+
+        subtotal_decimal = _to_decimal(subtotal)
+        return Totals(
+            subtotal=subtotal_decimal,
+            tax_amount=Decimal(tax_total),
+            total_amount=subtotal_decimal + tax_total,
+            buckets=tax_buckets,
+            line_amounts=[_to_decimal(amount) for amount in lines],
+        )
+
+    def compute_items(self, items: Iterable[Any], tax_rate: Any = STANDARD_TAX_RATE, keep_lines: bool = False) -> Totals:
+        """
+        quantity / unit_price（任意で tax_rate）属性を持つ明細オブジェクトから計算
+        明細の tax_rate が None の場合は tax_rate を適用する
+        """
+        quantities = array('q')
+        unit_prices = array('q')
+        rates = array('q')
+        default_rate = rate_to_bp(tax_rate)
+        for item in items:
+            quantities.append(to_scaled(item.quantity, QUANTITY_SCALE))
+            unit_prices.append(to_scaled(item.unit_price, 1))
+            line_rate = getattr(item, 'tax_rate', None)
+            rates.append(rate_to_bp(line_rate) if line_rate is not None else default_rate)
+        return self.compute(quantities, unit_prices, rates, keep_lines=keep_lines)
+
+def _to_decimal(scaled_amount: int) -> Decimal:
+    """0.01円単位の整数を Decimal（円）に変換"""
+    if scaled_amount % QUANTITY_SCALE == 0:
+        return Decimal(scaled_amount // QUANTITY_SCALE)
+    return Decimal(scaled_amount).scaleb(-2)
+
+# 請求書の標準エンジン（消費税は税率ごとに1回、Decimal.quantize と同じ銀行丸め）
+invoice_totals_engine = TotalsEngine()
+# 見積（明細金額・消費税とも1円未満切り捨て。従来の int() と同じ）
+estimate_totals_engine = TotalsEngine(tax_rounding=ROUNDING_DOWN, line_rounding=ROUNDING_DOWN)
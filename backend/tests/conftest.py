@@ -0,0 +1,64 @@
+import os
+import sys
+
+# main.py と同じく backend 直下を import パスに含める（from models import ... 形式のモジュール用）
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+def pytest_addoption(parser):
+    parser.addoption("--run-benchmarks", action="store_true", default=False, help="ベンチマークテストも実行する")
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "benchmark: 大量データのベンチマーク（--run-benchmarks 指定時のみ実行）")
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--run-benchmarks"):
+        return
+    skip = pytest.mark.skip(reason="ベンチマークは --run-benchmarks 指定時のみ実行")
+    for item in items:
+        if "benchmark" in item.keywords:
+            item.add_marker(skip)
+
+
+# ==============================================
+# SQLite のテスト用DB（各テストモジュールで schema フィクスチャに MetaData を返す）
+# ==============================================
+
+@pytest.fixture
+def database_url():
+    """既定はインメモリDB（別接続での並行更新を試すモジュールはファイルDBのURLを返す）"""
+    return "sqlite://"
+
+@pytest.fixture
+def engine(schema, database_url):
+    if database_url == "sqlite://":
+        # TestClient のスレッドからも同じインメモリDBを使う
+        engine = create_engine(database_url, poolclass=StaticPool, connect_args={"check_same_thread": False})
+    else:
+        engine = create_engine(database_url, connect_args={"timeout": 30, "check_same_thread": False}, pool_size=32)
+    schema.create_all(engine)
+    yield engine
+    engine.dispose()
+
+@pytest.fixture
+def session(engine):
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+@pytest.fixture
+def statements(engine):
+    """実行したSQL（空白を1つにまとめる）"""
+    executed = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append(" ".join(statement.split()))
+
+    return executed
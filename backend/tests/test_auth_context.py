@@ -0,0 +1,129 @@
+from unittest.mock import Mock
+
+from fastapi import Depends, FastAPI, Request
+from fastapi.testclient import TestClient
+
+from ..auth.jwt_auth import UserAuth, auth_manager, get_current_user
+from ..auth.middleware import AuthenticationMiddleware
+from ..auth.request_context import get_auth_counters, resolve_token_payload, resolve_user
+from ..middleware.auth_middleware import CurrentUser, get_current_company_id
+from ..middleware.auth_middleware import get_current_user as get_current_invoice_user
+
+class TestAuthContextPropagation:
+    """認証コンテキスト共有テストクラス"""
+
+    def setup_method(self):
+        self.user_loader = Mock(return_value={"user_id": 7, "username": "yamada"})
+        app = FastAPI()
+        app.add_middleware(AuthenticationMiddleware)
+        loader = self.user_loader
+
+        async def load_db_user(request: Request):
+            return resolve_user(request, loader)
+
+        # 別方式（署名鍵・audience の異なるトークン）の検証
+        self.other_decoder = Mock(return_value=None)
+        other_decoder = self.other_decoder
+
+        @app.get("/api/other-scheme")
+        async def other_scheme(request: Request):
+            payload = resolve_token_payload(request, other_decoder)
+            return {"payload": payload, "counters": get_auth_counters(request)}
+
+        @app.get("/api/whoami")
+        async def whoami(
+            request: Request,
+            user: UserAuth = Depends(get_current_user),
+            company_id: int = Depends(get_current_company_id),
+            db_user: dict = Depends(load_db_user),
+            db_user_again: dict = Depends(load_db_user, use_cache=False),
+        ):
+            return {
+                "user_id": user.user_id,
+                "company_id": company_id,
+                "counters": get_auth_counters(request),
+            }
+
+        self.client = TestClient(app)
+        self.token = auth_manager.create_access_token({
+            "user_id": 7,
+            "sub": "yamada",
+            "email": "yamada@example.com",
+            "role": "owner",
+            "company_id": 3,
+        })
+
+    def test_single_decode_and_lookup(self):
+        """ミドルウェア・各依存関数を通してデコード1回、DB参照1回以下であること"""
+        response = self.client.get("/api/whoami", headers={"Authorization": f"Bearer {self.token}"})
+        assert response.status_code == 200
+        body = response.json()
+        assert body["user_id"] == 7
+        assert body["company_id"] == 3
+        assert body["counters"] == {"token_decodes": 1, "db_lookups": 1}
+        assert self.user_loader.call_count == 1
+
+    def test_missing_token_rejected(self):
+        """トークンなしのリクエストは拒否されること"""
+        response = self.client.get("/api/whoami")
+        assert response.status_code in (401, 403)
+
+    def test_other_scheme_decodes_separately(self):
+        """ある方式で検証済みのトークンを、別方式の検証結果として扱わないこと"""
+        response = self.client.get("/api/other-scheme", headers={"Authorization": f"Bearer {self.token}"})
+        assert response.status_code == 200
+        # ミドルウェアでは有効でも、別方式では独自に検証して拒否される
+        assert response.json() == {"payload": None, "counters": {"token_decodes": 2, "db_lookups": 0}}
+        self.other_decoder.assert_called_once_with(self.token)
+
+    def test_payload_cached_per_decoder(self):
+        """同じ方式のデコードはリクエスト内で1回のみ"""
+        request = Request({"type": "http", "headers": [(b"authorization", b"Bearer abc")]})
+        accept = Mock(return_value={"sub": "yamada"})
+        reject = Mock(return_value=None)
+
+        assert resolve_token_payload(request, accept) == {"sub": "yamada"}
+        assert resolve_token_payload(request, reject) is None
+        assert resolve_token_payload(request, accept) == {"sub": "yamada"}
+        assert accept.call_count == 1 and reject.call_count == 1
+        assert resolve_user(request, Mock(return_value="user"), decoder=reject) is None
+
+    def test_user_cached_per_decoder(self):
+        """別方式で未検証だったユーザーを、検証済みの方式でのユーザー取得に持ち越さないこと"""
+        request = Request({"type": "http", "headers": [(b"authorization", b"Bearer abc")]})
+        accept = Mock(return_value={"sub": "yamada"})
+        reject = Mock(return_value=None)
+        loader = Mock(return_value="user")
+        resolve_token_payload(request, accept)
+        resolve_token_payload(request, reject)
+
+        assert resolve_user(request, loader, decoder=reject) is None
+        assert resolve_user(request, loader, decoder=accept) == "user"
+        assert resolve_user(request, loader, decoder=accept) == "user"
+        loader.assert_called_once_with({"sub": "yamada"})
+
+
+class TestCurrentUserWithoutMiddleware:
+    """認証ミドルウェアを通らない場合の現在ユーザー取得テストクラス"""
+
+    def setup_method(self):
+        app = FastAPI()
+
+        @app.get("/api/invoices/whoami")
+        async def whoami(user: CurrentUser = Depends(get_current_invoice_user)):
+            return {"user_id": user.user_id, "company_id": user.company_id, "role": user.role}
+
+        self.client = TestClient(app)
+
+    def test_token_verified_by_dependency(self):
+        token = auth_manager.create_access_token({
+            "user_id": 7, "sub": "yamada", "email": "yamada@example.com", "role": "employee", "company_id": 3,
+        })
+        response = self.client.get("/api/invoices/whoami", headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 200
+        assert response.json() == {"user_id": 7, "company_id": 3, "role": "employee"}
+
+    def test_invalid_token_rejected(self):
+        """無効なトークンを仮のユーザーとして扱わないこと"""
+        response = self.client.get("/api/invoices/whoami", headers={"Authorization": "Bearer invalid"})
+        assert response.status_code == 401
@@ -0,0 +1,167 @@
+import os
+import time
+
+import pytest
+from sqlalchemy import insert, update
+
+from ..services.cache_service import MemoryCache
+from ..services.category_tree import (
+    CategoryTreeCache, build_category_tree, category_version, load_category_tree, metadata, price_categories,
+    price_category_versions, subtree_category_ids
+)
+
+def category(category_id, name, parent=None, sort_order=0, is_active=True, company_id=1):
+    path = (parent["category_path"] if parent else "/") + f"{category_id}/"
+    return {
+        "category_id": category_id, "company_id": company_id, "category_code": f"C{category_id}",
+        "parent_category_id": parent["category_id"] if parent else None, "category_name": name,
+        "level_depth": path.count("/") - 1, "sort_order": sort_order, "is_active": is_active,
+        "category_path": path,
+    }
+
+def generate_tree(fanout=(5, 4, 3, 5)):
+    """4階層（5×4×3×5 = 300 葉）のカテゴリ"""
+    rows, level, next_id = [], [None], 1
+    for width in fanout:
+        children = []
+        for parent in level:
+            for sort_order in range(width, 0, -1):   # 登録順と表示順を逆にする
+                row = category(next_id, f"分類{next_id}", parent, sort_order)
+                rows.append(row)
+                children.append(row)
+                next_id += 1
+        level = children
+    return rows
+
+def names(nodes):
+    return [node["category_name"] for node in nodes]
+
+def bump_version(session, company_id):
+    """migration 016 のトリガーの代わりに版番号を進める（他のプロセスでの変更）"""
+    if session.execute(update(price_category_versions).where(
+        price_category_versions.c.company_id == company_id
+    ).values(version=price_category_versions.c.version + 1)).rowcount == 0:
+        session.execute(insert(price_category_versions).values(company_id=company_id, version=1))
+
+@pytest.fixture
+def schema():
+    return metadata
+
+
+class TestBuildCategoryTree:
+    """カテゴリツリー組み立てテストクラス"""
+
+    def test_order_and_inactive(self, session, statements):
+        plants = category(1, "植栽", sort_order=2)
+        stone = category(2, "石材", sort_order=1)
+        trees = category(3, "高木", plants, sort_order=1)
+        closed = category(4, "廃止", plants, sort_order=2, is_active=False)
+        session.execute(insert(price_categories), [
+            category(5, "低木", plants, sort_order=1), trees, plants, stone, closed,
+            category(6, "廃止の配下", closed), category(7, "他社", company_id=2),
+        ])
+        statements.clear()
+
+        tree = load_category_tree(session, 1)
+
+        assert len(statements) == 1
+        assert names(tree.roots) == ["石材", "植栽"]
+        # 同じ並び順は名前順（低木 < 高木）、無効なカテゴリは配下ごと除外
+        assert names(tree.roots[1]["children"]) == ["低木", "高木"]
+        assert tree.paths == {1: "/1/", 2: "/2/", 3: "/1/3/", 5: "/1/5/"}
+
+    def test_large_tree(self, session, statements):
+        rows = generate_tree()
+        session.execute(insert(price_categories), rows)
+        statements.clear()
+
+        tree = load_category_tree(session, 1)
+
+        assert len(statements) == 1 and len(tree.paths) == len(rows) == 385
+        node = tree.roots[0]
+        for depth in range(3):
+            assert [child["sort_order"] for child in node["children"]] == sorted(
+                child["sort_order"] for child in node["children"])
+            node = node["children"][0]
+        assert node["level_depth"] == 4 and node["children"] == []
+
+    @pytest.mark.benchmark
+    def test_benchmark(self, record_property):
+        """既定は4階層 8×8×8×8（4680カテゴリ）。分岐数は環境変数で変更可能"""
+        width = int(os.getenv("CATEGORY_TREE_BENCH_FANOUT", "8"))
+        rows = sorted(
+            (type("Row", (), row) for row in generate_tree((width,) * 4)),
+            key=lambda row: (row.sort_order, row.category_name)
+        )
+        for row in rows:
+            row.category_name_kana = row.icon_name = row.color_code = None
+            row.is_leaf_category = row.level_depth == 4
+
+        started = time.perf_counter()
+        tree = build_category_tree(rows)
+        elapsed = time.perf_counter() - started
+
+        assert len(tree.paths) == len(rows)
+        record_property("categories", len(rows))
+        record_property("elapsed_ms", round(elapsed * 1000, 1))
+
+
+class TestCategoryTreeCache:
+    """カテゴリツリーキャッシュテストクラス"""
+
+    def test_versioned_invalidation(self, session, statements):
+        cache = CategoryTreeCache(MemoryCache(name="category_tree_test"))
+        session.execute(insert(price_categories), [category(1, "植栽"), category(3, "他社", company_id=2)])
+        other = cache.get_or_build(session, 2, lambda: load_category_tree(session, 2))
+        statements.clear()
+
+        first = cache.get_or_build(session, 1, lambda: load_category_tree(session, 1))
+        assert cache.get_or_build(session, 1, lambda: load_category_tree(session, 1)) is first
+        # 読み込みごとに版番号を1行参照、ツリーの組み立ては1回
+        assert len(statements) == 3 and sum("price_categories." in s for s in statements) == 1
+
+        session.execute(insert(price_categories), [category(2, "石材", sort_order=-1)])
+        bump_version(session, 1)
+        # 別のキャッシュ（他のプロセス）の変更も版番号で検出する
+        second = cache.get_or_build(session, 1, lambda: load_category_tree(session, 1))
+
+        assert names(second.roots) == ["石材", "植栽"]
+        # 他社のキャッシュは無効化しない
+        assert category_version(session, 1) == 1 and category_version(session, 2) == 0
+        assert cache.get_or_build(session, 2, lambda: load_category_tree(session, 2)) is other
+
+    def test_build_during_change_not_served(self, session):
+        cache = CategoryTreeCache(MemoryCache(name="category_tree_test"))
+
+        def build_then_change():
+            tree = build_category_tree([])
+            bump_version(session, 1)   # 組み立て中にカテゴリが追加された
+            return tree
+
+        stale = cache.get_or_build(session, 1, build_then_change)
+        assert cache.get_or_build(session, 1, lambda: build_category_tree([])) is not stale
+
+
+def test_subtree_category_ids(session):
+    rows = generate_tree((2, 2, 2, 2))
+    session.execute(insert(price_categories), rows + [category(999, "他社", company_id=2)])
+    tree = load_category_tree(session, 1)
+    root = tree.roots[0]
+
+    ids = set(session.execute(subtree_category_ids(1, root["category_path"])).scalars())
+
+    def collect(node):
+        yield node["category_id"]
+        for child in node["children"]:
+            yield from collect(child)
+
+    assert ids == set(collect(root)) and len(ids) == 15
+    assert set(session.execute(subtree_category_ids(1, "/9999/")).scalars()) == set()
+
+def test_subtree_prefix_boundary(session):
+    """経路の前方一致は番号の途中で一致しない（/1/ は /10/ を含まない）"""
+    one, ten = category(1, "植栽"), category(10, "石材")
+    session.execute(insert(price_categories), [one, ten, category(11, "景石", ten)])
+
+    assert set(session.execute(subtree_category_ids(1, "/1/")).scalars()) == {1}
+    assert set(session.execute(subtree_category_ids(1, "/10/")).scalars()) == {10, 11}
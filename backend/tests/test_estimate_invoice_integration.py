@@ -0,0 +1,81 @@
+"""
+見積→請求書変換のクエリ数・性能テスト
+"""
+
+import os
+import time
+from datetime import date
+
+import pytest
+
+from models import Base, Company, Customer, Estimate, EstimateItem
+from services.estimate_invoice_integration import EstimateInvoiceIntegrationService
+
+@pytest.fixture
+def schema():
+    return Base.metadata
+
+def create_estimate(session, lines=200):
+    company = Company(company_id=1, company_name="庭園工房")
+    customer = Customer(customer_id=1, company_id=1, customer_name="田中造園")
+    estimate = Estimate(
+        estimate_id=1, company_id=1, customer_id=1, estimate_number="2024-0001",
+        estimate_name="庭園改修工事", status="承認", estimate_date=date(2024, 7, 1),
+        subtotal_amount=lines * 11000, adjustment_amount=0, total_amount=lines * 12100,
+    )
+    estimate.items = [
+        EstimateItem(
+            item_description=f"植栽工事{n}", item_type="header" if n % 20 == 0 else "item",
+            sort_order=lines - n, quantity=2, unit="本", unit_price=5500, line_total=11000,
+            is_visible_to_customer=n % 50 != 1,
+        )
+        for n in range(lines)
+    ]
+    session.add_all([company, customer, estimate])
+    session.commit()
+    session.expunge_all()
+
+
+class TestEstimateInvoiceConversion:
+    """見積→請求書変換テストクラス"""
+
+    def test_validation_and_conversion_share_one_load(self, session, statements):
+        create_estimate(session)
+        statements.clear()
+
+        service = EstimateInvoiceIntegrationService(session)
+        validation = service.validate_estimate_for_invoice_generation(1)
+        invoice_data = service.convert_estimate_to_invoice_data(1)
+
+        # 見積+顧客+会社（JOIN）と明細（IN）の2クエリのみ
+        assert len(statements) == 2
+        assert validation["valid"] and validation["estimate_info"]["items_count"] == 190
+        assert invoice_data["customer"]["customer_name"] == "田中造園"
+        assert invoice_data["company"]["company_name"] == "庭園工房"
+        assert len(invoice_data["items"]) == 196
+        assert [item["sort_order"] for item in invoice_data["items"]] == sorted(
+            item["sort_order"] for item in invoice_data["items"]
+        )
+
+    def test_missing_estimate(self, session, statements):
+        service = EstimateInvoiceIntegrationService(session)
+        assert not service.validate_estimate_for_invoice_generation(99)["valid"]
+        with pytest.raises(ValueError):
+            service.convert_estimate_to_invoice_data(99)
+        assert len(statements) == 1
+
+    @pytest.mark.benchmark
+    def test_conversions_per_second(self, session, record_property):
+        """200行の見積の検証+変換。回数は環境変数で変更可能"""
+        create_estimate(session)
+        runs = int(os.getenv("CONVERSION_BENCH_RUNS", "50"))
+
+        started = time.perf_counter()
+        for _ in range(runs):
+            service = EstimateInvoiceIntegrationService(session)
+            service.validate_estimate_for_invoice_generation(1)
+            service.convert_estimate_to_invoice_data(1)
+            session.expunge_all()
+        elapsed = time.perf_counter() - started
+
+        record_property("conversions_per_second", round(runs / elapsed))
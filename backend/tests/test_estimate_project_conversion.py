@@ -0,0 +1,142 @@
+import os
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import insert
+
+from ..models import Base, Customer, Estimate, EstimateItem
+from ..services.estimate_project_conversion import (
+    PROCESS_KEYWORDS, EstimateHeader, KeywordAutomaton, classify_process, load_estimate_source, plan_project_tasks
+)
+
+START = date(2024, 7, 1)
+
+def item(item_id, description, sort_order, parent_item_id=None, item_type="item", line_total=0, line_cost=0):
+    return {
+        "item_id": item_id, "estimate_id": 1, "parent_item_id": parent_item_id, "level": 1 if parent_item_id else 0,
+        "sort_order": sort_order, "item_type": item_type, "item_description": description,
+        "line_total": line_total, "line_cost": line_cost,
+    }
+
+def header(item_id, description, line_cost=0):
+    return EstimateHeader(item_id, description, item_id, Decimal(line_cost), Decimal(line_cost))
+
+@pytest.fixture
+def schema():
+    return Base.metadata
+
+
+class TestKeywordAutomaton:
+    """キーワードオートマトンテストクラス"""
+
+    def test_overlapping_keywords(self):
+        automaton = KeywordAutomaton(["he", "she", "his", "hers"])
+        assert automaton.find_all("ushers") == [(1, "she"), (2, "he"), (2, "hers")]
+
+    @pytest.mark.parametrize("seed", range(3))
+    def test_matches_brute_force(self, seed):
+        rng = random.Random(seed)
+        keywords = list(PROCESS_KEYWORDS) + ["".join(rng.choice("植栽工事") for _ in range(rng.randint(1, 3)))
+                                             for _ in range(20)]
+        automaton = KeywordAutomaton(keywords)
+        alphabet = "".join(PROCESS_KEYWORDS) + "・工事費"
+        for _ in range(50):
+            text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 40)))
+            expected = sorted(
+                (start, keyword) for keyword in set(keywords)
+                for start in range(len(text)) if text.startswith(keyword, start)
+            )
+            assert sorted(automaton.find_all(text)) == expected
+
+    @pytest.mark.parametrize("text, expected", [
+        ("整地・準備作業", ("demolition", 2)),
+        ("石工事・舗装", ("foundation", 4)),
+        ("仕上げ・清掃", ("finishing", 2)),
+        ("高木植栽工事", ("planting", 5)),
+        ("諸経費", None),
+    ])
+    def test_classify(self, text, expected):
+        assert classify_process(text) == expected
+
+
+class TestPlanProjectTasks:
+    """タスク計画テストクラス"""
+
+    def test_phases_and_dates(self):
+        tasks = plan_project_tasks([
+            header(1, "整地・準備作業", 80000),
+            header(2, "植栽工事", 400000),
+            header(3, "外構フェンス工事", 350000),
+            header(4, "諸経費"),
+            header(5, "仕上げ・清掃", 170000),
+        ], START)
+
+        assert [(t.category, t.duration_days, t.dependencies) for t in tasks] == [
+            ("demolition", 2, ()),
+            ("planting", 5, (0,)),
+            ("decoration", 7, (0,)),
+            ("other", 3, (0,)),               # 直前の項目と同じ順位（植栽・外構と並行）
+            ("finishing", 2, (1, 2, 3)),
+        ]
+        dates = [(t.start_date, t.end_date) for t in tasks]
+        assert dates[0] == (START, START + timedelta(days=1))
+        assert dates[2] == (START + timedelta(days=2), START + timedelta(days=8))
+        # 最も長い外構の翌日から仕上げ
+        assert dates[4] == (START + timedelta(days=9), START + timedelta(days=10))
+        assert tasks[1].budget_amount == Decimal(400000)
+
+    def test_empty(self):
+        assert plan_project_tasks([], START) == []
+
+
+class TestLoadEstimateSource:
+    """見積読み込みテストクラス"""
+
+    def test_single_query(self, session, statements):
+        session.execute(insert(Customer), [{"customer_id": 1, "company_id": 1, "customer_name": "田中"}])
+        session.execute(insert(Estimate), [{
+            "estimate_id": 1, "company_id": 1, "customer_id": 1, "estimate_number": "EST-001",
+            "estimate_name": "庭園リフォーム工事", "estimate_date": START,
+            "total_amount": 1500000, "total_cost": 1000000,
+        }])
+        session.execute(insert(EstimateItem), [
+            item(1, "植栽工事", 2, item_type="header"),
+            item(2, "高木", 3, parent_item_id=1, line_total=300000, line_cost=200000),
+            item(3, "低木", 4, parent_item_id=1, line_total=300000, line_cost=200000),
+            item(4, "整地・準備作業", 1, item_type="header", line_total=100000, line_cost=80000),
+        ])
+        session.commit()
+        statements.clear()
+
+        source = load_estimate_source(session, 1, company_id=1)
+
+        assert len(statements) == 1
+        assert (source.customer_name, source.total_cost) == ("田中", Decimal(1000000))
+        assert [(h.item_id, h.line_cost) for h in source.headers] == [(4, Decimal(80000)), (1, Decimal(400000))]
+        assert load_estimate_source(session, 1, company_id=2) is None
+
+
+@pytest.mark.benchmark
+class TestConversionBenchmark:
+    """大規模見積のタスク計画テストクラス"""
+
+    def test_plan_large_estimate(self, record_property):
+        """既定は2000大項目。件数は環境変数で変更可能"""
+        count = int(os.getenv("CONVERSION_BENCH_HEADERS", "2000"))
+        rng = random.Random(46)
+        names = list(PROCESS_KEYWORDS) + ["諸経費", "運搬費"]
+        headers = [header(i, f"{rng.choice(names)}・{rng.choice(names)}工事") for i in range(count)]
+
+        started = time.perf_counter()
+        tasks = plan_project_tasks(headers, START)
+        elapsed = time.perf_counter() - started
+
+        by_index = {task.index: task for task in tasks}
+        for task in tasks:
+            for dependency in task.dependencies:
+                assert by_index[dependency].end_date < task.start_date
+        record_property("headers", count)
+        record_property("elapsed_ms", round(elapsed * 1000))
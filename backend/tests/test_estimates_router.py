@@ -0,0 +1,60 @@
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from database import get_db
+from models import Base, Company, Customer
+from routers.estimates import router
+from services.auth_service import get_current_user_dependency
+from services.number_allocator import metadata as number_metadata
+
+@pytest.fixture
+def schema():
+    return Base.metadata
+
+@pytest.fixture
+def engine(engine):
+    number_metadata.create_all(engine)
+    return engine
+
+@pytest.fixture
+def session(session):
+    session.add_all([
+        Company(company_id=1, company_name="庭園工房"), Company(company_id=2, company_name="緑化設計"),
+        Customer(customer_id=1, company_id=1, customer_name="田中造園"),
+        Customer(customer_id=2, company_id=2, customer_name="鈴木邸"),
+    ])
+    session.commit()
+    return session
+
+def client_for(session, company_id):
+    app = FastAPI()
+    app.include_router(router, prefix="/api/estimates")
+    app.dependency_overrides[get_db] = lambda: session
+    app.dependency_overrides[get_current_user_dependency] = lambda: SimpleNamespace(user_id=1, company_id=company_id)
+    return TestClient(app)
+
+def new_estimate(customer_id):
+    return {
+        "customer_id": customer_id, "estimate_number": "", "estimate_name": "庭園改修",
+        "estimate_date": date.today().isoformat(),
+    }
+
+
+class TestCreateEstimate:
+    """見積作成の採番テストクラス"""
+
+    def test_numbered_per_user_company(self, session):
+        year = date.today().year
+        first = client_for(session, 1).post("/api/estimates/", json=new_estimate(1))
+        second = client_for(session, 2).post("/api/estimates/", json=new_estimate(2))
+        third = client_for(session, 1).post("/api/estimates/", json=new_estimate(1))
+
+        assert [r.status_code for r in (first, second, third)] == [201, 201, 201]
+        # ログインユーザーの会社で登録し、会社ごとに連番を振る
+        assert [(r.json()["company_id"], r.json()["estimate_number"]) for r in (first, second, third)] == [
+            (1, f"{year}-0001"), (2, f"{year}-0001"), (1, f"{year}-0002"),
+        ]
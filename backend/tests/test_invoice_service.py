@@ -1,7 +1,9 @@
 import pytest
 from datetime import date, datetime
 from decimal import Decimal
+from types import SimpleNamespace
 from unittest.mock import Mock, patch
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from fastapi import HTTPException
 
@@ -11,6 +13,24 @@ from ..models.invoice import (
 )
 from ..services.invoice_service import InvoiceService
 
+def batch_estimate(estimate_id, status="承認", subtotal=100000, adjustment=0, total=None):
+    """一括請求書化で読み込む見積行"""
+    return SimpleNamespace(
+        estimate_id=estimate_id, company_id=1, customer_id=1, estimate_number=f"2024-{estimate_id:04d}",
+        estimate_name="庭園改修", status=status, subtotal_amount=Decimal(subtotal),
+        adjustment_amount=Decimal(adjustment),
+        total_amount=Decimal(total if total is not None else (subtotal + adjustment) * 11 // 10),
+        notes=None, terms_and_conditions=None,
+    )
+
+def batch_item(estimate_id, item_type="item"):
+    """一括請求書化で読み込む見積明細行"""
+    return SimpleNamespace(
+        estimate_id=estimate_id, item_type=item_type, item_description="マツ H3.0", specification=None,
+        quantity=Decimal("10"), unit="本", unit_price=Decimal("10000"), line_total=Decimal("100000"),
+        level=1, sort_order=1,
+    )
+
 class TestInvoiceService:
     """請求書サービステストクラス"""
 
@@ -48,7 +68,7 @@ class TestInvoiceService:
         self.mock_db.add = Mock()
 
         # 作成された請求書をモック
-        mock_invoice = Mock()
+        mock_invoice = Mock(invoice_date=date.today())
         mock_invoice.invoice_id = 1
         mock_invoice.invoice_number = "INV-2024-001"
         self.mock_db.add.return_value = mock_invoice
@@ -86,7 +106,7 @@ class TestInvoiceService:
     def test_get_invoice_success(self):
         """請求書取得成功テスト"""
         # モック請求書
-        mock_invoice = Mock()
+        mock_invoice = Mock(invoice_date=date.today())
         mock_invoice.invoice_id = 1
         mock_invoice.company_id = self.company_id
         self.mock_db.query.return_value.filter.return_value.first.return_value = mock_invoice
@@ -112,7 +132,7 @@ class TestInvoiceService:
     def test_update_invoice_success(self):
         """請求書更新成功テスト"""
         # 既存請求書をモック
-        mock_invoice = Mock()
+        mock_invoice = Mock(invoice_date=date.today())
         mock_invoice.invoice_id = 1
         mock_invoice.company_id = self.company_id
         mock_invoice.payment_status = PaymentStatus.UNPAID
@@ -147,7 +167,7 @@ class TestInvoiceService:
     def test_update_paid_invoice_fails(self):
         """支払済み請求書の更新失敗テスト"""
         # 支払済み請求書をモック
-        mock_invoice = Mock()
+        mock_invoice = Mock(invoice_date=date.today())
         mock_invoice.payment_status = PaymentStatus.PAID
         self.mock_db.query.return_value.filter.return_value.first.return_value = mock_invoice
 
@@ -164,7 +184,7 @@ class TestInvoiceService:
     def test_delete_invoice_success(self):
         """請求書削除成功テスト"""
         # 下書き状態の請求書をモック
-        mock_invoice = Mock()
+        mock_invoice = Mock(invoice_date=date.today())
         mock_invoice.status = InvoiceStatus.DRAFT
         mock_invoice.invoice_number = "INV-2024-001"
         self.mock_db.query.return_value.filter.return_value.first.return_value = mock_invoice
@@ -182,7 +202,7 @@ class TestInvoiceService:
     def test_delete_sent_invoice_fails(self):
         """送付済み請求書の削除失敗テスト"""
         # 送付済み請求書をモック
-        mock_invoice = Mock()
+        mock_invoice = Mock(invoice_date=date.today())
         mock_invoice.status = InvoiceStatus.SENT
         self.mock_db.query.return_value.filter.return_value.first.return_value = mock_invoice
 
@@ -196,7 +216,7 @@ class TestInvoiceService:
     def test_update_status_success(self):
         """ステータス更新成功テスト"""
         # 請求書をモック
-        mock_invoice = Mock()
+        mock_invoice = Mock(invoice_date=date.today())
         mock_invoice.status = InvoiceStatus.DRAFT
         self.mock_db.query.return_value.filter.return_value.first.return_value = mock_invoice
         self.mock_db.commit = Mock()
@@ -216,7 +236,7 @@ class TestInvoiceService:
         from ..models.invoice import InvoicePaymentCreate
 
         # 請求書をモック
-        mock_invoice = Mock()
+        mock_invoice = Mock(invoice_date=date.today())
         mock_invoice.total_amount = Decimal("100000")
         mock_invoice.paid_amount = Decimal("0")
         self.mock_db.query.return_value.filter.return_value.first.return_value = mock_invoice
@@ -245,7 +265,7 @@ class TestInvoiceService:
         from ..models.invoice import InvoicePaymentCreate
 
         # 請求書をモック
-        mock_invoice = Mock()
+        mock_invoice = Mock(invoice_date=date.today())
         mock_invoice.total_amount = Decimal("100000")
         mock_invoice.paid_amount = Decimal("0")
         self.mock_db.query.return_value.filter.return_value.first.return_value = mock_invoice
@@ -273,7 +293,7 @@ class TestInvoiceService:
         from ..models.invoice import InvoicePaymentCreate
 
         # 請求書をモック
-        mock_invoice = Mock()
+        mock_invoice = Mock(invoice_date=date.today())
         mock_invoice.total_amount = Decimal("100000")
         mock_invoice.paid_amount = Decimal("80000")
         self.mock_db.query.return_value.filter.return_value.first.return_value = mock_invoice
@@ -292,7 +312,7 @@ class TestInvoiceService:
         assert exc_info.value.status_code == 400
         assert "残高を超えています" in str(exc_info.value.detail)
 
-    @patch('..services.invoice_service.generate_invoice_number')
+    @patch('backend.services.invoice_service.generate_invoice_number')
     def test_create_from_estimate_success(self, mock_generate_number):
         """見積からの請求書生成成功テスト"""
         # モック設定
@@ -311,37 +331,196 @@ class TestInvoiceService:
         self.mock_db.commit.assert_called_once()
 
     def test_get_payment_summary(self):
-        """支払サマリー取得テスト"""
-        # モック請求書リスト
-        mock_invoices = [
-            Mock(
-                total_amount=Decimal("100000"),
-                paid_amount=Decimal("100000"),
-                status=InvoiceStatus.SENT,
-                payment_status=PaymentStatus.PAID
-            ),
-            Mock(
-                total_amount=Decimal("50000"),
-                paid_amount=Decimal("0"),
-                status=InvoiceStatus.SENT,
-                payment_status=PaymentStatus.UNPAID
-            )
+        """支払サマリー取得テスト（GROUP BY 集計行から合算）"""
+        # モック集計行 (status, payment_status, 件数, 請求額, 入金額)
+        mock_rows = [
+            (InvoiceStatus.SENT, PaymentStatus.PAID, 1, Decimal("100000"), Decimal("100000")),
+            (InvoiceStatus.SENT, PaymentStatus.UNPAID, 2, Decimal("50000"), Decimal("0")),
         ]
 
-        self.mock_db.query.return_value.filter.return_value.all.return_value = mock_invoices
+        self.mock_db.query.return_value.filter.return_value.group_by.return_value.all.return_value = mock_rows
 
         # テスト実行
         result = self.service.get_payment_summary(self.company_id)
 
         # 検証
-        assert result['total_invoices'] == 2
+        assert result['total_invoices'] == 3
         assert result['total_amount'] == Decimal("150000")
         assert result['paid_amount'] == Decimal("100000")
         assert result['outstanding_amount'] == Decimal("50000")
+        assert result['status_summary'][InvoiceStatus.SENT] == {'count': 3, 'amount': Decimal("150000")}
+        assert result['payment_summary'][PaymentStatus.UNPAID]['count'] == 2
+        # 請求書エンティティはロードしないこと
+        self.mock_db.query.return_value.filter.return_value.all.assert_not_called()
+
+    def test_payment_summary_closed_month_is_read_only(self):
+        """締め済み月の集計が未保存でも、参照時は集計するだけで保存しない"""
+        self.mock_db.query.return_value.filter.return_value.all.return_value = []
+        self.mock_db.query.return_value.filter.return_value.group_by.return_value.all.return_value = [
+            (2024, 1, InvoiceStatus.SENT, PaymentStatus.UNPAID, 2, Decimal("50000"), Decimal("0")),
+        ]
+
+        result = self.service.get_payment_summary(self.company_id, 2024, 1)
+
+        assert result['total_invoices'] == 2
+        assert result['outstanding_amount'] == Decimal("50000")
+        self.mock_db.add.assert_not_called()
+        self.mock_db.commit.assert_not_called()
+
+    def test_materialize_monthly_summaries(self):
+        """未保存の締め済み月のみ集計して保存し、PostgreSQL では会社ごとにロックを取る"""
+        self.mock_db.get_bind.return_value.dialect.name = "postgresql"
+        distinct = self.mock_db.query.return_value.filter.return_value.filter.return_value.distinct
+        distinct.return_value.all.return_value = [(1, 2024, 5), (1, 2024, 4)]
+        # 保存済み: 2024年4月
+        stored = Mock(month=date(2024, 4, 1), breakdown=[])
+        self.mock_db.query.return_value.filter.return_value.all.return_value = [stored]
+        self.mock_db.query.return_value.filter.return_value.group_by.return_value.all.return_value = [
+            (2024, 5, InvoiceStatus.SENT, PaymentStatus.PAID, 1, Decimal("30000"), Decimal("30000")),
+        ]
+
+        saved = self.service.materialize_monthly_summaries(self.company_id, today=date(2024, 6, 10))
+
+        assert saved == 1
+        [summary] = [call.args[0] for call in self.mock_db.add.call_args_list]
+        assert (summary.company_id, summary.month) == (1, date(2024, 5, 1))
+        assert summary.breakdown == [[InvoiceStatus.SENT, PaymentStatus.PAID, 1, "30000", "30000"]]
+        lock = self.mock_db.execute.call_args
+        assert "pg_advisory_xact_lock" in str(lock.args[0])
+        assert lock.args[1]['company_id'] == 1
+        self.mock_db.commit.assert_called_once()
+
+    @patch('backend.services.invoice_service.mark_overdue_invoices')
+    def test_sweep_overdue_invoices(self, mock_mark_overdue):
+        """滞納スイープテスト（一括更新結果から集計キャッシュを破棄してコミット）"""
+        mock_mark_overdue.return_value = [
+            Mock(invoice_id=10, company_id=1, invoice_date=date(2024, 1, 15)),
+            Mock(invoice_id=11, company_id=1, invoice_date=date(2024, 2, 1)),
+        ]
+        self.mock_db.get_bind.return_value.dialect.name = "sqlite"
+
+        result = self.service.sweep_overdue_invoices(self.company_id, self.user_id)
+
+        assert result['updated_count'] == 2
+        assert result['invoice_ids'] == [10, 11]
+        mock_mark_overdue.assert_called_once_with(self.mock_db, self.company_id, None, self.user_id)
+        self.mock_db.commit.assert_called_once()
+
+    def test_get_overdue_invoices_is_read_only(self):
+        """期限切れ一覧取得で更新・コミットしないこと"""
+        self.mock_db.query.return_value.filter.return_value.order_by.return_value.all.return_value = []
+
+        assert self.service.get_overdue_invoices(self.company_id) == []
+        self.mock_db.commit.assert_not_called()
+
+    def test_create_from_estimates_reports_outcomes(self):
+        """一括請求書化テスト（見積ごとの結果を返し、該当なしは登録しない）"""
+        from ..models.invoice import InvoiceBatchFromEstimates
+
+        self.mock_db.execute.side_effect = [[batch_estimate(2)], [batch_item(2)]]
+        self.mock_db.query.return_value.filter.return_value.all.return_value = [(2, "INV-202406-001")]
+
+        result = self.service.create_from_estimates(
+            self.company_id, InvoiceBatchFromEstimates(estimate_ids=[1, 2, 1]), self.user_id
+        )
+
+        assert result['requested'] == 2
+        assert [o['status'] for o in result['results']] == ['failed', 'skipped']
+        assert result['results'][1]['invoice_number'] == "INV-202406-001"
+        assert result['created'] == 0
+        assert 'invoices_per_second' in result
+        self.mock_db.commit.assert_not_called()
+
+    @patch('backend.services.invoice_service.number_allocator')
+    def test_create_from_estimates_success(self, mock_allocator):
+        """一括請求書化成功テスト（調整額を含めて見積1件の変換と同じ金額で登録）"""
+        from ..models.invoice import InvoiceBatchFromEstimates
+
+        mock_allocator.allocate.return_value = ["INV-202406-001", "INV-202406-002"]
+        self.mock_db.execute.side_effect = [
+            [batch_estimate(1, adjustment=-5000), batch_estimate(2, status="提出済")],
+            [batch_item(1), batch_item(1, "header"), batch_item(2)],
+            None, None, None,
+        ]
+        self.mock_db.query.return_value.filter.return_value.all.side_effect = [
+            [],                                                # 既存の請求書なし
+            [("INV-202406-001", 11), ("INV-202406-002", 12)],  # 登録した請求書ID
+        ]
+
+        result = self.service.create_from_estimates(
+            self.company_id, InvoiceBatchFromEstimates(estimate_ids=[1, 2]), self.user_id
+        )
+
+        assert result['created'] == 2 and result['failed'] == 0
+        first, second = result['results']
+        assert (first['invoice_id'], first['invoice_number']) == (11, "INV-202406-001")
+        assert first['total_amount'] == Decimal("104500")
+        assert second['warnings'] == ["見積ステータスが '提出済' です。通常は承認済み見積から請求書を作成します。"]
+
+        invoice_rows = self.mock_db.execute.call_args_list[2].args[1]
+        assert [(row['subtotal'], row['tax_amount'], row['total_amount']) for row in invoice_rows] == [
+            (Decimal("95000"), Decimal("9500"), Decimal("104500")),
+            (Decimal("100000"), Decimal("10000"), Decimal("110000")),
+        ]
+        item_rows = self.mock_db.execute.call_args_list[3].args[1]
+        assert [row['invoice_id'] for row in item_rows] == [11, 11, 12]
+        self.mock_db.commit.assert_called_once()
+
+    def test_create_from_estimates_rejects_lost_and_zero(self):
+        """失注・キャンセル・0円以下の見積は請求書化しない"""
+        from ..models.invoice import InvoiceBatchFromEstimates
+
+        self.mock_db.execute.side_effect = [
+            [batch_estimate(1, status="失注"), batch_estimate(2, status="キャンセル"),
+             batch_estimate(3, subtotal=10000, adjustment=-10000)],
+            [batch_item(1), batch_item(2), batch_item(3)],
+        ]
+        self.mock_db.query.return_value.filter.return_value.all.return_value = []
+
+        result = self.service.create_from_estimates(
+            self.company_id, InvoiceBatchFromEstimates(estimate_ids=[1, 2, 3]), self.user_id
+        )
+
+        assert [o['status'] for o in result['results']] == ['failed', 'failed', 'failed']
+        assert result['results'][0]['errors'] == ["見積ステータスが '失注' のため請求書を作成できません"]
+        assert result['results'][1]['errors'] == ["見積ステータスが 'キャンセル' のため請求書を作成できません"]
+        assert result['results'][2]['errors'] == ["見積金額が0円以下です"]
+        self.mock_db.commit.assert_not_called()
+
+    @pytest.mark.parametrize("error, detail", [
+        # PostgreSQL（psycopg2 の diag.constraint_name）
+        (SimpleNamespace(diag=SimpleNamespace(constraint_name="idx_invoices_company_estimate_unique")),
+         "既に請求書化された見積が含まれています"),
+        (SimpleNamespace(diag=SimpleNamespace(constraint_name="idx_invoices_company_number_unique")),
+         "請求書番号が他の請求書と重複しました。再度実行してください"),
+        # SQLite（制約名がなく、メッセージに列名が入る）
+        (Exception("UNIQUE constraint failed: invoices.company_id, invoices.estimate_id"),
+         "既に請求書化された見積が含まれています"),
+        (Exception("UNIQUE constraint failed: invoices.company_id, invoices.invoice_number"),
+         "請求書番号が他の請求書と重複しました。再度実行してください"),
+    ])
+    @patch('backend.services.invoice_service.number_allocator')
+    def test_create_from_estimates_concurrent_conflict(self, mock_allocator, error, detail):
+        """一意インデックス違反は409（違反したインデックスに応じたメッセージ）"""
+        from ..models.invoice import InvoiceBatchFromEstimates
+
+        mock_allocator.allocate.return_value = ["INV-202406-001"]
+        self.mock_db.execute.side_effect = [[batch_estimate(1)], [batch_item(1)], None, None, None]
+        self.mock_db.query.return_value.filter.return_value.all.side_effect = [[], [("INV-202406-001", 11)]]
+        self.mock_db.commit.side_effect = IntegrityError("INSERT", {}, error)
+
+        with pytest.raises(HTTPException) as exc_info:
+            self.service.create_from_estimates(
+                self.company_id, InvoiceBatchFromEstimates(estimate_ids=[1]), self.user_id
+            )
+
+        assert exc_info.value.status_code == 409
+        assert exc_info.value.detail == detail
+        self.mock_db.rollback.assert_called_once()
 
     def test_calculate_invoice_totals(self):
         """請求書合計計算テスト"""
-        from ..models.invoice import calculate_invoice_totals
+        from ..services.invoice_service import calculate_invoice_totals
 
         # テスト明細
         items = [
@@ -367,23 +546,22 @@ class TestInvoiceService:
         assert totals['tax_amount'] == Decimal("2000")
         assert totals['total_amount'] == Decimal("22000")
 
-    def test_generate_invoice_number(self):
-        """請求書番号生成テスト"""
-        from ..models.invoice import generate_invoice_number
+    @patch('backend.services.invoice_service.number_allocator')
+    def test_generate_invoice_number(self, mock_allocator):
+        """請求書番号生成テスト（会社×月のカウンターから採番）"""
+        from ..services.invoice_service import generate_invoice_number, INVOICE_NUMBER
 
-        # 最後の請求書をモック
-        mock_last_invoice = Mock()
-        mock_last_invoice.invoice_number = "INV-202406-002"
-        
-        self.mock_db.query.return_value.filter.return_value.order_by.return_value.first.return_value = mock_last_invoice
+        mock_allocator.next_number.return_value = "INV-202406-003"
 
         # テスト実行
-        with patch('..models.invoice.datetime') as mock_datetime:
-            mock_datetime.now.return_value.date.return_value.strftime.return_value = "202406"
-            result = generate_invoice_number(self.mock_db, self.company_id)
+        result = generate_invoice_number(self.mock_db, self.company_id)
 
-        # 検証（連番が増加している）
+        # 検証（前方一致検索は行わない）
         assert "INV-202406-003" == result
+        mock_allocator.next_number.assert_called_once_with(
+            self.mock_db.get_bind.return_value, INVOICE_NUMBER, self.company_id
+        )
+        self.mock_db.query.assert_not_called()
 
     def test_rollback_on_error(self):
         """エラー時のロールバックテスト"""
@@ -0,0 +1,101 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pytest
+from sqlalchemy import Column, Integer, MetaData, Table, Text, text
+
+from ..services.number_allocator import (
+    DocumentNumberAllocator, ESTIMATE_NUMBER, INVOICE_NUMBER, metadata
+)
+
+JUNE = datetime(2024, 6, 15)
+
+# カウンターと、発行済み番号を持つ書類テーブル
+test_metadata = MetaData()
+for table in metadata.tables.values():
+    table.to_metadata(test_metadata)
+Table("invoices", test_metadata, Column("invoice_id", Integer, primary_key=True),
+      Column("company_id", Integer), Column("invoice_number", Text))
+Table("estimates", test_metadata, Column("estimate_id", Integer, primary_key=True),
+      Column("company_id", Integer), Column("estimate_number", Text))
+
+@pytest.fixture
+def schema():
+    return test_metadata
+
+@pytest.fixture
+def database_url(tmp_path):
+    # 複数スレッドから別接続で更新するためファイルDBを使用
+    return f"sqlite:///{tmp_path / 'numbers.db'}"
+
+
+class TestDocumentNumberAllocator:
+    """書類番号アロケーターテストクラス"""
+
+    def test_sequential_numbers(self, engine):
+        allocator = DocumentNumberAllocator()
+        numbers = [allocator.next_number(engine, INVOICE_NUMBER, 1, JUNE) for _ in range(3)]
+        assert numbers == ["INV-202406-001", "INV-202406-002", "INV-202406-003"]
+
+    def test_scoped_by_company_period_and_type(self, engine):
+        allocator = DocumentNumberAllocator()
+        assert allocator.next_number(engine, INVOICE_NUMBER, 1, JUNE) == "INV-202406-001"
+        assert allocator.next_number(engine, INVOICE_NUMBER, 2, JUNE) == "INV-202406-001"
+        assert allocator.next_number(engine, INVOICE_NUMBER, 1, datetime(2024, 7, 1)) == "INV-202407-001"
+        assert allocator.next_number(engine, ESTIMATE_NUMBER, 1, JUNE) == "2024-0001"
+
+    def test_continues_from_existing_numbers(self, engine):
+        """カウンター導入前の発行済み番号の続きから採番すること"""
+        with engine.begin() as conn:
+            conn.execute(text(
+                "INSERT INTO invoices (company_id, invoice_number) VALUES "
+                "(1, 'INV-202406-002'), (1, 'INV-202406-010'), (2, 'INV-202406-050'), (1, 'INV-202405-099')"
+            ))
+        allocator = DocumentNumberAllocator()
+        assert allocator.next_number(engine, INVOICE_NUMBER, 1, JUNE) == "INV-202406-011"
+
+    def test_beyond_999(self, engine):
+        """999件を超えても番号が重複しないこと"""
+        allocator = DocumentNumberAllocator()
+        numbers = allocator.allocate(engine, INVOICE_NUMBER, 1, 1001, JUNE)
+        assert numbers[998:] == ["INV-202406-999", "INV-202406-1000", "INV-202406-1001"]
+
+    def test_block_preallocation(self, engine):
+        """ブロック確保時はDB往復なしで払い出し、ワーカー間で重複しないこと"""
+        worker_a = DocumentNumberAllocator(block_size=10)
+        worker_b = DocumentNumberAllocator(block_size=10)
+
+        first = worker_a.allocate(engine, INVOICE_NUMBER, 1, 3, JUNE)
+        second = worker_b.allocate(engine, INVOICE_NUMBER, 1, 1, JUNE)
+        third = worker_a.allocate(engine, INVOICE_NUMBER, 1, 9, JUNE)
+
+        assert first == ["INV-202406-001", "INV-202406-002", "INV-202406-003"]
+        assert second == ["INV-202406-011"]
+        assert len(set(first + second + third)) == 13
+        assert worker_a.current_value(engine, INVOICE_NUMBER, 1, JUNE) == 30
+
+
+class TestAllocatorConcurrency:
+    """採番の並行実行テストクラス"""
+
+    @pytest.mark.parametrize("block_size", [1, 5])
+    def test_no_duplicates_under_parallel_load(self, engine, block_size):
+        """多数スレッド・複数ワーカーから同時に採番しても重複しないこと"""
+        threads = int(os.getenv("ALLOCATOR_STRESS_THREADS", "32"))
+        per_thread = int(os.getenv("ALLOCATOR_STRESS_PER_THREAD", "25"))
+        workers = [DocumentNumberAllocator(block_size=block_size) for _ in range(4)]
+
+        def allocate(index):
+            worker = workers[index % len(workers)]
+            return [worker.next_number(engine, INVOICE_NUMBER, 1, JUNE) for _ in range(per_thread)]
+
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            numbers = [n for batch in pool.map(allocate, range(threads)) for n in batch]
+
+        assert len(numbers) == threads * per_thread
+        assert len(set(numbers)) == len(numbers)
+        if block_size == 1:
+            # ブロック確保なしなら欠番もない
+            expected = {INVOICE_NUMBER.format("202406", i) for i in range(1, len(numbers) + 1)}
+            assert set(numbers) == expected
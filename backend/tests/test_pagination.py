@@ -0,0 +1,186 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import Column, DateTime, Integer, String, create_engine
+from sqlalchemy.orm import declarative_base, sessionmaker
+
+from ..services.pagination import (
+    CountCache, KeysetOrder, column_is_nullable, decode_cursor, encode_cursor,
+    order_by_desc, paginate, paginate_keyset
+)
+
+Base = declarative_base()
+
+class Document(Base):
+    __tablename__ = "documents"
+
+    document_id = Column(Integer, primary_key=True)
+    company_id = Column(Integer, nullable=False)
+    name = Column(String(50), nullable=False)
+    created_at = Column(DateTime, nullable=False)
+    note = Column(String(50))
+
+ORDER = order_by_desc(Document.created_at, Document.document_id)
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    base_time = datetime(2025, 7, 1, 9, 0, 0)
+    for i in range(1, 26):
+        session.add(Document(
+            document_id=i,
+            company_id=1 if i <= 23 else 2,
+            name=f"doc-{i % 5}",
+            # 作成日時の重複を含める（主キーで順序が決まること）
+            created_at=base_time + timedelta(minutes=i // 3),
+            note=None if i % 3 == 0 else f"note-{i % 4}",
+        ))
+    session.commit()
+    yield session
+    session.close()
+
+
+class TestKeysetPagination:
+    """キーセットページネーションテストクラス"""
+
+    def test_pages_match_offset_order(self, db):
+        """カーソルで辿った結果が OFFSET 方式の全件順序と一致すること"""
+        query = db.query(Document).filter(Document.company_id == 1)
+        expected = [
+            d.document_id for d in
+            query.order_by(Document.created_at.desc(), Document.document_id.desc()).all()
+        ]
+
+        seen, cursor = [], None
+        while True:
+            page = paginate_keyset(query, ORDER, 5, cursor=cursor)
+            seen.extend(d.document_id for d in page.items)
+            if not page.has_more:
+                assert page.next_cursor is None
+                break
+            cursor = page.next_cursor
+        assert seen == expected
+
+    def test_mixed_direction(self, db):
+        """昇順・降順が混在する並び順でも重複・欠落がないこと"""
+        order = (KeysetOrder(Document.name, False), KeysetOrder(Document.document_id, True))
+        query = db.query(Document)
+        expected = [
+            d.document_id for d in
+            query.order_by(Document.name.asc(), Document.document_id.desc()).all()
+        ]
+
+        seen, cursor = [], None
+        while True:
+            page = paginate_keyset(query, order, 4, cursor=cursor)
+            seen.extend(d.document_id for d in page.items)
+            if not page.has_more:
+                break
+            cursor = page.next_cursor
+        assert seen == expected
+
+    @pytest.mark.parametrize("descending", [False, True])
+    def test_nullable_column(self, db, descending):
+        """NULL を含むカラムでも末尾の NULL まで重複・欠落なく辿れること"""
+        order = (
+            KeysetOrder(Document.note, descending, nullable=column_is_nullable(Document.note)),
+            KeysetOrder(Document.document_id, descending),
+        )
+        rows = db.query(Document).all()
+        non_null = sorted((d for d in rows if d.note is not None),
+                          key=lambda d: (d.note, d.document_id), reverse=descending)
+        nulls = sorted((d for d in rows if d.note is None), key=lambda d: d.document_id, reverse=descending)
+        expected = [d.document_id for d in non_null + nulls]
+
+        seen, cursor = [], None
+        while True:
+            # 3件ごとのページで、NULL の行がページ末尾になるカーソルを含む
+            page = paginate_keyset(db.query(Document), order, 3, cursor=cursor)
+            seen.extend(d.document_id for d in page.items)
+            if not page.has_more:
+                break
+            cursor = page.next_cursor
+        assert seen == expected
+
+    def test_page_number_fallback(self, db):
+        """cursor 未指定時はページ番号の位置から取得すること"""
+        query = db.query(Document).filter(Document.company_id == 1)
+        first = paginate(query, ORDER, 5, namespace="docs:1", cache=CountCache())
+        second_by_page = paginate(query, ORDER, 5, namespace="docs:1", page=2, cache=CountCache())
+        second_by_cursor = paginate(query, ORDER, 5, namespace="docs:1", cursor=first.next_cursor, cache=CountCache())
+        assert [d.document_id for d in second_by_page.items] == [d.document_id for d in second_by_cursor.items]
+        assert first.total == 23
+        assert first.to_dict(5)["pages"] == 5
+
+
+class TestCursorEncoding:
+    """カーソルのエンコード・検証テストクラス"""
+
+    def test_roundtrip(self):
+        values = [datetime(2025, 7, 1, 12, 30, 15, 123456), 42]
+        assert decode_cursor(ORDER, encode_cursor(ORDER, values)) == values
+
+    @pytest.mark.parametrize("cursor", ["not-a-cursor", "", "e30"])
+    def test_invalid_cursor(self, cursor):
+        """不正なカーソルは400になること"""
+        with pytest.raises(HTTPException) as exc_info:
+            decode_cursor(ORDER, cursor)
+        assert exc_info.value.status_code == 400
+
+    def test_null_only_for_nullable_columns(self):
+        """NULL の値は nullable なカラムのカーソルでのみ受け付けること"""
+        nullable = (KeysetOrder(Document.note, False, nullable=True), KeysetOrder(Document.document_id, False))
+        assert decode_cursor(nullable, encode_cursor(nullable, [None, 3])) == [None, 3]
+        with pytest.raises(HTTPException):
+            decode_cursor(ORDER, encode_cursor(ORDER, [None, 3]))
+        assert column_is_nullable(Document.note) and not column_is_nullable(Document.name)
+
+    def test_cursor_from_other_ordering(self):
+        """別の並び順で発行されたカーソルは拒否されること"""
+        other = (KeysetOrder(Document.name, False), KeysetOrder(Document.document_id, False))
+        cursor = encode_cursor(other, ["doc-1", 3])
+        with pytest.raises(HTTPException):
+            decode_cursor(ORDER, cursor)
+
+
+class TestCountCache:
+    """件数キャッシュテストクラス"""
+
+    def test_cached_and_invalidated(self, db):
+        now = [0.0]
+        cache = CountCache(ttl_seconds=30, clock=lambda: now[0])
+        query = db.query(Document).filter(Document.company_id == 1)
+
+        assert cache.total(query, "docs:1") == (23, False)
+        db.add(Document(document_id=100, company_id=1, name="new", created_at=datetime(2025, 8, 1)))
+        db.commit()
+
+        # TTL内はキャッシュ値
+        assert cache.total(query, "docs:1") == (23, False)
+        assert cache.hits == 1
+
+        # 登録時の invalidate で再計算される
+        assert cache.invalidate("docs:1") == 1
+        assert cache.total(query, "docs:1") == (24, False)
+
+        # TTL経過でも再計算される
+        db.add(Document(document_id=101, company_id=1, name="new", created_at=datetime(2025, 8, 2)))
+        db.commit()
+        now[0] = 31.0
+        assert cache.total(query, "docs:1") == (25, False)
+
+    def test_filters_are_cached_separately(self, db):
+        cache = CountCache()
+        company1 = db.query(Document).filter(Document.company_id == 1)
+        company2 = db.query(Document).filter(Document.company_id == 2)
+        assert cache.total(company1, "docs")[0] == 23
+        assert cache.total(company2, "docs")[0] == 2
+
+    def test_estimate_falls_back_to_exact(self, db):
+        """PostgreSQL以外では推定件数の代わりに正確な件数を返すこと"""
+        query = db.query(Document)
+        assert CountCache().total(query, "docs", mode="estimate") == (25, False)
+        assert CountCache().total(query, "docs", mode="none") == (None, False)
@@ -0,0 +1,90 @@
+import asyncio
+import time
+from unittest.mock import Mock
+
+import pytest
+
+from ..auth.password_hashing import PasswordHasher, build_password_context
+
+class TestPasswordHasher:
+    """非同期パスワードハッシャーテストクラス"""
+
+    def setup_method(self):
+        # テスト高速化のため最小ワークファクター
+        self.hasher = PasswordHasher(context=build_password_context(rounds=4), max_workers=2, per_host_limit=1)
+
+    def teardown_method(self):
+        self.hasher.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_hash_and_verify(self):
+        """ハッシュ化・検証がプール経由で動作すること"""
+        hashed = await self.hasher.hash("Garden-Pass1!")
+        assert hashed.startswith("$2b$04$")
+        assert await self.hasher.verify("Garden-Pass1!", hashed) is True
+        assert await self.hasher.verify("wrong", hashed) is False
+        assert await self.hasher.verify("Garden-Pass1!", "not-a-hash") is False
+
+    @pytest.mark.asyncio
+    async def test_per_host_limit(self):
+        """同一ホストの同時実行数が制限されること"""
+        running = 0
+        peak = 0
+
+        def slow_hash(password):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            time.sleep(0.02)
+            running -= 1
+            return password
+
+        self.hasher.context = Mock(hash=slow_hash)
+        await asyncio.gather(*(self.hasher.hash(str(i), host="10.0.0.1") for i in range(4)))
+        assert peak == 1
+        # 待機者がいなくなったホストのセマフォは破棄されること
+        assert self.hasher._host_semaphores == {}
+
+    @pytest.mark.asyncio
+    async def test_event_loop_not_blocked(self):
+        """ハッシュ処理中もイベントループが進むこと"""
+        hasher = PasswordHasher(context=build_password_context(rounds=10), max_workers=1)
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.001)
+
+        task = asyncio.create_task(ticker())
+        await hasher.hash("Garden-Pass1!")
+        task.cancel()
+        hasher.shutdown()
+        assert ticks > 1
+
+    def test_calibrate(self):
+        """キャリブレーション結果にSLOと推奨値が含まれること"""
+        report = self.hasher.calibrate(latency_slo_ms=10_000, samples=1)
+        assert report["rounds"] == 4
+        assert report["recommended_rounds"] >= 4
+        assert report["hash_ms_median"] > 0
+        assert self.hasher.last_calibration is report
+
+    @pytest.mark.asyncio
+    async def test_calibrate_async_does_not_block(self):
+        """キャリブレーション中もイベントループが進むこと"""
+        hasher = PasswordHasher(context=build_password_context(rounds=10), max_workers=1)
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.001)
+
+        task = asyncio.create_task(ticker())
+        report = await hasher.calibrate_async(samples=1)
+        task.cancel()
+        hasher.shutdown()
+        assert ticks > 1 and hasher.last_calibration is report
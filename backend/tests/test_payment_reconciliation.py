@@ -0,0 +1,228 @@
+import io
+import os
+import random
+import time
+from datetime import date, timedelta
+
+import pytest
+
+from ..services.payment_reconciliation import (
+    AMBIGUOUS, DUPLICATE, ERROR, MATCHED, SUGGESTED, UNMATCHED,
+    STRATEGY_AMOUNT_ONLY, STRATEGY_CUSTOMER_TOTAL, STRATEGY_EXACT, STRATEGY_FEE_DEDUCTED, STRATEGY_FUZZY_NAME,
+    InvoiceIndex, OpenInvoice, PaymentReconciler, StatementFormatError, StatementLine,
+    iter_statement_lines, name_similarity, normalize_kana, open_statement, summarize
+)
+
+def make_invoice(invoice_id, name, total, paid=0, due_offset=0):
+    return OpenInvoice(
+        invoice_id=invoice_id,
+        invoice_number=f"INV-202406-{invoice_id:03d}",
+        customer_id=invoice_id,
+        customer_name=name,
+        name_key=normalize_kana(name),
+        total_amount=total,
+        paid_amount=paid,
+        due_date=date(2024, 6, 30) + timedelta(days=due_offset),
+    )
+
+def make_line(line_no, name, amount, transaction_id=None):
+    return StatementLine(line_no, date(2024, 7, 1), amount, name, transaction_id, normalize_kana(name))
+
+
+class TestNormalizeKana:
+    """振込名義の正規化テストクラス"""
+
+    @pytest.mark.parametrize("name, expected", [
+        ("ｶ)ﾀﾅｶｿﾞｳｴﾝ", "タナカゾウエン"),
+        ("タナカ造園(カ", "タナカ造園"),
+        ("株式会社 タナカゾウエン", "タナカゾウエン"),
+        ("たなか ぞうえん", "タナカゾウエン"),
+        ("ﾔﾏﾓﾄ ｼﾖｳｼﾞ", "ヤマモトシヨウジ"),
+        ("ヤマモト　ショウジ", "ヤマモトシヨウジ"),
+        ("", ""),
+        (None, ""),
+    ])
+    def test_normalize(self, name, expected):
+        assert normalize_kana(name) == expected
+
+    def test_similarity(self):
+        assert name_similarity("タナカゾウエン", "タナカゾウエン") == 1.0
+        assert name_similarity("タナカゾウエン", "タナカゾウエンコウギヨウ") == 0.9  # 銀行側の切り詰め
+        assert name_similarity("タナカゾウエン", "タナカソウエン") < 0.75
+        assert name_similarity("スズキケンセツ", "サトウゾウエン") == 0.0
+
+
+class TestStatementParsing:
+    """入金明細読み込みテストクラス"""
+
+    CSV = (
+        "取引日,摘要,入金額,出金額,取引番号\n"
+        "2024/07/01,ｶ)ﾀﾅｶｿﾞｳｴﾝ,\"110,000\",,T001\n"
+        "2024/07/01,ﾃｽｳﾘﾖｳ,,440,T002\n"
+        "2024/07/02,ｽｽﾞｷ ﾀﾛｳ,abc,,T003\n"
+        "\n"
+        "20240703,ｻﾄｳ ﾊﾅｺ,55000,,\n"
+    )
+
+    def test_parse_lines(self):
+        parsed = list(iter_statement_lines(io.StringIO(self.CSV)))
+
+        assert len(parsed) == 3
+        first, error, last = parsed
+        assert (first.line_no, first.amount, first.transaction_id, first.name_key) == (2, 110000, "T001", "タナカゾウエン")
+        assert isinstance(error, StatementFormatError) and error.line_no == 4
+        assert last.transaction_date == date(2024, 7, 3)
+        assert last.transaction_id is None
+
+    @pytest.mark.parametrize("encoding", ["cp932", "utf-8", "utf-8-sig"])
+    def test_detect_encoding(self, encoding):
+        stream = io.BytesIO(self.CSV.encode(encoding))
+        parsed = list(iter_statement_lines(open_statement(stream)))
+        assert parsed[0].payer_name == "ｶ)ﾀﾅｶｿﾞｳｴﾝ"
+
+    def test_missing_columns(self):
+        with pytest.raises(StatementFormatError):
+            list(iter_statement_lines(io.StringIO("日付,備考\n2024/07/01,x\n")))
+
+
+class TestPaymentReconciler:
+    """入金照合テストクラス"""
+
+    def test_exact_match_oldest_first(self):
+        index = InvoiceIndex([
+            make_invoice(1, "タナカゾウエン", 110000, due_offset=30),
+            make_invoice(2, "タナカゾウエン", 110000, due_offset=0),
+        ])
+        reconciler = PaymentReconciler(index)
+
+        first = reconciler.match(make_line(1, "ｶ)ﾀﾅｶｿﾞｳｴﾝ", 110000))
+        second = reconciler.match(make_line(2, "ｶ)ﾀﾅｶｿﾞｳｴﾝ", 110000))
+        third = reconciler.match(make_line(3, "ｶ)ﾀﾅｶｿﾞｳｴﾝ", 110000))
+
+        assert (first.status, first.strategy, first.allocations[0][0].invoice_id) == (MATCHED, STRATEGY_EXACT, 2)
+        assert second.allocations[0][0].invoice_id == 1
+        assert third.status == UNMATCHED
+
+    def test_partial_payment_balance(self):
+        index = InvoiceIndex([make_invoice(1, "サトウハナコ", 100000, paid=40000)])
+        result = PaymentReconciler(index).match(make_line(1, "ｻﾄｳ ﾊﾅｺ", 60000))
+        assert result.status == MATCHED
+        assert result.allocations[0][1] == 60000
+
+    def test_fuzzy_name(self):
+        index = InvoiceIndex([
+            make_invoice(1, "ヤマモトゾウエンコウギヨウ", 88000),
+            make_invoice(2, "スズキケンセツ", 88000),
+        ])
+        result = PaymentReconciler(index).match(make_line(1, "ﾔﾏﾓﾄｿﾞｳｴﾝｺｳｷﾞﾖ", 88000))
+        assert (result.status, result.strategy) == (MATCHED, STRATEGY_FUZZY_NAME)
+        assert result.allocations[0][0].invoice_id == 1
+
+    def test_customer_total(self):
+        index = InvoiceIndex([
+            make_invoice(1, "イトウタロウ", 30000),
+            make_invoice(2, "イトウタロウ", 20000),
+        ])
+        result = PaymentReconciler(index).match(make_line(1, "ｲﾄｳ ﾀﾛｳ", 50000))
+        assert (result.status, result.strategy) == (MATCHED, STRATEGY_CUSTOMER_TOTAL)
+        assert sorted(invoice.invoice_id for invoice, _ in result.allocations) == [1, 2]
+
+    def test_amount_only_is_not_applied(self):
+        index = InvoiceIndex([make_invoice(1, "ワタナベ", 77000), make_invoice(2, "コバヤシ", 66000),
+                              make_invoice(3, "カトウ", 66000)])
+        reconciler = PaymentReconciler(index)
+
+        single = reconciler.match(make_line(1, "ﾀｶﾊｼ", 77000))
+        multiple = reconciler.match(make_line(2, "ﾀｶﾊｼ", 66000))
+
+        assert (single.status, single.strategy) == (SUGGESTED, STRATEGY_AMOUNT_ONLY)
+        assert (multiple.status, len(multiple.candidates)) == (AMBIGUOUS, 2)
+        assert not any(invoice.consumed for invoice in index.by_amount[66000])
+
+    def test_fee_deducted(self):
+        index = InvoiceIndex([make_invoice(1, "ナカムラゾウエン", 110000)])
+        result = PaymentReconciler(index).match(make_line(1, "ﾅｶﾑﾗｿﾞｳｴﾝ", 109340))
+        assert (result.status, result.strategy) == (SUGGESTED, STRATEGY_FEE_DEDUCTED)
+
+    def test_duplicates_and_errors(self):
+        index = InvoiceIndex([make_invoice(1, "タナカ", 1000), make_invoice(2, "タナカ", 2000)])
+        lines = [make_line(2, "ﾀﾅｶ", 1000, "T1"), StatementFormatError(3, "bad"), make_line(4, "ﾀﾅｶ", 2000, "T2")]
+        calls = []
+
+        def recorded(ids):
+            calls.append(ids)
+            return {"T1"}
+
+        results = PaymentReconciler(index).reconcile(lines, recorded, chunk_size=2)
+
+        assert [r.status for r in results] == [DUPLICATE, ERROR, MATCHED]
+        assert calls == [["T1"], ["T2"]]
+        assert summarize(results)['matched_amount'] == 2000
+
+    def test_duplicates_within_file(self):
+        index = InvoiceIndex([make_invoice(i, "タナカ", 1000) for i in range(1, 5)])
+        statement = io.StringIO(
+            "取引日,振込依頼人名,入金額,取引番号\n"
+            "2024/07/01,ﾀﾅｶ,1000,T1\n"
+            "2024/07/01,ﾀﾅｶ,1000,T1\n"   # 同じ取引番号
+            "2024/07/01,ﾀﾅｶ,1000,\n"
+            "2024/07/01,ﾀﾅｶ,1000,\n"     # 取引番号なし・同じ内容
+            "2024/07/02,ﾀﾅｶ,1000,\n"     # 取引日が異なる別の入金
+        )
+
+        results = PaymentReconciler(index).reconcile(iter_statement_lines(statement), chunk_size=2)
+
+        assert [r.status for r in results] == [MATCHED, DUPLICATE, MATCHED, DUPLICATE, MATCHED]
+        assert results[3].message == "入金明細ファイル内で同じ明細が重複しています"
+
+    def test_recorded_lines_without_transaction_id(self):
+        index = InvoiceIndex([make_invoice(1, "タナカ", 1000), make_invoice(2, "スズキ", 2000)])
+        lines = [make_line(2, "ﾀﾅｶ", 1000), make_line(3, "ｽｽﾞｷ", 2000)]
+        calls = []
+
+        def recorded_keys(keys):
+            calls.append(keys)
+            return {lines[0].line_key}
+
+        results = PaymentReconciler(index).reconcile(lines, recorded_line_keys=recorded_keys)
+
+        assert [r.status for r in results] == [DUPLICATE, MATCHED]
+        assert calls == [[lines[0].line_key, lines[1].line_key]]
+        assert lines[0].line_key != lines[1].line_key
+
+
+@pytest.mark.benchmark
+class TestReconciliationBenchmark:
+    """大量明細の照合テストクラス"""
+
+    def test_bulk_statement(self, record_property):
+        """既定は明細1万行×未入金請求書5万件。件数は環境変数で変更可能"""
+        lines_count = int(os.getenv("RECONCILIATION_BENCH_LINES", "10000"))
+        invoices_count = int(os.getenv("RECONCILIATION_BENCH_INVOICES", "50000"))
+        rng = random.Random(37)
+        syllables = "アイウエオカキクケコサシスセソタチツテトナニヌネノハヒフヘホマミムメモヤユヨラリルレロワ"
+        names = sorted({''.join(rng.choice(syllables) for _ in range(rng.randint(4, 10)))
+                        for _ in range(invoices_count // 5)})
+        invoices = [
+            make_invoice(i, rng.choice(names), rng.randint(1, 2000) * 1100, due_offset=rng.randint(0, 90))
+            for i in range(1, invoices_count + 1)
+        ]
+        targets = rng.sample(invoices, lines_count)
+        statement = io.StringIO()
+        statement.write("取引日,振込依頼人名,入金額,取引番号\n")
+        for n, invoice in enumerate(targets):
+            statement.write(f"2024/07/01,ｶ){invoice.customer_name},{invoice.outstanding},T{n}\n")
+        statement.seek(0)
+
+        started = time.perf_counter()
+        index = InvoiceIndex(invoices)
+        results = PaymentReconciler(index).reconcile(iter_statement_lines(statement))
+        elapsed = time.perf_counter() - started
+
+        assert len(results) == lines_count
+        assert all(result.status == MATCHED for result in results)
+        applied = [invoice.invoice_id for result in results for invoice, _ in result.allocations]
+        assert len(applied) == len(set(applied))
+        record_property("lines", lines_count)
+        record_property("invoices", invoices_count)
+        record_property("elapsed_s", round(elapsed, 2))
@@ -0,0 +1,84 @@
+import pytest
+
+from ..auth.permission_bits import PermissionTable, flatten_permission_matrix
+from ..auth.rbac import (
+    Permission, UserRole, rbac_manager,
+    get_user_permissions_dict, get_rbac_matrix
+)
+
+SAMPLE_MATRIX = {
+    "owner": {
+        "estimates": {"view": True, "delete": True, "view_cost": True},
+        "invoices": {"view": True, "issue": True},
+    },
+    "employee": {
+        "estimates": {"view": True, "delete": False, "view_cost": False},
+        "invoices": {"view": False, "issue": False},
+    },
+}
+
+class TestPermissionTable:
+    """ビットマスク権限テーブルテストクラス"""
+
+    def setup_method(self):
+        self.table = PermissionTable(flatten_permission_matrix(SAMPLE_MATRIX))
+
+    def test_matches_nested_matrix(self):
+        """ネスト辞書による判定と結果が一致すること"""
+        for role, resources in SAMPLE_MATRIX.items():
+            for resource, actions in resources.items():
+                for action, granted in actions.items():
+                    assert self.table.has(role, f"{resource}:{action}") is granted
+
+    def test_unknown_role_and_permission(self):
+        """未定義のロール・権限は拒否されること"""
+        assert self.table.has("viewer", "estimates:view") is False
+        assert self.table.has("owner", "estimates:unknown") is False
+        assert self.table.role_mask("viewer") == 0
+
+    def test_batch_evaluate(self):
+        """一括判定が個別判定と一致すること"""
+        batch = self.table.batch({
+            "can_view": "estimates:view",
+            "can_issue": "invoices:issue",
+            "can_fly": "system:fly",
+        })
+        flags = batch.evaluate(self.table.role_mask("employee"))
+        assert flags == {"can_view": True, "can_issue": False, "can_fly": False}
+        assert self.table.allowed("owner", ["invoices:issue", "estimates:delete"]) == {
+            "invoices:issue": True,
+            "estimates:delete": True,
+        }
+
+    def test_mask_roundtrip(self):
+        """ビットマスクから権限名を復元できること"""
+        mask = self.table.mask_of(["estimates:view", "invoices:issue"])
+        assert sorted(self.table.permissions_of(mask)) == ["estimates:view", "invoices:issue"]
+
+
+class TestRBACManagerBitmask:
+    """RBACManagerのビットマスク判定テストクラス"""
+
+    @pytest.mark.parametrize("role", list(UserRole))
+    def test_matches_role_permission_lists(self, role):
+        """全権限について従来のリスト判定と一致すること"""
+        granted = rbac_manager.get_user_permissions(role)
+        for permission in Permission:
+            assert rbac_manager.has_permission(role, permission) is (permission in granted)
+            # 文字列値でも同じ結果になること
+            assert rbac_manager.has_permission(role.value, permission.value) is (permission in granted)
+
+    def test_frontend_flags(self):
+        """フロントエンド用権限辞書"""
+        owner_flags = get_user_permissions_dict(UserRole.OWNER)
+        employee_flags = get_user_permissions_dict(UserRole.EMPLOYEE)
+        assert all(owner_flags.values())
+        assert employee_flags["canViewCosts"] is False
+        assert employee_flags["canReadEstimates"] is True
+
+    def test_rbac_matrix(self):
+        """権限マトリクス"""
+        matrix = get_rbac_matrix()
+        assert matrix["owner"]["請求書の発行"] is True
+        assert matrix["employee"]["請求書の発行"] is False
+        assert matrix["employee"]["明細ごとの調整額入力"] is True
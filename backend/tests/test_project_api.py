@@ -0,0 +1,135 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from ..api.project_api import ProjectResponse, router
+from ..database import get_db
+from ..models.project_models import Base, Company, Project
+
+TODAY = date.today()
+
+HYBRIDS = ('estimated_profit', 'estimated_profit_rate', 'budget_consumption_rate', 'schedule_status', 'budget_status')
+
+def project(project_id, company_id=1, revenue=1000000, budget=800000, actual=400000, end_date=None, progress=50,
+            status='進行中'):
+    return Project(
+        project_id=project_id, company_id=company_id, customer_id=1, project_name=f"庭園{project_id}",
+        status=status, estimated_revenue=revenue, total_budget=budget, actual_cost=actual,
+        end_date=end_date, progress_percentage=progress,
+    )
+
+@pytest.fixture
+def schema():
+    return Base.metadata
+
+@pytest.fixture
+def session(session):
+    session.add_all([
+        Company(company_id=1, company_name="庭園設計", company_code="GD"),
+        Company(company_id=2, company_name="緑化工房", company_code="RK"),
+        # 予定どおり
+        project(1, end_date=TODAY + timedelta(days=30)),
+        # 予算・見積0円、完了日なし
+        project(2, revenue=0, budget=0, actual=0, progress=0, status='見積中'),
+        # 完了日超過・予算の9割超
+        project(3, revenue=120000, budget=100000, actual=95000, end_date=TODAY - timedelta(days=1), progress=30),
+        # 本日完了予定・予算超過
+        project(4, revenue=90000, budget=100000, actual=150000, end_date=TODAY, progress=10),
+        # 完了（完了日超過でも遅延ではない）
+        project(5, end_date=TODAY - timedelta(days=10), progress=100, status='完了'),
+        # 予算0円で原価のみ発生
+        project(6, revenue=0, budget=0, actual=5000),
+        # 他社
+        project(7, company_id=2, end_date=TODAY - timedelta(days=1)),
+    ])
+    session.commit()
+    return session
+
+@pytest.fixture
+def client(session):
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides[get_db] = lambda: session
+    return TestClient(app)
+
+def expected_response(session, project_id):
+    return ProjectResponse.model_validate(session.get(Project, project_id)).model_dump(mode="json")
+
+
+class TestProjectHybrids:
+    """プロジェクト計算項目（hybrid_property）テストクラス"""
+
+    @pytest.mark.parametrize("name", HYBRIDS)
+    def test_sql_matches_python(self, session, name):
+        # 金額・進捗が未設定（NULL）のプロジェクト
+        session.add(Project(project_id=8, company_id=1, customer_id=1, project_name="庭園8",
+                            estimated_revenue=None, total_budget=None, actual_cost=None, progress_percentage=None))
+        session.commit()
+
+        sql_values = dict(session.query(Project.project_id, getattr(Project, name)).order_by(Project.project_id))
+        python_values = {p.project_id: getattr(p, name) for p in session.query(Project).order_by(Project.project_id)}
+
+        assert sql_values.keys() == python_values.keys()
+        for project_id, value in python_values.items():
+            if isinstance(value, float):
+                assert sql_values[project_id] == pytest.approx(value), project_id
+            else:
+                assert sql_values[project_id] == value, project_id
+
+    def test_python_values(self, session):
+        values = {
+            p.project_id: tuple(getattr(p, name) for name in HYBRIDS)
+            for p in session.query(Project).filter(Project.company_id == 1).order_by(Project.project_id)
+        }
+
+        assert values == {
+            1: (Decimal(200000), 20.0, 50.0, "正常", "正常"),
+            2: (0, 0.0, 0.0, "正常", "正常"),
+            3: (Decimal(20000), pytest.approx(16.666666), 95.0, "遅延", "要注意"),
+            4: (Decimal(-10000), pytest.approx(-11.111111), 150.0, "要注意", "予算超過"),
+            5: (Decimal(200000), 20.0, 50.0, "完了", "正常"),
+            6: (0, 0.0, 0.0, "正常", "予算超過"),
+        }
+
+
+class TestProjectEndpoints:
+    """プロジェクト一覧・詳細・統計APIテストクラス"""
+
+    def test_list_matches_orm_response(self, client, session):
+        response = client.get("/api/projects/")
+
+        assert response.status_code == 200
+        projects = {p["project_id"]: p for p in response.json()}
+        # 自社のプロジェクトのみ、計算項目はSQL式で取得した値がORMの値と一致
+        assert sorted(projects) == [1, 2, 3, 4, 5, 6]
+        for project_id, body in projects.items():
+            assert body == expected_response(session, project_id)
+
+    def test_list_filters_by_status(self, client):
+        response = client.get("/api/projects/", params={"status": "見積中"})
+        assert [p["project_id"] for p in response.json()] == [2]
+
+    def test_detail(self, client, session):
+        response = client.get("/api/projects/3")
+
+        assert response.status_code == 200
+        assert response.json() == expected_response(session, 3)
+        assert response.json()["schedule_status"] == "遅延"
+        assert client.get("/api/projects/7").status_code == 404
+
+    def test_statistics(self, client):
+        response = client.get("/api/projects/statistics")
+
+        assert response.status_code == 200
+        stats = response.json()
+        assert {key: stats[key] for key in ("total_projects", "active_projects", "completed_projects",
+                                            "delayed_projects")} == {
+            "total_projects": 6, "active_projects": 5, "completed_projects": 1, "delayed_projects": 1,
+        }
+        assert Decimal(stats["total_budget"]) == 1800000
+        assert Decimal(stats["total_revenue"]) == 2210000
+        assert Decimal(stats["total_profit"]) == 410000
+        assert stats["average_profit_rate"] == pytest.approx(410000 / 2210000 * 100)
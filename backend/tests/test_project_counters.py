@@ -0,0 +1,108 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import func, insert, select, update
+
+from ..models.project_models import (
+    Base, ChangeOrder, Company, Project, ProjectTask, check_project_counters, refresh_project_counters
+)
+
+COUNTERS = ('task_count', 'completed_task_count', 'delayed_task_count', 'change_order_count',
+            'pending_change_order_count')
+
+@pytest.fixture
+def schema():
+    return Base.metadata
+
+@pytest.fixture
+def session(session):
+    session.add(Company(company_id=1, company_name="庭園設計", company_code="GD"))
+    session.add_all(Project(project_id=i, company_id=1, customer_id=1, project_name=f"庭園{i}") for i in (1, 2))
+    session.commit()
+    return session
+
+def task(project_id, status='未開始', **values):
+    return ProjectTask(project_id=project_id, task_name="植栽", status=status,
+                       start_date=date(2026, 4, 1), end_date=date(2026, 4, 30), **values)
+
+def change_order(project_id, status='申請中'):
+    return ChangeOrder(project_id=project_id, change_type="追加", title="景石追加", description="景石3基",
+                       requested_by="施主", status=status)
+
+def counters(session, project_id):
+    session.expire_all()
+    project = session.get(Project, project_id)
+    return {name: getattr(project, name) for name in COUNTERS}
+
+
+class TestProjectCounters:
+    """プロジェクト集計カウンターテストクラス"""
+
+    def test_orm_changes_keep_counters(self, session):
+        tasks = [task(1), task(1, '完了'), task(1, '遅延')]
+        orders = [change_order(1), change_order(1, '承認済')]
+        session.add_all(tasks + orders)
+        session.commit()
+        assert counters(session, 1) == {
+            'task_count': 3, 'completed_task_count': 1, 'delayed_task_count': 1,
+            'change_order_count': 2, 'pending_change_order_count': 1,
+        }
+
+        tasks[0].status = '完了'
+        tasks[2].project_id = 2     # 別プロジェクトへ移動（移動元も再計算）
+        orders[0].status = '承認済'
+        session.delete(orders[1])
+        session.commit()
+
+        assert counters(session, 1)['completed_task_count'] == 2
+        assert counters(session, 1)['delayed_task_count'] == 0
+        assert counters(session, 2)['delayed_task_count'] == 1
+        assert counters(session, 1)['pending_change_order_count'] == 0
+        assert check_project_counters(session) == []
+
+    def test_repair(self, session):
+        session.add_all([task(1), task(1, '完了'), change_order(2)])
+        session.commit()
+        # ORMを経由しない更新で集計列がずれた状態
+        session.execute(update(Project).where(Project.project_id == 1).values(task_count=9, completed_task_count=0))
+        session.execute(update(Project).where(Project.project_id == 2).values(pending_change_order_count=0))
+        session.commit()
+
+        mismatches = check_project_counters(session)
+        assert [m['project_id'] for m in mismatches] == [1, 2]
+        assert mismatches[0]['counters']['task_count'] == {'stored': 9, 'actual': 2}
+        # チェックのみでは修正しない
+        assert counters(session, 1)['task_count'] == 9
+
+        check_project_counters(session, repair=True)
+
+        assert check_project_counters(session) == []
+        assert counters(session, 1)['task_count'] == 2
+
+
+@pytest.mark.benchmark
+def test_benchmark_recount(session):
+    """1,000プロジェクト × 50タスクの再計算と整合性チェック（相関サブクエリの件数と一致）"""
+    projects, tasks_per_project = 1000, 50
+    statuses = ('未開始', '進行中', '完了', '遅延', '完了')
+    session.execute(insert(Project), [
+        {"project_id": i, "company_id": 1, "customer_id": 1, "project_name": f"庭園{i}"}
+        for i in range(3, projects + 1)
+    ])
+    session.execute(insert(ProjectTask), [
+        {"project_id": project_id, "task_name": "植栽", "status": statuses[(project_id + n) % len(statuses)],
+         "start_date": date(2026, 4, 1), "end_date": date(2026, 4, 30)}
+        for project_id in range(1, projects + 1) for n in range(tasks_per_project)
+    ])
+    assert len(check_project_counters(session)) == projects
+
+    refresh_project_counters(session.connection(), range(1, projects + 1))
+
+    assert check_project_counters(session) == []
+    completed = select(func.count()).where(
+        ProjectTask.project_id == Project.project_id, ProjectTask.status == '完了'
+    ).scalar_subquery()
+    assert all(
+        row.completed_task_count == row.expected
+        for row in session.execute(select(Project.completed_task_count, completed.label("expected")))
+    )
@@ -0,0 +1,148 @@
+import os
+import threading
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from ..services.prometheus_metrics import (
+    DB_QUERIES, DB_QUERY_ERRORS, HTTP_REQUEST_DURATION, HTTP_REQUESTS, HTTP_REQUESTS_IN_FLIGHT, SLOW_QUERIES,
+    MetricsRegistry, MultiprocessExporter, instrument_engine, render
+)
+from ..services.system_metrics import LatencyHistogram, RequestMetricsMiddleware
+
+def sample(metric, *labels):
+    return metric.state()["samples"].get(labels, 0)
+
+
+class TestMetricsRegistry:
+    """メトリクス集計テストクラス"""
+
+    def test_render(self):
+        registry = MetricsRegistry()
+        requests = registry.counter("requests_total", "リクエスト数", ("method", "path"))
+        latency = registry.histogram("latency_seconds", "処理時間", buckets=(0.1, 1.0))
+        requests.inc("GET", 'a"b')
+        requests.inc("GET", 'a"b', amount=2)
+        for value in (0.05, 0.1, 0.5, 3.0):
+            latency.observe(value)
+
+        assert render(registry.collect()) == (
+            "# HELP latency_seconds 処理時間\n"
+            "# TYPE latency_seconds histogram\n"
+            'latency_seconds_bucket{le="0.1"} 2\n'
+            'latency_seconds_bucket{le="1"} 3\n'
+            'latency_seconds_bucket{le="+Inf"} 4\n'
+            "latency_seconds_sum 3.65\n"
+            "latency_seconds_count 4\n"
+            "# HELP requests_total リクエスト数\n"
+            "# TYPE requests_total counter\n"
+            'requests_total{method="GET",path="a\\"b"} 3\n'
+        )
+
+    def test_duplicate_name(self):
+        registry = MetricsRegistry()
+        registry.gauge("in_flight", "")
+        with pytest.raises(ValueError):
+            registry.counter("in_flight", "")
+
+    def test_threads_write_own_shards(self):
+        registry = MetricsRegistry()
+        counter = registry.counter("hits_total", "", ("cache",))
+        histogram = registry.histogram("seconds", "")
+
+        def work():
+            for _ in range(10_000):
+                counter.inc("memory")
+                histogram.observe(0.01)
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert sample(counter, "memory") == 80_000
+        assert sample(histogram)[1] == 80_000 and len(counter._shards) == 8
+
+    def test_multiprocess_merge(self, tmp_path):
+        workers = []
+        for pid in (101, 102):
+            registry = MetricsRegistry()
+            requests = registry.counter("requests_total", "", ("status",))
+            in_flight = registry.gauge("in_flight", "")
+            latency = registry.histogram("latency_seconds", "", buckets=(1.0,))
+            requests.inc("200", amount=pid - 100)
+            in_flight.inc(amount=pid - 100)
+            latency.observe(0.5)
+            workers.append(MultiprocessExporter(
+                registry, str(tmp_path), pid=lambda pid=pid: pid, pid_alive=lambda pid: pid == 101
+            ))
+
+        workers[1].flush()   # 終了済みワーカーの最終書き出し
+        merged = workers[0].collect()
+
+        assert sorted(os.listdir(tmp_path)) == ["metrics_101.json", "metrics_102.json"]
+        assert merged["requests_total"]["samples"] == {("200",): 3}
+        assert merged["latency_seconds"]["samples"] == {(): [2, 0, 1.0]}
+        # 終了したワーカーのゲージは含めない
+        assert merged["in_flight"]["samples"] == {(): 1}
+
+    @pytest.mark.benchmark
+    def test_observe_overhead(self, record_property):
+        registry = MetricsRegistry()
+        histogram = registry.histogram("seconds", "", ("route",))
+        runs = int(os.getenv("METRICS_BENCH_RUNS", "200000"))
+
+        started = time.perf_counter()
+        for _ in range(runs):
+            histogram.observe(0.02, "/api/projects")
+        elapsed = time.perf_counter() - started
+
+        assert sample(histogram, "/api/projects")[2] == runs   # 0.025秒以下のバケット
+        record_property("ns_per_observation", round(elapsed / runs * 1e9))
+
+
+class TestInstrumentation:
+    """計測フックテストクラス"""
+
+    def test_database_queries(self):
+        engine = create_engine("sqlite://")
+        instrument_engine(engine, slow_query_seconds=0)
+        selects, slow, errors = sample(DB_QUERIES, "SELECT"), sample(SLOW_QUERIES, "SELECT"), sample(DB_QUERY_ERRORS, "SELECT")
+
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+            connection.execute(text("  select 2"))
+            with pytest.raises(OperationalError):
+                connection.execute(text("SELECT * FROM missing_table"))
+            assert connection.info["metrics_query_start"] == []
+
+        assert sample(DB_QUERIES, "SELECT") - selects == 2
+        assert sample(SLOW_QUERIES, "SELECT") - slow == 2
+        assert sample(DB_QUERY_ERRORS, "SELECT") - errors == 1
+        engine.dispose()
+
+    def test_http_routes(self):
+        app = FastAPI()
+        app.add_middleware(RequestMetricsMiddleware, histogram=LatencyHistogram())
+
+        @app.get("/projects/{project_id}")
+        async def get_project(project_id: int):
+            assert sample(HTTP_REQUESTS_IN_FLIGHT) == 1
+            return {}
+
+        before = sample(HTTP_REQUESTS, "GET", "/projects/{project_id}", "200")
+        client = TestClient(app)
+        client.get("/projects/1")
+        client.get("/projects/2")
+        client.get("/unknown")
+        client.get("/metrics")   # 計測対象外
+
+        assert sample(HTTP_REQUESTS, "GET", "/projects/{project_id}", "200") - before == 2
+        assert sample(HTTP_REQUESTS, "GET", "unmatched", "404") >= 1
+        assert sample(HTTP_REQUEST_DURATION, "GET", "/projects/{project_id}")[-2] == 0
+        assert sample(HTTP_REQUESTS_IN_FLIGHT) == 0
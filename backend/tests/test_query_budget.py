@@ -0,0 +1,145 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import Column, ForeignKey, Integer, MetaData, String, Table, insert, select
+
+from ..services.prometheus_metrics import QUERY_BUDGET_EXCEEDED
+from ..services.query_budget import (
+    QueryBudget, QueryBudgetExceeded, QueryBudgetMiddleware, fingerprint, query_budget, track_engine,
+    track_queries
+)
+
+metadata = MetaData()
+projects = Table(
+    "projects", metadata,
+    Column("project_id", Integer, primary_key=True),
+    Column("project_name", String(100)),
+)
+tasks = Table(
+    "tasks", metadata,
+    Column("task_id", Integer, primary_key=True),
+    Column("project_id", ForeignKey("projects.project_id")),
+    Column("task_name", String(100)),
+)
+
+@pytest.fixture
+def schema():
+    return metadata
+
+@pytest.fixture
+def engine(engine):
+    with engine.begin() as connection:
+        connection.execute(insert(projects), [{"project_id": i, "project_name": f"庭園{i}"} for i in range(1, 21)])
+        connection.execute(insert(tasks), [{"task_id": i, "project_id": i, "task_name": "植栽"} for i in range(1, 21)])
+    track_engine(engine)
+    return engine
+
+def list_tasks_n_plus_one(engine):
+    with engine.connect() as connection:
+        rows = connection.execute(select(tasks)).all()
+        return [
+            connection.execute(
+                select(projects.c.project_name).where(projects.c.project_id == row.project_id)
+            ).scalar_one()
+            for row in rows
+        ]
+
+def list_tasks_joined(engine):
+    with engine.connect() as connection:
+        return connection.execute(select(projects.c.project_name).join_from(tasks, projects)).scalars().all()
+
+def sample(metric, *labels):
+    return metric.state()["samples"].get(labels, 0)
+
+
+class TestFingerprint:
+    """クエリ指紋テストクラス"""
+
+    @pytest.mark.parametrize("statement, expected", [
+        ("SELECT * FROM t WHERE id = %(id_1)s", "SELECT * FROM t WHERE id = ?"),
+        ("SELECT * FROM t WHERE id = :id AND x::text = 'a''b'", "SELECT * FROM t WHERE id = ? AND x::text = ?"),
+        ("SELECT *\n  FROM t WHERE id IN ($1, $2, $3)", "SELECT * FROM t WHERE id IN (?)"),
+        ("SELECT t_1.id FROM t AS t_1 LIMIT 10", "SELECT t_1.id FROM t AS t_1 LIMIT ?"),
+    ])
+    def test_normalize(self, statement, expected):
+        assert fingerprint(statement) == expected
+
+    def test_in_lists_share_fingerprint(self):
+        assert fingerprint("SELECT * FROM t WHERE id IN (?)") == fingerprint("SELECT * FROM t WHERE id IN (?, ?, ?)")
+
+
+class TestTrackQueries:
+    """クエリ集計テストクラス"""
+
+    def test_detects_n_plus_one(self, engine):
+        with track_queries() as stats:
+            list_tasks_n_plus_one(engine)
+
+        assert stats.count == 21
+        [(key, count)] = stats.repeated(2)
+        assert count == 20 and "FROM projects" in key
+        assert QueryBudget(max_queries=5).violations(stats) == ["max_queries", "repeated"]
+
+    def test_joined_within_budget(self, engine):
+        with track_queries() as stats:
+            assert len(list_tasks_joined(engine)) == 20
+        assert stats.count == 1 and QueryBudget(max_queries=1).violations(stats) == []
+
+    def test_not_tracked_outside_block(self, engine):
+        with track_queries() as stats:
+            pass
+        list_tasks_joined(engine)
+        assert stats.count == 0
+
+
+class TestQueryBudgetMiddleware:
+    """クエリ予算ミドルウェアテストクラス"""
+
+    def build_client(self, engine, mode):
+        app = FastAPI()
+        app.add_middleware(QueryBudgetMiddleware, mode=mode)
+
+        # 同期エンドポイント（スレッドプールで実行）にも集計が引き継がれること
+        @app.get("/tasks/n-plus-one")
+        @query_budget(max_queries=3)
+        def tasks_n_plus_one():
+            return list_tasks_n_plus_one(engine)
+
+        @app.get("/tasks/joined")
+        @query_budget(max_queries=1)
+        async def tasks_joined():
+            return list_tasks_joined(engine)
+
+        @app.get("/tasks/undeclared")
+        def tasks_undeclared():
+            return list_tasks_n_plus_one(engine)
+
+        return TestClient(app)
+
+    def test_strict_fails_over_budget(self, engine):
+        client = self.build_client(engine, "strict")
+        assert client.get("/tasks/joined").status_code == 200
+
+        with pytest.raises(QueryBudgetExceeded) as error:
+            client.get("/tasks/n-plus-one")
+        assert error.value.route == "/tasks/n-plus-one"
+        assert error.value.reasons == ["max_queries", "repeated"]
+        assert "20回: SELECT projects.project_name FROM projects" in str(error.value)
+
+        # 予算未宣言のルートも既定の繰り返し上限で検出
+        with pytest.raises(QueryBudgetExceeded):
+            client.get("/tasks/undeclared")
+
+    def test_warn_records_metric(self, engine, caplog):
+        client = self.build_client(engine, "warn")
+        before = sample(QUERY_BUDGET_EXCEEDED, "/tasks/n-plus-one", "max_queries")
+
+        response = client.get("/tasks/n-plus-one")
+
+        assert response.status_code == 200
+        assert sample(QUERY_BUDGET_EXCEEDED, "/tasks/n-plus-one", "max_queries") - before == 1
+        assert "クエリ予算超過: /tasks/n-plus-one（21件 / 予算 3）" in caplog.text
+
+    def test_invalid_mode(self):
+        with pytest.raises(ValueError):
+            QueryBudgetMiddleware(FastAPI(), mode="fail")
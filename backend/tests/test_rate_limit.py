@@ -0,0 +1,159 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from ..auth.rate_limit import (
+    MemoryRateLimitStore, RateLimitMiddleware, RateLimitRule,
+    SharedMemoryRateLimitStore, SlidingWindowRateLimiter, client_ip_from_scope, parse_trusted_proxies
+)
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+class TestSlidingWindowRateLimiter:
+    """スライディングウィンドウ・レートリミッターテストクラス"""
+
+    def setup_method(self):
+        self.clock = FakeClock(600.0)  # ウィンドウ境界
+        self.limiter = SlidingWindowRateLimiter(clock=self.clock)
+        self.rule = RateLimitRule(limit=5, window_seconds=60)
+
+    def test_limit_within_window(self):
+        """ウィンドウ内で上限を超えると拒否されること"""
+        results = [self.limiter.hit("client", self.rule) for _ in range(6)]
+        assert [r.allowed for r in results] == [True] * 5 + [False]
+        assert results[0].remaining == 4
+        assert results[4].remaining == 0
+        assert results[5].retry_after > 0
+
+    def test_previous_window_is_weighted(self):
+        """前ウィンドウの件数が経過割合で減衰すること"""
+        for _ in range(5):
+            self.limiter.hit("client", self.rule)
+        # 次ウィンドウの半分経過: 推定 5 × 0.5 = 2.5件
+        self.clock.now += 90
+        allowed = [self.limiter.hit("client", self.rule).allowed for _ in range(3)]
+        assert allowed == [True, True, False]
+
+    def test_identifiers_are_independent(self):
+        """識別子ごとに独立して制限されること"""
+        for _ in range(5):
+            self.limiter.hit("a", self.rule)
+        assert self.limiter.hit("a", self.rule).allowed is False
+        assert self.limiter.hit("b", self.rule).allowed is True
+
+    def test_idle_keys_are_evicted(self):
+        """アイドル状態の識別子が削除されること"""
+        store = MemoryRateLimitStore()
+        limiter = SlidingWindowRateLimiter(store=store, clock=self.clock)
+        for i in range(10):
+            limiter.hit(f"client-{i}", self.rule)
+        assert len(store) == 10
+        self.clock.now += 180
+        for i in range(10):
+            limiter.hit(f"new-{i}", self.rule)
+        assert len(store) == 10
+
+    def test_lru_capacity(self):
+        """最大キー数を超えると最古のキーが削除されること"""
+        store = MemoryRateLimitStore(max_keys=3)
+        limiter = SlidingWindowRateLimiter(store=store, clock=self.clock)
+        for i in range(5):
+            limiter.hit(f"client-{i}", self.rule)
+        assert len(store) == 3
+
+    def test_shared_memory_store(self):
+        """共有メモリストアでも同じ判定になること"""
+        store = SharedMemoryRateLimitStore(slots=64)
+        try:
+            limiter = SlidingWindowRateLimiter(store=store, clock=self.clock)
+            allowed = [limiter.hit("client", self.rule).allowed for _ in range(6)]
+            assert allowed == [True] * 5 + [False]
+            # 別ワーカーから同じ共有メモリに接続
+            other = SlidingWindowRateLimiter(
+                store=SharedMemoryRateLimitStore(slots=64, name=store.name), clock=self.clock
+            )
+            assert other.hit("client", self.rule).allowed is False
+            other.store.close()
+        finally:
+            store.close(unlink=True)
+
+    def test_shared_memory_released_by_owner(self):
+        """生成したプロセスの release で共有メモリが削除されること"""
+        from multiprocessing import shared_memory
+
+        store = SharedMemoryRateLimitStore(slots=64)
+        attached = SharedMemoryRateLimitStore(slots=64, name=store.name)
+        attached.release()   # 接続側は削除しない
+        shared_memory.SharedMemory(name=store.name).close()
+
+        store.release()
+        store.release()
+        try:
+            shared_memory.SharedMemory(name=store.name)
+        except FileNotFoundError:
+            pass
+        else:
+            raise AssertionError("共有メモリが削除されていない")
+
+class TestClientIp:
+    """クライアントIP判定テストクラス"""
+
+    trusted = parse_trusted_proxies("10.0.0.0/8, 127.0.0.1")
+
+    def scope(self, peer, **headers):
+        return {
+            "client": (peer, 1234),
+            "headers": [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()],
+        }
+
+    def test_untrusted_peer_headers_ignored(self):
+        """信頼しない接続元の転送ヘッダーは使わないこと"""
+        scope = self.scope("203.0.113.5", x_forwarded_for="1.2.3.4", x_real_ip="5.6.7.8")
+        assert client_ip_from_scope(scope, self.trusted) == "203.0.113.5"
+        assert client_ip_from_scope(scope, ()) == "203.0.113.5"
+
+    def test_trusted_proxy_chain(self):
+        """信頼するプロキシ経由では、右から最初の信頼しないアドレスを使うこと"""
+        # クライアントが偽の 1.1.1.1 を付けても、プロキシが追記した実アドレスを使う
+        scope = self.scope("10.0.0.2", x_forwarded_for="1.1.1.1, 198.51.100.7, 10.0.0.9")
+        assert client_ip_from_scope(scope, self.trusted) == "198.51.100.7"
+        assert client_ip_from_scope(self.scope("127.0.0.1", x_real_ip="198.51.100.8"), self.trusted) == "198.51.100.8"
+        assert client_ip_from_scope(self.scope("127.0.0.1"), self.trusted) == "127.0.0.1"
+
+class TestRateLimitMiddleware:
+    """レート制限ミドルウェアテストクラス"""
+
+    def setup_method(self):
+        app = FastAPI()
+
+        @app.get("/api/ping")
+        async def ping():
+            return {"ok": True}
+
+        @app.get("/health")
+        async def health():
+            return {"status": "healthy"}
+
+        app.add_middleware(RateLimitMiddleware, rule=RateLimitRule(limit=2, window_seconds=60))
+        self.client = TestClient(app)
+
+    def test_headers_and_429(self):
+        """RateLimitヘッダーが付与され、上限超過で429になること"""
+        first = self.client.get("/api/ping")
+        assert first.status_code == 200
+        assert first.headers["RateLimit-Limit"] == "2"
+        assert first.headers["RateLimit-Remaining"] == "1"
+
+        self.client.get("/api/ping")
+        blocked = self.client.get("/api/ping")
+        assert blocked.status_code == 429
+        assert int(blocked.headers["Retry-After"]) >= 1
+
+    def test_exempt_paths(self):
+        """ヘルスチェックは制限対象外であること"""
+        for _ in range(5):
+            assert self.client.get("/health").status_code == 200
@@ -0,0 +1,204 @@
+import os
+import random
+import time
+from dataclasses import replace
+from datetime import date, timedelta
+
+import pytest
+
+from ..services.resource_leveling import (
+    ResourceCalendar, ResourceTask, compute_slack, find_conflicts, level_resources, parse_resources
+)
+from ..services.schedule_engine import ScheduleCycleError
+
+START = date(2024, 7, 1)
+
+def make_task(task_id, project_id, resources, start, days, dependencies=(), **fields):
+    return ResourceTask(
+        task_id, project_id, tuple(resources), START + timedelta(days=start),
+        START + timedelta(days=start + days - 1), tuple(dependencies), **fields
+    )
+
+def brute_force_conflicts(tasks):
+    pairs = set()
+    for i, a in enumerate(tasks):
+        for b in tasks[i + 1:]:
+            for resource in set(a.resources) & set(b.resources):
+                if a.start_date <= b.end_date and b.start_date <= a.end_date:
+                    pairs.add((resource, frozenset((a.task_id, b.task_id))))
+    return pairs
+
+def random_projects(rng, projects, tasks_per_project, crews, machines):
+    tasks = []
+    task_id = 0
+    for project_id in range(projects):
+        offset = rng.randint(0, 180)
+        previous = []
+        for n in range(tasks_per_project):
+            task_id += 1
+            resources = [f"班{rng.randrange(crews)}"]
+            if rng.random() < 0.2:
+                resources.append(f"重機{rng.randrange(machines)}")
+            dependencies = rng.sample(previous[-5:], min(len(previous[-5:]), rng.randint(0, 2)))
+            tasks.append(make_task(task_id, project_id, resources, offset + n, rng.randint(1, 5), dependencies))
+            previous.append(task_id)
+    return tasks
+
+
+def assert_leveled(tasks, conflicts, result):
+    """平準化後の日程の検証（残る重複は unresolved のみ、依存関係を満たす）"""
+    moved = {move.task_id: move for move in result.moves}
+    after = [
+        replace(task, start_date=moved[task.task_id].start_date, end_date=moved[task.task_id].end_date)
+        if task.task_id in moved else task
+        for task in tasks
+    ]
+    pairs = lambda found: {(c.resource, frozenset((c.first_task_id, c.second_task_id))) for c in found}
+    assert pairs(find_conflicts(after)) == pairs(result.unresolved)
+    assert len(result.unresolved) < len(conflicts)
+    by_id = {task.task_id: task for task in after}
+    for task in after:
+        for dependency in task.dependencies:
+            assert by_id[dependency].end_date < task.start_date
+    # 余裕日数を超える移動は、先行タスクの終了日による後ろ倒しのみ
+    for move in result.moves:
+        if move.exceeds_slack:
+            task = by_id[move.task_id]
+            assert move.start_date == max(by_id[d].end_date for d in task.dependencies) + timedelta(days=1)
+
+
+class TestConflicts:
+    """重複割当検出テストクラス"""
+
+    @pytest.mark.parametrize("assigned_to, expected", [
+        ("田中班、バックホウ1号", ("田中班", "バックホウ1号")),
+        ("田中班 / 田中班", ("田中班",)),
+        ("", ()),
+        (None, ()),
+    ])
+    def test_parse_resources(self, assigned_to, expected):
+        assert parse_resources(assigned_to) == expected
+
+    def test_overlaps(self):
+        tasks = [
+            make_task(1, 1, ["田中班"], 0, 3),
+            make_task(2, 2, ["田中班", "バックホウ"], 2, 2),  # 1日重複
+            make_task(3, 2, ["田中班"], 4, 1),               # 隣接のみ
+            make_task(4, 3, ["バックホウ"], 3, 1),
+        ]
+        conflicts = find_conflicts(tasks)
+        assert sorted((c.resource, c.first_task_id, c.second_task_id, c.overlap_days) for c in conflicts) == [
+            ("バックホウ", 2, 4, 1), ("田中班", 1, 2, 1)
+        ]
+
+    @pytest.mark.parametrize("seed", range(3))
+    def test_matches_brute_force(self, seed):
+        tasks = random_projects(random.Random(seed), 10, 20, crews=8, machines=3)
+        found = {(c.resource, frozenset((c.first_task_id, c.second_task_id))) for c in find_conflicts(tasks)}
+        assert found == brute_force_conflicts(tasks)
+
+    def test_calendar_merges_intervals(self):
+        calendar = ResourceCalendar()
+        calendar.book("A", START, START + timedelta(days=2))
+        calendar.book("A", START + timedelta(days=5), START + timedelta(days=6))
+        calendar.book("A", START + timedelta(days=3), START + timedelta(days=4))
+        assert calendar.starts["A"] == [START] and calendar.ends["A"] == [START + timedelta(days=6)]
+        assert calendar.earliest_start(["A"], START + timedelta(days=1), timedelta(days=1)) == START + timedelta(days=7)
+
+
+class TestLeveling:
+    """資源平準化テストクラス"""
+
+    def test_slack(self):
+        tasks = compute_slack([
+            make_task(1, 1, [], 0, 2),
+            make_task(2, 1, [], 2, 5, [1]),
+            make_task(3, 1, [], 2, 2, [1]),
+        ])
+        assert [tasks[i].slack_days for i in (1, 2, 3)] == [0, 0, 3]
+
+    def test_non_critical_task_is_shifted(self):
+        tasks = [
+            make_task(1, 1, ["田中班"], 0, 2),
+            make_task(2, 1, ["鈴木班"], 2, 5, [1]),
+            make_task(3, 1, ["田中班"], 2, 2, [1]),             # 余裕3日
+            make_task(4, 2, ["田中班"], 3, 2, priority=3),      # 別プロジェクトのクリティカルタスク
+        ]
+        result = level_resources(tasks)
+
+        # 余裕のあるタスク3を、先に確保されたクリティカルタスク4の後へ
+        assert [(m.task_id, m.days, m.exceeds_slack) for m in result.moves] == [(3, 3, False)]
+
+    def test_locked_tasks_and_successors(self):
+        tasks = [
+            make_task(1, 1, ["田中班"], 0, 3, locked=True),
+            make_task(2, 2, ["田中班"], 1, 2, locked=True),
+            make_task(3, 2, ["田中班"], 2, 1),
+            make_task(4, 2, ["鈴木班"], 3, 1, [3]),
+            make_task(5, 2, ["佐藤班"], 0, 9),                  # 3・4 に余裕5日
+        ]
+        result = level_resources(tasks)
+
+        assert [(c.first_task_id, c.second_task_id) for c in result.unresolved] == [(1, 2)]
+        # 3 は田中班が空く日まで、4 は 3 の後へ
+        assert [(m.task_id, m.start_date) for m in result.moves] == [
+            (3, START + timedelta(days=3)), (4, START + timedelta(days=4))
+        ]
+
+    def test_critical_tasks_not_moved(self):
+        tasks = [
+            make_task(1, 1, ["田中班"], 0, 3, priority=3),
+            make_task(2, 2, ["田中班"], 1, 3),
+            make_task(3, 2, ["鈴木班"], 4, 2, [2]),
+        ]
+        result = level_resources(tasks)
+
+        # 両プロジェクトともクリティカルパス上のため、重複は未解消として報告し日程は動かさない
+        assert result.moves == []
+        assert [(c.first_task_id, c.second_task_id, c.overlap_days) for c in result.unresolved] == [(1, 2, 2)]
+
+    def test_conflict_beyond_slack_is_unresolved(self):
+        tasks = [
+            make_task(1, 1, ["田中班"], 0, 5),
+            make_task(2, 2, ["田中班"], 2, 2),
+            make_task(3, 2, ["鈴木班"], 2, 4),                  # 2 の余裕は2日（田中班が空くのは3日後）
+        ]
+        result = level_resources(tasks)
+
+        # 工期に影響する移動は行わず、未解消として報告
+        assert result.moves == []
+        assert [(c.first_task_id, c.second_task_id) for c in result.unresolved] == [(1, 2)]
+
+    def test_cycle(self):
+        with pytest.raises(ScheduleCycleError):
+            level_resources([make_task(1, 1, [], 0, 1, [2]), make_task(2, 1, [], 1, 1, [1])])
+
+    def test_random_projects(self):
+        tasks = random_projects(random.Random(43), 10, 50, crews=30, machines=4)
+        conflicts = find_conflicts(tasks)
+        assert conflicts
+        assert_leveled(tasks, conflicts, level_resources(tasks))
+
+
+@pytest.mark.benchmark
+class TestLevelingBenchmark:
+    """大規模な資源平準化テストクラス"""
+
+    def test_bulk_projects(self, record_property):
+        """既定は100プロジェクト×200タスク。件数は環境変数で変更可能"""
+        projects = int(os.getenv("LEVELING_BENCH_PROJECTS", "100"))
+        tasks_per_project = int(os.getenv("LEVELING_BENCH_TASKS", "200"))
+        tasks = random_projects(random.Random(43), projects, tasks_per_project, crews=300, machines=40)
+
+        started = time.perf_counter()
+        conflicts = find_conflicts(tasks)
+        detected = time.perf_counter() - started
+        result = level_resources(tasks)
+        leveled = time.perf_counter() - started - detected
+
+        assert conflicts
+        assert_leveled(tasks, conflicts, result)
+        record_property("tasks", len(tasks))
+        record_property("conflicts", len(conflicts))
+        record_property("detect_ms", round(detected * 1000))
+        record_property("level_ms", round(leveled * 1000))
@@ -0,0 +1,192 @@
+import os
+import random
+import time
+from datetime import date, timedelta
+
+import pytest
+
+from ..services.schedule_engine import (
+    TICKS_PER_DAY, ScheduleCycleError, ScheduleError, ScheduleGraph, critical_path_delay, days_to_ticks,
+    propagate_shifts
+)
+
+# process_management の maintenance テンプレート（タスクIDは番号+1）
+MAINTENANCE = {
+    1: (0.5, []),
+    2: (1, [1]),
+    3: (1, [1]),
+    4: (0.5, [1]),
+    5: (0.5, [2, 3, 4]),
+}
+
+def build(spec):
+    return ScheduleGraph({k: v[0] for k, v in spec.items()}, {k: v[1] for k, v in spec.items()})
+
+def random_dag(rng, size, max_dependencies=3):
+    spec = {}
+    for task_id in range(size):
+        candidates = range(max(0, task_id - 200), task_id)
+        count = min(len(candidates), rng.randint(0, max_dependencies))
+        spec[task_id] = (rng.choice([0.5, 1, 1.5, 2, 3, 5]), rng.sample(candidates, count))
+    return spec
+
+def brute_force_finish(spec):
+    """依存関係を繰り返し緩和して最早終了を求める"""
+    finish = {task_id: days_to_ticks(duration) for task_id, (duration, _) in spec.items()}
+    changed = True
+    while changed:
+        changed = False
+        for task_id, (duration, dependencies) in spec.items():
+            start = max((finish[d] for d in dependencies), default=0)
+            if start + days_to_ticks(duration) > finish[task_id]:
+                finish[task_id] = start + days_to_ticks(duration)
+                changed = True
+    return finish
+
+
+class TestScheduleGraph:
+    """クリティカルパス計算テストクラス"""
+
+    def test_parallel_branches(self):
+        result = build(MAINTENANCE).compute()
+
+        assert result.project_days == 2.0
+        assert [result.tasks[i].early_start / TICKS_PER_DAY for i in (2, 3, 4)] == [0.5, 0.5, 0.5]
+        assert result.tasks[4].slack == days_to_ticks(0.5)
+        assert result.critical_tasks == [1, 2, 3, 5]
+
+    def test_dates_with_fractional_days(self):
+        dates = build(MAINTENANCE).compute().dates(date(2024, 7, 1))
+        assert dates[1] == (date(2024, 7, 1), date(2024, 7, 2))
+        assert dates[5] == (date(2024, 7, 2), date(2024, 7, 3))
+
+    def test_release_dates_and_deadline(self):
+        result = build(MAINTENANCE).compute(earliest_starts={4: 1.5}, project_duration=3)
+        assert result.tasks[5].early_start == days_to_ticks(2)
+        assert result.project_days == 3
+        assert result.tasks[5].slack == days_to_ticks(0.5)
+        assert result.critical_tasks == []
+
+    def test_cycle_detection(self):
+        spec = {1: (1, []), 2: (1, [1, 4]), 3: (1, [2]), 4: (1, [3]), 5: (1, [4])}
+        with pytest.raises(ScheduleCycleError) as excinfo:
+            build(spec).topological_order()
+        cycle = excinfo.value.cycle
+        assert cycle[0] == cycle[-1] and set(cycle) == {2, 3, 4}
+
+    def test_invalid_dependencies(self):
+        with pytest.raises(ScheduleError):
+            build({1: (1, [9])})
+        with pytest.raises(ScheduleCycleError):
+            build({1: (1, [1])}).compute()
+
+    @pytest.mark.parametrize("seed", range(5))
+    def test_matches_brute_force(self, seed):
+        spec = random_dag(random.Random(seed), 300)
+        result = build(spec).compute()
+        expected = brute_force_finish(spec)
+
+        assert {task_id: task.early_finish for task_id, task in result.tasks.items()} == expected
+        assert all(task.slack >= 0 for task in result.tasks.values())
+        for task_id, (_, dependencies) in spec.items():
+            for predecessor in dependencies:
+                assert result.tasks[predecessor].late_finish <= result.tasks[task_id].late_start
+
+    def test_critical_path_delay(self):
+        tasks = [
+            {"id": task_id, "duration": duration, "dependencies": dependencies,
+             "end_date": date(2024, 7, 1 + task_id), "status": "completed" if task_id == 1 else "in_progress"}
+            for task_id, (duration, dependencies) in MAINTENANCE.items()
+        ]
+        # タスク4は余裕があるため遅延に含めない
+        delay, critical = critical_path_delay(tasks, date(2024, 7, 5))
+        assert critical == [1, 2, 3, 5]
+        assert delay == 2  # タスク2: 7/3 終了予定
+
+
+class RecordingDict(dict):
+    """参照されたキーを記録する隣接リスト"""
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.visited = []
+
+    def get(self, key, default=None):
+        self.visited.append(key)
+        return super().get(key, default)
+
+def serial_chain(size):
+    """直列の工程表（終了日を含む日付、余裕なし）"""
+    start = date(2024, 7, 1)
+    dates, successors, predecessors = {}, RecordingDict(), {}
+    for task_id in range(size):
+        dates[task_id] = (start + timedelta(days=2 * task_id), start + timedelta(days=2 * task_id + 1))
+        if task_id:
+            successors.setdefault(task_id - 1, []).append(task_id)
+            predecessors[task_id] = [task_id - 1]
+    return dates, successors, predecessors
+
+
+class TestPropagateShifts:
+    """後続タスク再計算テストクラス"""
+
+    def test_only_moved_tasks_are_returned(self):
+        # 1 → 2 → 4, 1 → 3 → 4（3 には2日の余裕）
+        d = date(2024, 7, 1)
+        dates = {1: (d, d), 2: (d + timedelta(1), d + timedelta(5)), 3: (d + timedelta(1), d + timedelta(2)),
+                 4: (d + timedelta(6), d + timedelta(6))}
+        successors = {1: [2, 3], 2: [4], 3: [4]}
+        predecessors = {2: [1], 3: [1], 4: [2, 3]}
+
+        dates[3] = (d + timedelta(1), d + timedelta(4))  # 余裕の範囲内で延長
+        assert propagate_shifts([3], successors, predecessors, dates, gap_days=1) == []
+
+        dates[3] = (d + timedelta(1), d + timedelta(8))
+        shifts = propagate_shifts([3], successors, predecessors, dates, gap_days=1)
+        assert [(s.task_id, s.start_date, s.end_date, s.days) for s in shifts] == [
+            (4, d + timedelta(9), d + timedelta(9), 3)
+        ]
+
+    def test_chain_is_pushed_with_durations_kept(self):
+        dates, successors, predecessors = serial_chain(10)
+        dates[5] = (dates[5][0], dates[5][1] + timedelta(days=3))
+
+        shifts = propagate_shifts([5], successors, predecessors, dates, gap_days=1)
+
+        assert [shift.task_id for shift in shifts] == [6, 7, 8, 9]
+        assert all(shift.days == 3 for shift in shifts)
+        assert all(s.end_date - s.start_date == s.previous_end_date - s.previous_start_date for s in shifts)
+
+    def test_cost_is_proportional_to_affected_subgraph(self):
+        dates, successors, predecessors = serial_chain(500)
+        dates[490] = (dates[490][0], dates[490][1] + timedelta(days=1))
+
+        shifts = propagate_shifts([490], successors, predecessors, dates, gap_days=1)
+
+        assert [shift.task_id for shift in shifts] == list(range(491, 500))
+        assert set(successors.visited) == set(range(490, 500))
+
+    def test_cycle(self):
+        d = date(2024, 7, 1)
+        dates = {1: (d, d), 2: (d, d), 3: (d, d)}
+        with pytest.raises(ScheduleCycleError):
+            propagate_shifts([1], {1: [2], 2: [3], 3: [2]}, {2: [1, 3], 3: [2]}, dates)
+
+
+@pytest.mark.benchmark
+class TestScheduleBenchmark:
+    """大規模工程表の計算テストクラス"""
+
+    def test_large_schedule(self, record_property):
+        """既定は1万タスク。件数は環境変数で変更可能"""
+        size = int(os.getenv("SCHEDULE_BENCH_TASKS", "10000"))
+        spec = random_dag(random.Random(41), size)
+
+        started = time.perf_counter()
+        result = build(spec).compute()
+        elapsed = time.perf_counter() - started
+
+        assert len(result.order) == size
+        assert result.critical_tasks
+        record_property("tasks", size)
+        record_property("elapsed_ms", round(elapsed * 1000, 1))
@@ -0,0 +1,294 @@
+from datetime import date, timedelta
+
+import random
+
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy import update
+
+from ..api.process_management import router
+from ..database import get_db
+from ..services.schedule_store import MAX_HISTORY_DAYS, ProcessScheduleStore, metadata, process_schedule_rollups
+
+START = date(2024, 7, 1)
+
+def make_task(task_id, days, dependencies=(), **fields):
+    task = {
+        "id": task_id,
+        "name": f"工程{task_id}",
+        "description": "",
+        "start_date": START + timedelta(days=days - 1),
+        "end_date": START + timedelta(days=days),
+        "duration": 1,
+        "progress": 0,
+        "category": "planting",
+        "dependencies": list(dependencies),
+    }
+    task.update(fields)
+    return task
+
+@pytest.fixture
+def schema():
+    return metadata
+
+@pytest.fixture
+def store(session):
+    return ProcessScheduleStore(session)
+
+
+class TestProcessScheduleStore:
+    """工程表ストアテストクラス"""
+
+    def test_create_and_get(self, store):
+        created = store.create_schedule(
+            project_id=10, name="庭園工事", description="", start_date=START,
+            tasks=[make_task(1, 1), make_task(2, 3, [1]), make_task(3, 5, [1, 2])],
+        )
+
+        assert created["end_date"] == START + timedelta(days=5)
+        assert [task["dependencies"] for task in created["tasks"]] == [[], [1], [1, 2]]
+        assert store.get_project_schedule(10)["id"] == created["id"]
+        assert store.get_project_schedule(11) is None
+
+    def test_project_lookup_returns_first_schedule(self, store):
+        first = store.create_schedule(10, "A", "", START, [])
+        store.create_schedule(10, "B", "", START, [])
+        assert store.get_project_schedule(10)["id"] == first["id"]
+        assert first["end_date"] == START
+
+    def test_invalid_tasks(self, store):
+        with pytest.raises(HTTPException):
+            store.create_schedule(10, "A", "", START, [make_task(1, 1), make_task(1, 2)])
+        with pytest.raises(HTTPException):
+            store.create_schedule(10, "A", "", START, [make_task(1, 1, [2])])
+        assert store.get_project_schedule(10) is None
+
+    def test_task_update_touches_single_row(self, store, statements):
+        schedule = store.create_schedule(10, "A", "", START, [make_task(i, i) for i in range(1, 51)])
+        statements.clear()
+
+        task = store.update_task(schedule["id"], 7, {"progress": 60, "status": "in_progress"})
+
+        assert (task["progress"], task["status"]) == (60, "in_progress")
+        task_writes = [s for s in statements if "process_tasks" in s and not s.startswith("SELECT")]
+        assert len(task_writes) == 1 and task_writes[0].startswith("UPDATE")
+        assert not any(s.startswith("DELETE") for s in statements)
+        assert store.update_task(schedule["id"], 99, {"progress": 10}) is None
+
+    def test_task_dependencies_and_end_date(self, store):
+        schedule = store.create_schedule(10, "A", "", START, [make_task(1, 1), make_task(2, 2)])
+        schedule_id = schedule["id"]
+
+        added = store.add_task(schedule_id, make_task(None, 9, [1, 2]))
+        assert added["id"] == 3
+        assert store.get_schedule(schedule_id)["end_date"] == START + timedelta(days=9)
+
+        store.update_task(schedule_id, 3, {"dependencies": [2], "end_date": START + timedelta(days=4)})
+        assert store.get_task(schedule_id, 3)["dependencies"] == [2]
+        assert store.get_schedule(schedule_id)["end_date"] == START + timedelta(days=4)
+
+        with pytest.raises(HTTPException):
+            store.update_task(schedule_id, 3, {"dependencies": [3]})
+
+        assert store.delete_task(schedule_id, 2)
+        assert not store.delete_task(schedule_id, 2)
+        schedule = store.get_schedule(schedule_id)
+        assert [(task["id"], task["dependencies"]) for task in schedule["tasks"]] == [(1, []), (3, [])]
+
+        assert store.delete_task(schedule_id, 1) and store.delete_task(schedule_id, 3)
+        assert store.get_schedule(schedule_id)["end_date"] == START
+
+    def test_bulk_insert_keeps_each_task_fields(self, store):
+        created = store.create_schedule(10, "A", "", START, [
+            make_task(1, 1), make_task(2, 2, status="completed", assigned_to="田中班"),
+        ])
+
+        # 先頭タスクに無い項目も2件目以降で保存される（省略した項目は既定値）
+        assert [(task["status"], task["assigned_to"]) for task in created["tasks"]] == [
+            ("planned", ""), ("completed", "田中班")
+        ]
+
+    def test_update_schedule_replaces_tasks_only_when_given(self, store):
+        schedule = store.create_schedule(10, "A", "", START, [make_task(1, 1), make_task(2, 2, [1])])
+
+        renamed = store.update_schedule(schedule["id"], {"name": "B", "description": None})
+        assert (renamed["name"], len(renamed["tasks"])) == ("B", 2)
+
+        replaced = store.update_schedule(schedule["id"], {}, [make_task(5, 6)])
+        assert [task["id"] for task in replaced["tasks"]] == [5]
+        assert replaced["end_date"] == START + timedelta(days=6)
+
+    def test_date_change_moves_successors_only(self, store, statements):
+        # 1 → 2 → 3、4 は独立
+        tasks = [make_task(1, 1), make_task(2, 2, [1]), make_task(3, 3, [2]), make_task(4, 2)]
+        schedule = store.create_schedule(10, "A", "", START, tasks)
+        statements.clear()
+
+        task = store.update_task(schedule["id"], 1, {"end_date": START + timedelta(days=3)})
+
+        assert [(shift["task_id"], shift["days"]) for shift in task["rescheduled"]] == [(2, 2), (3, 2)]
+        updated = {t["id"]: (t["start_date"], t["end_date"]) for t in store.get_schedule(schedule["id"])["tasks"]}
+        assert updated[2] == (START + timedelta(days=3), START + timedelta(days=4))
+        assert updated[3] == (START + timedelta(days=4), START + timedelta(days=5))
+        assert updated[4] == (START + timedelta(days=1), START + timedelta(days=2))
+        assert store.get_schedule(schedule["id"])["end_date"] == START + timedelta(days=5)
+        # 後続タスクの移動は1回の一括UPDATE
+        assert sum(s.startswith("UPDATE process_tasks SET start_date") for s in statements) == 1
+
+    def test_duration_and_dependency_changes(self, store):
+        schedule = store.create_schedule(10, "A", "", START, [make_task(1, 1), make_task(2, 2), make_task(3, 3, [2])])
+        schedule_id = schedule["id"]
+
+        # 所要日数の変更は開始日から終了日を再計算
+        task = store.update_task(schedule_id, 2, {"duration": 2.5})
+        assert task["end_date"] == START + timedelta(days=4)
+        assert [shift["task_id"] for shift in task["rescheduled"]] == [3]
+
+        # 新しい先行タスクの終了後へ自身が移動
+        store.update_task(schedule_id, 1, {"start_date": START + timedelta(days=5)})
+        task = store.update_task(schedule_id, 2, {"dependencies": [1]})
+        assert [shift["task_id"] for shift in task["rescheduled"]] == [2, 3]
+        assert task["start_date"] == START + timedelta(days=6)
+
+
+def recomputed_summary(tasks):
+    """全タスクを走査した従来の集計"""
+    total = len(tasks)
+    categories = {}
+    for task in tasks:
+        categories.setdefault(task["category"], []).append(task["progress"])
+    return {
+        "overall_progress": sum(task["progress"] for task in tasks) // total if total else 0,
+        "completed_tasks": sum(task["status"] == "completed" for task in tasks),
+        "total_tasks": total,
+        "delayed_tasks": sum(task["status"] == "delayed" for task in tasks),
+        "category_progress": [
+            {"category": category, "progress": sum(values) // len(values), "tasks_count": len(values)}
+            for category, values in sorted(categories.items())
+        ],
+    }
+
+
+class TestProgressRollups:
+    """進捗集計テストクラス"""
+
+    def test_rollups_follow_random_mutations(self, engine, store):
+        rng = random.Random(44)
+        categories = ["survey", "planting", "finishing"]
+        statuses = ["planned", "in_progress", "completed", "delayed"]
+        tasks = [make_task(i, i, category=rng.choice(categories)) for i in range(1, 21)]
+        schedule_id = store.create_schedule(10, "A", "", START, tasks)["id"]
+
+        for _ in range(200):
+            task_ids = [task["id"] for task in store.get_schedule(schedule_id)["tasks"]]
+            action = rng.random()
+            if action < 0.6 and task_ids:
+                store.update_task(schedule_id, rng.choice(task_ids), {
+                    "progress": rng.randint(0, 100), "status": rng.choice(statuses),
+                    "category": rng.choice(categories) if rng.random() < 0.3 else None,
+                })
+            elif action < 0.8:
+                store.add_task(schedule_id, make_task(None, 3, category=rng.choice(categories),
+                                                      progress=rng.randint(0, 100)))
+            elif task_ids:
+                store.delete_task(schedule_id, rng.choice(task_ids))
+            assert store.progress_summary(schedule_id) == recomputed_summary(store.get_schedule(schedule_id)["tasks"])
+
+        store.update_schedule(schedule_id, {}, [make_task(1, 1, progress=50, status="completed")])
+        assert store.progress_summary(schedule_id)["completed_tasks"] == 1
+        with engine.connect() as conn:
+            assert conn.execute(process_schedule_rollups.select()).all() == [(schedule_id, "planting", "completed", 1, 50)]
+
+    def test_report_reads_rollups_only(self, store, statements):
+        schedule_id = store.create_schedule(10, "A", "", START, [make_task(i, i) for i in range(1, 101)])["id"]
+        statements.clear()
+
+        summary = store.progress_summary(schedule_id)
+
+        assert summary["total_tasks"] == 100
+        assert len(statements) == 1 and "process_tasks" not in statements[0]
+
+    def test_report_endpoint(self, store, session):
+        app = FastAPI()
+        app.include_router(router)
+        app.dependency_overrides[get_db] = lambda: session
+        client = TestClient(app)
+        schedule_id = store.create_schedule(10, "A", "", START, [
+            make_task(1, 1, status="completed", progress=100), make_task(2, 2, [1]),
+        ])["id"]
+
+        # 既定でクリティカルパスの遅延を計算（未完了の工程2の超過日数）
+        report = client.get(f"/api/process/schedules/{schedule_id}/report").json()["report"]
+        assert report["critical_path_delay"] == (date.today() - (START + timedelta(days=2))).days
+        assert report["critical_path"] == [1, 2]
+
+        # 省略しても遅延は整数（0日）で返す
+        report = client.get(f"/api/process/schedules/{schedule_id}/report", params={"critical_path": False}).json()["report"]
+        assert report["critical_path_delay"] == 0 and report["critical_path"] == []
+        assert report["completed_tasks"] == 1
+
+    def test_rollup_and_snapshot_upsert(self, store, statements):
+        schedule_id = store.create_schedule(10, "A", "", START, [make_task(1, 1)])["id"]
+        statements.clear()
+
+        store.add_task(schedule_id, make_task(None, 2, category="survey", progress=40))
+        store.add_task(schedule_id, make_task(None, 3, category="survey", progress=20))
+
+        # 集計行・スナップショットは UPDATE → INSERT の2段階ではなく1文で書き込む
+        writes = [s for s in statements if "process_schedule_rollups" in s or "process_progress_snapshots" in s]
+        assert not any(s.startswith("UPDATE") for s in writes)
+        assert sum("ON CONFLICT" in s for s in writes) == 4
+        summary = store.progress_summary(schedule_id)
+        assert summary["total_tasks"] == 3
+        assert summary["category_progress"] == [
+            {"category": "planting", "progress": 0, "tasks_count": 1},
+            {"category": "survey", "progress": 30, "tasks_count": 2},
+        ]
+        assert [p["overall_progress"] for p in store.progress_history(schedule_id)] == [20]
+
+    def test_daily_snapshots(self, session):
+        days = iter([START, START, START + timedelta(days=1), START + timedelta(days=3)])
+        store = ProcessScheduleStore(session, today=lambda: next(days))
+
+        schedule_id = store.create_schedule(10, "A", "", START, [make_task(1, 1), make_task(2, 2)])["id"]
+        store.update_task(schedule_id, 1, {"progress": 100, "status": "completed"})   # 同日は上書き
+        store.update_task(schedule_id, 2, {"progress": 50})
+        store.update_task(schedule_id, 2, {"progress": 100, "status": "completed"})
+
+        assert [(p["date"], p["overall_progress"]) for p in store.progress_history(schedule_id)] == [
+            (START, 50), (START + timedelta(days=1), 75), (START + timedelta(days=3), 100)
+        ]
+        filled = store.progress_history(schedule_id, START + timedelta(days=1), START + timedelta(days=4))
+        assert [(p["date"].day, p["completed_tasks"]) for p in filled] == [(2, 1), (3, 1), (4, 2), (5, 2)]
+
+    def test_history_range_limit(self, session):
+        store = ProcessScheduleStore(session, today=lambda: START)
+        schedule_id = store.create_schedule(10, "A", "", START, [make_task(1, 1)])["id"]
+        last_day = START + timedelta(days=MAX_HISTORY_DAYS - 1)
+        assert len(store.progress_history(schedule_id, START, last_day)) == MAX_HISTORY_DAYS
+
+        for date_from, date_to in [(START, last_day + timedelta(days=1)), (last_day, START)]:
+            with pytest.raises(HTTPException) as error:
+                store.progress_history(schedule_id, date_from, date_to)
+            assert error.value.status_code == 400
+
+    def test_rebuild_rollups(self, store):
+        tasks = [make_task(1, 1, progress=40), make_task(2, 2, category="survey", status="completed", progress=100)]
+        schedule_id = store.create_schedule(10, "A", "", START, tasks)["id"]
+        assert store.rebuild_rollups(schedule_id) == []
+
+        # 集計行がずれた状態（更新の取りこぼしなど）
+        store.db.execute(update(process_schedule_rollups).where(
+            process_schedule_rollups.c.category == "planting"
+        ).values(task_count=3, progress_sum=10))
+        store.db.commit()
+
+        mismatches = store.rebuild_rollups(schedule_id)
+
+        assert mismatches == [
+            {"category": "planting", "status": "planned", "stored": [3, 10], "actual": [1, 40]}
+        ]
+        assert store.progress_summary(schedule_id) == recomputed_summary(store.get_schedule(schedule_id)["tasks"])
+        assert store.progress_history(schedule_id)[-1]["overall_progress"] == 70
+        assert store.rebuild_rollups(schedule_id + 1) is None
@@ -0,0 +1,83 @@
+from unittest.mock import Mock
+
+from ..auth.security import SessionActivityRing, SessionSecurity, SecurityConfig
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+        self.reads = 0
+
+    def __call__(self) -> float:
+        self.reads += 1
+        return self.now
+
+def make_request(ip: str = "192.168.1.10"):
+    request = Mock()
+    request.headers = {"User-Agent": "pytest"}
+    request.client.host = ip
+    return request
+
+class TestSessionActivityRing:
+    """アクティビティリングバッファテストクラス"""
+
+    def test_keeps_latest_entries(self):
+        """上限を超えると古い記録から上書きされること"""
+        ring = SessionActivityRing(size=3, now=0.0)
+        for t in range(1, 6):
+            ring.record(float(t))
+        assert ring.recent() == [3.0, 4.0, 5.0]
+        assert ring.count == 5
+        assert ring.first_at == 0.0
+        assert ring.last_at == 5.0
+        assert ring.count_since(4.0) == 2
+
+class TestSessionSecurity:
+    """セッションセキュリティテストクラス"""
+
+    def setup_method(self):
+        self.clock = FakeClock()
+        self.security = SessionSecurity(clock=self.clock)
+        self.request = make_request()
+
+    def test_single_clock_read_per_validation(self):
+        """検証1回あたりのクロック読み取りが1回であること"""
+        session_id = self.security.create_session(1, {"role": "owner"}, self.request)
+        self.clock.reads = 0
+        for _ in range(250):
+            assert self.security.validate_session(session_id, self.request) is not None
+        assert self.clock.reads == 250
+        activity = self.security.session_activities[session_id]
+        assert activity.count == 251
+        assert len(activity.recent()) == SessionSecurity.ACTIVITY_BUFFER_SIZE
+
+    def test_expired_session_rejected_and_reaped(self):
+        """期限切れは検証で拒否され、削除はスイーパーが行うこと"""
+        session_id = self.security.create_session(1, {}, self.request)
+        self.clock.now += SecurityConfig.SESSION_TIMEOUT_MINUTES * 60 + 1
+
+        assert self.security.validate_session(session_id, self.request) is None
+        assert session_id in self.security.active_sessions
+
+        assert self.security.reap_expired_sessions() == 1
+        assert session_id not in self.security.active_sessions
+        assert 1 not in self.security.user_sessions
+
+    def test_extended_session_survives_sweep(self):
+        """延長されたセッションは古い期限で削除されないこと"""
+        session_id = self.security.create_session(1, {}, self.request)
+        timeout = SecurityConfig.SESSION_TIMEOUT_MINUTES * 60
+        self.clock.now += timeout - 10  # 延長しきい値内
+        assert self.security.validate_session(session_id, self.request) is not None
+
+        self.clock.now += 20  # 当初の期限を超過
+        assert self.security.reap_expired_sessions() == 0
+        assert self.security.validate_session(session_id, self.request) is not None
+
+    def test_memory_report(self):
+        """1万セッションあたりのメモリ使用量が報告されること"""
+        for user_id in range(50):
+            self.security.create_session(user_id, {}, self.request)
+        report = self.security.get_memory_usage()
+        assert report["sessions"] == 50
+        assert report["bytes_per_session"] > 0
+        assert report["mb_per_10k_sessions"] > 0
@@ -0,0 +1,130 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+
+from ..services.cache_service import MemoryCache
+from ..services.system_metrics import (
+    LatencyHistogram, RequestMetricsMiddleware, SystemMetricsCollector, format_bytes,
+    pool_stats, read_process_stats
+)
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+class TestLatencyHistogram:
+    """レイテンシヒストグラムテストクラス"""
+
+    def test_quantiles(self):
+        histogram = LatencyHistogram(buckets=(10, 100, 1000))
+        for value in [5] * 50 + [50] * 45 + [500] * 4 + [3000]:
+            histogram.observe(value)
+
+        snapshot = histogram.snapshot()
+        assert snapshot["count"] == 100
+        assert snapshot["max_ms"] == 3000
+        assert 0 < snapshot["p50_ms"] <= 10
+        assert 10 < snapshot["p95_ms"] <= 100
+        assert 100 < snapshot["p99_ms"] <= 1000
+        assert histogram.quantile(1.0) == 3000
+
+    def test_empty(self):
+        assert LatencyHistogram().snapshot()["p95_ms"] == 0.0
+
+    def test_middleware_records_requests(self):
+        histogram = LatencyHistogram()
+        app = FastAPI()
+        app.add_middleware(RequestMetricsMiddleware, histogram=histogram)
+
+        @app.get("/health")
+        async def health():
+            return {}
+
+        @app.get("/items")
+        async def items():
+            return []
+
+        client = TestClient(app)
+        client.get("/items")
+        client.get("/items")
+        client.get("/health")   # 計測対象外
+        assert histogram.count == 2
+
+
+class TestSystemMetricsCollector:
+    """システムメトリクス収集テストクラス"""
+
+    def setup_method(self):
+        self.engine = create_engine("sqlite://", poolclass=QueuePool, pool_size=2, max_overflow=1)
+        self.session = sessionmaker(bind=self.engine)()
+        self.clock = FakeClock()
+        self.cache = MemoryCache()
+        self.reads = 0
+
+        def process_reader():
+            self.reads += 1
+            return {"rss_bytes": 100 * 1024 * 1024, "cpu_seconds": self.reads * 0.5, "threads": 4}
+
+        self.collector = SystemMetricsCollector(
+            histogram=LatencyHistogram(), cache=self.cache, ttl_seconds=5,
+            clock=self.clock, process_reader=process_reader
+        )
+
+    def teardown_method(self):
+        self.session.close()
+        self.engine.dispose()
+
+    def test_cached_within_ttl(self):
+        first = self.collector.collect(self.session)
+        self.clock.now += 4
+        assert self.collector.collect(self.session) is first
+        assert self.reads == 1
+
+        self.clock.now += 1
+        second = self.collector.collect(self.session)
+        assert second is not first and self.reads == 2
+        # 前回収集からの5秒間に0.5秒のCPU時間
+        assert second["process"]["cpu_percent"] == 10.0
+        assert second["process"]["rss_mb"] == 100.0
+
+    def test_pool_and_cache(self):
+        self.cache.set("a", 1)
+        self.cache.get("a")
+        self.cache.get("b")
+        connection = self.engine.connect()
+
+        metrics = self.collector.collect(self.session)
+
+        assert metrics["cache"] == {"entries": 1, "hits": 1, "misses": 1, "hit_rate": 0.5}
+        assert metrics["database_pool"]["checkedout"] == 1
+        assert metrics["database_pool"]["overflow"] == 0
+        assert metrics["database_size_bytes"] is None   # PostgreSQL以外
+        connection.close()
+
+    def test_no_database_query_on_sqlite(self):
+        statements = []
+        event.listen(self.engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+        self.collector.collect(self.session)
+        assert statements == []
+
+    def test_pool_overflow(self):
+        connections = [self.engine.connect() for _ in range(3)]
+        assert pool_stats(self.engine)["overflow"] == 1
+        for connection in connections:
+            connection.close()
+
+
+def test_read_process_stats():
+    stats = read_process_stats()
+    assert stats["rss_bytes"] > 0 and stats["threads"] >= 1 and stats["cpu_seconds"] >= 0
+
+def test_format_bytes():
+    assert format_bytes(None) == "不明"
+    assert format_bytes(512) == "512 B"
+    assert format_bytes(245 * 1024 * 1024) == "245.0 MB"
+    assert format_bytes(3 * 1024 ** 4) == "3072.0 GB"
@@ -0,0 +1,143 @@
+import random
+from decimal import (
+    Decimal, ROUND_CEILING, ROUND_DOWN, ROUND_FLOOR, ROUND_HALF_EVEN, ROUND_HALF_UP
+)
+from types import SimpleNamespace
+
+import pytest
+
+from ..services.totals_engine import (
+    ROUNDING_CEIL, ROUNDING_DOWN, ROUNDING_FLOOR, ROUNDING_HALF_EVEN, ROUNDING_HALF_UP,
+    TotalsEngine, divide_round, estimate_totals_engine, invoice_totals_engine
+)
+
+DECIMAL_ROUNDING = {
+    ROUNDING_DOWN: ROUND_DOWN,
+    ROUNDING_FLOOR: ROUND_FLOOR,
+    ROUNDING_CEIL: ROUND_CEILING,
+    ROUNDING_HALF_UP: ROUND_HALF_UP,
+    ROUNDING_HALF_EVEN: ROUND_HALF_EVEN,
+}
+
+def random_items(rng, count, rates=(None,)):
+    return [
+        SimpleNamespace(
+            quantity=Decimal(rng.randint(0, 100_000)) / 100,
+            unit_price=Decimal(rng.randint(0, 5_000_000)),
+            tax_rate=rng.choice(rates),
+        )
+        for _ in range(count)
+    ]
+
+def decimal_totals(items, tax_rate=Decimal('0.10')):
+    """従来の Decimal 計算（税率ごとに quantize）"""
+    buckets = {}
+    for item in items:
+        rate = item.tax_rate if item.tax_rate is not None else tax_rate
+        buckets[rate] = buckets.get(rate, Decimal('0')) + item.quantity * item.unit_price
+    subtotal = sum(buckets.values(), Decimal('0'))
+    tax_amount = sum(((amount * rate).quantize(Decimal('0')) for rate, amount in buckets.items()), Decimal('0'))
+    return {'subtotal': subtotal, 'tax_amount': tax_amount, 'total_amount': subtotal + tax_amount}
+
+
+class TestDivideRound:
+    """端数処理テストクラス"""
+
+    @pytest.mark.parametrize("mode", list(DECIMAL_ROUNDING))
+    def test_matches_decimal_quantize(self, mode):
+        rng = random.Random(36)
+        for _ in range(2000):
+            numerator = rng.randint(-10**9, 10**9)
+            denominator = rng.choice([2, 10, 100, 10_000, 1_000_000])
+            expected = (Decimal(numerator) / Decimal(denominator)).quantize(
+                Decimal('0'), rounding=DECIMAL_ROUNDING[mode]
+            )
+            assert divide_round(numerator, denominator, mode) == int(expected)
+
+    @pytest.mark.parametrize("mode", list(DECIMAL_ROUNDING))
+    def test_exact_halves(self, mode):
+        for numerator in (-25, -15, -5, 5, 15, 25):
+            expected = (Decimal(numerator) / 10).quantize(Decimal('0'), rounding=DECIMAL_ROUNDING[mode])
+            assert divide_round(numerator, 10, mode) == int(expected)
+
+
+class TestTotalsEngine:
+    """金額計算エンジンテストクラス"""
+
+    def test_matches_decimal_on_random_invoices(self):
+        """乱数で生成した請求書で従来の Decimal 計算と一致すること"""
+        rng = random.Random(20240601)
+        for _ in range(300):
+            items = random_items(rng, rng.randint(0, 60))
+            assert invoice_totals_engine.compute_items(items).as_dict() == decimal_totals(items)
+
+    def test_matches_decimal_with_reduced_rate(self):
+        """標準10%・軽減8%混在でも税率別に一致すること"""
+        rng = random.Random(8)
+        rates = (None, Decimal('0.10'), Decimal('0.08'))
+        for _ in range(300):
+            items = random_items(rng, rng.randint(1, 40), rates)
+            assert invoice_totals_engine.compute_items(items).as_dict() == decimal_totals(items)
+
+    def test_tax_breakdown(self):
+        items = [
+            SimpleNamespace(quantity=Decimal('3'), unit_price=Decimal('1001'), tax_rate=None),
+            SimpleNamespace(quantity=Decimal('1.5'), unit_price=Decimal('333'), tax_rate=Decimal('0.08')),
+        ]
+        totals = invoice_totals_engine.compute_items(items)
+
+        assert totals.subtotal == Decimal('3502.5')
+        assert totals.tax_breakdown() == [
+            {'rate': Decimal('0.1'), 'taxable_amount': Decimal('3003'), 'tax_amount': Decimal('300')},
+            {'rate': Decimal('0.08'), 'taxable_amount': Decimal('499.5'), 'tax_amount': Decimal('40')},
+        ]
+        assert totals.total_amount == Decimal('3842.5')
+
+    def test_large_amounts_do_not_overflow(self):
+        """int64 を超える中間値でも正しく計算すること"""
+        items = [SimpleNamespace(quantity=Decimal('99999999.99'), unit_price=Decimal('9999999999'), tax_rate=None)] * 50
+        assert invoice_totals_engine.compute_items(items).as_dict() == decimal_totals(items)
+
+    def test_line_rounding(self):
+        engine = TotalsEngine(tax_rounding=ROUNDING_DOWN, line_rounding=ROUNDING_DOWN)
+        totals = engine.compute([150, 150], [333, 333], keep_lines=True)
+
+        assert totals.line_amounts == [Decimal('499'), Decimal('499')]
+        assert totals.subtotal == Decimal('998')
+        assert totals.tax_amount == Decimal('99')
+
+    def test_tax_for_truncates_like_int(self):
+        engine = TotalsEngine(tax_rounding=ROUNDING_DOWN)
+        rng = random.Random(1)
+        for _ in range(1000):
+            amount = rng.randint(-10**7, 10**9)
+            assert engine.tax_for(amount) == int(amount * Decimal('0.10'))
+
+    def test_line_amount_truncates_like_int(self):
+        rng = random.Random(2)
+        for item in random_items(rng, 1000):
+            adjustment = rng.randint(-1000, 1000)
+            assert estimate_totals_engine.line_amount(item.quantity, item.unit_price, adjustment) == \
+                int(item.quantity * item.unit_price) + adjustment
+
+    def test_estimate_totals(self):
+        items = [
+            SimpleNamespace(item_type="header", line_total=None, line_cost=None),
+            SimpleNamespace(item_type="item", line_total=Decimal("120000"), line_cost=Decimal("80000")),
+            SimpleNamespace(item_type="item", line_total=Decimal("30000"), line_cost=None),
+        ]
+        totals = estimate_totals_engine.estimate_totals(items, Decimal("-10000"))
+
+        assert (totals.subtotal, totals.total_cost, totals.total_amount, totals.gross_profit) == \
+            (150000, 80000, 140000, 60000)
+        assert totals.gross_profit_rate == pytest.approx(60000 / 140000)
+        assert estimate_totals_engine.estimate_totals([], 0).gross_profit_rate == 0.0
+
+    def test_compute_amounts(self):
+        totals = invoice_totals_engine.compute_amounts([1005, 2010, 15])
+        assert totals.subtotal == Decimal('3030')
+        assert totals.tax_amount == Decimal('303')
+
+    def test_rejects_unknown_rounding(self):
+        with pytest.raises(ValueError):
+            TotalsEngine(tax_rounding="bankers")
@@ -0,0 +1,39 @@
+-- ======================================
+-- Garden システム キーセットページネーション用インデックス
+-- Migration: 005_keyset_pagination_indexes.sql
+-- 一覧APIの OFFSET/COUNT(*) をカーソル方式に置き換えるための複合インデックス
+-- ======================================
+
+DO $$
+BEGIN
+    RAISE NOTICE '===========================================';
+    RAISE NOTICE 'キーセットページネーション用インデックス作成開始';
+    RAISE NOTICE '===========================================';
+END $$;
+
+-- 請求書一覧: (created_at, invoice_id) 降順
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_invoices_company_created_keyset
+ON invoices(company_id, created_at DESC, invoice_id DESC);
+
+-- 見積一覧: (created_at, estimate_id) 降順
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_estimates_company_created_keyset
+ON estimates(company_id, created_at DESC, estimate_id DESC);
+
+-- プロジェクト一覧: (updated_at, project_id) 降順
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_projects_company_updated_keyset
+ON projects(company_id, updated_at DESC, project_id DESC);
+
+-- 単価マスター検索（既定の並び順）: (item_name, item_id)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_price_master_company_name_keyset
+ON price_master(company_id, is_active, item_name, item_id);
+
+-- 推定件数（EXPLAIN の行数見積もり）の精度を保つため統計情報を更新
+ANALYZE invoices;
+ANALYZE estimates;
+ANALYZE projects;
+ANALYZE price_master;
+
+DO $$
+BEGIN
+    RAISE NOTICE 'キーセットページネーション用インデックス作成完了';
+END $$;
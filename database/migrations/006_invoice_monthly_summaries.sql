@@ -0,0 +1,33 @@
+-- ======================================
+-- Garden システム 請求書月次集計テーブル
+-- Migration: 006_invoice_monthly_summaries.sql
+-- 締め済み月の支払サマリーを保持し、年間サマリーを月次集計から組み立てる
+-- ======================================
+
+DO $$
+BEGIN
+    RAISE NOTICE '===========================================';
+    RAISE NOTICE '請求書月次集計テーブル作成開始';
+    RAISE NOTICE '===========================================';
+END $$;
+
+-- 月次集計（1社1か月1行、ステータス×支払状況の内訳をJSONで保持）
+-- 該当月の請求書が変更されると行は削除され、次回参照時に再集計される
+CREATE TABLE IF NOT EXISTS invoice_monthly_summaries (
+    company_id INTEGER NOT NULL,
+    month DATE NOT NULL,
+    breakdown JSONB NOT NULL DEFAULT '[]'::jsonb,
+    computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (company_id, month),
+    CONSTRAINT check_month_start CHECK (EXTRACT(DAY FROM month) = 1)
+);
+
+-- 期間集計（GROUP BY status, payment_status）用のカバリングインデックス
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_invoices_company_date_summary
+ON invoices(company_id, invoice_date)
+INCLUDE (status, payment_status, total_amount, paid_amount);
+
+DO $$
+BEGIN
+    RAISE NOTICE '請求書月次集計テーブル作成完了';
+END $$;
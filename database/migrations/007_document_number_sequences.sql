@@ -0,0 +1,80 @@
+-- ======================================
+-- Garden システム 書類番号カウンター
+-- Migration: 007_document_number_sequences.sql
+-- 請求書・見積番号を会社×種別×期間のカウンター行から UPDATE ... RETURNING で採番する
+-- 請求書番号の重複が残っている場合は何も変更せずに中止する（psql で実行）
+-- ======================================
+
+\set ON_ERROR_STOP on
+
+DO $$
+BEGIN
+    RAISE NOTICE '===========================================';
+    RAISE NOTICE '書類番号カウンターテーブル作成開始';
+    RAISE NOTICE '===========================================';
+END $$;
+
+-- 前回の CREATE INDEX CONCURRENTLY が失敗して残った無効なインデックスを削除
+SELECT 'DROP INDEX CONCURRENTLY ' || quote_ident(index_class.relname)
+FROM pg_index
+JOIN pg_class index_class ON index_class.oid = pg_index.indexrelid
+WHERE index_class.relname = 'idx_invoices_company_number_unique'
+  AND NOT pg_index.indisvalid
+\gexec
+
+-- 一意インデックスを作成できない（同じ会社で請求書番号が重複している）場合は中止
+DO $$
+DECLARE
+    duplicate_count INTEGER;
+BEGIN
+    SELECT COUNT(*) INTO duplicate_count
+    FROM (
+        SELECT 1 FROM invoices
+        GROUP BY company_id, invoice_number
+        HAVING COUNT(*) > 1
+    ) duplicates;
+
+    IF duplicate_count > 0 THEN
+        RAISE EXCEPTION '請求書番号の重複が % 件あります。重複を解消してから再実行してください', duplicate_count
+            USING HINT = 'SELECT company_id, invoice_number, array_agg(invoice_id) FROM invoices '
+                         'GROUP BY company_id, invoice_number HAVING COUNT(*) > 1;';
+    END IF;
+END $$;
+
+CREATE TABLE IF NOT EXISTS document_number_sequences (
+    company_id INTEGER NOT NULL,
+    document_type VARCHAR(30) NOT NULL,   -- invoice / estimate
+    period VARCHAR(10) NOT NULL,          -- invoice: YYYYMM, estimate: YYYY
+    last_value INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (company_id, document_type, period),
+    CONSTRAINT check_last_value_non_negative CHECK (last_value >= 0)
+);
+
+-- 発行済みの請求書番号（INV-YYYYMM-連番）からカウンターを初期化
+INSERT INTO document_number_sequences (company_id, document_type, period, last_value)
+SELECT company_id, 'invoice', substring(invoice_number FROM 5 FOR 6),
+       MAX(CAST(substring(invoice_number FROM 12) AS INTEGER))
+FROM invoices
+WHERE invoice_number ~ '^INV-[0-9]{6}-[0-9]+$'
+GROUP BY company_id, substring(invoice_number FROM 5 FOR 6)
+ON CONFLICT (company_id, document_type, period)
+DO UPDATE SET last_value = GREATEST(document_number_sequences.last_value, EXCLUDED.last_value);
+
+-- 発行済みの見積番号（YYYY-連番）からカウンターを初期化
+INSERT INTO document_number_sequences (company_id, document_type, period, last_value)
+SELECT company_id, 'estimate', substring(estimate_number FROM 1 FOR 4),
+       MAX(CAST(substring(estimate_number FROM 6) AS INTEGER))
+FROM estimates
+WHERE estimate_number ~ '^[0-9]{4}-[0-9]+$'
+GROUP BY company_id, substring(estimate_number FROM 1 FOR 4)
+ON CONFLICT (company_id, document_type, period)
+DO UPDATE SET last_value = GREATEST(document_number_sequences.last_value, EXCLUDED.last_value);
+
+-- 番号の一意性をDBでも保証
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS idx_invoices_company_number_unique
+ON invoices(company_id, invoice_number);
+
+DO $$
+BEGIN
+    RAISE NOTICE '書類番号カウンターテーブル作成完了';
+END $$;
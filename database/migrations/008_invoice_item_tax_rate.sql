@@ -0,0 +1,24 @@
+-- ======================================
+-- Garden システム 明細別税率
+-- Migration: 008_invoice_item_tax_rate.sql
+-- 軽減税率（8%）の明細を税率別に集計するため、請求明細に税率列を追加する
+-- ======================================
+
+DO $$
+BEGIN
+    RAISE NOTICE '===========================================';
+    RAISE NOTICE '請求明細 税率列追加開始';
+    RAISE NOTICE '===========================================';
+END $$;
+
+-- NULL は請求書の税率（標準10%）を適用
+ALTER TABLE invoice_items ADD COLUMN IF NOT EXISTS tax_rate DECIMAL(5, 3);
+
+ALTER TABLE invoice_items DROP CONSTRAINT IF EXISTS check_invoice_item_tax_rate;
+ALTER TABLE invoice_items ADD CONSTRAINT check_invoice_item_tax_rate
+    CHECK (tax_rate IS NULL OR (tax_rate >= 0 AND tax_rate <= 1));
+
+DO $$
+BEGIN
+    RAISE NOTICE '請求明細 税率列追加完了';
+END $$;
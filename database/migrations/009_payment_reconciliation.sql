@@ -0,0 +1,30 @@
+-- ======================================
+-- Garden システム 入金消込
+-- Migration: 009_payment_reconciliation.sql
+-- 銀行入金明細との照合用に顧客名カナと取引番号の索引を追加する
+-- ======================================
+
+DO $$
+BEGIN
+    RAISE NOTICE '===========================================';
+    RAISE NOTICE '入金消込用カラム・インデックス作成開始';
+    RAISE NOTICE '===========================================';
+END $$;
+
+-- 振込依頼人名（カナ）との照合用
+ALTER TABLE customers ADD COLUMN IF NOT EXISTS customer_name_kana VARCHAR(255);
+
+-- 消込対象（未払い・一部支払・滞納）の請求書の読み込み
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_invoices_company_open_payment
+ON invoices(company_id, payment_status)
+WHERE payment_status IN ('未払い', '一部支払', '滞納');
+
+-- 取込済み明細の重複検出
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_invoice_payments_transaction_id
+ON invoice_payments(transaction_id)
+WHERE transaction_id IS NOT NULL;
+
+DO $$
+BEGIN
+    RAISE NOTICE '入金消込用カラム・インデックス作成完了';
+END $$;
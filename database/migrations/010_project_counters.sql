@@ -0,0 +1,53 @@
+-- ======================================
+-- Garden システム プロジェクト集計カウンター
+-- Migration: 010_project_counters.sql
+-- ダッシュボードのプロジェクト概要で、タスク・変更指示の件数を
+-- プロジェクト行ごとの相関サブクエリで数えずに済むよう集計列を追加する
+-- （以後の更新はアプリケーション側で同一トランザクション内に再計算）
+-- ======================================
+
+DO $$
+BEGIN
+    RAISE NOTICE '===========================================';
+    RAISE NOTICE 'プロジェクト集計カウンター作成開始';
+    RAISE NOTICE '===========================================';
+END $$;
+
+ALTER TABLE projects
+    ADD COLUMN IF NOT EXISTS task_count INTEGER NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS completed_task_count INTEGER NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS delayed_task_count INTEGER NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS change_order_count INTEGER NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS pending_change_order_count INTEGER NOT NULL DEFAULT 0;
+
+-- 既存データから初期値を設定（1回のGROUP BY集計）
+UPDATE projects p
+SET task_count = t.task_count,
+    completed_task_count = t.completed_task_count,
+    delayed_task_count = t.delayed_task_count
+FROM (
+    SELECT project_id,
+           COUNT(*) AS task_count,
+           COUNT(*) FILTER (WHERE status = '完了') AS completed_task_count,
+           COUNT(*) FILTER (WHERE status = '遅延') AS delayed_task_count
+    FROM project_tasks
+    GROUP BY project_id
+) t
+WHERE p.project_id = t.project_id;
+
+UPDATE projects p
+SET change_order_count = c.change_order_count,
+    pending_change_order_count = c.pending_change_order_count
+FROM (
+    SELECT project_id,
+           COUNT(*) AS change_order_count,
+           COUNT(*) FILTER (WHERE status = '申請中') AS pending_change_order_count
+    FROM change_orders
+    GROUP BY project_id
+) c
+WHERE p.project_id = c.project_id;
+
+DO $$
+BEGIN
+    RAISE NOTICE 'プロジェクト集計カウンター作成完了';
+END $$;
@@ -0,0 +1,66 @@
+-- ======================================
+-- Garden システム 工程表ストア
+-- Migration: 011_process_schedules.sql
+-- 工程表・工程タスク・タスク間依存関係を行単位で保存する
+-- （工程表はプロジェクトID・工程表IDの索引で取得し、タスク更新は該当行のみ書き換える）
+-- ======================================
+
+DO $$
+BEGIN
+    RAISE NOTICE '===========================================';
+    RAISE NOTICE '工程表ストア作成開始';
+    RAISE NOTICE '===========================================';
+END $$;
+
+CREATE TABLE IF NOT EXISTS process_schedules (
+    schedule_id SERIAL PRIMARY KEY,
+    project_id INTEGER NOT NULL,
+    name VARCHAR(255) NOT NULL,
+    description TEXT NOT NULL DEFAULT '',
+    start_date DATE NOT NULL,
+    end_date DATE NOT NULL,
+    template_id VARCHAR(50),
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS process_tasks (
+    schedule_id INTEGER NOT NULL REFERENCES process_schedules(schedule_id) ON DELETE CASCADE,
+    task_id INTEGER NOT NULL,
+    name VARCHAR(255) NOT NULL,
+    description TEXT NOT NULL DEFAULT '',
+    start_date DATE NOT NULL,
+    end_date DATE NOT NULL,
+    duration DOUBLE PRECISION NOT NULL DEFAULT 0,
+    progress INTEGER NOT NULL DEFAULT 0 CHECK (progress BETWEEN 0 AND 100),
+    category VARCHAR(50) NOT NULL,
+    assigned_to VARCHAR(100) NOT NULL DEFAULT '',
+    status VARCHAR(20) NOT NULL DEFAULT 'planned',
+    priority VARCHAR(20) NOT NULL DEFAULT 'medium',
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (schedule_id, task_id)
+);
+
+CREATE TABLE IF NOT EXISTS process_task_dependencies (
+    schedule_id INTEGER NOT NULL,
+    task_id INTEGER NOT NULL,
+    depends_on_task_id INTEGER NOT NULL,
+    PRIMARY KEY (schedule_id, task_id, depends_on_task_id),
+    FOREIGN KEY (schedule_id, task_id)
+        REFERENCES process_tasks(schedule_id, task_id) ON DELETE CASCADE,
+    FOREIGN KEY (schedule_id, depends_on_task_id)
+        REFERENCES process_tasks(schedule_id, task_id) ON DELETE CASCADE
+);
+
+-- プロジェクトの工程表取得
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_process_schedules_project
+ON process_schedules(project_id, schedule_id);
+
+-- 後続タスクの逆引き
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_process_task_dependencies_predecessor
+ON process_task_dependencies(schedule_id, depends_on_task_id);
+
+DO $$
+BEGIN
+    RAISE NOTICE '工程表ストア作成完了';
+END $$;
@@ -0,0 +1,58 @@
+-- ======================================
+-- Garden システム 工程表の進捗集計
+-- Migration: 012_process_progress_rollups.sql
+-- 進捗レポートを全タスクの走査なしで返すため、カテゴリ×ステータス別の
+-- タスク数・進捗合計と、バーンアップ用の日別スナップショットを追加する
+-- （以後の更新はアプリケーション側でタスク更新と同一トランザクション内に差分反映）
+-- ======================================
+
+DO $$
+BEGIN
+    RAISE NOTICE '===========================================';
+    RAISE NOTICE '工程表進捗集計作成開始';
+    RAISE NOTICE '===========================================';
+END $$;
+
+CREATE TABLE IF NOT EXISTS process_schedule_rollups (
+    schedule_id INTEGER NOT NULL REFERENCES process_schedules(schedule_id) ON DELETE CASCADE,
+    category VARCHAR(50) NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    task_count INTEGER NOT NULL DEFAULT 0,
+    progress_sum INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (schedule_id, category, status)
+);
+
+CREATE TABLE IF NOT EXISTS process_progress_snapshots (
+    schedule_id INTEGER NOT NULL REFERENCES process_schedules(schedule_id) ON DELETE CASCADE,
+    snapshot_date DATE NOT NULL,
+    total_tasks INTEGER NOT NULL DEFAULT 0,
+    completed_tasks INTEGER NOT NULL DEFAULT 0,
+    progress_sum INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (schedule_id, snapshot_date)
+);
+
+-- 既存データから集計を作成
+INSERT INTO process_schedule_rollups (schedule_id, category, status, task_count, progress_sum)
+SELECT schedule_id, category, status, COUNT(*), SUM(progress)
+FROM process_tasks
+GROUP BY schedule_id, category, status
+ON CONFLICT (schedule_id, category, status) DO UPDATE
+SET task_count = EXCLUDED.task_count,
+    progress_sum = EXCLUDED.progress_sum;
+
+-- 当日のスナップショットを作成
+INSERT INTO process_progress_snapshots (schedule_id, snapshot_date, total_tasks, completed_tasks, progress_sum)
+SELECT schedule_id,
+       CURRENT_DATE,
+       SUM(task_count),
+       COALESCE(SUM(task_count) FILTER (WHERE status = 'completed'), 0),
+       SUM(progress_sum)
+FROM process_schedule_rollups
+GROUP BY schedule_id
+ON CONFLICT (schedule_id, snapshot_date) DO NOTHING;
+
+DO $$
+BEGIN
+    RAISE NOTICE '工程表進捗集計作成完了';
+END $$;
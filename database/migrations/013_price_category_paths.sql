@@ -0,0 +1,76 @@
+-- ======================================
+-- Garden システム 単価カテゴリの経路（マテリアライズドパス）
+-- Migration: 013_price_category_paths.sql
+-- カテゴリに祖先IDを連ねた経路（例: /1/5/12/）を持たせ、
+-- 「このカテゴリ配下のすべて」を前方一致1回で検索できるようにする
+-- （経路はトリガーで維持し、親の付け替え時は配下の経路もまとめて更新）
+-- ======================================
+
+DO $$
+BEGIN
+    RAISE NOTICE '===========================================';
+    RAISE NOTICE '単価カテゴリ経路作成開始';
+    RAISE NOTICE '===========================================';
+END $$;
+
+ALTER TABLE price_categories ADD COLUMN IF NOT EXISTS category_path VARCHAR(255);
+
+-- 既存データの経路を作成
+WITH RECURSIVE paths AS (
+    SELECT category_id, '/' || category_id || '/' AS category_path
+    FROM price_categories
+    WHERE parent_category_id IS NULL
+    UNION ALL
+    SELECT child.category_id, paths.category_path || child.category_id || '/'
+    FROM price_categories child
+    JOIN paths ON child.parent_category_id = paths.category_id
+)
+UPDATE price_categories pc
+SET category_path = paths.category_path
+FROM paths
+WHERE pc.category_id = paths.category_id;
+
+-- 登録・親の付け替え時に経路を設定
+CREATE OR REPLACE FUNCTION set_price_category_path()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.category_path := COALESCE(
+        (SELECT category_path FROM price_categories WHERE category_id = NEW.parent_category_id),
+        '/'
+    ) || NEW.category_id || '/';
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 親の付け替え後に配下の経路を書き換え
+CREATE OR REPLACE FUNCTION move_price_category_subtree()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.category_path IS DISTINCT FROM OLD.category_path THEN
+        UPDATE price_categories
+        SET category_path = NEW.category_path || substring(category_path FROM length(OLD.category_path) + 1)
+        WHERE category_path LIKE OLD.category_path || '%'
+          AND category_id <> NEW.category_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS set_price_category_path ON price_categories;
+CREATE TRIGGER set_price_category_path
+    BEFORE INSERT OR UPDATE OF parent_category_id ON price_categories
+    FOR EACH ROW EXECUTE FUNCTION set_price_category_path();
+
+DROP TRIGGER IF EXISTS move_price_category_subtree ON price_categories;
+CREATE TRIGGER move_price_category_subtree
+    AFTER UPDATE OF parent_category_id ON price_categories
+    FOR EACH ROW EXECUTE FUNCTION move_price_category_subtree();
+
+-- 配下検索（category_path LIKE '/1/5/%'）用
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_price_categories_company_path
+ON price_categories(company_id, category_path text_pattern_ops);
+
+DO $$
+BEGIN
+    RAISE NOTICE '単価カテゴリ経路作成完了';
+END $$;
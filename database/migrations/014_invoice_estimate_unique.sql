@@ -0,0 +1,52 @@
+-- ======================================
+-- Garden システム 見積の二重請求書化防止
+-- Migration: 014_invoice_estimate_unique.sql
+-- 1つの見積から作成できる有効な請求書（キャンセル以外）を1件に制限する
+-- 同じ見積の請求書が既に複数ある場合は何も変更せずに中止する（psql で実行）
+-- ======================================
+
+\set ON_ERROR_STOP on
+
+DO $$
+BEGIN
+    RAISE NOTICE '===========================================';
+    RAISE NOTICE '見積の二重請求書化防止インデックス作成開始';
+    RAISE NOTICE '===========================================';
+END $$;
+
+-- 前回の CREATE INDEX CONCURRENTLY が失敗して残った無効なインデックスを削除
+SELECT 'DROP INDEX CONCURRENTLY ' || quote_ident(index_class.relname)
+FROM pg_index
+JOIN pg_class index_class ON index_class.oid = pg_index.indexrelid
+WHERE index_class.relname = 'idx_invoices_company_estimate_unique'
+  AND NOT pg_index.indisvalid
+\gexec
+
+DO $$
+DECLARE
+    duplicate_count INTEGER;
+BEGIN
+    SELECT COUNT(*) INTO duplicate_count
+    FROM (
+        SELECT 1 FROM invoices
+        WHERE estimate_id IS NOT NULL AND status <> 'キャンセル'
+        GROUP BY company_id, estimate_id
+        HAVING COUNT(*) > 1
+    ) duplicates;
+
+    IF duplicate_count > 0 THEN
+        RAISE EXCEPTION '複数の有効な請求書がある見積が % 件あります。不要な請求書をキャンセルしてから再実行してください', duplicate_count
+            USING HINT = 'SELECT company_id, estimate_id, array_agg(invoice_number) FROM invoices '
+                         'WHERE estimate_id IS NOT NULL AND status <> ''キャンセル'' '
+                         'GROUP BY company_id, estimate_id HAVING COUNT(*) > 1;';
+    END IF;
+END $$;
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS idx_invoices_company_estimate_unique
+ON invoices(company_id, estimate_id)
+WHERE estimate_id IS NOT NULL AND status <> 'キャンセル';
+
+DO $$
+BEGIN
+    RAISE NOTICE '見積の二重請求書化防止インデックス作成完了';
+END $$;
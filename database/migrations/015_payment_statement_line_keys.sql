@@ -0,0 +1,25 @@
+-- ======================================
+-- Garden システム 入金明細の重複検出キー
+-- Migration: 015_payment_statement_line_keys.sql
+-- 取引番号の無い入金明細も、取引日・名義・金額・行内容のハッシュで
+-- 取込済みかどうかを判定できるようにする
+-- ======================================
+
+DO $$
+BEGIN
+    RAISE NOTICE '===========================================';
+    RAISE NOTICE '入金明細キー作成開始';
+    RAISE NOTICE '===========================================';
+END $$;
+
+ALTER TABLE invoice_payments ADD COLUMN IF NOT EXISTS statement_line_key VARCHAR(64);
+
+-- 取込済み明細の重複検出（取引番号の無い明細）
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_invoice_payments_statement_line_key
+ON invoice_payments(statement_line_key)
+WHERE statement_line_key IS NOT NULL;
+
+DO $$
+BEGIN
+    RAISE NOTICE '入金明細キー作成完了';
+END $$;
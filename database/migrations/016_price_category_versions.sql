@@ -0,0 +1,47 @@
+-- ======================================
+-- Garden システム 単価カテゴリの版番号
+-- Migration: 016_price_category_versions.sql
+-- カテゴリツリーのキャッシュ（アプリの各プロセスが保持）を無効化するため、
+-- 会社ごとの版番号をDBに持ち、カテゴリの登録・更新・削除時にトリガーで進める
+-- （キャッシュは読み込みのたびに版番号を比較する）
+-- ======================================
+
+DO $$
+BEGIN
+    RAISE NOTICE '===========================================';
+    RAISE NOTICE '単価カテゴリ版番号作成開始';
+    RAISE NOTICE '===========================================';
+END $$;
+
+CREATE TABLE IF NOT EXISTS price_category_versions (
+    company_id INTEGER PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+);
+
+-- カテゴリの変更ごとに会社の版番号を進める（会社の付け替え時は両方）
+CREATE OR REPLACE FUNCTION bump_price_category_version()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        INSERT INTO price_category_versions (company_id, version)
+        VALUES (OLD.company_id, 1)
+        ON CONFLICT (company_id) DO UPDATE SET version = price_category_versions.version + 1;
+    END IF;
+    IF TG_OP <> 'DELETE' AND (TG_OP = 'INSERT' OR NEW.company_id IS DISTINCT FROM OLD.company_id) THEN
+        INSERT INTO price_category_versions (company_id, version)
+        VALUES (NEW.company_id, 1)
+        ON CONFLICT (company_id) DO UPDATE SET version = price_category_versions.version + 1;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS bump_price_category_version ON price_categories;
+CREATE TRIGGER bump_price_category_version
+    AFTER INSERT OR UPDATE OR DELETE ON price_categories
+    FOR EACH ROW EXECUTE FUNCTION bump_price_category_version();
+
+DO $$
+BEGIN
+    RAISE NOTICE '単価カテゴリ版番号作成完了';
+END $$;
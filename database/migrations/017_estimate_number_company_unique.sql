@@ -0,0 +1,61 @@
+-- ======================================
+-- Garden システム 見積番号の会社単位の一意化
+-- Migration: 017_estimate_number_company_unique.sql
+-- 見積番号は会社×年のカウンターから採番するため（各社 YYYY-0001 から始まる）、
+-- 全社共通の一意制約を (company_id, estimate_number) の一意インデックスに置き換える
+-- 同じ会社で見積番号が重複している場合は何も変更せずに中止する（psql で実行）
+-- ======================================
+
+\set ON_ERROR_STOP on
+
+DO $$
+BEGIN
+    RAISE NOTICE '===========================================';
+    RAISE NOTICE '見積番号の一意制約変更開始';
+    RAISE NOTICE '===========================================';
+END $$;
+
+-- 前回の CREATE INDEX CONCURRENTLY が失敗して残った無効なインデックスを削除
+SELECT 'DROP INDEX CONCURRENTLY ' || quote_ident(index_class.relname)
+FROM pg_index
+JOIN pg_class index_class ON index_class.oid = pg_index.indexrelid
+WHERE index_class.relname = 'unique_estimate_number'
+  AND NOT pg_index.indisvalid
+\gexec
+
+DO $$
+DECLARE
+    duplicate_count INTEGER;
+BEGIN
+    SELECT COUNT(*) INTO duplicate_count
+    FROM (
+        SELECT 1 FROM estimates
+        GROUP BY company_id, estimate_number
+        HAVING COUNT(*) > 1
+    ) duplicates;
+
+    IF duplicate_count > 0 THEN
+        RAISE EXCEPTION '見積番号の重複が % 件あります。重複を解消してから再実行してください', duplicate_count
+            USING HINT = 'SELECT company_id, estimate_number, array_agg(estimate_id) FROM estimates '
+                         'GROUP BY company_id, estimate_number HAVING COUNT(*) > 1;';
+    END IF;
+END $$;
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS unique_estimate_number
+ON estimates(company_id, estimate_number);
+
+-- 全社共通の一意制約（estimate_number 単独の UNIQUE）を削除
+SELECT 'ALTER TABLE estimates DROP CONSTRAINT ' || quote_ident(conname)
+FROM pg_constraint
+WHERE conrelid = 'estimates'::regclass
+  AND contype = 'u'
+  AND conkey = ARRAY[(
+      SELECT attnum FROM pg_attribute
+      WHERE attrelid = 'estimates'::regclass AND attname = 'estimate_number'
+  )]
+\gexec
+
+DO $$
+BEGIN
+    RAISE NOTICE '見積番号の一意制約変更完了';
+END $$;
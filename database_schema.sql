@@ -87,7 +87,7 @@ CREATE TABLE estimates (
     company_id INTEGER NOT NULL REFERENCES companies(company_id),
     project_id INTEGER REFERENCES projects(project_id),
     customer_id INTEGER NOT NULL REFERENCES customers(customer_id),
-    estimate_number VARCHAR(50) UNIQUE NOT NULL, -- 見積番号
+    estimate_number VARCHAR(50) NOT NULL, -- 見積番号（会社内で一意）
     estimate_date DATE NOT NULL DEFAULT CURRENT_DATE,
     valid_until DATE, -- 見積有効期限
     status VARCHAR(50) NOT NULL DEFAULT 'draft'
@@ -104,7 +104,10 @@ CREATE TABLE estimates (
     notes TEXT,
     created_by INTEGER REFERENCES users(user_id),
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    
+    -- 見積番号は会社×年のカウンターから採番するため会社単位で一意
+    CONSTRAINT unique_estimate_number UNIQUE (company_id, estimate_number)
 );
 
 -- 見積明細テーブル（階層構造対応）
@@ -6,8 +6,10 @@ Garden DX - OWASP Top 10 セキュリティ対策実装
 import re
 import html
 import urllib.parse
-from typing import Dict, List, Optional, Any, Union
+from typing import Dict, List, Optional, Any, Tuple, Union
 from datetime import datetime, timedelta
+from collections import OrderedDict
+import time
 import hashlib
 import secrets
 import ipaddress
@@ -445,10 +447,16 @@ class OWASPSecurity:
             return False
 
 class RateLimiter:
-    """レート制限実装"""
-    
-    def __init__(self):
-        self.attempts = {}  # {identifier: [timestamps]}
+    """
+    レート制限実装（スライディングウィンドウカウンター）
+    識別子ごとに (ウィンドウ番号, 現ウィンドウ件数, 前ウィンドウ件数) の固定サイズ状態のみ保持し、
+    アイドルになった識別子はLRU順に削除する
+    """
+    
+    def __init__(self, max_identifiers: int = 100000, clock=time.monotonic):
+        self.attempts: "OrderedDict[str, Tuple[int, int, int]]" = OrderedDict()
+        self.max_identifiers = max_identifiers
+        self.clock = clock
         self.limits = {
             'login': {'max_attempts': 5, 'window_minutes': 15},
             'api': {'max_attempts': 100, 'window_minutes': 1},
@@ -457,26 +465,37 @@ class RateLimiter:
     
     def check_rate_limit(self, identifier: str, limit_type: str = 'api') -> bool:
         """レート制限チェック"""
-        now = datetime.now()
-        limit_config = self.limits.get(limit_type, self.limits['api'])
+        if limit_type not in self.limits:
+            limit_type = 'api'
+        limit_config = self.limits[limit_type]
+        max_attempts = limit_config['max_attempts']
+        window = limit_config['window_minutes'] * 60
         
-        # 識別子の試行履歴取得
-        if identifier not in self.attempts:
-            self.attempts[identifier] = []
+        now = self.clock()
+        index = int(now // window)
+        key = f"{limit_type}:{identifier}"
         
-        attempts = self.attempts[identifier]
+        # 前回ウィンドウからの繰り越し
+        state = self.attempts.get(key)
+        if state is None or state[0] < index - 1:
+            current, previous = 0, 0
+        elif state[0] == index - 1:
+            current, previous = 0, state[1]
+        else:
+            current, previous = state[1], state[2]
         
-        # 古い試行を削除
-        window_start = now - timedelta(minutes=limit_config['window_minutes'])
-        attempts[:] = [attempt for attempt in attempts if attempt > window_start]
+        # 推定件数 = 前ウィンドウ件数 × 未経過割合 + 現ウィンドウ件数
+        estimated = previous * (1.0 - (now - index * window) / window) + current
+        allowed = estimated + 1 <= max_attempts
+        if allowed:
+            current += 1
         
-        # 制限チェック
-        if len(attempts) >= limit_config['max_attempts']:
-            return False
+        self.attempts[key] = (index, current, previous)
+        self.attempts.move_to_end(key)
+        if len(self.attempts) > self.max_identifiers:
+            self.attempts.popitem(last=False)
         
-        # 新しい試行を記録
-        attempts.append(now)
-        return True
+        return allowed
     
     def check_login_attempts(self, username: str) -> bool:
         """ログイン試行制限チェック"""